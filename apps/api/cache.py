@@ -1,21 +1,306 @@
+"""Response cache for the API routes.
+
+Two tiers:
+
+* an in-process LRU bounded by ``FITNESS_CACHE_MAX_ENTRIES`` / ``FITNESS_CACHE_MAX_BYTES``;
+* an optional shared tier (``FITNESS_CACHE_BACKEND=sqlite|redis``) so every uvicorn
+  worker sees values computed by the others.
+
+Concurrent misses for the same key are single-flighted: one caller computes, the rest
+wait and reuse its value (:func:`get_or_set_async` does the same for ``async def``
+routes without blocking the event loop). Hit/miss/eviction counters go to ``packages.metrics``.
+Entries are only valid for the data ``version`` they were computed against (the
+per-user data version, see ``utils.get_data_version``).
+
+Shared-tier entries are JSON, never pickle: anyone who can write to the Redis
+server or SQLite file must not get code execution in the API workers. Values that
+are not JSON-serializable stay in the in-process tier only; values read back from
+the shared tier have JSON types (string dict keys, lists for tuples).
+"""
+import asyncio
+import json
+import logging
+import sqlite3
+import threading
 import time
-from typing import Any, Callable, Dict, Optional, Tuple
+from collections import OrderedDict
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+import anyio
+
+import packages.config as config
+from packages import metrics
+
+try:
+    import redis
+except ImportError:  # pragma: no cover - optional dependency
+    redis = None
+
+logger = logging.getLogger("fitness.api")
+
+# expires_at, version, value, approximate size in bytes
+_Entry = Tuple[float, Optional[str], Any, int]
+
+_lock = threading.Lock()
+_cache: "OrderedDict[str, _Entry]" = OrderedDict()
+_cache_bytes = 0
+_flights: Dict[str, List[Any]] = {}
+_async_flights: Dict[str, "asyncio.Future"] = {}
+# Result of a flight whose leader was cancelled: its waiters compute the value themselves.
+_ABANDONED = object()
+_shared = None
+_shared_key: Optional[Tuple[str, str]] = None
+
+
+class SQLiteSharedCache:
+    """Shared tier in a local SQLite file (works across processes on one host)."""
+
+    PURGE_EVERY = 200
+
+    def __init__(self, path):
+        self._lock = threading.Lock()
+        self._writes = 0
+        self._conn = sqlite3.connect(str(path), timeout=1.0, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS api_cache (
+              key TEXT PRIMARY KEY,
+              expires_at REAL NOT NULL,
+              payload BLOB NOT NULL
+            )
+            """
+        )
+        self._conn.commit()
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT payload FROM api_cache WHERE key = ? AND expires_at > ?",
+                (key, time.time()),
+            ).fetchone()
+        return row[0] if row else None
+
+    def set(self, key: str, payload: bytes, expires_at: float) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO api_cache(key, expires_at, payload) VALUES(?, ?, ?)",
+                (key, expires_at, payload),
+            )
+            self._writes += 1
+            if self._writes % self.PURGE_EVERY == 0:
+                self._conn.execute("DELETE FROM api_cache WHERE expires_at <= ?", (time.time(),))
+            self._conn.commit()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM api_cache")
+            self._conn.commit()
+
+
+class RedisSharedCache:
+    """Shared tier on any Redis-protocol server (Redis, Valkey, KeyDB...)."""
+
+    PREFIX = "fitness:cache:"
+
+    def __init__(self, url: str):
+        if redis is None:
+            raise RuntimeError("redis package is required for FITNESS_CACHE_BACKEND=redis")
+        self._client = redis.Redis.from_url(url)
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self._client.get(self.PREFIX + key)
 
+    def set(self, key: str, payload: bytes, expires_at: float) -> None:
+        ttl_ms = int((expires_at - time.time()) * 1000)
+        if ttl_ms > 0:
+            self._client.set(self.PREFIX + key, payload, px=ttl_ms)
 
-_cache: Dict[str, Tuple[float, Any, Optional[str]]] = {}
+    def clear(self) -> None:
+        for key in self._client.scan_iter(self.PREFIX + "*"):
+            self._client.delete(key)
 
 
-def get_or_set(key: str, ttl_seconds: int, last_update: Optional[str], compute: Callable[[], Any]) -> Any:
-    now = time.time()
-    entry = _cache.get(key)
-    if entry:
-        expires_at, value, cached_last_update = entry
-        if expires_at > now and cached_last_update == last_update:
+def _json_default(value: Any) -> Any:
+    # Row values the Postgres driver returns as objects (the routes render these as JSON anyway).
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def _encode(expires_at: float, version: Optional[str], value: Any) -> Optional[bytes]:
+    try:
+        raw = json.dumps(
+            {"expires_at": expires_at, "version": version, "value": value},
+            default=_json_default,
+            separators=(",", ":"),
+        )
+    except (TypeError, ValueError):
+        return None
+    return raw.encode("utf-8")
+
+
+def _decode(payload: bytes) -> Tuple[float, Optional[str], Any]:
+    entry = json.loads(payload)
+    return float(entry["expires_at"]), entry["version"], entry["value"]
+
+
+def _shared_tier():
+    """Shared backend for the current config (None for in-process only)."""
+    global _shared, _shared_key
+    backend = config.CACHE_BACKEND
+    target = str(config.CACHE_REDIS_URL if backend == "redis" else config.CACHE_SQLITE_PATH)
+    if _shared_key == (backend, target):
+        return _shared
+    shared = None
+    try:
+        if backend == "sqlite":
+            config.CACHE_SQLITE_PATH.parent.mkdir(parents=True, exist_ok=True)
+            shared = SQLiteSharedCache(config.CACHE_SQLITE_PATH)
+        elif backend == "redis":
+            shared = RedisSharedCache(config.CACHE_REDIS_URL)
+    except Exception as exc:
+        logger.warning("cache_shared_tier_unavailable backend=%s error=%s", backend, exc)
+    _shared, _shared_key = shared, (backend, target)
+    return shared
+
+
+def _remember(key: str, entry: _Entry) -> None:
+    """Insert into the LRU and evict from the cold end until within bounds."""
+    global _cache_bytes
+    with _lock:
+        old = _cache.pop(key, None)
+        if old is not None:
+            _cache_bytes -= old[3]
+        _cache[key] = entry
+        _cache_bytes += entry[3]
+        evicted = 0
+        while _cache and (
+            len(_cache) > config.CACHE_MAX_ENTRIES or _cache_bytes > config.CACHE_MAX_BYTES
+        ):
+            _, dropped = _cache.popitem(last=False)
+            _cache_bytes -= dropped[3]
+            evicted += 1
+    if evicted:
+        metrics.inc("api_cache_evictions_total", evicted)
+
+
+def _lookup(key: str, now: float, version: Optional[str]) -> Tuple[bool, Any]:
+    with _lock:
+        entry = _cache.get(key)
+        if entry is not None:
+            if entry[0] > now and entry[1] == version:
+                _cache.move_to_end(key)
+                metrics.inc('api_cache_hits_total{tier="memory"}')
+                return True, entry[2]
+    shared = _shared_tier()
+    if shared is None:
+        return False, None
+    try:
+        payload = shared.get(key)
+        if payload is None:
+            return False, None
+        expires_at, cached_version, value = _decode(payload)
+    except Exception as exc:
+        logger.warning("cache_shared_get_failed key=%s error=%s", key, exc)
+        return False, None
+    if expires_at <= now or cached_version != version:
+        return False, None
+    _remember(key, (expires_at, cached_version, value, len(payload)))
+    metrics.inc('api_cache_hits_total{tier="shared"}')
+    return True, value
+
+
+def _store(key: str, expires_at: float, version: Optional[str], value: Any) -> None:
+    payload = _encode(expires_at, version, value)
+    _remember(key, (expires_at, version, value, len(payload) if payload is not None else len(repr(value))))
+    shared = _shared_tier()
+    if shared is None or payload is None:
+        return
+    try:
+        shared.set(key, payload, expires_at)
+    except Exception as exc:
+        logger.warning("cache_shared_set_failed key=%s error=%s", key, exc)
+
+
+def get_or_set(key: str, ttl_seconds: int, version: Optional[str], compute: Callable[[], Any]) -> Any:
+    hit, value = _lookup(key, time.time(), version)
+    if hit:
+        return value
+
+    with _lock:
+        flight = _flights.setdefault(key, [threading.Lock(), 0])
+        flight[1] += 1
+    try:
+        with flight[0]:
+            # Another caller may have filled the key while we waited.
+            hit, value = _lookup(key, time.time(), version)
+            if hit:
+                metrics.inc("api_cache_coalesced_total")
+                return value
+            metrics.inc("api_cache_misses_total")
+            value = compute()
+            _store(key, time.time() + ttl_seconds, version, value)
+            return value
+    finally:
+        with _lock:
+            flight[1] -= 1
+            if flight[1] == 0 and _flights.get(key) is flight:
+                del _flights[key]
+
+
+async def get_or_set_async(
+    key: str, ttl_seconds: int, version: Optional[str], compute: Callable[[], Awaitable[Any]]
+) -> Any:
+    """:func:`get_or_set` for async routes: concurrent misses on a key await one ``compute()``."""
+    shared = _shared_tier() is not None
+
+    async def call(fn, *args):
+        # The shared tier does file/network I/O: keep it off the event loop.
+        return await anyio.to_thread.run_sync(fn, *args) if shared else fn(*args)
+
+    while True:
+        hit, value = await call(_lookup, key, time.time(), version)
+        if hit:
+            return value
+        flight = _async_flights.get(key)
+        if flight is None:
+            break
+        metrics.inc("api_cache_coalesced_total")
+        value = await asyncio.shield(flight)
+        if value is not _ABANDONED:
             return value
-    value = compute()
-    _cache[key] = (now + ttl_seconds, value, last_update)
-    return value
+        # The leader's request went away (e.g. client disconnect); ours did not, so retry.
+    flight = asyncio.get_running_loop().create_future()
+    _async_flights[key] = flight
+    try:
+        metrics.inc("api_cache_misses_total")
+        value = await compute()
+        await call(_store, key, time.time() + ttl_seconds, version, value)
+        flight.set_result(value)
+        return value
+    except asyncio.CancelledError:
+        flight.set_result(_ABANDONED)
+        raise
+    except Exception as exc:
+        flight.set_exception(exc)
+        flight.exception()  # waiters re-raise it; don't log it as never retrieved
+        raise
+    finally:
+        if _async_flights.get(key) is flight:
+            del _async_flights[key]
 
 
 def clear() -> None:
-    _cache.clear()
+    global _cache_bytes
+    with _lock:
+        _cache.clear()
+        _cache_bytes = 0
+    shared = _shared_tier()
+    if shared is not None:
+        shared.clear()
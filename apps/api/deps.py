@@ -1,6 +1,7 @@
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
 
+from packages import db
 from packages.config import AUTH_DISABLED
 from .auth import decode_token, hash_password
 from .utils import get_db
@@ -9,6 +10,17 @@ from .utils import get_db
 auth_scheme = HTTPBearer(auto_error=False)
 
 
+async def request_db_scope():
+    """App-wide dependency: every ``get_db()`` in one request reuses one pooled connection.
+
+    Async so the scope is entered in the request's own context, which FastAPI copies
+    into the threadpool for sync dependencies and endpoints. Nothing is checked out
+    until a handler actually touches the database.
+    """
+    with db.connection_scope():
+        yield
+
+
 def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(auth_scheme)):
     if AUTH_DISABLED:
         with get_db() as conn:
@@ -0,0 +1,120 @@
+"""HTTP validators (ETag / If-None-Match) and Cache-Control for read endpoints.
+
+Routes opt in by adding one of the dependencies below to their decorator::
+
+    @router.get("/weekly", dependencies=[Depends(user_etag)])
+
+The dependency derives a weak ETag from the data version that backs the response
+(the per-user data version for aggregates, the activity's pipeline fingerprint for
+per-activity endpoints) *before* the handler runs. A matching ``If-None-Match``
+short-circuits with :class:`NotModified`, which ``main.py`` turns into an empty 304;
+otherwise ``main.py``'s middleware copies the ETag and Cache-Control headers onto the
+200 response.
+"""
+import datetime
+import hashlib
+from typing import Optional
+
+from fastapi import Depends, Request
+
+from .deps import get_current_user
+from .utils import db_exists, get_data_version, get_db
+
+# Aggregates change whenever the pipeline reprocesses a user's activities: always
+# revalidate, which is cheap because the ETag check runs before the handler.
+REVALIDATE = "private, no-cache"
+# Recorded stream samples never change for an activity id.
+IMMUTABLE = "private, max-age=31536000, immutable"
+
+
+class NotModified(Exception):
+    def __init__(self, etag: str, cache_control: str):
+        self.etag = etag
+        self.cache_control = cache_control
+
+
+def make_etag(*parts: object) -> str:
+    digest = hashlib.sha256("\0".join(str(p) for p in parts).encode("utf-8")).hexdigest()
+    # Weak: the representation is equivalent, not byte-identical (compression, key order).
+    return f'W/"{digest[:32]}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    opaque = etag[2:] if etag.startswith("W/") else etag
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == opaque:
+            return True
+    return False
+
+
+def _apply(request: Request, etag: Optional[str], cache_control: str) -> None:
+    if etag is None:
+        return
+    if request.method in ("GET", "HEAD") and etag_matches(request.headers.get("if-none-match"), etag):
+        raise NotModified(etag, cache_control)
+    request.state.etag = etag
+    request.state.cache_control = cache_control
+
+
+def _request_key(request: Request) -> str:
+    # Strip the /api and /api/v1 prefixes so every mount shares one validator.
+    path = request.url.path
+    for prefix in ("/api/v1", "/api"):
+        if path.startswith(prefix + "/"):
+            path = path[len(prefix):]
+            break
+    return f"{path}?{request.url.query}"
+
+
+def _activity_fingerprint(activity_id: str, user_id) -> Optional[str]:
+    if not db_exists():
+        return None
+    try:
+        with get_db() as conn:
+            row = conn.execute(
+                """
+                SELECT f.fingerprint, f.pipeline_version
+                FROM activity_fingerprints f
+                JOIN activities a ON a.activity_id = f.activity_id
+                WHERE f.activity_id = ? AND a.user_id = ?
+                """,
+                (activity_id, user_id),
+            ).fetchone()
+    except Exception:
+        return None  # pre-migration DB: no validator, serve normally
+    if not row:
+        return None
+    return f"{row[0]}:{row[1]}"
+
+
+def user_etag(request: Request, user=Depends(get_current_user)) -> None:
+    """User-level validator for aggregate endpoints (weekly, insights, totals...)."""
+    version = get_data_version(user["id"])
+    if version is None:
+        return
+    # Rolling windows ("last 7 days") move with the calendar even without new data.
+    today = datetime.datetime.now(datetime.timezone.utc).date().isoformat()
+    _apply(request, make_etag("user", user["id"], version, today, _request_key(request)), REVALIDATE)
+
+
+def activity_etag(activity_id: str, request: Request, user=Depends(get_current_user)) -> None:
+    """Activity-level validator for ``/activity/{activity_id}/...`` detail endpoints."""
+    fingerprint = _activity_fingerprint(activity_id, user["id"])
+    if fingerprint is None:
+        return
+    _apply(request, make_etag("activity", user["id"], fingerprint, _request_key(request)), REVALIDATE)
+
+
+def stream_etag(activity_id: str, request: Request, user=Depends(get_current_user)) -> None:
+    """Like :func:`activity_etag`, but the payload may be cached as immutable."""
+    fingerprint = _activity_fingerprint(activity_id, user["id"])
+    if fingerprint is None:
+        return
+    _apply(request, make_etag("activity", user["id"], fingerprint, _request_key(request)), IMMUTABLE)
@@ -0,0 +1,175 @@
+"""Async client for the LLM behind ``/insights/evaluate`` and assistant memory compaction.
+
+* One keep-alive ``httpx.AsyncClient`` per event loop (closed on app shutdown), so
+  repeated calls reuse the TLS connection instead of handshaking per question.
+* At most ``FITNESS_LLM_MAX_CONCURRENCY`` upstream calls per process; a caller that
+  can't get a slot within the timeout gets ``busy`` and the route falls back to its
+  deterministic answer.
+* :func:`cached_completion` keys answers on a hash of the question (see
+  :func:`prompt_key`) under a metrics version: identical in-flight questions share
+  one upstream call and repeats are served from the response cache until the
+  user's data changes.
+
+Failures are returned as codes (``http_error:<status>``, ``network_error``,
+``timeout``, ``busy``, ...) rather than raised, like the rest of the insights code.
+"""
+import asyncio
+import hashlib
+import json
+import os
+import time
+import weakref
+from typing import Dict, List, Optional, Tuple
+
+import httpx
+
+import packages.config as config
+from packages.metrics import inc, observe
+
+from .cache import get_or_set_async
+
+LLMResult = Tuple[Optional[Dict[str, object]], Optional[str], Optional[str]]
+
+
+class _LLMError(Exception):
+    def __init__(self, code: str):
+        super().__init__(code)
+        self.code = code
+
+
+def model_name() -> str:
+    return os.getenv("OPENAI_MODEL", "gpt-5.2-2025-12-11")
+
+
+def extract_response_text(payload: Dict[str, object]) -> str | None:
+    output_text = payload.get("output_text")
+    if isinstance(output_text, str) and output_text.strip():
+        return output_text.strip()
+    output = payload.get("output")
+    if isinstance(output, list):
+        chunks: List[str] = []
+        for item in output:
+            if not isinstance(item, dict):
+                continue
+            if item.get("type") != "message":
+                continue
+            for part in item.get("content", []) or []:
+                if not isinstance(part, dict):
+                    continue
+                if part.get("type") == "output_text" and part.get("text"):
+                    chunks.append(str(part["text"]))
+        text = "".join(chunks).strip()
+        return text or None
+    return None
+
+
+class _LoopClient:
+    def __init__(self, timeout: float, concurrency: int):
+        self.key = (timeout, concurrency)
+        self.slots = asyncio.Semaphore(concurrency)
+        self.client = httpx.AsyncClient(
+            timeout=httpx.Timeout(timeout, connect=min(timeout, 10.0)),
+            limits=httpx.Limits(
+                max_connections=concurrency, max_keepalive_connections=concurrency, keepalive_expiry=60.0
+            ),
+        )
+
+
+_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, _LoopClient]" = weakref.WeakKeyDictionary()
+
+
+def _client() -> _LoopClient:
+    loop = asyncio.get_running_loop()
+    key = (config.LLM_TIMEOUT_SEC, max(1, config.LLM_MAX_CONCURRENCY))
+    state = _clients.get(loop)
+    if state is None or state.key != key:
+        if state is not None:
+            loop.create_task(state.client.aclose())
+        state = _clients[loop] = _LoopClient(*key)
+    return state
+
+
+async def close_clients() -> None:
+    state = _clients.pop(asyncio.get_running_loop(), None)
+    if state is not None:
+        await state.client.aclose()
+
+
+async def complete_json(system_text: str, user_text: str) -> LLMResult:
+    """One Responses API call that must return a JSON object: ``(payload, model, error)``."""
+    api_key = os.getenv("OPENAI_API_KEY")
+    if not api_key:
+        return None, None, "missing_api_key"
+    model = model_name()
+    body = {
+        "model": model,
+        "input": [
+            {"role": "system", "content": system_text},
+            {"role": "user", "content": user_text},
+        ],
+        "text": {"format": {"type": "json_object"}},
+    }
+    state = _client()
+    started = time.monotonic()
+    try:
+        await asyncio.wait_for(state.slots.acquire(), config.LLM_TIMEOUT_SEC)
+    except asyncio.TimeoutError:
+        inc('llm_requests_total{result="busy"}')
+        return None, model, "busy"
+    try:
+        resp = await state.client.post(
+            f"{config.OPENAI_BASE_URL.rstrip('/')}/responses",
+            json=body,
+            headers={"Authorization": f"Bearer {api_key}"},
+        )
+        payload = resp.json() if resp.status_code < 400 else None
+    except httpx.TimeoutException:
+        return _failed(model, "timeout")
+    except httpx.HTTPError:
+        return _failed(model, "network_error")
+    except json.JSONDecodeError:
+        return _failed(model, "bad_json")
+    finally:
+        state.slots.release()
+        observe("llm_request_duration_seconds", time.monotonic() - started)
+    if resp.status_code >= 400:
+        return _failed(model, f"http_error:{resp.status_code}")
+
+    text = extract_response_text(payload) if isinstance(payload, dict) else None
+    if not text:
+        return _failed(model, "empty_response")
+    try:
+        parsed = json.loads(text)
+    except json.JSONDecodeError:
+        return _failed(model, "invalid_json")
+    if not isinstance(parsed, dict):
+        return _failed(model, "invalid_payload")
+    inc('llm_requests_total{result="ok"}')
+    return parsed, model, None
+
+
+def _failed(model: str, code: str) -> LLMResult:
+    inc('llm_requests_total{result="error"}')
+    return None, model, code
+
+
+def prompt_key(*parts) -> str:
+    """Cache key for an answer: the model plus whatever identifies the question (JSON-hashed)."""
+    raw = json.dumps([model_name(), *parts], sort_keys=True, default=str, ensure_ascii=False)
+    return "llm:" + hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+async def cached_completion(key: str, version: Optional[str], system_text: str, user_text: str) -> LLMResult:
+    """:func:`complete_json` with in-flight coalescing and answer caching (errors are never cached)."""
+
+    async def compute():
+        parsed, _, err = await complete_json(system_text, user_text)
+        if err:
+            raise _LLMError(err)
+        return parsed
+
+    try:
+        parsed = await get_or_set_async(key, config.LLM_CACHE_TTL_SEC, version, compute)
+    except _LLMError as exc:
+        return None, model_name() if exc.code != "missing_api_key" else None, exc.code
+    return parsed, model_name(), None
@@ -1,6 +1,7 @@
-from fastapi import FastAPI, Request, HTTPException
+from fastapi import Depends, FastAPI, Request, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import JSONResponse, Response
 import os
 import threading
 import time
@@ -9,14 +10,21 @@ import logging
 
 from packages.config import (
     CORS_ORIGINS,
+    GZIP_LEVEL,
+    GZIP_MIN_BYTES,
     REFRESH_SECONDS,
     RUN_MODE,
 )
+from packages import db_async
+from packages.db import PoolTimeout
 from packages.error_reporting import init_error_reporting
 from packages.ingestion_runner import run_ingestion_pipeline
 from packages.logging_utils import setup_logging
 from packages.request_context import request_id_var
 from packages.metrics import inc, observe
+from . import llm
+from .deps import request_db_scope
+from .http_cache import NotModified
 from .routes import activities as activities_routes
 from .routes import auth as auth_routes
 from .routes import health as health_routes
@@ -31,7 +39,7 @@ setup_logging()
 init_error_reporting("api", enable_fastapi=True)
 logger = logging.getLogger("fitness.api")
 
-app = FastAPI(title="Fitness Platform API")
+app = FastAPI(title="Fitness Platform API", dependencies=[Depends(request_db_scope)])
 
 
 def format_error(code: str, message: str, request_id: str | None = None, details: dict | None = None):
@@ -58,12 +66,31 @@ def trigger_ingestion_on_start():
     thread.start()
 
 
+@app.on_event("shutdown")
+async def close_async_clients():
+    await db_async.close_pools()
+    await llm.close_clients()
+
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=CORS_ORIGINS,
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(GZipMiddleware, minimum_size=GZIP_MIN_BYTES, compresslevel=GZIP_LEVEL)
+
+
+@app.middleware("http")
+async def http_cache_headers(request: Request, call_next):
+    # Routes opt in via the http_cache dependencies, which leave the validator on request.state.
+    response = await call_next(request)
+    etag = getattr(request.state, "etag", None)
+    if etag and response.status_code == 200:
+        response.headers["ETag"] = etag
+        response.headers["Cache-Control"] = request.state.cache_control
+        response.headers["Vary"] = "Authorization"
+    return response
 
 
 @app.middleware("http")
@@ -101,6 +128,26 @@ async def http_exception_handler(request: Request, exc: HTTPException):
     return JSONResponse(status_code=exc.status_code, content=format_error(code, message, req_id, details))
 
 
+@app.exception_handler(NotModified)
+async def not_modified_handler(request: Request, exc: NotModified):
+    inc("http_not_modified_total")
+    return Response(
+        status_code=304,
+        headers={"ETag": exc.etag, "Cache-Control": exc.cache_control, "Vary": "Authorization"},
+    )
+
+
+@app.exception_handler(PoolTimeout)
+async def pool_timeout_handler(request: Request, exc: PoolTimeout):
+    req_id = request_id_var.get() or "-"
+    logger.warning("db_pool_timeout %s %s", request.method, request.url.path)
+    return JSONResponse(
+        status_code=503,
+        content=format_error("db_unavailable", "Database busy, retry shortly", req_id),
+        headers={"Retry-After": "1"},
+    )
+
+
 @app.exception_handler(Exception)
 async def unhandled_exception_handler(request: Request, exc: Exception):
     req_id = request_id_var.get() or "-"
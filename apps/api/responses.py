@@ -0,0 +1,88 @@
+"""Fast serialization path for large array payloads (streams, series).
+
+Routes that return tens of thousands of floats hand their dict to :func:`fast_json`
+instead of returning it: the ``response_model`` still documents the shape in OpenAPI,
+but FastAPI skips re-validating every element through Pydantic, and the body is
+encoded with orjson when installed (stdlib ``json`` otherwise). Compression is left to
+the GZip middleware in ``main.py``.
+
+``format=f32`` responses use :func:`f32_frame`: a uint32 LE header length, a JSON
+header (padded to a 4-byte boundary) and the packed little-endian float32 columns, so
+a browser can wrap each column in a ``Float32Array`` without parsing numbers::
+
+    {"format": "f32", "columns": {"time": {"offset": 0, "count": 10800, "dims": 1}, ...}}
+
+``offset`` is relative to the end of the header, ``dims`` > 1 means interleaved rows
+(latlng), and NaN marks missing values.
+"""
+import json
+import struct
+from typing import Any, Dict, Optional, Tuple
+
+from fastapi.responses import Response
+
+import packages.config as config
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional dependency
+    orjson = None
+
+MAX_PRECISION = 6
+
+
+def round_floats(value: Any, digits: int) -> Any:
+    """Round every float in nested lists/dicts (ints and other values pass through)."""
+    if isinstance(value, float):
+        return round(value, digits)
+    if isinstance(value, list):
+        # Flat numeric arrays dominate: avoid a recursive call per element.
+        return [
+            round(v, digits) if type(v) is float else (v if type(v) is int else round_floats(v, digits))
+            for v in value
+        ]
+    if isinstance(value, dict):
+        return {k: round_floats(v, digits) for k, v in value.items()}
+    return value
+
+
+def dumps(content: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(content, separators=(",", ":"), allow_nan=False, default=str).encode("utf-8")
+
+
+class FastJSONResponse(Response):
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+class F32Response(Response):
+    media_type = "application/octet-stream"
+
+
+def f32_frame(columns: Dict[str, Tuple[bytes, int, int]]) -> bytes:
+    """Frame ``{name: (float32 bytes, count, dims)}`` as described in the module docstring."""
+    header: Dict[str, Any] = {"format": "f32", "columns": {}}
+    offset = 0
+    for name, (data, count, dims) in columns.items():
+        header["columns"][name] = {"offset": offset, "count": count, "dims": dims}
+        offset += len(data)
+    head = json.dumps(header, separators=(",", ":")).encode("utf-8")
+    head += b" " * (-(4 + len(head)) % 4)
+    return struct.pack("<I", len(head)) + head + b"".join(data for data, _, _ in columns.values())
+
+
+def fast_json(content: Any, precision: Optional[int] = None) -> Any:
+    """Round to ``precision`` decimals if asked and wrap in :class:`FastJSONResponse`.
+
+    With ``FITNESS_FAST_JSON=0`` the (rounded) dict is returned for FastAPI's regular
+    validate-and-encode path, which is what the benchmark compares against.
+    """
+    if precision is not None:
+        content = round_floats(content, max(0, min(MAX_PRECISION, precision)))
+    if not config.FAST_JSON:
+        return content
+    return FastJSONResponse(content)
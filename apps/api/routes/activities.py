@@ -1,12 +1,18 @@
 import json
 import logging
 import os
-from typing import Any, Dict, List
+from typing import Annotated, Any, Dict, List, Literal
 
 from fastapi import APIRouter, Depends, Query, HTTPException
 
-from ..cache import get_or_set
+from packages import series, simplify, stream_codec
+
+from packages.db_async import dict_rows as dict_rows_async
+
+from ..cache import get_or_set_async
 from ..deps import get_current_user
+from ..http_cache import activity_etag, stream_etag, user_etag
+from ..responses import MAX_PRECISION, F32Response, f32_frame, fast_json
 from ..schemas import (
     ActivityDetailResponse,
     ActivityRouteResponse,
@@ -19,7 +25,16 @@ from ..schemas import (
     SummaryResponse,
     WeeklyResponse,
 )
-from ..utils import build_date_filter, db_exists, decode_polyline, dict_rows, get_last_update, get_db
+from ..utils import (
+    build_date_filter,
+    db_exists,
+    decode_cursor,
+    decode_polyline,
+    encode_cursor,
+    get_data_version_async,
+    get_db,
+    get_db_async,
+)
 
 
 router_public = APIRouter()
@@ -28,69 +43,81 @@ router_api = APIRouter()
 logger = logging.getLogger("fitness.api")
 
 CACHE_TTL_SECONDS = 45
+MaxPoints = Annotated[int | None, Query(ge=3, le=simplify.MAX_POINTS_LIMIT)]
 MAX_ACTIVITIES_LIMIT = 200
 
 
 @router_public.get("/stats", response_model=StatsResponse)
-def stats(user=Depends(get_current_user)):
+async def stats(user=Depends(get_current_user)):
     if not db_exists():
         return {"db": "missing"}
-    with get_db() as conn:
-        cur = conn.cursor()
-        cur.execute("SELECT COUNT(*) FROM activities_raw WHERE user_id=?", (user["id"],))
-        activities = cur.fetchone()[0]
-        cur.execute("SELECT COUNT(*) FROM streams_raw WHERE user_id=?", (user["id"],))
-        streams = cur.fetchone()[0]
-        cur.execute("SELECT COUNT(*) FROM weather_raw WHERE user_id=?", (user["id"],))
-        weather = cur.fetchone()[0]
-        return {"activities_raw": activities, "streams_raw": streams, "weather_raw": weather}
+    async with get_db_async() as conn:
+        counts = {}
+        for table in ("activities_raw", "streams_raw", "weather_raw"):
+            cur = await conn.execute(f"SELECT COUNT(*) FROM {table} WHERE user_id=?", (user["id"],))
+            counts[table] = (await cur.fetchone())[0]
+        return counts
 
 
-@router_public.get("/weekly", response_model=WeeklyResponse)
-def weekly(limit: int = 52, user=Depends(get_current_user)):
+@router_public.get("/weekly", response_model=WeeklyResponse, dependencies=[Depends(user_etag)])
+async def weekly(limit: int = 52, user=Depends(get_current_user)):
     if not db_exists():
         return {"db": "missing"}
 
-    last_update = get_last_update()
+    data_version = await get_data_version_async(user["id"])
     cache_key = f"weekly:{user['id']}:{limit}"
 
-    def compute():
-        with get_db() as conn:
-            cur = conn.cursor()
-            cur.execute(
+    async def compute():
+        async with get_db_async() as conn:
+            cur = await conn.execute(
                 """
                 SELECT
                   week, runs, distance_m, moving_s, avg_pace_sec, flat_pace_sec,
                   flat_pace_weather_sec, avg_hr_norm, cadence_avg, stride_len,
                   eff_index, roll_pace_sec, roll_hr, roll_dist, monotony, strain
-                FROM metrics_weekly
+                FROM metrics_weekly_mat
                 WHERE user_id = ?
                 ORDER BY week DESC
                 LIMIT ?
                 """,
                 (user["id"], limit),
             )
-            return {"weekly": list(dict_rows(cur))}
+            return {"weekly": await dict_rows_async(cur)}
 
-    return get_or_set(cache_key, CACHE_TTL_SECONDS, last_update, compute)
+    return await get_or_set_async(cache_key, CACHE_TTL_SECONDS, data_version, compute)
 
 
-@router_public.get("/activities", response_model=ActivitiesResponse)
-def activities(
+@router_public.get("/activities", response_model=ActivitiesResponse, dependencies=[Depends(user_etag)])
+async def activities(
     activity_type: str = Query("run", alias="type"),
     limit: int = 100,
     offset: int = 0,
     start: str | None = None,
     end: str | None = None,
+    cursor: str | None = None,
     user=Depends(get_current_user),
 ):
+    """Newest first. Pass ``next_cursor`` back as ``cursor`` for the next page.
+
+    The keyset cursor is a ``(start_time, activity_id)`` position, so deep pages cost
+    the same as the first one. ``offset`` is kept for older clients. Activities
+    without a start time have no position in that order and are not listed.
+    """
     if not db_exists():
         return {"db": "missing"}
     limit = max(1, min(MAX_ACTIVITIES_LIMIT, limit))
-    with get_db() as conn:
-        cur = conn.cursor()
-        date_clause, date_params = build_date_filter(start, end)
-        cur.execute(
+    keyset_clause = ""
+    keyset_params: List[Any] = []
+    if cursor:
+        position = decode_cursor(cursor, 2)
+        if position is None or None in position:
+            raise HTTPException(status_code=400, detail="invalid_cursor")
+        keyset_clause = " AND (a.start_time, a.activity_id) < (?, ?)"
+        keyset_params = position
+        offset = 0
+    date_clause, date_params = build_date_filter(start, end)
+    async with get_db_async() as conn:
+        cur = await conn.execute(
             f"""
             SELECT
               a.activity_id,
@@ -111,29 +138,33 @@ def activities(
               d.hr_zone_label
             FROM activities a
             LEFT JOIN activity_details_run d ON d.activity_id = a.activity_id
-            WHERE lower(a.activity_type) = lower(?)
-              AND a.user_id = ?
-              {date_clause}
-            ORDER BY a.start_time DESC
+            WHERE a.user_id = ?
+              AND lower(a.activity_type) = lower(?)
+              AND a.start_time IS NOT NULL
+              {date_clause}{keyset_clause}
+            ORDER BY a.start_time DESC, a.activity_id DESC
             LIMIT ? OFFSET ?
             """,
-            (activity_type, user["id"], *date_params, limit, offset),
+            (user["id"], activity_type, *date_params, *keyset_params, limit, max(0, offset)),
         )
-        return {"activities": list(dict_rows(cur))}
+        rows = await dict_rows_async(cur)
+    next_cursor = None
+    if len(rows) == limit:
+        next_cursor = encode_cursor(rows[-1]["start_time"], rows[-1]["activity_id"])
+    return {"activities": rows, "next_cursor": next_cursor}
 
 
-@router_api.get("/activity_totals", response_model=ActivityTotalsResponse)
-def activity_totals(start: str | None = None, end: str | None = None, user=Depends(get_current_user)):
+@router_api.get("/activity_totals", response_model=ActivityTotalsResponse, dependencies=[Depends(user_etag)])
+async def activity_totals(start: str | None = None, end: str | None = None, user=Depends(get_current_user)):
     if not db_exists():
         return {"db": "missing"}
-    last_update = get_last_update()
+    data_version = await get_data_version_async(user["id"])
     cache_key = f"totals:{user['id']}:{start}:{end}"
 
-    def compute():
-        with get_db() as conn:
-            cur = conn.cursor()
-            date_clause, date_params = build_date_filter(start, end)
-            cur.execute(
+    async def compute():
+        date_clause, date_params = build_date_filter(start, end)
+        async with get_db_async() as conn:
+            cur = await conn.execute(
                 f"""
                 SELECT lower(a.activity_type) AS activity_type,
                        COUNT(*) AS count,
@@ -145,18 +176,17 @@ def activity_totals(start: str | None = None, end: str | None = None, user=Depen
                 """,
                 (user["id"], *date_params),
             )
-            return {"totals": list(dict_rows(cur))}
+            return {"totals": await dict_rows_async(cur)}
 
-    return get_or_set(cache_key, CACHE_TTL_SECONDS, last_update, compute)
+    return await get_or_set_async(cache_key, CACHE_TTL_SECONDS, data_version, compute)
 
 
-@router_public.get("/activity/{activity_id}", response_model=ActivityDetailResponse)
-def activity_detail(activity_id: str, user=Depends(get_current_user)):
+@router_public.get("/activity/{activity_id}", response_model=ActivityDetailResponse, dependencies=[Depends(activity_etag)])
+async def activity_detail(activity_id: str, user=Depends(get_current_user)):
     if not db_exists():
         return {"db": "missing"}
-    with get_db() as conn:
-        cur = conn.cursor()
-        cur.execute(
+    async with get_db_async() as conn:
+        cur = await conn.execute(
             """
             SELECT
               a.activity_id,
@@ -183,16 +213,17 @@ def activity_detail(activity_id: str, user=Depends(get_current_user)):
             """,
             (activity_id, user["id"]),
         )
-        row = cur.fetchone()
+        row = await cur.fetchone()
         if not row:
             raise HTTPException(status_code=404, detail="not_found")
         cols = [c[0] for c in cur.description]
         data = {cols[i]: row[i] for i in range(len(cols))}
         # Add weather context when available.
-        weather = conn.execute(
+        cur = await conn.execute(
             "SELECT raw_json FROM weather_raw WHERE activity_id=? AND user_id=?",
             (activity_id, user["id"]),
-        ).fetchone()
+        )
+        weather = await cur.fetchone()
         if weather and weather[0]:
             try:
                 data["weather"] = json.loads(weather[0])
@@ -203,8 +234,16 @@ def activity_detail(activity_id: str, user=Depends(get_current_user)):
         return data
 
 
-@router_public.get("/activity/{activity_id}/streams", response_model=StreamsResponse)
-def activity_streams(activity_id: str, types: str = "time,distance,heartrate,cadence,altitude", downsample: int = 1, user=Depends(get_current_user)):
+@router_public.get("/activity/{activity_id}/streams", response_model=StreamsResponse, dependencies=[Depends(stream_etag)])
+def activity_streams(
+    activity_id: str,
+    types: str = "time,distance,heartrate,cadence,altitude",
+    downsample: int = 1,
+    precision: Annotated[int | None, Query(ge=0, le=MAX_PRECISION)] = None,
+    fmt: Annotated[Literal["json", "f32"], Query(alias="format")] = "json",
+    max_points: MaxPoints = None,
+    user=Depends(get_current_user),
+):
     if not db_exists():
         return {"db": "missing"}
     want = {t.strip() for t in types.split(",") if t.strip()}
@@ -213,53 +252,80 @@ def activity_streams(activity_id: str, types: str = "time,distance,heartrate,cad
     with get_db() as conn:
         cur = conn.cursor()
         cur.execute(
-            "SELECT stream_type, raw_json FROM streams_raw WHERE activity_id=? AND user_id=?",
+            "SELECT stream_type, raw_json, data_blob FROM streams_raw WHERE activity_id=? AND user_id=?",
             (activity_id, user["id"]),
         )
+        rows = [row for row in cur.fetchall() if row[0] in want]
+        if max_points:
+            return _simplified_streams(rows, max_points, precision, fmt)
+        if fmt == "f32":
+            columns = {}
+            for stream_type, raw_json, data_blob in rows:
+                packed = stream_codec.load_f32(raw_json, data_blob, downsample)
+                if packed is not None:
+                    columns[stream_type] = packed
+            return F32Response(f32_frame(columns))
         out: Dict[str, Any] = {}
-        for stream_type, raw_json in cur.fetchall():
-            if stream_type not in want:
-                continue
-            try:
-                payload = json.loads(raw_json)
+        for stream_type, raw_json, data_blob in rows:
+            payload = stream_codec.load_payload(raw_json, data_blob)
+            if isinstance(payload, dict):
                 data = payload.get("data")
                 if downsample > 1 and isinstance(data, list):
                     payload["data"] = data[::downsample]
-                out[stream_type] = payload
-            except json.JSONDecodeError:
-                out[stream_type] = None
-        return {"streams": out}
-
-
-@router_public.get("/activity/{activity_id}/laps", response_model=LapsResponse)
+            out[stream_type] = payload
+        return fast_json({"streams": out}, precision)
+
+
+def _simplified_streams(rows, max_points: int, precision: int | None, fmt: str):
+    """Apply one LTTB index set (over the numeric streams, against time) to every stream."""
+    payloads = {}
+    for stream_type, raw_json, data_blob in rows:
+        payload = stream_codec.load_payload(raw_json, data_blob)
+        if isinstance(payload, dict) and isinstance(payload.get("data"), list):
+            payloads[stream_type] = payload
+    if not payloads:
+        return fast_json({"streams": {}}, precision)
+    length = max(len(p["data"]) for p in payloads.values())
+    x = payloads["time"]["data"] if "time" in payloads else list(range(length))
+    ys = [
+        p["data"]
+        for stream_type, p in payloads.items()
+        if stream_type != "time" and length and len(p["data"]) == length and not isinstance(p["data"][0], list)
+    ]
+    indices = simplify.lttb_indices(x, ys, max_points) if len(x) == length else list(range(length))
+    for payload in payloads.values():
+        payload["data"] = simplify.take(payload["data"], indices)
+    if fmt == "f32":
+        return F32Response(f32_frame({k: stream_codec.f32_bytes(p["data"]) for k, p in payloads.items()}))
+    return fast_json({"streams": payloads}, precision)
+
+
+@router_public.get("/activity/{activity_id}/laps", response_model=LapsResponse, dependencies=[Depends(activity_etag)])
 def activity_laps(activity_id: str, lap_m: int = 1000, user=Depends(get_current_user)):
     if not db_exists():
         return {"db": "missing"}
     with get_db() as conn:
         cur = conn.cursor()
         cur.execute(
-            "SELECT raw_json FROM streams_raw WHERE activity_id=? AND stream_type='distance' AND user_id=?",
+            "SELECT raw_json, data_blob FROM streams_raw WHERE activity_id=? AND stream_type='distance' AND user_id=?",
             (activity_id, user["id"]),
         )
         dist_row = cur.fetchone()
         cur.execute(
-            "SELECT raw_json FROM streams_raw WHERE activity_id=? AND stream_type='time' AND user_id=?",
+            "SELECT raw_json, data_blob FROM streams_raw WHERE activity_id=? AND stream_type='time' AND user_id=?",
             (activity_id, user["id"]),
         )
         time_row = cur.fetchone()
         cur.execute(
-            "SELECT raw_json FROM streams_raw WHERE activity_id=? AND stream_type='altitude' AND user_id=?",
+            "SELECT raw_json, data_blob FROM streams_raw WHERE activity_id=? AND stream_type='altitude' AND user_id=?",
             (activity_id, user["id"]),
         )
         alt_row = cur.fetchone()
         if not dist_row or not time_row:
             return {"laps": []}
-        try:
-            dist = json.loads(dist_row[0]).get("data", [])
-            time_stream = json.loads(time_row[0]).get("data", [])
-            alt = json.loads(alt_row[0]).get("data", []) if alt_row and alt_row[0] else []
-        except json.JSONDecodeError:
-            return {"laps": []}
+        dist = stream_codec.load_data(*dist_row)
+        time_stream = stream_codec.load_data(*time_row)
+        alt = stream_codec.load_data(*alt_row) if alt_row else []
         if not dist or not time_stream or len(dist) != len(time_stream):
             return {"laps": []}
 
@@ -336,7 +402,7 @@ def activity_laps(activity_id: str, lap_m: int = 1000, user=Depends(get_current_
         return {"laps": laps}
 
 
-@router_public.get("/activity/{activity_id}/summary", response_model=SummaryResponse)
+@router_public.get("/activity/{activity_id}/summary", response_model=SummaryResponse, dependencies=[Depends(activity_etag)])
 def activity_summary(activity_id: str, user=Depends(get_current_user)):
     if not db_exists():
         return {"db": "missing"}
@@ -481,156 +547,143 @@ def activity_summary(activity_id: str, user=Depends(get_current_user)):
         }
 
 
-@router_public.get("/activity/{activity_id}/series", response_model=ActivitySeriesResponse)
-def activity_series(activity_id: str, downsample: int = 5, user=Depends(get_current_user)):
+def _simplified_cache(cur, activity_id: str, kind: str, max_points: int, user_id):
+    """Pipeline-precomputed max_points payload, None if absent."""
+    cur.execute(
+        """
+        SELECT s.payload
+        FROM activity_simplified_cache s
+        JOIN activities a ON a.activity_id = s.activity_id
+        WHERE s.activity_id = ? AND s.kind = ? AND s.max_points = ? AND a.user_id = ?
+        """,
+        (activity_id, kind, max_points, user_id),
+    )
+    row = cur.fetchone()
+    return series.unpack(row[0]) if row else None
+
+
+def _series_response(out: Dict[str, list], precision: int | None, fmt: str, max_points: int | None = None):
+    if max_points:
+        out = simplify.simplify_series(out, max_points)
+    if fmt == "f32":
+        return F32Response(f32_frame({key: stream_codec.f32_bytes(values) for key, values in out.items()}))
+    return fast_json({"series": out}, precision)
+
+
+@router_public.get("/activity/{activity_id}/series", response_model=ActivitySeriesResponse, dependencies=[Depends(activity_etag)])
+def activity_series(
+    activity_id: str,
+    downsample: int = 5,
+    precision: Annotated[int | None, Query(ge=0, le=MAX_PRECISION)] = None,
+    fmt: Annotated[Literal["json", "f32"], Query(alias="format")] = "json",
+    max_points: MaxPoints = None,
+    user=Depends(get_current_user),
+):
     if not db_exists():
         return {"db": "missing"}
+    # max_points replaces stride slicing: LTTB over the full-resolution series.
+    downsample = 1 if max_points else max(1, downsample)
     with get_db() as conn:
         cur = conn.cursor()
+        if max_points in simplify.SIMPLIFY_TARGETS:
+            cached = _simplified_cache(cur, activity_id, "series", max_points, user["id"])
+            if cached is not None:
+                return _series_response(cached, precision, fmt)
+        if downsample in series.SERIES_LEVELS:
+            # Precomputed by the pipeline: one indexed read.
+            cur.execute(
+                """
+                SELECT s.payload
+                FROM activity_series_cache s
+                JOIN activities a ON a.activity_id = s.activity_id
+                WHERE s.activity_id = ? AND s.downsample = ? AND a.user_id = ?
+                """,
+                (activity_id, downsample, user["id"]),
+            )
+            row = cur.fetchone()
+            cached = series.unpack(row[0]) if row else None
+            if cached is not None:
+                return _series_response(cached, precision, fmt, max_points)
+
         cur.execute(
-            "SELECT raw_json FROM streams_raw WHERE activity_id=? AND stream_type='time' AND user_id=?",
-            (activity_id, user["id"]),
-        )
-        time_row = cur.fetchone()
-        cur.execute(
-            "SELECT raw_json FROM streams_raw WHERE activity_id=? AND stream_type='distance' AND user_id=?",
-            (activity_id, user["id"]),
-        )
-        dist_row = cur.fetchone()
-        cur.execute(
-            "SELECT raw_json FROM streams_raw WHERE activity_id=? AND stream_type='heartrate' AND user_id=?",
-            (activity_id, user["id"]),
-        )
-        hr_row = cur.fetchone()
-        cur.execute(
-            "SELECT hr_norm_json FROM activities_norm WHERE activity_id=?",
-            (activity_id,),
-        )
-        hr_norm_row = cur.fetchone()
-        cur.execute(
-            "SELECT pace_smooth_json, cadence_smooth_json, hr_smooth_json FROM activities_norm WHERE activity_id=?",
-            (activity_id,),
-        )
-        smooth_row = cur.fetchone()
-        cur.execute(
-            "SELECT raw_json FROM streams_raw WHERE activity_id=? AND stream_type='cadence' AND user_id=?",
-            (activity_id, user["id"]),
-        )
-        cad_row = cur.fetchone()
-        cur.execute(
-            "SELECT raw_json FROM streams_raw WHERE activity_id=? AND stream_type='altitude' AND user_id=?",
+            """
+            SELECT stream_type, raw_json, data_blob
+            FROM streams_raw
+            WHERE activity_id = ? AND user_id = ?
+              AND stream_type IN ('time', 'distance', 'heartrate', 'cadence', 'altitude')
+            """,
             (activity_id, user["id"]),
         )
-        alt_row = cur.fetchone()
-        if not time_row or not dist_row:
+        streams = {stream_type: (raw_json, data_blob) for stream_type, raw_json, data_blob in cur.fetchall()}
+        if "time" not in streams or "distance" not in streams:
             logger.warning(
                 "missing_streams_series activity_id=%s user_id=%s has_time=%s has_distance=%s",
                 activity_id,
                 user["id"],
-                bool(time_row),
-                bool(dist_row),
+                "time" in streams,
+                "distance" in streams,
             )
             return {"series": {}}
+        cur.execute(
+            """
+            SELECT hr_norm_json, pace_smooth_json, cadence_smooth_json, hr_smooth_json
+            FROM activities_norm
+            WHERE activity_id = ?
+            """,
+            (activity_id,),
+        )
+        norm_row = cur.fetchone() or (None, None, None, None)
 
-        def load_data(row):
-            try:
-                return json.loads(row[0]).get("data", [])
-            except json.JSONDecodeError:
-                return []
-
-        time_stream = load_data(time_row)
-        dist = load_data(dist_row)
-        hr = load_data(hr_row) if hr_row else []
-        hr_norm = []
-        if hr_norm_row and hr_norm_row[0]:
-            try:
-                hr_norm = json.loads(hr_norm_row[0])
-            except json.JSONDecodeError:
-                hr_norm = []
-        pace_smooth = cadence_smooth = hr_smooth = []
-        if smooth_row:
-            try:
-                pace_smooth = json.loads(smooth_row[0]) if smooth_row[0] else []
-            except json.JSONDecodeError:
-                pace_smooth = []
-            try:
-                cadence_smooth = json.loads(smooth_row[1]) if smooth_row[1] else []
-            except json.JSONDecodeError:
-                cadence_smooth = []
-            try:
-                hr_smooth = json.loads(smooth_row[2]) if smooth_row[2] else []
-            except json.JSONDecodeError:
-                hr_smooth = []
-        # If smoothed arrays are present but contain only nulls, treat as missing
-        if pace_smooth and not any(v is not None for v in pace_smooth):
-            pace_smooth = []
-        if cadence_smooth and not any(v is not None for v in cadence_smooth):
-            cadence_smooth = []
-        if hr_smooth and not any(v is not None for v in hr_smooth):
-            hr_smooth = []
-        cad = load_data(cad_row) if cad_row else []
-        alt = load_data(alt_row) if alt_row else []
-
-        if not time_stream or not dist or len(time_stream) != len(dist):
-            return {"series": {}}
-
-        out_time = time_stream[::downsample]
-        out_dist = dist[::downsample]
-        out = {
-            "time": out_time,
-            "pace": (pace_smooth[::downsample] if pace_smooth else []),
-            "hr": (hr_smooth if hr_smooth else (hr_norm if hr_norm else hr))[::downsample] if (hr_smooth or hr_norm or hr) else [],
-            "cadence": (cadence_smooth if cadence_smooth else cad)[::downsample] if (cadence_smooth or cad) else [],
-            "elevation": alt[::downsample] if alt else [],
-        }
+    def load_data(stream_type):
+        row = streams.get(stream_type)
+        return stream_codec.load_data(*row) if row else []
 
-        def forward_fill(values):
-            last = None
-            filled = []
-            for v in values:
-                if v is None:
-                    filled.append(last)
-                else:
-                    last = v
-                    filled.append(v)
-            return filled
-
-        if not out["pace"] or not any(v is not None for v in out["pace"]):
-            for i in range(1, len(time_stream), downsample):
-                dt = time_stream[i] - time_stream[i - 1]
-                dd = dist[i] - dist[i - 1]
-                pace = (dt / (dd / 1000)) if dd > 0 else None
-                out["pace"].append(pace)
-
-        out["pace"] = forward_fill(out["pace"])
-        out["hr"] = forward_fill(out["hr"])
-        out["cadence"] = forward_fill(out["cadence"])
-
-        def rolling_distance_avg(distances, values, window_m=200):
-            if not distances or not values:
-                return values
-            out_vals = []
-            start_idx = 0
-            for i, d in enumerate(distances):
-                while start_idx < i and distances[start_idx] < d - window_m:
-                    start_idx += 1
-                window = [v for v in values[start_idx:i + 1] if v is not None]
-                out_vals.append(sum(window) / len(window) if window else values[i])
-            return out_vals
-
-        out["pace"] = rolling_distance_avg(out_dist, out["pace"], window_m=200)
-
-        return {"series": out}
-
-
-@router_public.get("/activity/{activity_id}/route", response_model=ActivityRouteResponse)
-def activity_route(activity_id: str, downsample: int = 5, user=Depends(get_current_user)):
+    def load_json(value):
+        if not value:
+            return []
+        try:
+            return json.loads(value)
+        except json.JSONDecodeError:
+            return []
+
+    hr_norm, pace_smooth, cadence_smooth, hr_smooth = (load_json(v) for v in norm_row)
+    out = series.build_series(
+        load_data("time"),
+        load_data("distance"),
+        downsample,
+        hr=load_data("heartrate"),
+        hr_norm=hr_norm,
+        pace_smooth=pace_smooth,
+        cadence_smooth=cadence_smooth,
+        hr_smooth=hr_smooth,
+        cadence=load_data("cadence"),
+        altitude=load_data("altitude"),
+    )
+    return _series_response(out, precision, fmt, max_points)
+
+
+@router_public.get("/activity/{activity_id}/route", response_model=ActivityRouteResponse, dependencies=[Depends(activity_etag)])
+def activity_route(
+    activity_id: str,
+    downsample: int = 5,
+    max_points: Annotated[int | None, Query(ge=2, le=simplify.MAX_POINTS_LIMIT)] = None,
+    user=Depends(get_current_user),
+):
     if not db_exists():
         return {"db": "missing"}
+
+    def thin(coords):
+        # Douglas-Peucker keeps corners and turnarounds that stride slicing drops.
+        return simplify.simplify_route(coords, max_points) if max_points else coords[::downsample]
+
     with get_db() as conn:
         cur = conn.cursor()
+        if max_points in simplify.SIMPLIFY_TARGETS:
+            cached = _simplified_cache(cur, activity_id, "route", max_points, user["id"])
+            if cached is not None:
+                return {"route": cached}
         cur.execute(
-            "SELECT raw_json FROM streams_raw WHERE activity_id=? AND stream_type='latlng' AND user_id=?",
+            "SELECT raw_json, data_blob FROM streams_raw WHERE activity_id=? AND stream_type='latlng' AND user_id=?",
             (activity_id, user["id"]),
         )
         row = cur.fetchone()
@@ -647,13 +700,9 @@ def activity_route(activity_id: str, downsample: int = 5, user=Depends(get_curre
                 summary_polyline = (activity.get("map") or {}).get("summary_polyline")
                 if summary_polyline:
                     coords = decode_polyline(summary_polyline)
-                    return {"route": coords[::downsample]}
+                    return {"route": thin(coords)}
             except json.JSONDecodeError:
                 pass
             return {"route": []}
-        try:
-            payload = json.loads(row[0])
-            latlng = payload.get("data") or []
-            return {"route": latlng[::downsample]}
-        except json.JSONDecodeError:
-            return {"route": []}
+        latlng = stream_codec.load_data(*row)
+        return {"route": thin(latlng)}
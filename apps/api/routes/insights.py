@@ -1,18 +1,29 @@
 import json
 import logging
-import os
 import re
 import uuid
 import time
 import statistics
 from datetime import datetime, timezone, timedelta
 from typing import Dict, List
-from urllib import request, error
 
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, BackgroundTasks, Depends
+from starlette.concurrency import run_in_threadpool
 
+from packages import db
+from packages.config import INSIGHTS_SNAPSHOT_MAX_AGE_SEC
+from packages.insights import (
+    compute_insights,
+    load_snapshot as load_insights_snapshot,
+    save_snapshot as save_insights_snapshot,
+    snapshot_age_sec,
+)
+from packages.training_days import TrainingDays, load_training_days
+
+from .. import llm
 from ..cache import get_or_set
 from ..deps import get_current_user
+from ..http_cache import user_etag
 from ..schemas import (
     AssistantOverviewResponse,
     InsightsContextRequest,
@@ -23,7 +34,16 @@ from ..schemas import (
     InsightsResponse,
     InsightsSeriesResponse,
 )
-from ..utils import compute_vdot, db_exists, get_db, get_last_update, linear_slope, week_key
+from ..utils import (
+    compute_vdot,
+    db_exists,
+    get_data_version,
+    get_data_version_async,
+    get_db,
+    get_db_async,
+    linear_slope,
+    week_key,
+)
 
 
 router = APIRouter()
@@ -41,64 +61,6 @@ def _format_pace_sec_per_km(pace_sec: float | None) -> str | None:
     return f"{minutes}:{seconds:02d}/km"
 
 
-def _best_run_in_distance_window(
-    conn,
-    user_id: int,
-    min_m: float,
-    max_m: float,
-    start_time_after: str | None = None,
-):
-    cur = conn.cursor()
-    clause = ""
-    params: list[object] = [user_id, min_m, max_m]
-    if start_time_after:
-        clause = " AND a.start_time >= ?"
-        params.append(start_time_after)
-    cur.execute(
-        f"""
-        SELECT a.activity_id, a.start_time, c.distance_m, c.moving_s
-        FROM activities a
-        JOIN activities_calc c ON c.activity_id = a.activity_id
-        WHERE a.user_id = ?
-          AND lower(a.activity_type) = 'run'
-          AND c.distance_m IS NOT NULL
-          AND c.moving_s IS NOT NULL
-          AND c.moving_s > 0
-          AND c.distance_m >= ?
-          AND c.distance_m <= ?
-          {clause}
-        ORDER BY c.moving_s ASC
-        LIMIT 1
-        """
-    , tuple(params))
-    row = cur.fetchone()
-    if not row:
-        return None
-    activity_id, start_time, distance_m, moving_s = row
-    return {
-        "activity_id": activity_id,
-        "start_time": start_time,
-        "distance_m": distance_m,
-        "moving_s": moving_s,
-    }
-
-
-def _best_run_pb(conn, user_id: int, target_m: int, start_time_after: str | None = None):
-    # Prefer runs whose total distance is very close to the target (avoid a fast 4.6k
-    # being reported as a 5k PB, etc.). Fall back to wider ranges if needed.
-    if target_m == 5000:
-        windows = [(4950, 5100), (4900, 5200), (4800, 5200), (4500, 5500)]
-    elif target_m == 10000:
-        windows = [(9900, 10200), (9800, 10300), (9700, 10300), (9000, 11000)]
-    else:
-        windows = [(target_m * 0.98, target_m * 1.02), (target_m * 0.95, target_m * 1.05)]
-    for lo, hi in windows:
-        best = _best_run_in_distance_window(conn, user_id, lo, hi, start_time_after)
-        if best:
-            return best
-    return None
-
-
 def _predict_riegel_from_best_pace_activity(
     conn,
     user_id: int,
@@ -148,12 +110,12 @@ def _predict_riegel_from_best_pace_activity(
     return best_time, best_activity_id
 
 
-@router.get("/assistant/overview", response_model=AssistantOverviewResponse)
+@router.get("/assistant/overview", response_model=AssistantOverviewResponse, dependencies=[Depends(user_etag)])
 def assistant_overview(user=Depends(get_current_user)):
     if not db_exists():
         return {"db": "missing"}
 
-    last_update = get_last_update()
+    data_version = get_data_version(user["id"])
     cache_key = f"assistant_overview:{user['id']}"
 
     def compute():
@@ -171,7 +133,7 @@ def assistant_overview(user=Depends(get_current_user)):
             cur.execute(
                 """
                 SELECT week, distance_m, avg_pace_sec, avg_hr_norm
-                FROM metrics_weekly
+                FROM metrics_weekly_mat
                 WHERE user_id = ?
                 ORDER BY week DESC
                 LIMIT 12
@@ -302,362 +264,33 @@ def assistant_overview(user=Depends(get_current_user)):
             },
         }
 
-    return get_or_set(cache_key, CACHE_TTL_SECONDS, last_update, compute)
+    return get_or_set(cache_key, CACHE_TTL_SECONDS, data_version, compute)
 
 
-@router.get("/insights", response_model=InsightsResponse)
+@router.get("/insights", response_model=InsightsResponse, dependencies=[Depends(user_etag)])
 def insights(user=Depends(get_current_user)):
     if not db_exists():
         return {"db": "missing"}
 
-    last_update = get_last_update()
+    data_version = get_data_version(user["id"])
     cache_key = f"insights:{user['id']}"
 
     def compute():
-        now = time.time()
-        one_year_ago = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(now - 365 * 24 * 3600))
-        days_28_ago = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(now - 28 * 24 * 3600))
-        days_7_ago = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(now - 7 * 24 * 3600))
         with get_db() as conn:
-            cur = conn.cursor()
-
-            # PBs from segments (if available).
-            cur.execute(
-                """
-                SELECT sb.distance_m, sb.time_s, sb.activity_id, sb.date
-                FROM segments_best sb
-                JOIN activities a ON a.activity_id = sb.activity_id
-                WHERE a.user_id = ?
-                  AND sb.scope = 'best_all'
-                  AND sb.distance_m IN (5000, 10000)
-                """
-                ,
-                (user["id"],),
-            )
-            pb_all: Dict[int, Dict[str, object]] = {}
-            for dist, time_s, activity_id, date in cur.fetchall():
-                pb_all[int(dist)] = {
-                    "time_s": time_s,
-                    "activity_id": activity_id,
-                    "date": date,
-                }
-
-            # Fallback PBs from full runs if segments_best isn't populated (Postgres + API-only mode).
-            if 5000 not in pb_all:
-                best_5k = _best_run_pb(conn, user["id"], 5000)
-                if best_5k:
-                    pb_all[5000] = {
-                        "time_s": best_5k["moving_s"],
-                        "activity_id": best_5k["activity_id"],
-                        "date": best_5k["start_time"],
-                    }
-            if 10000 not in pb_all:
-                best_10k = _best_run_pb(conn, user["id"], 10000)
-                if best_10k:
-                    pb_all[10000] = {
-                        "time_s": best_10k["moving_s"],
-                        "activity_id": best_10k["activity_id"],
-                        "date": best_10k["start_time"],
-                    }
-
-            cur.execute(
-                """
-                SELECT a.activity_id, a.start_time, c.distance_m, c.moving_s
-                FROM activities a
-                JOIN activities_calc c ON c.activity_id = a.activity_id
-                WHERE lower(a.activity_type) = 'run'
-                  AND a.user_id = ?
-                  AND a.start_time >= ?
-                  AND c.distance_m IS NOT NULL
-                  AND c.moving_s IS NOT NULL
-                  AND c.moving_s > 0
-                """,
-                (user["id"], one_year_ago),
-            )
-            best_vdot = None
-            best_source = None
-            for activity_id, start_time, distance_m, moving_s in cur.fetchall():
-                if distance_m is None or moving_s is None:
-                    continue
-                if distance_m < 5000:
-                    continue
-                vdot = compute_vdot(distance_m, moving_s)
-                if vdot is None:
-                    continue
-                if best_vdot is None or vdot > best_vdot:
-                    best_vdot = vdot
-                    best_source = {
-                        "activity_id": activity_id,
-                        "start_time": start_time,
-                        "distance_m": distance_m,
-                        "moving_s": moving_s,
-                    }
-
-            # Best 5K/10K in last 12 months (full activity bests).
-            best_12m: Dict[int, Dict[str, object]] = {}
-            cur.execute(
-                """
-                SELECT a.activity_id, a.start_time, c.distance_m, c.moving_s
-                FROM activities a
-                JOIN activities_calc c ON c.activity_id = a.activity_id
-                WHERE lower(a.activity_type) = 'run'
-                  AND a.user_id = ?
-                  AND a.start_time >= ?
-                  AND c.distance_m >= 5000
-                  AND c.moving_s > 0
-                """,
-                (user["id"], one_year_ago),
-            )
-            for activity_id, start_time, distance_m, moving_s in cur.fetchall():
-                dist = float(distance_m)
-                pace = moving_s / (dist / 1000)
-                if dist >= 5000:
-                    prev = best_12m.get(5000)
-                    if not prev or pace < prev["pace"]:  # type: ignore[index]
-                        best_12m[5000] = {
-                            "time_s": moving_s,
-                            "activity_id": activity_id,
-                            "date": start_time,
-                            "pace": pace,
-                        }
-                if dist >= 10000:
-                    prev = best_12m.get(10000)
-                    if not prev or pace < prev["pace"]:  # type: ignore[index]
-                        best_12m[10000] = {
-                            "time_s": moving_s,
-                            "activity_id": activity_id,
-                            "date": start_time,
-                            "pace": pace,
-                        }
-
-            # Prefer "true" 5k/10k runs when they exist.
-            best_5k_12m = _best_run_pb(conn, user["id"], 5000, one_year_ago)
-            if best_5k_12m:
-                best_12m[5000] = {
-                    "time_s": best_5k_12m["moving_s"],
-                    "activity_id": best_5k_12m["activity_id"],
-                    "date": best_5k_12m["start_time"],
-                }
-            best_10k_12m = _best_run_pb(conn, user["id"], 10000, one_year_ago)
-            if best_10k_12m:
-                best_12m[10000] = {
-                    "time_s": best_10k_12m["moving_s"],
-                    "activity_id": best_10k_12m["activity_id"],
-                    "date": best_10k_12m["start_time"],
-                }
-
-            # Estimated bests from segment PBs (Riegel).
-            cur.execute(
-                """
-                SELECT distance_m, time_s
-                FROM segments_best
-                WHERE scope IN ('best_12w', 'best_all')
-                  AND distance_m IN (3000, 5000, 10000)
-                ORDER BY CASE scope WHEN 'best_12w' THEN 0 ELSE 1 END
-                """
-            )
-            segment_best: Dict[int, float] = {}
-            for dist, time_s in cur.fetchall():
-                if dist not in segment_best:
-                    segment_best[int(dist)] = time_s
-
-            def riegel(t1, d1, d2, exp=1.06):
-                return t1 * ((d2 / d1) ** exp)
-
-            est_5k = None
-            est_10k = None
-            if 3000 in segment_best:
-                est_5k = riegel(segment_best[3000], 3000, 5000)
-                est_10k = riegel(segment_best[3000], 3000, 10000)
-            elif 5000 in segment_best:
-                est_10k = riegel(segment_best[5000], 5000, 10000)
-            elif 10000 in segment_best:
-                est_5k = riegel(segment_best[10000], 10000, 5000)
-            elif best_source and best_source.get("distance_m") and best_source.get("moving_s"):
-                # Fallback estimate: riegel from best VDOT-eligible full run.
-                d1 = float(best_source["distance_m"])
-                t1 = float(best_source["moving_s"])
-                if d1 > 0 and t1 > 0:
-                    est_5k = riegel(t1, d1, 5000)
-                    est_10k = riegel(t1, d1, 10000)
-
-            cur.execute(
-                """
-                SELECT week, avg_pace_sec, avg_hr_norm, eff_index
-                FROM metrics_weekly
-                WHERE user_id = ?
-                ORDER BY week DESC
-                LIMIT 12
-                """,
-                (user["id"],),
-            )
-            rows = cur.fetchall()
-            rows = list(reversed(rows))
-            pace_series = [r[1] for r in rows if r[1] is not None]
-            hr_series = [r[2] for r in rows if r[2] is not None]
-            eff_series = [r[3] for r in rows if r[3] is not None]
-
-            pace_trend = linear_slope(pace_series)
-            hr_trend = linear_slope(hr_series)
-            eff_trend = linear_slope(eff_series)
-
-            cur.execute(
-                """
-                SELECT monotony, strain, week
-                FROM metrics_weekly
-                WHERE user_id = ?
-                ORDER BY week DESC
-                LIMIT 1
-                """,
-                (user["id"],),
-            )
-            row = cur.fetchone()
-            monotony = row[0] if row else None
-            strain = row[1] if row else None
-
-            # Weekly fatigue load: moving time (s) * avg HR (bpm).
-            cur.execute(
-                """
-                SELECT week, moving_s, avg_hr_norm
-                FROM metrics_weekly
-                WHERE user_id = ?
-                ORDER BY week DESC
-                LIMIT 6
-                """,
-                (user["id"],),
-            )
-            fatigue_rows = cur.fetchall()
-            weekly_fatigue = []
-            for week, moving_s, avg_hr_norm in fatigue_rows:
-                if moving_s is None or avg_hr_norm is None:
-                    continue
-                weekly_fatigue.append(
-                    {"week": week, "load": float(moving_s) * float(avg_hr_norm)}
-                )
-            weekly_fatigue_sorted = list(reversed(weekly_fatigue))
-            last_week_load = weekly_fatigue_sorted[-1]["load"] if weekly_fatigue_sorted else None
-            last_4 = weekly_fatigue_sorted[-4:] if len(weekly_fatigue_sorted) >= 1 else []
-            fatigue_4w_avg = (
-                sum(w["load"] for w in last_4) / len(last_4) if last_4 else None
-            )
-
-            # Recovery index (28d): median efficiency vs max efficiency.
-            cur.execute(
-                """
-                SELECT c.distance_m, c.moving_s, COALESCE(c.avg_hr_norm, c.avg_hr_raw)
-                FROM activities_calc c
-                JOIN activities a ON a.activity_id = c.activity_id
-                WHERE a.user_id = ?
-                  AND lower(a.activity_type) = 'run'
-                  AND a.start_time >= ?
-                  AND c.distance_m IS NOT NULL
-                  AND c.moving_s IS NOT NULL
-                  AND c.moving_s > 0
-                  AND COALESCE(c.avg_hr_norm, c.avg_hr_raw) IS NOT NULL
-                """,
-                (user["id"], days_28_ago),
-            )
-            efficiencies = []
-            for distance_m, moving_s, avg_hr in cur.fetchall():
-                if not distance_m or not moving_s or not avg_hr:
-                    continue
-                pace_sec = moving_s / (distance_m / 1000)
-                if pace_sec <= 0:
-                    continue
-                # Speed per bpm proxy.
-                eff = (1000 / pace_sec) / avg_hr
-                if eff > 0:
-                    efficiencies.append(eff)
-            recovery_index = None
-            if efficiencies:
-                eff_med = statistics.median(efficiencies)
-                eff_max = max(efficiencies)
-                if eff_max > 0:
-                    recovery_index = 100 * (eff_med / eff_max)
-
-            # Pace/HR efficiency trend (12w) using weekly data.
-            cur.execute(
-                """
-                SELECT avg_pace_sec, avg_hr_norm
-                FROM metrics_weekly
-                WHERE user_id = ?
-                ORDER BY week DESC
-                LIMIT 12
-                """,
-                (user["id"],),
-            )
-            eff_weekly = []
-            for avg_pace_sec, avg_hr_norm in cur.fetchall():
-                if avg_pace_sec and avg_hr_norm:
-                    eff = (1000 / avg_pace_sec) / avg_hr_norm
-                    eff_weekly.append(eff)
-            eff_weekly = list(reversed(eff_weekly))
-            efficiency_trend = linear_slope(eff_weekly)
-
-            cur.execute(
-                """
-                SELECT AVG(decoupling), AVG(hr_drift)
-                FROM activities_calc
-                WHERE activity_type = 'run'
-                  AND activity_id IN (
-                    SELECT activity_id
-                    FROM activities
-                    WHERE user_id = ?
-                      AND lower(activity_type) = 'run'
-                      AND start_time >= ?
-                  )
-                """,
-                (user["id"], days_28_ago),
-            )
-            decoupling_avg, hr_drift_avg = cur.fetchone() or (None, None)
-
-            cur.execute(
-                """
-                SELECT COALESCE(SUM(distance_m), 0)
-                FROM activities
-                WHERE user_id = ?
-                  AND lower(activity_type) = 'run'
-                  AND start_time >= ?
-                """,
-                (user["id"], days_7_ago),
-            )
-            dist_7d = cur.fetchone()[0] or 0
-            cur.execute(
-                """
-                SELECT COALESCE(SUM(distance_m), 0)
-                FROM activities
-                WHERE user_id = ?
-                  AND lower(activity_type) = 'run'
-                  AND start_time >= ?
-                """,
-                (user["id"], days_28_ago),
-            )
-            dist_28d = cur.fetchone()[0] or 0
-
-        return {
-            "vdot_best": best_vdot,
-            "vdot_source": best_source,
-            "pb_all": pb_all,
-            "pb_12m": best_12m,
-            "est_5k_s": est_5k,
-            "est_10k_s": est_10k,
-            "pace_trend_sec_per_week": pace_trend,
-            "hr_trend_bpm_per_week": hr_trend,
-            "eff_trend_per_week": eff_trend,
-            "monotony": monotony,
-            "strain": strain,
-            "decoupling_28d": decoupling_avg,
-            "hr_drift_28d": hr_drift_avg,
-            "weekly_fatigue": weekly_fatigue_sorted,
-            "fatigue_last_week": last_week_load,
-            "fatigue_4w_avg": fatigue_4w_avg,
-            "recovery_index_28d": recovery_index,
-            "efficiency_trend_12w": efficiency_trend,
-            "dist_7d_km": dist_7d / 1000 if dist_7d else 0,
-            "dist_28d_km": dist_28d / 1000 if dist_28d else 0,
-        }
-
-    return get_or_set(cache_key, CACHE_TTL_SECONDS, last_update, compute)
+            stored = load_insights_snapshot(conn, user["id"])
+            if stored:
+                payload, computed_at = stored
+                age = snapshot_age_sec(computed_at)
+                if age is not None and age <= INSIGHTS_SNAPSHOT_MAX_AGE_SEC:
+                    return payload
+            # Miss or stale (the 7d/28d windows move with the clock): recompute and store.
+            computed_at = datetime.now(timezone.utc)
+            payload = compute_insights(conn, user["id"], now=computed_at.timestamp())
+            save_insights_snapshot(conn, user["id"], payload, computed_at.isoformat())
+            conn.commit()
+        return payload
+
+    return get_or_set(cache_key, CACHE_TTL_SECONDS, data_version, compute)
 
 
 @router.get("/insights/daily", response_model=InsightsDailyResponse)
@@ -709,28 +342,6 @@ def _trend_label(value: float | None, better_lower: bool, threshold: float = 0.5
     return "improving" if improving else "declining"
 
 
-def _extract_response_text(payload: Dict[str, object]) -> str | None:
-    output_text = payload.get("output_text")
-    if isinstance(output_text, str) and output_text.strip():
-        return output_text.strip()
-    output = payload.get("output")
-    if isinstance(output, list):
-        chunks: List[str] = []
-        for item in output:
-            if not isinstance(item, dict):
-                continue
-            if item.get("type") != "message":
-                continue
-            for part in item.get("content", []) or []:
-                if not isinstance(part, dict):
-                    continue
-                if part.get("type") == "output_text" and part.get("text"):
-                    chunks.append(str(part["text"]))
-        text = "".join(chunks).strip()
-        return text or None
-    return None
-
-
 def _coerce_list(value: object, limit: int = 3) -> List[str]:
     if not isinstance(value, list):
         return []
@@ -832,11 +443,7 @@ def _save_memory(conn, user_id: int, summary: Dict[str, object], last_session_id
         )
 
 
-def _call_openai_memory_summary(existing_summary: str | None, turns_text: str):
-    api_key = os.getenv("OPENAI_API_KEY")
-    if not api_key:
-        return None, None, "missing_api_key"
-    model = os.getenv("OPENAI_MODEL", "gpt-5.2-2025-12-11")
+def _memory_prompt(existing_summary: str | None, turns_text: str):
     system_text = (
         "You are summarizing a long-term memory for a running coach. "
         "Return JSON with keys: summary (string), goals (array), preferences (array), "
@@ -845,63 +452,33 @@ def _call_openai_memory_summary(existing_summary: str | None, turns_text: str):
     user_text = "Existing summary:\n"
     user_text += (existing_summary or "None") + "\n\n"
     user_text += "New turns:\n" + turns_text
-    body = {
-        "model": model,
-        "input": [
-            {"role": "system", "content": system_text},
-            {"role": "user", "content": user_text},
-        ],
-        "text": {"format": {"type": "json_object"}},
-    }
-    req = request.Request(
-        "https://api.openai.com/v1/responses",
-        data=json.dumps(body).encode("utf-8"),
-        headers={
-            "Authorization": f"Bearer {api_key}",
-            "Content-Type": "application/json",
-        },
-    )
-    try:
-        with request.urlopen(req, timeout=30) as resp:
-            payload = json.load(resp)
-    except error.HTTPError as exc:
-        return None, model, f"http_error:{exc.code}"
-    except error.URLError:
-        return None, model, "network_error"
-    except json.JSONDecodeError:
-        return None, model, "bad_json"
+    return system_text, user_text
 
-    text = _extract_response_text(payload)
-    if not text:
-        return None, model, "empty_response"
-    try:
-        parsed = json.loads(text)
-    except json.JSONDecodeError:
-        return None, model, "invalid_json"
-    if not isinstance(parsed, dict):
-        return None, model, "invalid_payload"
-    return parsed, model, None
 
-
-def _maybe_compact_memory(conn, user_id: int):
+def _load_compaction_turns(user_id: int):
+    """(existing summary, turns text, last session row id), or None if there's too little to compact."""
     try:
-        summary, last_id = _load_memory(conn, user_id)
-    except Exception:
-        return
-    last_id = last_id or 0
-    cur = conn.cursor()
-    cur.execute(
-        """
-        SELECT id, prompt_json, response_json
-        FROM insight_sessions
-        WHERE user_id = ? AND id > ?
-        ORDER BY id ASC
-        """,
-        (user_id, last_id),
-    )
-    rows = cur.fetchall()
+        with get_db() as conn:
+            try:
+                summary, last_id = _load_memory(conn, user_id)
+            except Exception:
+                return None
+            last_id = last_id or 0
+            cur = conn.cursor()
+            cur.execute(
+                """
+                SELECT id, prompt_json, response_json
+                FROM insight_sessions
+                WHERE user_id = ? AND id > ?
+                ORDER BY id ASC
+                """,
+                (user_id, last_id),
+            )
+            rows = cur.fetchall()
+    finally:
+        db.release_scoped()
     if len(rows) < 6:
-        return
+        return None
     turns: List[Dict[str, str]] = []
     for row in rows[-12:]:
         prompt_json = row[1] or "{}"
@@ -918,17 +495,41 @@ def _maybe_compact_memory(conn, user_id: int):
         answer = response.get("answer")
         if question or answer:
             turns.append({"question": str(question or ""), "answer": str(answer or "")})
-    turns_text = _format_turns(turns)
     existing_summary = None
     if isinstance(summary, dict):
         existing_summary = summary.get("summary")
-    summary_payload, model, err = _call_openai_memory_summary(existing_summary, turns_text)
-    if summary_payload:
-        summary_payload["model"] = model
-        summary_payload["updated_at"] = datetime.now(timezone.utc).isoformat()
-        _save_memory(conn, user_id, summary_payload, rows[-1][0])
-    elif err and err != "missing_api_key":
-        logger.warning("assistant_memory compact_error=%s model=%s", err, model)
+    return existing_summary, _format_turns(turns), rows[-1][0]
+
+
+def _store_memory(user_id: int, summary: Dict[str, object], last_session_id: int):
+    with get_db() as conn:
+        _save_memory(conn, user_id, summary, last_session_id)
+        conn.commit()
+
+
+# Users whose memory is being summarized right now: one compaction per user at a time.
+_compacting: set = set()
+
+
+async def _maybe_compact_memory(user_id: int):
+    if user_id in _compacting:
+        return
+    _compacting.add(user_id)
+    try:
+        pending = await run_in_threadpool(_load_compaction_turns, user_id)
+        if pending is None:
+            return
+        existing_summary, turns_text, last_row_id = pending
+        # No DB connection is held across the LLM call.
+        summary_payload, model, err = await llm.complete_json(*_memory_prompt(existing_summary, turns_text))
+        if summary_payload:
+            summary_payload["model"] = model
+            summary_payload["updated_at"] = datetime.now(timezone.utc).isoformat()
+            await run_in_threadpool(_store_memory, user_id, summary_payload, last_row_id)
+        elif err and err != "missing_api_key":
+            logger.warning("assistant_memory compact_error=%s model=%s", err, model)
+    finally:
+        _compacting.discard(user_id)
 
 
 def _parse_range_days(question: str, context: Dict[str, object] | None) -> int | None:
@@ -962,135 +563,28 @@ def _parse_range_days(question: str, context: Dict[str, object] | None) -> int |
     return None
 
 
-def _summarize_window(conn, user_id: int, start_dt: datetime, end_dt: datetime):
-    start_iso = start_dt.isoformat()
-    end_iso = end_dt.isoformat()
-    cur = conn.cursor()
-    cur.execute(
-        """
-        SELECT COUNT(*), SUM(c.distance_m), SUM(c.moving_s), AVG(c.avg_hr_norm), AVG(c.avg_hr_raw)
-        FROM activities a
-        JOIN activities_calc c ON c.activity_id = a.activity_id
-        WHERE a.user_id = ?
-          AND lower(a.activity_type) = 'run'
-          AND a.start_time >= ?
-          AND a.start_time <= ?
-        """,
-        (user_id, start_iso, end_iso),
-    )
-    row = cur.fetchone() or [0, 0, 0, None, None]
-    run_count = row[0] or 0
-    distance_m = row[1] or 0
-    moving_s = row[2] or 0
-    avg_hr = row[3] or row[4]
-    avg_pace_sec = None
-    if distance_m and moving_s:
-        avg_pace_sec = moving_s / (distance_m / 1000.0)
-
-    cur.execute(
-        """
-        SELECT MIN(time_s)
-        FROM segments_best
-        WHERE distance_m = 5000 AND date >= ? AND date <= ?
-        """,
-        (start_iso, end_iso),
-    )
-    best_5k = (cur.fetchone() or [None])[0]
-    cur.execute(
-        """
-        SELECT MIN(time_s)
-        FROM segments_best
-        WHERE distance_m = 10000 AND date >= ? AND date <= ?
-        """,
-        (start_iso, end_iso),
-    )
-    best_10k = (cur.fetchone() or [None])[0]
-
-    cur.execute(
-        """
-        SELECT start_time
-        FROM activities
-        WHERE user_id = ?
-          AND lower(activity_type) = 'run'
-          AND start_time >= ?
-          AND start_time <= ?
-        ORDER BY start_time
-        """,
-        (user_id, start_iso, end_iso),
-    )
-    times = [_parse_dt(r[0]) for r in cur.fetchall()]
-    times = [t for t in times if t is not None]
-    # Keep this computation in Python to stay compatible across SQLite/Postgres.
-    weeks_with_runs = len({week_key(t) for t in times}) if times else 0
-    longest_gap_days = None
-    if len(times) >= 2:
-        gaps = []
-        for prev, cur_time in zip(times, times[1:]):
-            gap = (cur_time - prev).days
-            gaps.append(gap)
-        longest_gap_days = max(gaps) if gaps else None
-
-    cur.execute(
-        """
-        SELECT week, avg_pace_sec
-        FROM metrics_weekly
-        WHERE user_id = ?
-          AND week >= ?
-        ORDER BY week
-        """,
-        (user_id, week_key(start_dt)),
-    )
-    weekly_pace_series = [r[1] for r in cur.fetchall() if r[1] is not None]
+def _summarize_window(days: TrainingDays, weekly_pace: List[tuple], start_dt: datetime, end_dt: datetime):
+    summary = days.summary(start_dt, end_dt)
+    start_week = week_key(start_dt)
+    weekly_pace_series = [pace for week, pace in weekly_pace if str(week)[:10] >= start_week and pace is not None]
     pace_trend = linear_slope(weekly_pace_series) if weekly_pace_series else None
-
-    cur.execute(
-        """
-        SELECT a.start_time, c.distance_m
-        FROM activities a
-        JOIN activities_calc c ON c.activity_id = a.activity_id
-        WHERE a.user_id = ?
-          AND lower(a.activity_type) = 'run'
-          AND a.start_time >= ?
-          AND a.start_time <= ?
-        """,
-        (user_id, start_iso, end_iso),
-    )
-    yearly: Dict[str, float] = {}
-    for start_time, distance_m in cur.fetchall():
-        dt = _parse_dt(start_time)
-        if not dt:
-            continue
-        yr = str(dt.year)
-        yearly[yr] = yearly.get(yr, 0.0) + ((distance_m or 0.0) / 1000.0)
-
+    yearly = summary.pop("yearly_distance_km")
     return {
-        "start": start_iso,
-        "end": end_iso,
-        "runs": run_count,
-        "distance_km": round(distance_m / 1000.0, 1) if distance_m else 0.0,
-        "moving_hours": round(moving_s / 3600.0, 2) if moving_s else 0.0,
-        "avg_pace_sec": round(avg_pace_sec, 2) if avg_pace_sec else None,
-        "avg_hr": round(avg_hr, 1) if avg_hr else None,
-        "best_5k_time_s": best_5k,
-        "best_10k_time_s": best_10k,
-        "weeks_with_runs": weeks_with_runs,
-        "longest_gap_days": longest_gap_days,
+        "start": start_dt.isoformat(),
+        "end": end_dt.isoformat(),
+        **summary,
         "pace_trend": pace_trend,
         "yearly_distance_km": yearly,
     }
 
 
-def _call_openai_insights(
+def _insights_prompt(
     question: str,
     context: Dict[str, object],
     metrics: Dict[str, object],
     history_text: str | None,
     memory_summary: str | None,
 ):
-    api_key = os.getenv("OPENAI_API_KEY")
-    if not api_key:
-        return None, None, "missing_api_key"
-    model = os.getenv("OPENAI_MODEL", "gpt-5.2-2025-12-11")
     system_text = (
         "You are a running coach for a single athlete. "
         "Respond in JSON with keys: answer (string), today_recommendation (string), "
@@ -1106,158 +600,215 @@ def _call_openai_insights(
         user_text += f"Memory summary: {memory_summary}\n"
     if history_text:
         user_text += f"Recent conversation:\n{history_text}\n"
-    body = {
-        "model": model,
-        "input": [
-            {"role": "system", "content": system_text},
-            {"role": "user", "content": user_text},
-        ],
-        "text": {"format": {"type": "json_object"}},
-    }
-    req = request.Request(
-        "https://api.openai.com/v1/responses",
-        data=json.dumps(body).encode("utf-8"),
-        headers={
-            "Authorization": f"Bearer {api_key}",
-            "Content-Type": "application/json",
-        },
-    )
-    try:
-        with request.urlopen(req, timeout=30) as resp:
-            payload = json.load(resp)
-    except error.HTTPError as exc:
-        return None, model, f"http_error:{exc.code}"
-    except error.URLError:
-        return None, model, "network_error"
-    except json.JSONDecodeError:
-        return None, model, "bad_json"
-
-    text = _extract_response_text(payload)
-    if not text:
-        return None, model, "empty_response"
-    try:
-        parsed = json.loads(text)
-    except json.JSONDecodeError:
-        return None, model, "invalid_json"
-    if not isinstance(parsed, dict):
-        return None, model, "invalid_payload"
-    return parsed, model, None
+    return system_text, user_text
 
 
-@router.post("/insights/evaluate", response_model=InsightsEvaluateResponse)
-def insights_evaluate(payload: InsightsEvaluateRequest, user=Depends(get_current_user)):
-    if not db_exists():
-        return {"db": "missing"}
-    session_id = payload.session_id or str(uuid.uuid4())
-    recommendations: List[str] = []
-    follow_ups: List[str] = []
+def _load_evaluate_inputs(user_id: int, session_id: str, question: str, context: Dict[str, object] | None):
+    # Runs in a worker thread; hands the request's connection back before the LLM call.
     dist_7d_km = None
     dist_28d_km = None
     pace_trend = None
     hr_trend = None
-    last_run_at = None
     has_hr = False
     history_text = None
     memory_summary = None
 
-    with get_db() as conn:
-        cur = conn.cursor()
-        cur.execute(
-            """
-            SELECT week, distance_m, avg_pace_sec, avg_hr_norm, monotony, strain
-            FROM metrics_weekly
-            WHERE user_id = ?
-            ORDER BY week DESC
-            LIMIT 12
-            """,
-            (user["id"],),
-        )
-        rows = cur.fetchall()
-        if rows:
-            dist_7d_km = (rows[0][1] or 0) / 1000.0
-            dist_28d_km = sum((r[1] or 0) for r in rows[:4]) / 1000.0
-            pace_series = [r[2] for r in reversed(rows) if r[2] is not None]
-            hr_series = [r[3] for r in reversed(rows) if r[3] is not None]
-            has_hr = bool(hr_series)
-            pace_trend = linear_slope(pace_series)
-            hr_trend = linear_slope(hr_series)
+    try:
+        with get_db() as conn:
+            cur = conn.cursor()
+            cur.execute(
+                """
+                SELECT week, distance_m, avg_pace_sec, avg_hr_norm, monotony, strain
+                FROM metrics_weekly_mat
+                WHERE user_id = ?
+                ORDER BY week DESC
+                LIMIT 12
+                """,
+                (user_id,),
+            )
+            rows = cur.fetchall()
+            if rows:
+                dist_7d_km = (rows[0][1] or 0) / 1000.0
+                dist_28d_km = sum((r[1] or 0) for r in rows[:4]) / 1000.0
+                pace_series = [r[2] for r in reversed(rows) if r[2] is not None]
+                hr_series = [r[3] for r in reversed(rows) if r[3] is not None]
+                has_hr = bool(hr_series)
+                pace_trend = linear_slope(pace_series)
+                hr_trend = linear_slope(hr_series)
 
-        cur.execute(
-            """
-            SELECT MAX(start_time)
-            FROM activities
-            WHERE user_id = ? AND lower(activity_type) = 'run'
-            """,
-            (user["id"],),
-        )
-        row = cur.fetchone()
-        last_run_at = _parse_dt(row[0] if row else None)
+            cur.execute(
+                """
+                SELECT MAX(start_time)
+                FROM activities
+                WHERE user_id = ? AND lower(activity_type) = 'run'
+                """,
+                (user_id,),
+            )
+            row = cur.fetchone()
+            last_run_at = _parse_dt(row[0] if row else None)
 
-        cur.execute(
-            """
-            SELECT COUNT(*)
-            FROM context_events
-            WHERE user_id = ?
-              AND occurred_at >= ?
-            """,
-            (user["id"], (datetime.now(timezone.utc) - timedelta(days=7)).isoformat()),
-        )
-        recent_context = (cur.fetchone() or [0])[0]
+            cur.execute(
+                """
+                SELECT COUNT(*)
+                FROM context_events
+                WHERE user_id = ?
+                  AND occurred_at >= ?
+                """,
+                (user_id, (datetime.now(timezone.utc) - timedelta(days=7)).isoformat()),
+            )
+            recent_context = (cur.fetchone() or [0])[0]
 
-        try:
-            memory_payload, _ = _load_memory(conn, user["id"])
-            if isinstance(memory_payload, dict):
-                memory_summary = memory_payload.get("summary")
-        except Exception:
-            memory_summary = None
+            try:
+                memory_payload, _ = _load_memory(conn, user_id)
+                if isinstance(memory_payload, dict):
+                    memory_summary = memory_payload.get("summary")
+            except Exception:
+                memory_summary = None
 
-        try:
+            try:
+                cur.execute(
+                    """
+                    SELECT prompt_json, response_json
+                    FROM insight_sessions
+                    WHERE user_id = ? AND session_id = ?
+                    ORDER BY id DESC
+                    LIMIT 6
+                    """,
+                    (user_id, session_id),
+                )
+                rows = list(reversed(cur.fetchall()))
+                turns: List[Dict[str, str]] = []
+                for prompt_json, response_json in rows:
+                    try:
+                        prompt = json.loads(prompt_json or "{}")
+                    except json.JSONDecodeError:
+                        prompt = {}
+                    try:
+                        response = json.loads(response_json or "{}")
+                    except json.JSONDecodeError:
+                        response = {}
+                    turn_question = prompt.get("question")
+                    turn_answer = response.get("answer")
+                    if turn_question or turn_answer:
+                        turns.append({"question": str(turn_question or ""), "answer": str(turn_answer or "")})
+                history_text = _format_turns(turns) if turns else None
+            except Exception:
+                history_text = None
+
+            requested_days = _parse_range_days(question, context)
+            window_summaries: Dict[str, object] = {}
+            now_dt = datetime.now(timezone.utc)
+            windows = [
+                ("3m", 90),
+                ("6m", 180),
+                ("12m", 365),
+                ("3y", 365 * 3),
+            ]
+            if requested_days:
+                windows.append(("requested", requested_days))
+            # Two reads cover every window: the daily rollup and the weekly paces.
+            since_dt = now_dt - timedelta(days=max(days for _, days in windows))
+            training = load_training_days(conn, user_id, since_dt)
             cur.execute(
                 """
-                SELECT prompt_json, response_json
-                FROM insight_sessions
-                WHERE user_id = ? AND session_id = ?
-                ORDER BY id DESC
-                LIMIT 6
+                SELECT week, avg_pace_sec
+                FROM metrics_weekly_mat
+                WHERE user_id = ?
+                  AND week >= ?
+                ORDER BY week
                 """,
-                (user["id"], session_id),
+                (user_id, week_key(since_dt)),
             )
-            rows = list(reversed(cur.fetchall()))
-            turns: List[Dict[str, str]] = []
-            for prompt_json, response_json in rows:
-                try:
-                    prompt = json.loads(prompt_json or "{}")
-                except json.JSONDecodeError:
-                    prompt = {}
-                try:
-                    response = json.loads(response_json or "{}")
-                except json.JSONDecodeError:
-                    response = {}
-                question = prompt.get("question")
-                answer = response.get("answer")
-                if question or answer:
-                    turns.append({"question": str(question or ""), "answer": str(answer or "")})
-            history_text = _format_turns(turns) if turns else None
-        except Exception:
-            history_text = None
-
-        requested_days = _parse_range_days(payload.question, payload.context)
-        window_summaries: Dict[str, object] = {}
-        now_dt = datetime.now(timezone.utc)
-        windows = [
-            ("3m", 90),
-            ("6m", 180),
-            ("12m", 365),
-            ("3y", 365 * 3),
-        ]
-        for label, days in windows:
-            start_dt = now_dt - timedelta(days=days)
-            window_summaries[label] = _summarize_window(conn, user["id"], start_dt, now_dt)
-        if requested_days:
-            start_dt = now_dt - timedelta(days=requested_days)
-            window_summaries["requested"] = _summarize_window(
-                conn, user["id"], start_dt, now_dt
+            weekly_pace = cur.fetchall()
+            for label, days in windows:
+                start_dt = now_dt - timedelta(days=days)
+                window_summaries[label] = _summarize_window(training, weekly_pace, start_dt, now_dt)
+    finally:
+        db.release_scoped()
+    return {
+        "dist_7d_km": dist_7d_km,
+        "dist_28d_km": dist_28d_km,
+        "pace_trend": pace_trend,
+        "hr_trend": hr_trend,
+        "has_hr": has_hr,
+        "last_run_at": last_run_at,
+        "recent_context": recent_context,
+        "history_text": history_text,
+        "memory_summary": memory_summary,
+        "window_summaries": window_summaries,
+    }
+
+
+def _save_session(
+    user_id: int,
+    session_id: str,
+    question: str,
+    context: Dict[str, object] | None,
+    metrics_payload: Dict[str, object],
+    provider: str,
+    model: str | None,
+    response_payload: Dict[str, object],
+):
+    try:
+        with get_db() as conn:
+            cur = conn.cursor()
+            cur.execute(
+                """
+                INSERT INTO insight_sessions(user_id, session_date, session_id, prompt_json, response_json)
+                VALUES(?, ?, ?, ?, ?)
+                """,
+                (
+                    user_id,
+                    time.strftime("%Y-%m-%d"),
+                    session_id,
+                    json.dumps(
+                        {
+                            "session_id": session_id,
+                            "question": question,
+                            "context": context or {},
+                            "metrics": metrics_payload,
+                        }
+                    ),
+                    json.dumps(
+                        {
+                            "provider": provider,
+                            "model": model,
+                            "answer": response_payload["answer"],
+                            "today_recommendation": response_payload["today_recommendation"],
+                            "trend_insight": response_payload["trend_insight"],
+                            "predicted_5k_time_s": response_payload["predicted_5k_time_s"],
+                            "predicted_10k_time_s": response_payload["predicted_10k_time_s"],
+                            "recommendations": response_payload["recommendations"],
+                            "follow_ups": response_payload["follow_ups"],
+                        }
+                    ),
+                ),
             )
+            conn.commit()
+    finally:
+        db.release_scoped()
+
+
+@router.post("/insights/evaluate", response_model=InsightsEvaluateResponse)
+async def insights_evaluate(
+    payload: InsightsEvaluateRequest, background_tasks: BackgroundTasks, user=Depends(get_current_user)
+):
+    if not db_exists():
+        return {"db": "missing"}
+    session_id = payload.session_id or str(uuid.uuid4())
+    recommendations: List[str] = []
+    follow_ups: List[str] = []
+    inputs = await run_in_threadpool(
+        _load_evaluate_inputs, user["id"], session_id, payload.question, payload.context
+    )
+    dist_7d_km = inputs["dist_7d_km"]
+    dist_28d_km = inputs["dist_28d_km"]
+    pace_trend = inputs["pace_trend"]
+    hr_trend = inputs["hr_trend"]
+    has_hr = inputs["has_hr"]
+    last_run_at = inputs["last_run_at"]
+    recent_context = inputs["recent_context"]
+    window_summaries = inputs["window_summaries"]
 
     metrics_payload = {
         "dist_7d_km": dist_7d_km,
@@ -1324,12 +875,22 @@ def insights_evaluate(payload: InsightsEvaluateRequest, user=Depends(get_current
         predicted_5k_time_s = summary_source.get("best_5k_time_s")
         predicted_10k_time_s = summary_source.get("best_10k_time_s")
 
-    llm_payload, model, llm_error = _call_openai_insights(
+    system_text, user_text = _insights_prompt(
         payload.question,
         payload.context or {},
         metrics_payload,
-        history_text,
-        memory_summary,
+        inputs["history_text"],
+        inputs["memory_summary"],
+    )
+    # The metrics carry window timestamps, so answers are keyed on the question (with its
+    # session history and memory) under the data version the metrics were computed from;
+    # the UTC date covers the rolling windows. Identical in-flight questions share one call.
+    cache_key = llm.prompt_key(
+        user["id"], payload.question, payload.context, inputs["history_text"], inputs["memory_summary"]
+    )
+    metrics_version = f"{await get_data_version_async(user['id'])}:{datetime.now(timezone.utc).date()}"
+    llm_payload, model, llm_error = await llm.cached_completion(
+        cache_key, metrics_version, system_text, user_text
     )
     if llm_payload:
         provider = "openai"
@@ -1372,48 +933,23 @@ def insights_evaluate(payload: InsightsEvaluateRequest, user=Depends(get_current
         "follow_ups": follow_ups,
         "session_id": session_id,
     }
-    with get_db() as conn:
-        cur = conn.cursor()
-        cur.execute(
-            """
-            INSERT INTO insight_sessions(user_id, session_date, session_id, prompt_json, response_json)
-            VALUES(?, ?, ?, ?, ?)
-            """,
-            (
-                user["id"],
-                time.strftime("%Y-%m-%d"),
-                session_id,
-                json.dumps(
-                    {
-                        "session_id": session_id,
-                        "question": payload.question,
-                        "context": payload.context or {},
-                        "metrics": metrics_payload,
-                    }
-                ),
-                json.dumps(
-                    {
-                        "provider": provider,
-                        "model": model,
-                        "answer": answer,
-                        "today_recommendation": today_recommendation,
-                        "trend_insight": trend_insight,
-                        "predicted_5k_time_s": predicted_5k_time_s,
-                        "predicted_10k_time_s": predicted_10k_time_s,
-                        "recommendations": recommendations,
-                        "follow_ups": follow_ups,
-                    }
-                ),
-            ),
-        )
-        _maybe_compact_memory(conn, user["id"])
-        conn.commit()
-
+    await run_in_threadpool(
+        _save_session,
+        user["id"],
+        session_id,
+        payload.question,
+        payload.context,
+        metrics_payload,
+        provider,
+        model,
+        response_payload,
+    )
+    background_tasks.add_task(_maybe_compact_memory, user["id"])
     return response_payload
 
 
-@router.get("/insights/series", response_model=InsightsSeriesResponse)
-def insights_series(metric: str = "pace_trend", weeks: int = 52, user=Depends(get_current_user)):
+@router.get("/insights/series", response_model=InsightsSeriesResponse, dependencies=[Depends(user_etag)])
+async def insights_series(metric: str = "pace_trend", weeks: int = 52, user=Depends(get_current_user)):
     if not db_exists():
         return {"db": "missing"}
     weeks = max(4, min(104, weeks))
@@ -1421,9 +957,7 @@ def insights_series(metric: str = "pace_trend", weeks: int = 52, user=Depends(ge
     start_cutoff = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(now - weeks * 7 * 24 * 3600))
     series = []
     series_meta = None
-    with get_db() as conn:
-        cur = conn.cursor()
-
+    async with get_db_async() as conn:
         if metric in {
             "pace_trend",
             "hr_trend",
@@ -1435,17 +969,17 @@ def insights_series(metric: str = "pace_trend", weeks: int = 52, user=Depends(ge
             "eff_trend_phr",
             "recovery_index",
         }:
-            cur.execute(
+            cur = await conn.execute(
                 """
                 SELECT week, distance_m, moving_s, avg_pace_sec, avg_hr_norm, eff_index, monotony, strain
-                FROM metrics_weekly
+                FROM metrics_weekly_mat
                 WHERE user_id = ?
                 ORDER BY week DESC
                 LIMIT ?
                 """,
                 (user["id"], weeks),
             )
-            rows = list(reversed(cur.fetchall()))
+            rows = list(reversed(await cur.fetchall()))
             eff_values = []
             for week, distance_m, moving_s, avg_pace_sec, avg_hr_norm, eff_index, monotony, strain in rows:
                 value = None
@@ -1480,7 +1014,7 @@ def insights_series(metric: str = "pace_trend", weeks: int = 52, user=Depends(ge
                     ]
 
         elif metric in {"vdot", "decoupling"}:
-            cur.execute(
+            cur = await conn.execute(
                 """
                 SELECT a.start_time, c.distance_m, c.moving_s, c.decoupling
                 FROM activities a
@@ -1492,7 +1026,7 @@ def insights_series(metric: str = "pace_trend", weeks: int = 52, user=Depends(ge
                 (user["id"], start_cutoff),
             )
             buckets: Dict[str, list] = {}
-            for start_time, distance_m, moving_s, decoupling in cur.fetchall():
+            for start_time, distance_m, moving_s, decoupling in await cur.fetchall():
                 week = week_key(start_time or "")
                 if metric == "decoupling":
                     if decoupling is None:
@@ -1514,11 +1048,11 @@ def insights_series(metric: str = "pace_trend", weeks: int = 52, user=Depends(ge
                 series.append({"week": week, "value": value})
 
         if metric == "decoupling":
-            cur.execute(
+            cur = await conn.execute(
                 "SELECT COUNT(*) FROM streams_raw WHERE user_id=? AND stream_type='heartrate'",
                 (user["id"],),
             )
-            hr_count = cur.fetchone()[0] or 0
+            hr_count = (await cur.fetchone())[0] or 0
             if hr_count == 0:
                 series_meta = {"reason": "missing_hr_streams"}
 
@@ -1,5 +1,6 @@
 from fastapi import APIRouter, Response
 
+from packages.db import pool_stats
 from packages.metrics import snapshot
 
 router = APIRouter()
@@ -13,5 +14,9 @@ def metrics():
         lines.append(f"{name} {value}")
     for name, value in sorted(durations.items()):
         lines.append(f"{name}_sum {value}")
+    pool = pool_stats()
+    if pool:
+        for name, value in pool.items():
+            lines.append(f"db_pool_{name} {value}")
     body = "\n".join(lines) + "\n"
     return Response(content=body, media_type="text/plain")
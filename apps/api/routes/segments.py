@@ -1,6 +1,9 @@
 from fastapi import APIRouter, Depends
 
+from packages import stream_codec
+
 from ..deps import get_current_user
+from ..http_cache import activity_etag
 from ..schemas import ActivitySegmentsResponse, SegmentsBestResponse
 from ..utils import db_exists, get_db
 
@@ -8,14 +11,11 @@ from ..utils import db_exists, get_db
 router = APIRouter()
 
 
-def _stream_series(raw_json: str | None):
-    if not raw_json:
+def _stream_series(row: tuple | None):
+    if not row:
         return None
-    try:
-        import json
-
-        parsed = json.loads(raw_json)
-    except Exception:
+    parsed = stream_codec.load_payload(*row)
+    if not isinstance(parsed, dict):
         return None
     data = parsed.get("data")
     if not isinstance(data, list):
@@ -75,7 +75,7 @@ def segments_best(user=Depends(get_current_user)):
         return data
 
 
-@router.get("/activity/{activity_id}/segments", response_model=ActivitySegmentsResponse)
+@router.get("/activity/{activity_id}/segments", response_model=ActivitySegmentsResponse, dependencies=[Depends(activity_etag)])
 def activity_segments(activity_id: str, user=Depends(get_current_user)):
     if not db_exists():
         return {"db": "missing"}
@@ -97,13 +97,13 @@ def activity_segments(activity_id: str, user=Depends(get_current_user)):
         # Fallback: compute basic rolling bests from streams (API-only mode).
         cur.execute(
             """
-            SELECT stream_type, raw_json
+            SELECT stream_type, raw_json, data_blob
             FROM streams_raw
             WHERE user_id = ? AND activity_id = ? AND stream_type IN ('time', 'distance')
             """,
             (user["id"], activity_id),
         )
-        raw = {row[0]: row[1] for row in cur.fetchall()}
+        raw = {row[0]: (row[1], row[2]) for row in cur.fetchall()}
         time_series = _stream_series(raw.get("time"))
         dist_series = _stream_series(raw.get("distance"))
         if not time_series or not dist_series:
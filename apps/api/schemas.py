@@ -163,6 +163,7 @@ class ActivitySummary(BaseModel):
 
 class ActivitiesResponse(DBMissingResponse):
     activities: List[ActivitySummary] = Field(default_factory=list)
+    next_cursor: Optional[str] = None
 
 
 class ActivityDetailResponse(DBMissingResponse):
@@ -1,15 +1,24 @@
+import base64
+import binascii
 import datetime
 import json
 from typing import Any, Dict, Iterable, List, Optional, Tuple
 
+import anyio
+
 import packages.config as config
-from packages import db
+from packages import db, db_async
+from packages.insights import compute_vdot, linear_slope  # noqa: F401 - re-exported for routes
 
 
 def get_db():
-    conn = db.connect()
-    db.configure_connection(conn)
-    return conn
+    # Pooled; within a request every call shares the request's connection (see deps.request_db_scope).
+    return db.connection()
+
+
+def get_db_async():
+    """``async with get_db_async() as conn:`` for ``async def`` routes (see packages.db_async)."""
+    return db_async.connection()
 
 
 def db_exists() -> bool:
@@ -34,28 +43,24 @@ def build_date_filter(start: str | None, end: str | None) -> Tuple[str, List[str
     return clause, params
 
 
-def compute_vdot(distance_m: float, time_s: float) -> Optional[float]:
-    if not distance_m or not time_s:
-        return None
-    v_m_min = (distance_m / time_s) * 60.0
-    vo2 = -4.60 + 0.182258 * v_m_min + 0.000104 * (v_m_min ** 2)
-    t_min = time_s / 60.0
-    pct = 0.8 + 0.1894393 * (2.718281828 ** (-0.012778 * t_min)) + 0.2989558 * (2.718281828 ** (-0.1932605 * t_min))
-    if pct == 0:
-        return None
-    return vo2 / pct
+def encode_cursor(*values: Any) -> str:
+    """Opaque keyset cursor for paginated lists (urlsafe base64 of a JSON array)."""
+    raw = json.dumps([str(v) if v is not None else None for v in values], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
 
 
-def linear_slope(values: List[float]) -> Optional[float]:
-    n = len(values)
-    if n < 2:
+def decode_cursor(cursor: str, size: int) -> Optional[List[Optional[str]]]:
+    """Inverse of :func:`encode_cursor`; None if the cursor is malformed."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        values = json.loads(raw)
+    except (binascii.Error, ValueError):
+        return None
+    if not isinstance(values, list) or len(values) != size:
         return None
-    xs = list(range(n))
-    x_mean = sum(xs) / n
-    y_mean = sum(values) / n
-    num = sum((x - x_mean) * (y - y_mean) for x, y in zip(xs, values))
-    den = sum((x - x_mean) ** 2 for x in xs)
-    return (num / den) if den else None
+    if not all(v is None or isinstance(v, str) for v in values):
+        return None
+    return values
 
 
 def decode_polyline(polyline: str) -> List[List[float]]:
@@ -97,13 +102,61 @@ def decode_polyline(polyline: str) -> List[List[float]]:
     return coords
 
 
+# (path, mtime_ns, size) -> parsed value; a stat() per request instead of read + parse.
+_last_update_memo: Tuple[Optional[Tuple[str, int, int]], Optional[str]] = (None, None)
+
+
 def get_last_update() -> Optional[str]:
-    if not config.LAST_UPDATE_PATH.exists():
+    global _last_update_memo
+    path = config.LAST_UPDATE_PATH
+    try:
+        st = path.stat()
+    except OSError:
         return None
+    stamp = (str(path), st.st_mtime_ns, st.st_size)
+    if _last_update_memo[0] == stamp:
+        return _last_update_memo[1]
     try:
-        return json.loads(config.LAST_UPDATE_PATH.read_text()).get("last_update")
-    except json.JSONDecodeError:
+        value = json.loads(path.read_text()).get("last_update")
+    except (OSError, json.JSONDecodeError):
         return None
+    _last_update_memo = (stamp, value)
+    return value
+
+
+# last_update the table was read for -> {user_id: version}; reloaded once per pipeline run.
+_data_versions_memo: Tuple[Optional[str], Optional[Dict[Any, int]]] = (None, None)
+
+
+def _load_data_versions() -> Optional[Dict[Any, int]]:
+    try:
+        with get_db() as conn:
+            rows = conn.execute("SELECT user_id, version FROM user_data_versions").fetchall()
+    except Exception:
+        return None  # pre-migration DB: fall back to the global last_update
+    return {user_id: version for user_id, version in rows}
+
+
+def get_data_version(user_id: Any) -> Optional[str]:
+    """Per-user data version for cache validation and ETags.
+
+    The pipeline bumps ``user_data_versions`` only for users whose activities were
+    reprocessed, so other users keep their cached responses across runs.
+    """
+    global _data_versions_memo
+    last_update = get_last_update()
+    memo_update, versions = _data_versions_memo
+    if versions is None or memo_update != last_update:
+        versions = _load_data_versions() if db_exists() else None
+        if versions is None:
+            return last_update
+        _data_versions_memo = (last_update, versions)
+    return f"v{versions.get(user_id, 0)}"
+
+
+async def get_data_version_async(user_id: Any) -> Optional[str]:
+    # Usually a memo hit, but a new pipeline run reloads the table: keep that off the loop.
+    return await anyio.to_thread.run_sync(get_data_version, user_id)
 
 
 def week_key(value: str) -> str:
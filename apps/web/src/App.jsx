@@ -69,7 +69,7 @@ export default function App() {
   const [syncNonce, setSyncNonce] = useState(0);
   const [activitiesData, setActivitiesData] = useState(EMPTY_ACTIVITIES);
   const [activityFilter, setActivityFilter] = useState({ type: 'run', range: 'all', start: null, end: null, label: 'All activities' });
-  const [activityOffset, setActivityOffset] = useState(0);
+  const [activityCursor, setActivityCursor] = useState(null);
   const [activityHasMore, setActivityHasMore] = useState(true);
   const [activityLoading, setActivityLoading] = useState(false);
   const [activityError, setActivityError] = useState(null);
@@ -396,17 +396,17 @@ export default function App() {
     return (overviewData.performance || []).find((item) => item.id === id) || null;
   }, [overviewData.performance]);
 
-  const fetchActivities = useCallback(async (offset, append) => {
+  const fetchActivities = useCallback(async (cursor, append) => {
     setActivityLoading(true);
     setActivityError(null);
     try {
-      const json = await fetchActivitiesPage(apiFetch, activityFilter, offset, PAGE_SIZE);
+      const json = await fetchActivitiesPage(apiFetch, activityFilter, cursor, PAGE_SIZE);
       const activities = json.activities || [];
       const merged = append ? [...activityList, ...activities] : activities;
       setActivityList(merged);
       setActivitiesData(buildActivities(activityFilter, merged));
-      setActivityOffset(offset + activities.length);
-      setActivityHasMore(activities.length === PAGE_SIZE);
+      setActivityCursor(json.next_cursor || null);
+      setActivityHasMore(Boolean(json.next_cursor));
     } catch {
       setActivityError('Failed to load activities.');
       setActivitiesData({ ...EMPTY_ACTIVITIES, items: [], filterLabel: activityFilter.label });
@@ -613,8 +613,8 @@ export default function App() {
         ] = await Promise.all([
           apiFetch(`/activity/${activeId}`),
           apiFetch(`/activity/${activeId}/summary`),
-          apiFetch(`/activity/${activeId}/series`),
-          apiFetch(`/activity/${activeId}/route`),
+          apiFetch(`/activity/${activeId}/series?format=f32&max_points=1500`),
+          apiFetch(`/activity/${activeId}/route?max_points=1500`),
           apiFetch(`/activity/${activeId}/laps`),
           apiFetch(`/activity/${activeId}/segments`),
           apiFetch(`/segments_best`)
@@ -622,7 +622,7 @@ export default function App() {
         const [detail, summary, series, route, lapsJson, activitySegments, segments] = await Promise.all([
           detailRes.json(),
           summaryRes.json(),
-          seriesRes.json(),
+          readSeries(seriesRes),
           routeRes.json(),
           lapsRes.json(),
           activitySegmentsRes.json(),
@@ -641,10 +641,10 @@ export default function App() {
 
   useEffect(() => {
     if (screen !== 'activities') return;
-    setActivityOffset(0);
+    setActivityCursor(null);
     setActivityHasMore(true);
     setActivityList([]);
-    fetchActivities(0, false);
+    fetchActivities(null, false);
     // eslint-disable-next-line react-hooks/exhaustive-deps
   }, [activityFilter, screen, syncNonce]);
 
@@ -719,7 +719,7 @@ export default function App() {
           error={activityError}
           onLoadMore={() => {
             if (activityLoading || !activityHasMore) return;
-            fetchActivities(activityOffset, true);
+            fetchActivities(activityCursor, true);
           }}
           onSelectActivity={(activity) => {
             if (activity?.id) setActiveId(activity.id);
@@ -916,6 +916,25 @@ function buildOverview(weekly, totalsAll, totalsWeek, insights = EMPTY_OVERVIEW.
   };
 }
 
+// /series?format=f32: uint32 header length, JSON header, then little-endian float32 columns.
+function decodeF32Frame(buffer) {
+  const headerLen = new DataView(buffer).getUint32(0, true);
+  const header = JSON.parse(new TextDecoder().decode(new Uint8Array(buffer, 4, headerLen)));
+  const base = 4 + headerLen;
+  const out = {};
+  Object.entries(header.columns || {}).forEach(([name, col]) => {
+    const values = new Float32Array(buffer, base + col.offset, col.count * col.dims);
+    out[name] = Array.from(values, (v) => (Number.isNaN(v) ? null : v));
+  });
+  return out;
+}
+
+async function readSeries(res) {
+  const contentType = res.headers.get('content-type') || '';
+  if (!res.ok || !contentType.includes('application/octet-stream')) return res.json();
+  return { series: decodeF32Frame(await res.arrayBuffer()) };
+}
+
 function buildActivityDetail(detail, summary = {}, laps = [], series = {}, route = [], segments = {}, activitySegments = {}) {
   if (!detail || detail.error) return EMPTY_ACTIVITY;
   const weather = detail.weather;
@@ -1240,11 +1259,11 @@ function buildWeekRange(weekStart) {
   };
 }
 
-async function fetchActivitiesPage(apiFetch, filter, offset, limit) {
+async function fetchActivitiesPage(apiFetch, filter, cursor, limit) {
   const params = new URLSearchParams();
   params.set('type', filter.type);
   params.set('limit', String(limit));
-  params.set('offset', String(offset));
+  if (cursor) params.set('cursor', cursor);
   if (filter.start) params.set('start', filter.start);
   if (filter.end) params.set('end', filter.end);
   const res = await apiFetch(`/activities?${params.toString()}`);
@@ -0,0 +1,7 @@
+-- Per-activity input fingerprints for the incremental pipeline mode.
+CREATE TABLE IF NOT EXISTS activity_fingerprints (
+  activity_id TEXT PRIMARY KEY,
+  fingerprint TEXT NOT NULL,
+  pipeline_version TEXT NOT NULL,
+  processed_at TEXT
+);
@@ -0,0 +1,2 @@
+-- Compact binary stream payloads (packages/stream_codec.py), raw_json keeps the metadata.
+ALTER TABLE streams_raw ADD COLUMN data_blob BLOB;
@@ -0,0 +1,7 @@
+"""Re-encode existing streams_raw rows into data_blob (see packages/stream_codec.py)."""
+from packages import stream_codec
+
+
+def migrate(conn):
+    if stream_codec.enabled():
+        stream_codec.convert_rows(conn, binary=True)
@@ -0,0 +1,37 @@
+-- Materialized copy of the metrics_weekly view, maintained incrementally by the pipeline
+-- (refresh_metrics_weekly) and read by the API instead of the view.
+CREATE TABLE IF NOT EXISTS metrics_weekly_mat (
+  week TEXT NOT NULL,
+  user_id INTEGER,
+  runs INTEGER,
+  distance_m REAL,
+  moving_s REAL,
+  avg_pace_sec REAL,
+  flat_pace_sec REAL,
+  flat_pace_weather_sec REAL,
+  avg_hr_norm REAL,
+  cadence_avg REAL,
+  stride_len REAL,
+  eff_index REAL,
+  roll_pace_sec REAL,
+  roll_hr REAL,
+  roll_dist REAL,
+  monotony REAL,
+  strain REAL,
+  UNIQUE(user_id, week)
+);
+
+CREATE INDEX IF NOT EXISTS idx_metrics_weekly_mat_user_week ON metrics_weekly_mat(user_id, week);
+
+DELETE FROM metrics_weekly_mat;
+
+INSERT INTO metrics_weekly_mat(
+  week, user_id, runs, distance_m, moving_s, avg_pace_sec, flat_pace_sec,
+  flat_pace_weather_sec, avg_hr_norm, cadence_avg, stride_len, eff_index,
+  roll_pace_sec, roll_hr, roll_dist, monotony, strain
+)
+SELECT
+  week, user_id, runs, distance_m, moving_s, avg_pace_sec, flat_pace_sec,
+  flat_pace_weather_sec, avg_hr_norm, cadence_avg, stride_len, eff_index,
+  roll_pace_sec, roll_hr, roll_dist, monotony, strain
+FROM metrics_weekly;
@@ -0,0 +1,7 @@
+-- Per-user /api/insights payload precomputed by the pipeline (packages/insights.py).
+CREATE TABLE IF NOT EXISTS insights_snapshot (
+  user_id INTEGER NOT NULL,
+  computed_at TEXT NOT NULL,
+  payload_json TEXT NOT NULL,
+  PRIMARY KEY (user_id, computed_at)
+);
@@ -0,0 +1,7 @@
+-- Per-user data version, bumped by the pipeline only for users whose activities were
+-- reprocessed. The API validates cached responses (and ETags) against it.
+CREATE TABLE IF NOT EXISTS user_data_versions (
+  user_id INTEGER PRIMARY KEY,
+  version INTEGER NOT NULL DEFAULT 0,
+  updated_at TEXT
+);
@@ -0,0 +1,8 @@
+-- Chart-ready /activity/{id}/series payloads per downsample level (packages/series.py),
+-- written by the pipeline as zlib-compressed JSON.
+CREATE TABLE IF NOT EXISTS activity_series_cache (
+  activity_id TEXT NOT NULL,
+  downsample INTEGER NOT NULL,
+  payload BLOB NOT NULL,
+  PRIMARY KEY (activity_id, downsample)
+);
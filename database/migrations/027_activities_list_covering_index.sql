@@ -0,0 +1,8 @@
+-- Covering index for the /activities keyset pagination: (user, type) equality, then
+-- (start_time, activity_id) DESC order plus the listed columns, so a page is an index
+-- range scan without table lookups. Supersedes idx_activities_user_type_time.
+CREATE INDEX IF NOT EXISTS idx_activities_user_type_time_cover
+  ON activities(user_id, lower(activity_type), start_time DESC, activity_id DESC,
+                activity_type, name, distance_m, moving_s, elev_gain);
+
+DROP INDEX IF EXISTS idx_activities_user_type_time;
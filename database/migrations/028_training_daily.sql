@@ -0,0 +1,26 @@
+-- Per-user, per-day run rollup with running (prefix) sums, maintained by the pipeline
+-- (packages/training_days.py). The assistant answers any date-window summary from it:
+-- totals are the difference of two cum_* rows, the rest a scan over the window's days.
+CREATE TABLE IF NOT EXISTS training_daily (
+  user_id INTEGER NOT NULL,
+  day TEXT NOT NULL,
+  runs INTEGER NOT NULL,
+  distance_m REAL NOT NULL,
+  moving_s REAL NOT NULL,
+  hr_norm_sum REAL NOT NULL,
+  hr_norm_n INTEGER NOT NULL,
+  hr_raw_sum REAL NOT NULL,
+  hr_raw_n INTEGER NOT NULL,
+  best_5k_s REAL,
+  best_10k_s REAL,
+  first_start TEXT,
+  last_start TEXT,
+  cum_runs INTEGER NOT NULL,
+  cum_distance_m REAL NOT NULL,
+  cum_moving_s REAL NOT NULL,
+  cum_hr_norm_sum REAL NOT NULL,
+  cum_hr_norm_n INTEGER NOT NULL,
+  cum_hr_raw_sum REAL NOT NULL,
+  cum_hr_raw_n INTEGER NOT NULL,
+  PRIMARY KEY (user_id, day)
+);
@@ -0,0 +1,11 @@
+-- Local artifact files (activities.jsonl, streams/*.json, weather/*.json) already imported,
+-- with the size/mtime/hash they had, so re-runs skip unchanged files
+-- (packages/import_manifest.py).
+CREATE TABLE IF NOT EXISTS import_manifest (
+  path TEXT PRIMARY KEY,
+  size INTEGER NOT NULL,
+  mtime_ns INTEGER NOT NULL,
+  sha256 TEXT NOT NULL,
+  rows INTEGER,
+  imported_at TEXT
+);
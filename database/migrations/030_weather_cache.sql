@@ -0,0 +1,12 @@
+-- Open-Meteo hourly archive data, one row per grid cell and UTC day. Activities in
+-- the same cell share it, so each cell/day is fetched once
+-- (services/ingestion/weather_api_import.py). weather_raw rows are derived from it.
+CREATE TABLE IF NOT EXISTS weather_cache (
+  cell TEXT NOT NULL,
+  date TEXT NOT NULL,
+  lat REAL NOT NULL,
+  lon REAL NOT NULL,
+  hourly_json TEXT NOT NULL,
+  fetched_at TEXT,
+  PRIMARY KEY (cell, date)
+);
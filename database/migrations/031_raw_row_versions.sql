@@ -0,0 +1,4 @@
+-- Bumped by every streams_raw/weather_raw upsert so the pipeline fingerprint sees
+-- changed payloads without reading them (services/processing/pipeline.py).
+ALTER TABLE streams_raw ADD COLUMN version INTEGER NOT NULL DEFAULT 1;
+ALTER TABLE weather_raw ADD COLUMN version INTEGER NOT NULL DEFAULT 1;
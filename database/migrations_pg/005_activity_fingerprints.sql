@@ -0,0 +1,8 @@
+-- Per-activity input fingerprints for the incremental pipeline mode.
+-- Keeps parity with SQLite migration 019_activity_fingerprints.sql.
+CREATE TABLE IF NOT EXISTS activity_fingerprints (
+  activity_id TEXT PRIMARY KEY,
+  fingerprint TEXT NOT NULL,
+  pipeline_version TEXT NOT NULL,
+  processed_at TIMESTAMPTZ
+);
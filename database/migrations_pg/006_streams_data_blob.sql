@@ -0,0 +1,3 @@
+-- Compact binary stream payloads (packages/stream_codec.py), raw_json keeps the metadata.
+-- Keeps parity with SQLite migration 020_streams_data_blob.sql.
+ALTER TABLE streams_raw ADD COLUMN IF NOT EXISTS data_blob BYTEA;
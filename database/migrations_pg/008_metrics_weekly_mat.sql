@@ -0,0 +1,38 @@
+-- Materialized copy of the metrics_weekly view, maintained incrementally by the pipeline
+-- (refresh_metrics_weekly) and read by the API instead of the view.
+-- Keeps parity with SQLite migration 022_metrics_weekly_mat.sql.
+CREATE TABLE IF NOT EXISTS metrics_weekly_mat (
+  week DATE NOT NULL,
+  user_id BIGINT,
+  runs INTEGER,
+  distance_m DOUBLE PRECISION,
+  moving_s DOUBLE PRECISION,
+  avg_pace_sec DOUBLE PRECISION,
+  flat_pace_sec DOUBLE PRECISION,
+  flat_pace_weather_sec DOUBLE PRECISION,
+  avg_hr_norm DOUBLE PRECISION,
+  cadence_avg DOUBLE PRECISION,
+  stride_len DOUBLE PRECISION,
+  eff_index DOUBLE PRECISION,
+  roll_pace_sec DOUBLE PRECISION,
+  roll_hr DOUBLE PRECISION,
+  roll_dist DOUBLE PRECISION,
+  monotony DOUBLE PRECISION,
+  strain DOUBLE PRECISION,
+  UNIQUE(user_id, week)
+);
+
+CREATE INDEX IF NOT EXISTS idx_metrics_weekly_mat_user_week ON metrics_weekly_mat(user_id, week);
+
+DELETE FROM metrics_weekly_mat;
+
+INSERT INTO metrics_weekly_mat(
+  week, user_id, runs, distance_m, moving_s, avg_pace_sec, flat_pace_sec,
+  flat_pace_weather_sec, avg_hr_norm, cadence_avg, stride_len, eff_index,
+  roll_pace_sec, roll_hr, roll_dist, monotony, strain
+)
+SELECT
+  week, user_id, runs, distance_m, moving_s, avg_pace_sec, flat_pace_sec,
+  flat_pace_weather_sec, avg_hr_norm, cadence_avg, stride_len, eff_index,
+  roll_pace_sec, roll_hr, roll_dist, monotony, strain
+FROM metrics_weekly;
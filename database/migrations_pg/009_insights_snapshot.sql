@@ -0,0 +1,8 @@
+-- Per-user /api/insights payload precomputed by the pipeline (packages/insights.py).
+-- Keeps parity with SQLite migration 023_insights_snapshot.sql.
+CREATE TABLE IF NOT EXISTS insights_snapshot (
+  user_id BIGINT NOT NULL,
+  computed_at TIMESTAMPTZ NOT NULL,
+  payload_json TEXT NOT NULL,
+  PRIMARY KEY (user_id, computed_at)
+);
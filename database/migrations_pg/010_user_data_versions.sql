@@ -0,0 +1,8 @@
+-- Per-user data version, bumped by the pipeline only for users whose activities were
+-- reprocessed. The API validates cached responses (and ETags) against it.
+-- Keeps parity with SQLite migration 024_user_data_versions.sql.
+CREATE TABLE IF NOT EXISTS user_data_versions (
+  user_id BIGINT PRIMARY KEY,
+  version BIGINT NOT NULL DEFAULT 0,
+  updated_at TIMESTAMPTZ
+);
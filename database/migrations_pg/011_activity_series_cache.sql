@@ -0,0 +1,9 @@
+-- Chart-ready /activity/{id}/series payloads per downsample level (packages/series.py),
+-- written by the pipeline as zlib-compressed JSON.
+-- Keeps parity with SQLite migration 025_activity_series_cache.sql.
+CREATE TABLE IF NOT EXISTS activity_series_cache (
+  activity_id TEXT NOT NULL,
+  downsample INTEGER NOT NULL,
+  payload BYTEA NOT NULL,
+  PRIMARY KEY (activity_id, downsample)
+);
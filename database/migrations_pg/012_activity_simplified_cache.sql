@@ -0,0 +1,10 @@
+-- Shape-preserving /series (LTTB) and /route (Douglas-Peucker) payloads for the common
+-- max_points targets (packages/simplify.py), written by the pipeline as zlib-compressed JSON.
+-- Keeps parity with SQLite migration 026_activity_simplified_cache.sql.
+CREATE TABLE IF NOT EXISTS activity_simplified_cache (
+  activity_id TEXT NOT NULL,
+  kind TEXT NOT NULL,
+  max_points INTEGER NOT NULL,
+  payload BYTEA NOT NULL,
+  PRIMARY KEY (activity_id, kind, max_points)
+);
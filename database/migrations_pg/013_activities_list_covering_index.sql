@@ -0,0 +1,7 @@
+-- Covering index for the /activities keyset pagination (index-only scans per page).
+-- Keeps parity with SQLite migration 027_activities_list_covering_index.sql.
+CREATE INDEX IF NOT EXISTS idx_activities_user_type_time_cover
+  ON activities(user_id, lower(activity_type), start_time DESC, activity_id DESC)
+  INCLUDE (activity_type, name, distance_m, moving_s, elev_gain);
+
+DROP INDEX IF EXISTS idx_activities_user_type_time;
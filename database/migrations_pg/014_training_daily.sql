@@ -0,0 +1,26 @@
+-- Per-user, per-day run rollup with running (prefix) sums, maintained by the pipeline
+-- (packages/training_days.py) and read by the assistant's window summaries.
+-- Keeps parity with SQLite migration 028_training_daily.sql.
+CREATE TABLE IF NOT EXISTS training_daily (
+  user_id BIGINT NOT NULL,
+  day DATE NOT NULL,
+  runs INTEGER NOT NULL,
+  distance_m DOUBLE PRECISION NOT NULL,
+  moving_s DOUBLE PRECISION NOT NULL,
+  hr_norm_sum DOUBLE PRECISION NOT NULL,
+  hr_norm_n INTEGER NOT NULL,
+  hr_raw_sum DOUBLE PRECISION NOT NULL,
+  hr_raw_n INTEGER NOT NULL,
+  best_5k_s DOUBLE PRECISION,
+  best_10k_s DOUBLE PRECISION,
+  first_start TIMESTAMPTZ,
+  last_start TIMESTAMPTZ,
+  cum_runs INTEGER NOT NULL,
+  cum_distance_m DOUBLE PRECISION NOT NULL,
+  cum_moving_s DOUBLE PRECISION NOT NULL,
+  cum_hr_norm_sum DOUBLE PRECISION NOT NULL,
+  cum_hr_norm_n INTEGER NOT NULL,
+  cum_hr_raw_sum DOUBLE PRECISION NOT NULL,
+  cum_hr_raw_n INTEGER NOT NULL,
+  PRIMARY KEY (user_id, day)
+);
@@ -0,0 +1,11 @@
+-- Local artifact files already imported, so re-runs skip unchanged files
+-- (packages/import_manifest.py).
+-- Keeps parity with SQLite migration 029_import_manifest.sql.
+CREATE TABLE IF NOT EXISTS import_manifest (
+  path TEXT PRIMARY KEY,
+  size BIGINT NOT NULL,
+  mtime_ns BIGINT NOT NULL,
+  sha256 TEXT NOT NULL,
+  rows INTEGER,
+  imported_at TIMESTAMPTZ
+);
@@ -0,0 +1,12 @@
+-- Open-Meteo hourly archive data, one row per grid cell and UTC day
+-- (services/ingestion/weather_api_import.py).
+-- Keeps parity with SQLite migration 030_weather_cache.sql.
+CREATE TABLE IF NOT EXISTS weather_cache (
+  cell TEXT NOT NULL,
+  date DATE NOT NULL,
+  lat DOUBLE PRECISION NOT NULL,
+  lon DOUBLE PRECISION NOT NULL,
+  hourly_json TEXT NOT NULL,
+  fetched_at TIMESTAMPTZ,
+  PRIMARY KEY (cell, date)
+);
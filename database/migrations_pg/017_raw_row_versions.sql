@@ -0,0 +1,5 @@
+-- Bumped by every streams_raw/weather_raw upsert so the pipeline fingerprint sees
+-- changed payloads without reading them.
+-- Keeps parity with SQLite migration 031_raw_row_versions.sql.
+ALTER TABLE streams_raw ADD COLUMN IF NOT EXISTS version INTEGER NOT NULL DEFAULT 1;
+ALTER TABLE weather_raw ADD COLUMN IF NOT EXISTS version INTEGER NOT NULL DEFAULT 1;
@@ -24,7 +24,9 @@ CREATE TABLE IF NOT EXISTS streams_raw (
   activity_id TEXT NOT NULL,
   stream_type TEXT NOT NULL,
   raw_json TEXT NOT NULL,
+  data_blob BLOB,
   user_id INTEGER,
+  version INTEGER NOT NULL DEFAULT 1,
   created_at TEXT DEFAULT CURRENT_TIMESTAMP,
   UNIQUE(source_id, activity_id, stream_type),
   FOREIGN KEY (source_id) REFERENCES sources(id)
@@ -35,6 +37,7 @@ CREATE TABLE IF NOT EXISTS weather_raw (
   activity_id TEXT NOT NULL,
   raw_json TEXT NOT NULL,
   user_id INTEGER,
+  version INTEGER NOT NULL DEFAULT 1,
   created_at TEXT DEFAULT CURRENT_TIMESTAMP
 );
 
@@ -190,9 +193,16 @@ CREATE TABLE IF NOT EXISTS assistant_memory (
   FOREIGN KEY (user_id) REFERENCES users(id)
 );
 
+CREATE TABLE IF NOT EXISTS activity_fingerprints (
+  activity_id TEXT PRIMARY KEY,
+  fingerprint TEXT NOT NULL,
+  pipeline_version TEXT NOT NULL,
+  processed_at TEXT
+);
+
 CREATE INDEX IF NOT EXISTS idx_activities_user_start_time ON activities(user_id, start_time);
 CREATE INDEX IF NOT EXISTS idx_activities_activity_type ON activities(activity_type);
-CREATE INDEX IF NOT EXISTS idx_activities_user_type_time ON activities(user_id, lower(activity_type), start_time);
+CREATE INDEX IF NOT EXISTS idx_activities_user_type_time_cover ON activities(user_id, lower(activity_type), start_time DESC, activity_id DESC, activity_type, name, distance_m, moving_s, elev_gain);
 CREATE INDEX IF NOT EXISTS idx_activities_raw_user_activity ON activities_raw(user_id, activity_id);
 CREATE INDEX IF NOT EXISTS idx_streams_raw_user_activity ON streams_raw(user_id, activity_id);
 CREATE INDEX IF NOT EXISTS idx_streams_raw_user_activity_stream ON streams_raw(user_id, activity_id, stream_type);
@@ -212,3 +222,105 @@ CREATE INDEX IF NOT EXISTS idx_segments_best_scope_activity ON segments_best(sco
 CREATE INDEX IF NOT EXISTS idx_source_sync_state_user ON source_sync_state(user_id);
 
 -- metrics_weekly is now a VIEW created by migrations.
+
+-- Materialized metrics_weekly, refreshed incrementally by the pipeline.
+CREATE TABLE IF NOT EXISTS metrics_weekly_mat (
+  week TEXT NOT NULL,
+  user_id INTEGER,
+  runs INTEGER,
+  distance_m REAL,
+  moving_s REAL,
+  avg_pace_sec REAL,
+  flat_pace_sec REAL,
+  flat_pace_weather_sec REAL,
+  avg_hr_norm REAL,
+  cadence_avg REAL,
+  stride_len REAL,
+  eff_index REAL,
+  roll_pace_sec REAL,
+  roll_hr REAL,
+  roll_dist REAL,
+  monotony REAL,
+  strain REAL,
+  UNIQUE(user_id, week)
+);
+
+CREATE INDEX IF NOT EXISTS idx_metrics_weekly_mat_user_week ON metrics_weekly_mat(user_id, week);
+
+-- Per-user /api/insights snapshot, written by the pipeline.
+CREATE TABLE IF NOT EXISTS insights_snapshot (
+  user_id INTEGER NOT NULL,
+  computed_at TEXT NOT NULL,
+  payload_json TEXT NOT NULL,
+  PRIMARY KEY (user_id, computed_at)
+);
+
+-- Per-user data version for API cache validation, bumped by the pipeline.
+CREATE TABLE IF NOT EXISTS user_data_versions (
+  user_id INTEGER PRIMARY KEY,
+  version INTEGER NOT NULL DEFAULT 0,
+  updated_at TEXT
+);
+
+-- Precomputed /activity/{id}/series payloads, written by the pipeline.
+CREATE TABLE IF NOT EXISTS activity_series_cache (
+  activity_id TEXT NOT NULL,
+  downsample INTEGER NOT NULL,
+  payload BLOB NOT NULL,
+  PRIMARY KEY (activity_id, downsample)
+);
+
+-- Precomputed max_points-simplified /series and /route payloads, written by the pipeline.
+CREATE TABLE IF NOT EXISTS activity_simplified_cache (
+  activity_id TEXT NOT NULL,
+  kind TEXT NOT NULL,
+  max_points INTEGER NOT NULL,
+  payload BLOB NOT NULL,
+  PRIMARY KEY (activity_id, kind, max_points)
+);
+
+-- Per-user daily run rollup with prefix sums, written by the pipeline.
+CREATE TABLE IF NOT EXISTS training_daily (
+  user_id INTEGER NOT NULL,
+  day TEXT NOT NULL,
+  runs INTEGER NOT NULL,
+  distance_m REAL NOT NULL,
+  moving_s REAL NOT NULL,
+  hr_norm_sum REAL NOT NULL,
+  hr_norm_n INTEGER NOT NULL,
+  hr_raw_sum REAL NOT NULL,
+  hr_raw_n INTEGER NOT NULL,
+  best_5k_s REAL,
+  best_10k_s REAL,
+  first_start TEXT,
+  last_start TEXT,
+  cum_runs INTEGER NOT NULL,
+  cum_distance_m REAL NOT NULL,
+  cum_moving_s REAL NOT NULL,
+  cum_hr_norm_sum REAL NOT NULL,
+  cum_hr_norm_n INTEGER NOT NULL,
+  cum_hr_raw_sum REAL NOT NULL,
+  cum_hr_raw_n INTEGER NOT NULL,
+  PRIMARY KEY (user_id, day)
+);
+
+-- Local artifact files already imported (size/mtime/hash), so re-runs skip them.
+CREATE TABLE IF NOT EXISTS import_manifest (
+  path TEXT PRIMARY KEY,
+  size INTEGER NOT NULL,
+  mtime_ns INTEGER NOT NULL,
+  sha256 TEXT NOT NULL,
+  rows INTEGER,
+  imported_at TEXT
+);
+
+-- Open-Meteo hourly archive data per grid cell and UTC day, shared by nearby activities.
+CREATE TABLE IF NOT EXISTS weather_cache (
+  cell TEXT NOT NULL,
+  date TEXT NOT NULL,
+  lat REAL NOT NULL,
+  lon REAL NOT NULL,
+  hourly_json TEXT NOT NULL,
+  fetched_at TEXT,
+  PRIMARY KEY (cell, date)
+);
@@ -37,7 +37,9 @@ CREATE TABLE IF NOT EXISTS streams_raw (
   activity_id TEXT NOT NULL,
   stream_type TEXT NOT NULL,
   raw_json TEXT NOT NULL,
+  data_blob BYTEA,
   user_id BIGINT,
+  version INTEGER NOT NULL DEFAULT 1,
   created_at TIMESTAMPTZ DEFAULT NOW(),
   UNIQUE(source_id, activity_id, stream_type),
   FOREIGN KEY (source_id) REFERENCES sources(id)
@@ -48,6 +50,7 @@ CREATE TABLE IF NOT EXISTS weather_raw (
   activity_id TEXT NOT NULL,
   raw_json TEXT NOT NULL,
   user_id BIGINT,
+  version INTEGER NOT NULL DEFAULT 1,
   created_at TIMESTAMPTZ DEFAULT NOW()
 );
 
@@ -210,6 +213,13 @@ CREATE TABLE IF NOT EXISTS pipeline_runs (
   duration_sec DOUBLE PRECISION
 );
 
+CREATE TABLE IF NOT EXISTS activity_fingerprints (
+  activity_id TEXT PRIMARY KEY,
+  fingerprint TEXT NOT NULL,
+  pipeline_version TEXT NOT NULL,
+  processed_at TIMESTAMPTZ
+);
+
 CREATE TABLE IF NOT EXISTS job_runs (
   id BIGSERIAL PRIMARY KEY,
   job_name TEXT NOT NULL,
@@ -259,7 +269,7 @@ CREATE TABLE IF NOT EXISTS source_sync_state (
 CREATE INDEX IF NOT EXISTS idx_activities_start_time ON activities(start_time);
 CREATE INDEX IF NOT EXISTS idx_activities_user_start_time ON activities(user_id, start_time);
 CREATE INDEX IF NOT EXISTS idx_activities_activity_type ON activities(activity_type);
-CREATE INDEX IF NOT EXISTS idx_activities_user_type_time ON activities(user_id, lower(activity_type), start_time);
+CREATE INDEX IF NOT EXISTS idx_activities_user_type_time_cover ON activities(user_id, lower(activity_type), start_time DESC, activity_id DESC) INCLUDE (activity_type, name, distance_m, moving_s, elev_gain);
 CREATE INDEX IF NOT EXISTS idx_activities_raw_user_activity ON activities_raw(user_id, activity_id);
 CREATE INDEX IF NOT EXISTS idx_streams_raw_user_activity ON streams_raw(user_id, activity_id);
 CREATE INDEX IF NOT EXISTS idx_streams_raw_user_activity_stream ON streams_raw(user_id, activity_id, stream_type);
@@ -409,3 +419,105 @@ SELECT
   CASE WHEN m.monotony IS NOT NULL THEN (m.monotony * (m.load_m / 1000.0)) END AS strain
 FROM weekly_roll w
 LEFT JOIN mono m ON m.week = w.week;
+
+-- Materialized metrics_weekly, refreshed incrementally by the pipeline.
+CREATE TABLE IF NOT EXISTS metrics_weekly_mat (
+  week DATE NOT NULL,
+  user_id BIGINT,
+  runs INTEGER,
+  distance_m DOUBLE PRECISION,
+  moving_s DOUBLE PRECISION,
+  avg_pace_sec DOUBLE PRECISION,
+  flat_pace_sec DOUBLE PRECISION,
+  flat_pace_weather_sec DOUBLE PRECISION,
+  avg_hr_norm DOUBLE PRECISION,
+  cadence_avg DOUBLE PRECISION,
+  stride_len DOUBLE PRECISION,
+  eff_index DOUBLE PRECISION,
+  roll_pace_sec DOUBLE PRECISION,
+  roll_hr DOUBLE PRECISION,
+  roll_dist DOUBLE PRECISION,
+  monotony DOUBLE PRECISION,
+  strain DOUBLE PRECISION,
+  UNIQUE(user_id, week)
+);
+
+CREATE INDEX IF NOT EXISTS idx_metrics_weekly_mat_user_week ON metrics_weekly_mat(user_id, week);
+
+-- Per-user /api/insights snapshot, written by the pipeline.
+CREATE TABLE IF NOT EXISTS insights_snapshot (
+  user_id BIGINT NOT NULL,
+  computed_at TIMESTAMPTZ NOT NULL,
+  payload_json TEXT NOT NULL,
+  PRIMARY KEY (user_id, computed_at)
+);
+
+-- Per-user data version for API cache validation, bumped by the pipeline.
+CREATE TABLE IF NOT EXISTS user_data_versions (
+  user_id BIGINT PRIMARY KEY,
+  version BIGINT NOT NULL DEFAULT 0,
+  updated_at TIMESTAMPTZ
+);
+
+-- Precomputed /activity/{id}/series payloads, written by the pipeline.
+CREATE TABLE IF NOT EXISTS activity_series_cache (
+  activity_id TEXT NOT NULL,
+  downsample INTEGER NOT NULL,
+  payload BYTEA NOT NULL,
+  PRIMARY KEY (activity_id, downsample)
+);
+
+-- Precomputed max_points-simplified /series and /route payloads, written by the pipeline.
+CREATE TABLE IF NOT EXISTS activity_simplified_cache (
+  activity_id TEXT NOT NULL,
+  kind TEXT NOT NULL,
+  max_points INTEGER NOT NULL,
+  payload BYTEA NOT NULL,
+  PRIMARY KEY (activity_id, kind, max_points)
+);
+
+-- Per-user daily run rollup with prefix sums, written by the pipeline.
+CREATE TABLE IF NOT EXISTS training_daily (
+  user_id BIGINT NOT NULL,
+  day DATE NOT NULL,
+  runs INTEGER NOT NULL,
+  distance_m DOUBLE PRECISION NOT NULL,
+  moving_s DOUBLE PRECISION NOT NULL,
+  hr_norm_sum DOUBLE PRECISION NOT NULL,
+  hr_norm_n INTEGER NOT NULL,
+  hr_raw_sum DOUBLE PRECISION NOT NULL,
+  hr_raw_n INTEGER NOT NULL,
+  best_5k_s DOUBLE PRECISION,
+  best_10k_s DOUBLE PRECISION,
+  first_start TIMESTAMPTZ,
+  last_start TIMESTAMPTZ,
+  cum_runs INTEGER NOT NULL,
+  cum_distance_m DOUBLE PRECISION NOT NULL,
+  cum_moving_s DOUBLE PRECISION NOT NULL,
+  cum_hr_norm_sum DOUBLE PRECISION NOT NULL,
+  cum_hr_norm_n INTEGER NOT NULL,
+  cum_hr_raw_sum DOUBLE PRECISION NOT NULL,
+  cum_hr_raw_n INTEGER NOT NULL,
+  PRIMARY KEY (user_id, day)
+);
+
+-- Local artifact files already imported (size/mtime/hash), so re-runs skip them.
+CREATE TABLE IF NOT EXISTS import_manifest (
+  path TEXT PRIMARY KEY,
+  size BIGINT NOT NULL,
+  mtime_ns BIGINT NOT NULL,
+  sha256 TEXT NOT NULL,
+  rows INTEGER,
+  imported_at TIMESTAMPTZ
+);
+
+-- Open-Meteo hourly archive data per grid cell and UTC day, shared by nearby activities.
+CREATE TABLE IF NOT EXISTS weather_cache (
+  cell TEXT NOT NULL,
+  date DATE NOT NULL,
+  lat DOUBLE PRECISION NOT NULL,
+  lon DOUBLE PRECISION NOT NULL,
+  hourly_json TEXT NOT NULL,
+  fetched_at TIMESTAMPTZ,
+  PRIMARY KEY (cell, date)
+);
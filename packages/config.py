@@ -13,6 +13,15 @@ if load_dotenv:
 
 DB_URL = os.getenv("FITNESS_DB_URL")
 DB_PATH = Path(os.getenv("FITNESS_DB_PATH", ROOT / "data" / "fitness.db"))
+# API connection pool: connections kept open, hard cap, seconds a request waits for a
+# free connection, and idle seconds after which a checkout pings the connection first.
+DB_POOL_ENABLED = os.getenv("FITNESS_DB_POOL", "1") == "1"
+DB_POOL_MIN = int(os.getenv("FITNESS_DB_POOL_MIN", "1"))
+DB_POOL_MAX = int(os.getenv("FITNESS_DB_POOL_MAX", "10"))
+DB_POOL_TIMEOUT_SEC = float(os.getenv("FITNESS_DB_POOL_TIMEOUT_SEC", "10"))
+DB_POOL_PING_SEC = float(os.getenv("FITNESS_DB_POOL_PING_SEC", "30"))
+# Async routes: "auto" (aiosqlite / psycopg 3 when installed), "native" or "thread".
+DB_ASYNC_BACKEND = os.getenv("FITNESS_DB_ASYNC_BACKEND", "auto").strip().lower()
 LAST_UPDATE_PATH = Path(os.getenv("FITNESS_LAST_UPDATE_PATH", ROOT / "data" / "last_update.json"))
 API_HOST = os.getenv("FITNESS_API_HOST", "127.0.0.1")
 API_PORT = int(os.getenv("FITNESS_API_PORT", "8000"))
@@ -28,9 +37,29 @@ STRAVA_CLIENT_SECRET = os.getenv("STRAVA_CLIENT_SECRET")
 STRAVA_REFRESH_TOKEN = os.getenv("STRAVA_REFRESH_TOKEN")
 STRAVA_ACCESS_TOKEN = os.getenv("STRAVA_ACCESS_TOKEN")
 STRAVA_EXPIRES_AT = os.getenv("STRAVA_EXPIRES_AT")
+# Strava API client: base URL (a local stub in tests), concurrent stream fetches,
+# retries on 429/5xx, activities per write transaction, and requests left unused in
+# each rate-limit window for other clients of the same app.
+STRAVA_API_BASE = os.getenv("FITNESS_STRAVA_API_BASE", "https://www.strava.com/api/v3")
+STRAVA_FETCH_WORKERS = int(os.getenv("FITNESS_STRAVA_FETCH_WORKERS", "4"))
+STRAVA_MAX_RETRIES = int(os.getenv("FITNESS_STRAVA_MAX_RETRIES", "5"))
+STRAVA_WRITE_BATCH = int(os.getenv("FITNESS_STRAVA_WRITE_BATCH", "25"))
+STRAVA_RATE_RESERVE = int(os.getenv("FITNESS_STRAVA_RATE_RESERVE", "5"))
 WEATHER_API_ENABLED = os.getenv(
     "FITNESS_WEATHER_API_ENABLED", "1" if STRAVA_API_ENABLED else "0"
 ) == "1"
+# Open-Meteo archive: base URL (a local stub in tests), grid cell size in degrees that
+# activities share weather within, and max days fetched per request.
+WEATHER_API_BASE = os.getenv("FITNESS_WEATHER_API_BASE", "https://archive-api.open-meteo.com/v1/archive")
+WEATHER_GRID_DEG = float(os.getenv("FITNESS_WEATHER_GRID_DEG", "0.1"))
+WEATHER_RANGE_DAYS = int(os.getenv("FITNESS_WEATHER_RANGE_DAYS", "31"))
+# Weather backfill: concurrent archive requests, requests per second to the archive
+# host (Open-Meteo's free tier allows 5000/hour), retries on 429/5xx, and
+# activities per write transaction.
+WEATHER_FETCH_WORKERS = int(os.getenv("FITNESS_WEATHER_FETCH_WORKERS", "4"))
+WEATHER_RATE_PER_SEC = float(os.getenv("FITNESS_WEATHER_RATE_PER_SEC", "1.0"))
+WEATHER_MAX_RETRIES = int(os.getenv("FITNESS_WEATHER_MAX_RETRIES", "3"))
+WEATHER_WRITE_BATCH = int(os.getenv("FITNESS_WEATHER_WRITE_BATCH", "100"))
 JWT_SECRET = os.getenv("FITNESS_JWT_SECRET", "dev-secret")
 JWT_ALG = os.getenv("FITNESS_JWT_ALG", "HS256")
 JWT_EXP_MINUTES = int(os.getenv("FITNESS_JWT_EXP_MINUTES", "60"))
@@ -62,6 +91,46 @@ DECOUPLING_COOLDOWN_SEC = int(os.getenv("FITNESS_DECOUPLING_COOLDOWN_SEC", "300"
 DECOUPLING_GRADE_MAX = float(os.getenv("FITNESS_DECOUPLING_GRADE_MAX", "0.03"))
 DECOUPLING_MIN_SAMPLES = int(os.getenv("FITNESS_DECOUPLING_MIN_SAMPLES", "20"))
 
+# Stream signal-processing backend: "auto" (NumPy when installed), "numpy" or "python".
+PIPELINE_BACKEND = os.getenv("FITNESS_PIPELINE_BACKEND", "auto").strip().lower()
+# Parallel pipeline: worker processes (1 = serial), activities per worker task, and
+# activities per write transaction.
+PIPELINE_WORKERS = int(os.getenv("FITNESS_PIPELINE_WORKERS", "1"))
+PIPELINE_CHUNK_SIZE = int(os.getenv("FITNESS_PIPELINE_CHUNK_SIZE", "25"))
+PIPELINE_BATCH_SIZE = int(os.getenv("FITNESS_PIPELINE_BATCH_SIZE", "200"))
+# Activities whose streams/weather are bulk-loaded per query.
+PIPELINE_LOAD_CHUNK_SIZE = int(os.getenv("FITNESS_PIPELINE_LOAD_CHUNK_SIZE", "100"))
+# Rows per write transaction for the local artifact importers (strava_import, weather_import).
+IMPORT_BATCH_SIZE = int(os.getenv("FITNESS_IMPORT_BATCH_SIZE", "500"))
+
+# Storage format for new streams_raw rows: "binary" (compact data_blob) or "json".
+STREAM_ENCODING = os.getenv("FITNESS_STREAM_ENCODING", "binary").strip().lower()
+
+# /api/insights serves the pipeline's stored snapshot while it is younger than this.
+INSIGHTS_SNAPSHOT_MAX_AGE_SEC = int(os.getenv("FITNESS_INSIGHTS_SNAPSHOT_MAX_AGE_SEC", "3600"))
+
+# API response cache: in-process LRU bounds plus an optional shared tier
+# ("memory" = per-process only, "sqlite" = local file shared by workers, "redis").
+CACHE_BACKEND = os.getenv("FITNESS_CACHE_BACKEND", "memory").strip().lower()
+CACHE_MAX_ENTRIES = int(os.getenv("FITNESS_CACHE_MAX_ENTRIES", "1024"))
+CACHE_MAX_BYTES = int(os.getenv("FITNESS_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+CACHE_SQLITE_PATH = Path(os.getenv("FITNESS_CACHE_SQLITE_PATH", ROOT / "data" / "api_cache.db"))
+CACHE_REDIS_URL = os.getenv("FITNESS_CACHE_REDIS_URL", "redis://localhost:6379/0")
+
+# Large array endpoints (streams, series) skip Pydantic re-validation and use orjson when available.
+FAST_JSON = os.getenv("FITNESS_FAST_JSON", "1") == "1"
+# Responses of at least this many bytes are gzip-compressed for clients that accept it.
+# Level 1 keeps nearly all of the size win on numeric arrays at a fraction of the CPU.
+GZIP_MIN_BYTES = int(os.getenv("FITNESS_GZIP_MIN_BYTES", "1024"))
+GZIP_LEVEL = int(os.getenv("FITNESS_GZIP_LEVEL", "1"))
+
+# /insights/evaluate LLM calls: API base URL (a local mock in tests), per-call timeout,
+# concurrent upstream calls per process, and how long an identical answer is reused.
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL", "https://api.openai.com/v1")
+LLM_TIMEOUT_SEC = float(os.getenv("FITNESS_LLM_TIMEOUT_SEC", "30"))
+LLM_MAX_CONCURRENCY = int(os.getenv("FITNESS_LLM_MAX_CONCURRENCY", "4"))
+LLM_CACHE_TTL_SEC = int(os.getenv("FITNESS_LLM_CACHE_TTL_SEC", "3600"))
+
 # Worker reliability settings
 PIPELINE_MAX_RETRIES = int(os.getenv("FITNESS_PIPELINE_MAX_RETRIES", "2"))
 PIPELINE_BACKOFF_BASE_SEC = float(os.getenv("FITNESS_PIPELINE_BACKOFF_BASE_SEC", "5"))
@@ -1,15 +1,29 @@
+import contextlib
+import contextvars
+import os
+import re
 import sqlite3
+import threading
+import time
+from collections import deque
 from pathlib import Path
 import datetime
-from typing import Iterable, Optional
+from typing import Callable, Iterable, Iterator, Optional
 
 import packages.config as config
+from packages.metrics import inc, observe
 
 try:  # Optional dependency for Postgres
     import psycopg2
+    import psycopg2.extras
 except ImportError:  # pragma: no cover - optional in SQLite-only envs
     psycopg2 = None
 
+# Multi-row VALUES pages sent per statement by executemany() on Postgres.
+EXECUTE_VALUES_PAGE_SIZE = 500
+
+_VALUES_TUPLE = re.compile(r"VALUES\s*\(\s*\?(?:\s*,\s*\?)*\s*\)", re.IGNORECASE)
+
 
 def is_postgres() -> bool:
     return bool(config.DB_URL) and config.DB_URL.startswith("postgres")
@@ -44,6 +58,24 @@ class DBCursor:
             self._cursor.execute(sql, list(params))
         return self
 
+    def executemany(self, sql: str, seq_of_params: Iterable[Iterable]):
+        rows = [list(params) for params in seq_of_params]
+        if not rows:
+            return self
+        if not self._postgres:
+            self._cursor.executemany(sql, rows)
+            return self
+        match = _VALUES_TUPLE.search(sql)
+        if match and "?" not in sql[: match.start()] and "?" not in sql[match.end():]:
+            # INSERT ... VALUES (?,...,?): send multi-row VALUES pages instead of one statement per row.
+            pg_sql = sql[: match.start()] + "VALUES %s" + sql[match.end():]
+            psycopg2.extras.execute_values(
+                self._cursor, pg_sql, rows, page_size=EXECUTE_VALUES_PAGE_SIZE
+            )
+        else:
+            psycopg2.extras.execute_batch(self._cursor, _adapt_sql(sql), rows)
+        return self
+
     def fetchone(self):
         row = self._cursor.fetchone()
         if not self._postgres or row is None:
@@ -60,6 +92,10 @@ class DBCursor:
     def lastrowid(self):
         return getattr(self._cursor, "lastrowid", None)
 
+    @property
+    def rowcount(self):
+        return getattr(self._cursor, "rowcount", -1)
+
     @staticmethod
     def _coerce(value):
         # Keep API/pipeline behavior consistent across SQLite/Postgres:
@@ -74,9 +110,12 @@ class DBCursor:
 
 
 class DBConnection:
-    def __init__(self, conn, postgres: bool):
+    def __init__(self, conn, postgres: bool, release: Optional[Callable] = None):
         self._conn = conn
         self._postgres = postgres
+        # Pooled connections hand the raw connection back instead of closing it.
+        self._release = release
+        self._closed = False
 
     def cursor(self):
         return DBCursor(self._conn.cursor(), self._postgres)
@@ -86,6 +125,11 @@ class DBConnection:
         cur.execute(sql, params)
         return cur
 
+    def executemany(self, sql: str, seq_of_params: Iterable[Iterable]):
+        cur = self.cursor()
+        cur.executemany(sql, seq_of_params)
+        return cur
+
     def executescript(self, sql: str) -> None:
         if not self._postgres:
             self._conn.executescript(sql)
@@ -101,7 +145,13 @@ class DBConnection:
         self._conn.rollback()
 
     def close(self) -> None:
-        self._conn.close()
+        if self._closed:
+            return
+        self._closed = True
+        if self._release is not None:
+            self._release(self._conn)
+        else:
+            self._conn.close()
 
     def __enter__(self):
         return self
@@ -124,7 +174,8 @@ def connect() -> DBConnection:
         if psycopg2 is None:
             raise RuntimeError("psycopg2 is required for Postgres. Add psycopg2-binary.")
         return DBConnection(psycopg2.connect(config.DB_URL), postgres=True)
-    return DBConnection(sqlite3.connect(config.DB_PATH), postgres=False)
+    # Request-scoped and async-route connections hop between worker threads (one user at a time).
+    return DBConnection(sqlite3.connect(config.DB_PATH, check_same_thread=False), postgres=False)
 
 
 def configure_connection(conn: DBConnection) -> None:
@@ -138,6 +189,279 @@ def configure_connection(conn: DBConnection) -> None:
         return
 
 
+class PoolTimeout(RuntimeError):
+    """No pooled connection became free within ``FITNESS_DB_POOL_TIMEOUT_SEC``."""
+
+
+class ConnectionPool:
+    """Thread-safe pool of raw DB-API connections (SQLite or psycopg2).
+
+    Connections are configured once when opened (SQLite PRAGMAs), rolled back when
+    returned so no transaction leaks into the next borrower, and pinged with
+    ``SELECT 1`` on checkout once idle for ``ping_after`` seconds; broken ones are
+    discarded and replaced. Checkouts beyond ``max_size`` wait up to ``timeout``.
+    """
+
+    def __init__(
+        self,
+        factory: Callable,
+        postgres: bool,
+        min_size: int = 1,
+        max_size: int = 10,
+        timeout: float = 10.0,
+        ping_after: float = 30.0,
+    ):
+        self._factory = factory
+        self.postgres = postgres
+        self.max_size = max(1, max_size)
+        self.min_size = max(0, min(min_size, self.max_size))
+        self.timeout = timeout
+        self.ping_after = ping_after
+        self.pid = os.getpid()
+        self._idle: deque = deque()  # (raw connection, monotonic time it was returned)
+        self._size = 0
+        self._closed = False
+        self._cond = threading.Condition()
+        for _ in range(self.min_size):
+            self._size += 1
+            self._idle.append((self._open(), time.monotonic()))
+
+    def _open(self):
+        try:
+            raw = self._factory()
+        except Exception:
+            with self._cond:
+                self._size -= 1
+                self._cond.notify()
+            raise
+        inc("db_pool_connections_opened_total")
+        return raw
+
+    def _discard(self, raw) -> None:
+        try:
+            raw.close()
+        except Exception:
+            pass
+        with self._cond:
+            self._size -= 1
+            self._cond.notify()
+        inc("db_pool_connections_discarded_total")
+
+    def _ping(self, raw) -> bool:
+        try:
+            cur = raw.cursor()
+            cur.execute("SELECT 1")
+            cur.fetchone()
+            raw.rollback()
+            return True
+        except Exception:
+            inc("db_pool_ping_failures_total")
+            return False
+
+    def acquire(self) -> DBConnection:
+        started = time.monotonic()
+        deadline = started + self.timeout
+        while True:
+            raw = None
+            with self._cond:
+                while True:
+                    if self._closed:
+                        raise RuntimeError("Connection pool is closed")
+                    if self._idle:
+                        # LIFO keeps the warmest connections busy and lets the rest age out.
+                        raw, returned_at = self._idle.pop()
+                        break
+                    if self._size < self.max_size:
+                        self._size += 1
+                        break
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        inc("db_pool_timeouts_total")
+                        raise PoolTimeout(f"No database connection free after {self.timeout:.1f}s")
+                    self._cond.wait(remaining)
+            if raw is None:
+                raw = self._open()
+            elif time.monotonic() - returned_at >= self.ping_after and not self._ping(raw):
+                self._discard(raw)
+                continue
+            break
+        inc("db_pool_acquire_total")
+        observe("db_pool_wait_seconds", time.monotonic() - started)
+        return DBConnection(raw, self.postgres, release=self._release)
+
+    def _release(self, raw) -> None:
+        try:
+            raw.rollback()
+            healthy = not getattr(raw, "closed", False)
+        except Exception:
+            healthy = False
+        with self._cond:
+            if healthy and not self._closed:
+                self._idle.append((raw, time.monotonic()))
+                self._cond.notify()
+                return
+        self._discard(raw)
+
+    def close(self) -> None:
+        with self._cond:
+            self._closed = True
+            idle, self._idle = list(self._idle), deque()
+        for raw, _ in idle:
+            self._discard(raw)
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                "size": self._size,
+                "idle": len(self._idle),
+                "in_use": self._size - len(self._idle),
+                "max": self.max_size,
+            }
+
+
+def _open_sqlite():
+    conn = connect()
+    configure_connection(conn)
+    conn.commit()
+    return conn._conn
+
+
+def _open_postgres():
+    if psycopg2 is None:
+        raise RuntimeError("psycopg2 is required for Postgres. Add psycopg2-binary.")
+    return psycopg2.connect(config.DB_URL)
+
+
+_pool: Optional[ConnectionPool] = None
+_pool_key = None
+_pool_lock = threading.Lock()
+
+
+def _pool_target():
+    if is_postgres():
+        return config.DB_URL
+    try:
+        # A replaced database file (restore, fixture rebuild) must not be served by
+        # connections still holding the old inode.
+        stat = os.stat(config.DB_PATH)
+        return str(config.DB_PATH), stat.st_dev, stat.st_ino
+    except OSError:
+        return str(config.DB_PATH), None, None
+
+
+def get_pool() -> ConnectionPool:
+    """The process-wide pool for the configured database, rebuilt if the target changes."""
+    global _pool, _pool_key
+    key = (
+        _pool_target(),
+        os.getpid(),
+        config.DB_POOL_MIN,
+        config.DB_POOL_MAX,
+        config.DB_POOL_TIMEOUT_SEC,
+        config.DB_POOL_PING_SEC,
+    )
+    pool = _pool
+    if pool is not None and _pool_key == key:
+        return pool
+    with _pool_lock:
+        if _pool is not None and _pool_key == key:
+            return _pool
+        if _pool is not None and _pool.pid == os.getpid():
+            _pool.close()  # a forked child leaves the parent's sockets alone
+        postgres = is_postgres()
+        _pool = ConnectionPool(
+            _open_postgres if postgres else _open_sqlite,
+            postgres,
+            min_size=config.DB_POOL_MIN,
+            max_size=config.DB_POOL_MAX,
+            timeout=config.DB_POOL_TIMEOUT_SEC,
+            ping_after=config.DB_POOL_PING_SEC,
+        )
+        _pool_key = key
+        return _pool
+
+
+def pool_stats() -> Optional[dict]:
+    pool = _pool
+    return pool.stats() if pool is not None else None
+
+
+class _Scope:
+    __slots__ = ("conn", "closed")
+
+    def __init__(self):
+        self.conn: Optional[DBConnection] = None
+        self.closed = False
+
+
+_scope: contextvars.ContextVar = contextvars.ContextVar("db_connection_scope", default=None)
+
+
+def _checkout() -> DBConnection:
+    if not config.DB_POOL_ENABLED:
+        conn = connect()
+        configure_connection(conn)
+        return conn
+    return get_pool().acquire()
+
+
+def _keep_open(raw) -> None:
+    return None
+
+
+@contextlib.contextmanager
+def connection_scope() -> Iterator[None]:
+    """Share one connection between all :func:`connection` calls in the block (an API request).
+
+    The connection is checked out lazily on first use and released when the block
+    exits. It is used by one thread at a time, so the block must not fan out
+    concurrent queries.
+    """
+    scope = _Scope()
+    token = _scope.set(scope)
+    try:
+        yield
+    finally:
+        try:
+            _scope.reset(token)
+        except ValueError:
+            pass  # exited from a copied context; the scope object is released below either way
+        scope.closed = True
+        _release_scope(scope)
+
+
+def _release_scope(scope: _Scope) -> None:
+    conn, scope.conn = scope.conn, None
+    if conn is not None:
+        conn.close()
+
+
+def release_scoped() -> None:
+    """Hand the current scope's connection back early, e.g. before slow outbound I/O.
+
+    A later :func:`connection` call in the same scope checks out a fresh one.
+    """
+    scope = _scope.get()
+    if scope is not None:
+        _release_scope(scope)
+
+
+def connection() -> DBConnection:
+    """A configured connection: ``with db.connection() as conn:`` commits (or rolls back) and closes.
+
+    Inside :func:`connection_scope` every call borrows the scope's connection and
+    closing only ends the transaction; otherwise it comes from the pool (or a fresh
+    connection with ``FITNESS_DB_POOL=0``).
+    """
+    scope = _scope.get()
+    if scope is None or scope.closed:
+        # Work outliving its request (background tasks) gets its own connection.
+        return _checkout()
+    if scope.conn is None:
+        scope.conn = _checkout()
+    return DBConnection(scope.conn._conn, scope.conn._postgres, release=_keep_open)
+
+
 def migrations_dir() -> Path:
     root = Path(__file__).resolve().parents[1]
     if is_postgres():
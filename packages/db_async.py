@@ -0,0 +1,317 @@
+"""Async counterpart of :mod:`packages.db` for the ``async def`` API routes::
+
+    async with db_async.connection() as conn:
+        cur = await conn.execute("SELECT ... WHERE user_id = ?", (user_id,))
+        rows = await cur.fetchall()
+
+Backends (``FITNESS_DB_ASYNC_BACKEND``):
+
+* ``native``: aiosqlite for SQLite, psycopg 3 ``AsyncConnection`` for Postgres, kept
+  in a small per-event-loop pool bounded by ``FITNESS_DB_POOL_MAX``.
+* ``thread``: the sync pooled :class:`packages.db.DBConnection`, every call run in a
+  worker thread under a dedicated limiter, so slow queries never take Starlette's
+  threadpool away from the sync routes.
+* ``auto`` (default): ``native`` when the driver is installed, otherwise ``thread``.
+
+SQL keeps ``?`` placeholders; Postgres gets the same ``%s`` adaptation and date
+coercion as the sync wrapper.
+"""
+import asyncio
+import contextlib
+import time
+import weakref
+from functools import partial
+from typing import AsyncIterator, Callable, Iterable, Optional
+
+import anyio
+
+import packages.config as config
+from packages import db
+from packages.metrics import inc, observe
+
+try:
+    import aiosqlite
+except ImportError:  # pragma: no cover - optional dependency
+    aiosqlite = None
+
+try:  # psycopg 3; the sync path keeps using psycopg2
+    import psycopg
+except ImportError:  # pragma: no cover - optional dependency
+    psycopg = None
+
+
+def backend() -> str:
+    """``native`` or ``thread`` for the configured database."""
+    choice = config.DB_ASYNC_BACKEND
+    if choice == "thread":
+        return "thread"
+    driver = psycopg if db.is_postgres() else aiosqlite
+    if driver is not None:
+        return "native"
+    if choice == "native":
+        raise RuntimeError(
+            "FITNESS_DB_ASYNC_BACKEND=native needs " + ("psycopg" if db.is_postgres() else "aiosqlite")
+        )
+    return "thread"
+
+
+class AsyncDBCursor:
+    def __init__(self, cursor, postgres: bool, run: Optional[Callable] = None):
+        self._cursor = cursor
+        self._postgres = postgres
+        # Thread backend: ``cursor`` is a sync DBCursor (which already coerces values).
+        self._run = run
+
+    @property
+    def description(self):
+        return self._cursor.description
+
+    async def fetchone(self):
+        if self._run is not None:
+            return await self._run(self._cursor.fetchone)
+        row = await self._cursor.fetchone()
+        if not self._postgres or row is None:
+            return row
+        return tuple(db.DBCursor._coerce(v) for v in row)
+
+    async def fetchall(self):
+        if self._run is not None:
+            return await self._run(self._cursor.fetchall)
+        rows = await self._cursor.fetchall()
+        if not self._postgres:
+            return rows
+        return [tuple(db.DBCursor._coerce(v) for v in row) for row in rows]
+
+
+class AsyncDBConnection:
+    def __init__(self, conn, postgres: bool, run: Optional[Callable] = None, release: Optional[Callable] = None):
+        self._conn = conn
+        self._postgres = postgres
+        self._run = run
+        self._release = release
+        self._closed = False
+
+    async def execute(self, sql: str, params: Optional[Iterable] = None) -> AsyncDBCursor:
+        if self._run is not None:
+            cur = await self._run(self._conn.execute, sql, params)
+            return AsyncDBCursor(cur, self._postgres, self._run)
+        if self._postgres:
+            sql = sql.replace("?", "%s")
+        cur = await self._conn.execute(sql, () if params is None else list(params))
+        return AsyncDBCursor(cur, self._postgres)
+
+    async def commit(self) -> None:
+        if self._run is not None:
+            await self._run(self._conn.commit)
+        else:
+            await self._conn.commit()
+
+    async def rollback(self) -> None:
+        if self._run is not None:
+            await self._run(self._conn.rollback)
+        else:
+            await self._conn.rollback()
+
+    async def close(self) -> None:
+        if self._closed:
+            return
+        self._closed = True
+        if self._release is not None:
+            await self._release(self._conn)
+        elif self._run is not None:
+            await self._run(self._conn.close)
+        else:
+            await self._conn.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        try:
+            if exc_type:
+                await self.rollback()
+            else:
+                await self.commit()
+        finally:
+            await self.close()
+
+
+async def _open_native():
+    if db.is_postgres():
+        return await psycopg.AsyncConnection.connect(config.DB_URL)
+    conn = await aiosqlite.connect(config.DB_PATH)
+    try:
+        await conn.execute("PRAGMA foreign_keys=ON")
+        await conn.execute("PRAGMA journal_mode=WAL")
+        await conn.execute("PRAGMA busy_timeout=5000")
+        await conn.commit()
+    except Exception:
+        await conn.close()
+        raise
+    return conn
+
+
+class AsyncConnectionPool:
+    """Per-event-loop pool of native async connections (same policy as :class:`packages.db.ConnectionPool`)."""
+
+    def __init__(self, postgres: bool, max_size: int, timeout: float, ping_after: float):
+        self.postgres = postgres
+        self.max_size = max(1, max_size)
+        self.timeout = timeout
+        self.ping_after = ping_after
+        self._slots = asyncio.Semaphore(self.max_size)
+        self._idle: list = []  # (connection, monotonic time it was returned)
+        self._closed = False
+
+    async def _close_raw(self, raw) -> None:
+        try:
+            await raw.close()
+        except Exception:
+            pass
+
+    async def _ping(self, raw) -> bool:
+        try:
+            cur = await raw.execute("SELECT 1")
+            await cur.fetchone()
+            await raw.rollback()
+            return True
+        except Exception:
+            inc('db_pool_ping_failures_total{pool="async"}')
+            return False
+
+    async def acquire(self) -> AsyncDBConnection:
+        started = time.monotonic()
+        try:
+            await asyncio.wait_for(self._slots.acquire(), self.timeout)
+        except asyncio.TimeoutError:
+            inc('db_pool_timeouts_total{pool="async"}')
+            raise db.PoolTimeout(f"No database connection free after {self.timeout:.1f}s") from None
+        try:
+            raw = None
+            while self._idle:
+                candidate, returned_at = self._idle.pop()
+                if time.monotonic() - returned_at < self.ping_after or await self._ping(candidate):
+                    raw = candidate
+                    break
+                await self._close_raw(candidate)
+            if raw is None:
+                raw = await _open_native()
+                inc('db_pool_connections_opened_total{pool="async"}')
+        except BaseException:
+            self._slots.release()
+            raise
+        inc('db_pool_acquire_total{pool="async"}')
+        observe('db_pool_wait_seconds{pool="async"}', time.monotonic() - started)
+        return AsyncDBConnection(raw, self.postgres, release=self._release)
+
+    async def _release(self, raw) -> None:
+        try:
+            await raw.rollback()
+            healthy = not self._closed
+        except Exception:
+            healthy = False
+        if healthy:
+            self._idle.append((raw, time.monotonic()))
+        else:
+            await self._close_raw(raw)
+        self._slots.release()
+
+    async def close(self) -> None:
+        self._closed = True
+        idle, self._idle = self._idle, []
+        for raw, _ in idle:
+            await self._close_raw(raw)
+
+
+class _LoopState:
+    def __init__(self):
+        self.pool: Optional[AsyncConnectionPool] = None
+        self.pool_key = None
+        self.keeper: Optional[asyncio.Task] = None
+        self.limiter: Optional[anyio.CapacityLimiter] = None
+
+
+_states: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, _LoopState]" = weakref.WeakKeyDictionary()
+
+
+def _state() -> _LoopState:
+    loop = asyncio.get_running_loop()
+    state = _states.get(loop)
+    if state is None:
+        state = _states[loop] = _LoopState()
+    return state
+
+
+async def _keep(pool: AsyncConnectionPool) -> None:
+    # aiosqlite runs a non-daemon thread per connection: close them when the loop
+    # shuts down (asyncio.run and uvicorn cancel leftover tasks) so exit never hangs.
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await pool.close()
+
+
+def _pool() -> AsyncConnectionPool:
+    state = _state()
+    key = (db._pool_target(), config.DB_POOL_MAX, config.DB_POOL_TIMEOUT_SEC, config.DB_POOL_PING_SEC)
+    if state.pool is None or state.pool_key != key:
+        if state.keeper is not None:
+            state.keeper.cancel()  # closes the previous pool's idle connections
+        state.pool = AsyncConnectionPool(
+            db.is_postgres(),
+            max_size=config.DB_POOL_MAX,
+            timeout=config.DB_POOL_TIMEOUT_SEC,
+            ping_after=config.DB_POOL_PING_SEC,
+        )
+        state.pool_key = key
+        state.keeper = asyncio.get_running_loop().create_task(_keep(state.pool))
+    return state.pool
+
+
+def _thread_runner() -> Callable:
+    state = _state()
+    if state.limiter is None:
+        state.limiter = anyio.CapacityLimiter(max(1, config.DB_POOL_MAX))
+    limiter = state.limiter
+
+    async def run(fn, *args):
+        return await anyio.to_thread.run_sync(partial(fn, *args), limiter=limiter)
+
+    return run
+
+
+async def acquire() -> AsyncDBConnection:
+    if backend() == "native":
+        return await _pool().acquire()
+    run = _thread_runner()
+    conn = await run(db.connection)
+    return AsyncDBConnection(conn, conn._postgres, run=run)
+
+
+@contextlib.asynccontextmanager
+async def connection() -> AsyncIterator[AsyncDBConnection]:
+    """``async with`` a pooled connection: commits on success, rolls back on error, then releases."""
+    conn = await acquire()
+    async with conn:
+        yield conn
+
+
+async def close_pools() -> None:
+    """Close this event loop's native pool (app shutdown).
+
+    ``asyncio.run`` and uvicorn get this for free via the keeper task; scripts that
+    drive their own loop with ``run_until_complete`` must await it before exiting.
+    """
+    state = _state()
+    if state.keeper is not None:
+        state.keeper.cancel()
+        state.keeper = None
+    if state.pool is not None:
+        await state.pool.close()
+        state.pool = None
+        state.pool_key = None
+
+
+async def dict_rows(cur: AsyncDBCursor) -> list:
+    cols = [c[0] for c in cur.description]
+    return [{cols[i]: row[i] for i in range(len(cols))} for row in await cur.fetchall()]
@@ -0,0 +1,87 @@
+"""Which local artifact files have been imported (``import_manifest``), so re-runs skip them.
+
+A file whose size and mtime match its entry is skipped without being read. If
+only the mtime moved (copied or touched), its SHA-256 decides. An append-only
+file that grew past a prefix with the recorded hash (``activities.jsonl``) can
+be resumed from the old size instead of re-imported.
+"""
+from __future__ import annotations
+
+import hashlib
+import os
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import BinaryIO, Dict, Optional
+
+HASH_CHUNK = 1 << 20
+
+
+@dataclass
+class ManifestEntry:
+    path: str
+    size: int
+    mtime_ns: int
+    sha256: str
+
+
+def manifest_key(path: Path) -> str:
+    return str(Path(path).resolve())
+
+
+def load_entries(conn, directory: Path) -> Dict[str, ManifestEntry]:
+    """Entries for files under ``directory``, keyed by :func:`manifest_key`."""
+    prefix = manifest_key(directory).rstrip(os.sep) + os.sep
+    rows = conn.execute(
+        "SELECT path, size, mtime_ns, sha256 FROM import_manifest WHERE path >= ? AND path < ?",
+        (prefix, prefix[:-1] + chr(ord(os.sep) + 1)),
+    ).fetchall()
+    return {row[0]: ManifestEntry(*row) for row in rows}
+
+
+def load_entry(conn, path: Path) -> Optional[ManifestEntry]:
+    row = conn.execute(
+        "SELECT path, size, mtime_ns, sha256 FROM import_manifest WHERE path = ?",
+        (manifest_key(path),),
+    ).fetchone()
+    return ManifestEntry(*row) if row else None
+
+
+def unchanged(entry: Optional[ManifestEntry], stat: os.stat_result) -> bool:
+    return entry is not None and entry.size == stat.st_size and entry.mtime_ns == stat.st_mtime_ns
+
+
+def hash_stream(fh: BinaryIO, limit: Optional[int] = None, digest=None):
+    """Feed ``fh`` (up to ``limit`` bytes) into ``digest`` in fixed-size chunks; returns the digest."""
+    digest = digest or hashlib.sha256()
+    remaining = limit
+    while remaining is None or remaining > 0:
+        chunk = fh.read(HASH_CHUNK if remaining is None else min(HASH_CHUNK, remaining))
+        if not chunk:
+            break
+        digest.update(chunk)
+        if remaining is not None:
+            remaining -= len(chunk)
+    return digest
+
+
+def file_sha256(path: Path) -> str:
+    with open(path, "rb") as fh:
+        return hash_stream(fh).hexdigest()
+
+
+def record(conn, path: Path, stat: os.stat_result, sha256: str, rows: int) -> None:
+    """Upsert the entry for ``path``; commit together with the rows it describes."""
+    conn.execute(
+        """
+        INSERT INTO import_manifest(path, size, mtime_ns, sha256, rows, imported_at)
+        VALUES(?, ?, ?, ?, ?, ?)
+        ON CONFLICT(path) DO UPDATE SET
+          size=excluded.size,
+          mtime_ns=excluded.mtime_ns,
+          sha256=excluded.sha256,
+          rows=excluded.rows,
+          imported_at=excluded.imported_at
+        """,
+        (manifest_key(path), stat.st_size, stat.st_mtime_ns, sha256, rows, datetime.now(timezone.utc).isoformat()),
+    )
@@ -1,17 +1,34 @@
 from pathlib import Path
 from contextlib import nullcontext
+import json
 import os
 import subprocess
 import sys
+import tempfile
 import time
 
-from packages.metrics import inc, observe
+from packages.metrics import EXPORT_PATH_ENV, inc, merge, observe
 from packages.pipeline_lock import pipeline_lock
 
 
+def _collect_metrics(step: str, path: Path) -> None:
+    """Fold the metrics a step exported (see packages.metrics.export_snapshot) into ours."""
+    if not path.exists():
+        return
+    try:
+        exported = json.loads(path.read_text(encoding="utf-8"))
+    except ValueError:
+        print(f"Ignoring unreadable metrics export from step {step}")
+        return
+    merge(exported.get("counters", {}), exported.get("durations", {}))
+
+
 def _run_step(step: str, cmd: list[str], cwd: str | None = None) -> bool:
     start = time.perf_counter()
-    res = subprocess.run(cmd, cwd=cwd)
+    with tempfile.TemporaryDirectory() as tmp:
+        export_path = Path(tmp) / "metrics.json"
+        res = subprocess.run(cmd, cwd=cwd, env={**os.environ, EXPORT_PATH_ENV: str(export_path)})
+        _collect_metrics(step, export_path)
     duration = time.perf_counter() - start
     inc(f"pipeline_step_runs_total{{step=\"{step}\"}}")
     observe(f"pipeline_step_duration_seconds{{step=\"{step}\"}}", duration)
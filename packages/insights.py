@@ -0,0 +1,500 @@
+"""Per-user insights payload (``/api/insights``) and its precomputed snapshot.
+
+The pipeline stores one snapshot per user at the end of each run
+(``insights_snapshot``); the route serves the latest one and falls back to
+:func:`compute_insights` when it is missing or older than
+``INSIGHTS_SNAPSHOT_MAX_AGE_SEC``.
+"""
+from __future__ import annotations
+
+import json
+import statistics
+import time
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+
+def compute_vdot(distance_m: float, time_s: float) -> Optional[float]:
+    if not distance_m or not time_s:
+        return None
+    v_m_min = (distance_m / time_s) * 60.0
+    vo2 = -4.60 + 0.182258 * v_m_min + 0.000104 * (v_m_min ** 2)
+    t_min = time_s / 60.0
+    pct = 0.8 + 0.1894393 * (2.718281828 ** (-0.012778 * t_min)) + 0.2989558 * (2.718281828 ** (-0.1932605 * t_min))
+    if pct == 0:
+        return None
+    return vo2 / pct
+
+
+def linear_slope(values: List[float]) -> Optional[float]:
+    n = len(values)
+    if n < 2:
+        return None
+    xs = list(range(n))
+    x_mean = sum(xs) / n
+    y_mean = sum(values) / n
+    num = sum((x - x_mean) * (y - y_mean) for x, y in zip(xs, values))
+    den = sum((x - x_mean) ** 2 for x in xs)
+    return (num / den) if den else None
+
+
+def _best_run_in_distance_window(
+    conn,
+    user_id: int,
+    min_m: float,
+    max_m: float,
+    start_time_after: str | None = None,
+):
+    cur = conn.cursor()
+    clause = ""
+    params: list[object] = [user_id, min_m, max_m]
+    if start_time_after:
+        clause = " AND a.start_time >= ?"
+        params.append(start_time_after)
+    cur.execute(
+        f"""
+        SELECT a.activity_id, a.start_time, c.distance_m, c.moving_s
+        FROM activities a
+        JOIN activities_calc c ON c.activity_id = a.activity_id
+        WHERE a.user_id = ?
+          AND lower(a.activity_type) = 'run'
+          AND c.distance_m IS NOT NULL
+          AND c.moving_s IS NOT NULL
+          AND c.moving_s > 0
+          AND c.distance_m >= ?
+          AND c.distance_m <= ?
+          {clause}
+        ORDER BY c.moving_s ASC
+        LIMIT 1
+        """
+    , tuple(params))
+    row = cur.fetchone()
+    if not row:
+        return None
+    activity_id, start_time, distance_m, moving_s = row
+    return {
+        "activity_id": activity_id,
+        "start_time": start_time,
+        "distance_m": distance_m,
+        "moving_s": moving_s,
+    }
+
+
+def _best_run_pb(conn, user_id: int, target_m: int, start_time_after: str | None = None):
+    # Prefer runs whose total distance is very close to the target (avoid a fast 4.6k
+    # being reported as a 5k PB, etc.). Fall back to wider ranges if needed.
+    if target_m == 5000:
+        windows = [(4950, 5100), (4900, 5200), (4800, 5200), (4500, 5500)]
+    elif target_m == 10000:
+        windows = [(9900, 10200), (9800, 10300), (9700, 10300), (9000, 11000)]
+    else:
+        windows = [(target_m * 0.98, target_m * 1.02), (target_m * 0.95, target_m * 1.05)]
+    for lo, hi in windows:
+        best = _best_run_in_distance_window(conn, user_id, lo, hi, start_time_after)
+        if best:
+            return best
+    return None
+
+
+def compute_insights(conn, user_id: int, now: Optional[float] = None) -> Dict[str, object]:
+    """Build the full InsightsResponse payload for ``user_id``."""
+    now = time.time() if now is None else now
+    one_year_ago = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(now - 365 * 24 * 3600))
+    days_28_ago = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(now - 28 * 24 * 3600))
+    days_7_ago = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(now - 7 * 24 * 3600))
+    cur = conn.cursor()
+
+    # PBs from segments (if available).
+    cur.execute(
+        """
+        SELECT sb.distance_m, sb.time_s, sb.activity_id, sb.date
+        FROM segments_best sb
+        JOIN activities a ON a.activity_id = sb.activity_id
+        WHERE a.user_id = ?
+          AND sb.scope = 'best_all'
+          AND sb.distance_m IN (5000, 10000)
+        """
+        ,
+        (user_id,),
+    )
+    pb_all: Dict[int, Dict[str, object]] = {}
+    for dist, time_s, activity_id, date in cur.fetchall():
+        pb_all[int(dist)] = {
+            "time_s": time_s,
+            "activity_id": activity_id,
+            "date": date,
+        }
+
+    # Fallback PBs from full runs if segments_best isn't populated (Postgres + API-only mode).
+    if 5000 not in pb_all:
+        best_5k = _best_run_pb(conn, user_id, 5000)
+        if best_5k:
+            pb_all[5000] = {
+                "time_s": best_5k["moving_s"],
+                "activity_id": best_5k["activity_id"],
+                "date": best_5k["start_time"],
+            }
+    if 10000 not in pb_all:
+        best_10k = _best_run_pb(conn, user_id, 10000)
+        if best_10k:
+            pb_all[10000] = {
+                "time_s": best_10k["moving_s"],
+                "activity_id": best_10k["activity_id"],
+                "date": best_10k["start_time"],
+            }
+
+    cur.execute(
+        """
+        SELECT a.activity_id, a.start_time, c.distance_m, c.moving_s
+        FROM activities a
+        JOIN activities_calc c ON c.activity_id = a.activity_id
+        WHERE lower(a.activity_type) = 'run'
+          AND a.user_id = ?
+          AND a.start_time >= ?
+          AND c.distance_m IS NOT NULL
+          AND c.moving_s IS NOT NULL
+          AND c.moving_s > 0
+        """,
+        (user_id, one_year_ago),
+    )
+    best_vdot = None
+    best_source = None
+    for activity_id, start_time, distance_m, moving_s in cur.fetchall():
+        if distance_m is None or moving_s is None:
+            continue
+        if distance_m < 5000:
+            continue
+        vdot = compute_vdot(distance_m, moving_s)
+        if vdot is None:
+            continue
+        if best_vdot is None or vdot > best_vdot:
+            best_vdot = vdot
+            best_source = {
+                "activity_id": activity_id,
+                "start_time": start_time,
+                "distance_m": distance_m,
+                "moving_s": moving_s,
+            }
+
+    # Best 5K/10K in last 12 months (full activity bests).
+    best_12m: Dict[int, Dict[str, object]] = {}
+    cur.execute(
+        """
+        SELECT a.activity_id, a.start_time, c.distance_m, c.moving_s
+        FROM activities a
+        JOIN activities_calc c ON c.activity_id = a.activity_id
+        WHERE lower(a.activity_type) = 'run'
+          AND a.user_id = ?
+          AND a.start_time >= ?
+          AND c.distance_m >= 5000
+          AND c.moving_s > 0
+        """,
+        (user_id, one_year_ago),
+    )
+    for activity_id, start_time, distance_m, moving_s in cur.fetchall():
+        dist = float(distance_m)
+        pace = moving_s / (dist / 1000)
+        if dist >= 5000:
+            prev = best_12m.get(5000)
+            if not prev or pace < prev["pace"]:  # type: ignore[index]
+                best_12m[5000] = {
+                    "time_s": moving_s,
+                    "activity_id": activity_id,
+                    "date": start_time,
+                    "pace": pace,
+                }
+        if dist >= 10000:
+            prev = best_12m.get(10000)
+            if not prev or pace < prev["pace"]:  # type: ignore[index]
+                best_12m[10000] = {
+                    "time_s": moving_s,
+                    "activity_id": activity_id,
+                    "date": start_time,
+                    "pace": pace,
+                }
+
+    # Prefer "true" 5k/10k runs when they exist.
+    best_5k_12m = _best_run_pb(conn, user_id, 5000, one_year_ago)
+    if best_5k_12m:
+        best_12m[5000] = {
+            "time_s": best_5k_12m["moving_s"],
+            "activity_id": best_5k_12m["activity_id"],
+            "date": best_5k_12m["start_time"],
+        }
+    best_10k_12m = _best_run_pb(conn, user_id, 10000, one_year_ago)
+    if best_10k_12m:
+        best_12m[10000] = {
+            "time_s": best_10k_12m["moving_s"],
+            "activity_id": best_10k_12m["activity_id"],
+            "date": best_10k_12m["start_time"],
+        }
+
+    # Estimated bests from segment PBs (Riegel).
+    cur.execute(
+        """
+        SELECT distance_m, time_s
+        FROM segments_best
+        WHERE scope IN ('best_12w', 'best_all')
+          AND distance_m IN (3000, 5000, 10000)
+        ORDER BY CASE scope WHEN 'best_12w' THEN 0 ELSE 1 END
+        """
+    )
+    segment_best: Dict[int, float] = {}
+    for dist, time_s in cur.fetchall():
+        if dist not in segment_best:
+            segment_best[int(dist)] = time_s
+
+    def riegel(t1, d1, d2, exp=1.06):
+        return t1 * ((d2 / d1) ** exp)
+
+    est_5k = None
+    est_10k = None
+    if 3000 in segment_best:
+        est_5k = riegel(segment_best[3000], 3000, 5000)
+        est_10k = riegel(segment_best[3000], 3000, 10000)
+    elif 5000 in segment_best:
+        est_10k = riegel(segment_best[5000], 5000, 10000)
+    elif 10000 in segment_best:
+        est_5k = riegel(segment_best[10000], 10000, 5000)
+    elif best_source and best_source.get("distance_m") and best_source.get("moving_s"):
+        # Fallback estimate: riegel from best VDOT-eligible full run.
+        d1 = float(best_source["distance_m"])
+        t1 = float(best_source["moving_s"])
+        if d1 > 0 and t1 > 0:
+            est_5k = riegel(t1, d1, 5000)
+            est_10k = riegel(t1, d1, 10000)
+
+    cur.execute(
+        """
+        SELECT week, avg_pace_sec, avg_hr_norm, eff_index
+        FROM metrics_weekly_mat
+        WHERE user_id = ?
+        ORDER BY week DESC
+        LIMIT 12
+        """,
+        (user_id,),
+    )
+    rows = cur.fetchall()
+    rows = list(reversed(rows))
+    pace_series = [r[1] for r in rows if r[1] is not None]
+    hr_series = [r[2] for r in rows if r[2] is not None]
+    eff_series = [r[3] for r in rows if r[3] is not None]
+
+    pace_trend = linear_slope(pace_series)
+    hr_trend = linear_slope(hr_series)
+    eff_trend = linear_slope(eff_series)
+
+    cur.execute(
+        """
+        SELECT monotony, strain, week
+        FROM metrics_weekly_mat
+        WHERE user_id = ?
+        ORDER BY week DESC
+        LIMIT 1
+        """,
+        (user_id,),
+    )
+    row = cur.fetchone()
+    monotony = row[0] if row else None
+    strain = row[1] if row else None
+
+    # Weekly fatigue load: moving time (s) * avg HR (bpm).
+    cur.execute(
+        """
+        SELECT week, moving_s, avg_hr_norm
+        FROM metrics_weekly_mat
+        WHERE user_id = ?
+        ORDER BY week DESC
+        LIMIT 6
+        """,
+        (user_id,),
+    )
+    fatigue_rows = cur.fetchall()
+    weekly_fatigue = []
+    for week, moving_s, avg_hr_norm in fatigue_rows:
+        if moving_s is None or avg_hr_norm is None:
+            continue
+        weekly_fatigue.append(
+            {"week": week, "load": float(moving_s) * float(avg_hr_norm)}
+        )
+    weekly_fatigue_sorted = list(reversed(weekly_fatigue))
+    last_week_load = weekly_fatigue_sorted[-1]["load"] if weekly_fatigue_sorted else None
+    last_4 = weekly_fatigue_sorted[-4:] if len(weekly_fatigue_sorted) >= 1 else []
+    fatigue_4w_avg = (
+        sum(w["load"] for w in last_4) / len(last_4) if last_4 else None
+    )
+
+    # Recovery index (28d): median efficiency vs max efficiency.
+    cur.execute(
+        """
+        SELECT c.distance_m, c.moving_s, COALESCE(c.avg_hr_norm, c.avg_hr_raw)
+        FROM activities_calc c
+        JOIN activities a ON a.activity_id = c.activity_id
+        WHERE a.user_id = ?
+          AND lower(a.activity_type) = 'run'
+          AND a.start_time >= ?
+          AND c.distance_m IS NOT NULL
+          AND c.moving_s IS NOT NULL
+          AND c.moving_s > 0
+          AND COALESCE(c.avg_hr_norm, c.avg_hr_raw) IS NOT NULL
+        """,
+        (user_id, days_28_ago),
+    )
+    efficiencies = []
+    for distance_m, moving_s, avg_hr in cur.fetchall():
+        if not distance_m or not moving_s or not avg_hr:
+            continue
+        pace_sec = moving_s / (distance_m / 1000)
+        if pace_sec <= 0:
+            continue
+        # Speed per bpm proxy.
+        eff = (1000 / pace_sec) / avg_hr
+        if eff > 0:
+            efficiencies.append(eff)
+    recovery_index = None
+    if efficiencies:
+        eff_med = statistics.median(efficiencies)
+        eff_max = max(efficiencies)
+        if eff_max > 0:
+            recovery_index = 100 * (eff_med / eff_max)
+
+    # Pace/HR efficiency trend (12w) using weekly data.
+    cur.execute(
+        """
+        SELECT avg_pace_sec, avg_hr_norm
+        FROM metrics_weekly_mat
+        WHERE user_id = ?
+        ORDER BY week DESC
+        LIMIT 12
+        """,
+        (user_id,),
+    )
+    eff_weekly = []
+    for avg_pace_sec, avg_hr_norm in cur.fetchall():
+        if avg_pace_sec and avg_hr_norm:
+            eff = (1000 / avg_pace_sec) / avg_hr_norm
+            eff_weekly.append(eff)
+    eff_weekly = list(reversed(eff_weekly))
+    efficiency_trend = linear_slope(eff_weekly)
+
+    cur.execute(
+        """
+        SELECT AVG(decoupling), AVG(hr_drift)
+        FROM activities_calc
+        WHERE activity_type = 'run'
+          AND activity_id IN (
+            SELECT activity_id
+            FROM activities
+            WHERE user_id = ?
+              AND lower(activity_type) = 'run'
+              AND start_time >= ?
+          )
+        """,
+        (user_id, days_28_ago),
+    )
+    decoupling_avg, hr_drift_avg = cur.fetchone() or (None, None)
+
+    cur.execute(
+        """
+        SELECT COALESCE(SUM(distance_m), 0)
+        FROM activities
+        WHERE user_id = ?
+          AND lower(activity_type) = 'run'
+          AND start_time >= ?
+        """,
+        (user_id, days_7_ago),
+    )
+    dist_7d = cur.fetchone()[0] or 0
+    cur.execute(
+        """
+        SELECT COALESCE(SUM(distance_m), 0)
+        FROM activities
+        WHERE user_id = ?
+          AND lower(activity_type) = 'run'
+          AND start_time >= ?
+        """,
+        (user_id, days_28_ago),
+    )
+    dist_28d = cur.fetchone()[0] or 0
+
+    return {
+        "vdot_best": best_vdot,
+        "vdot_source": best_source,
+        "pb_all": pb_all,
+        "pb_12m": best_12m,
+        "est_5k_s": est_5k,
+        "est_10k_s": est_10k,
+        "pace_trend_sec_per_week": pace_trend,
+        "hr_trend_bpm_per_week": hr_trend,
+        "eff_trend_per_week": eff_trend,
+        "monotony": monotony,
+        "strain": strain,
+        "decoupling_28d": decoupling_avg,
+        "hr_drift_28d": hr_drift_avg,
+        "weekly_fatigue": weekly_fatigue_sorted,
+        "fatigue_last_week": last_week_load,
+        "fatigue_4w_avg": fatigue_4w_avg,
+        "recovery_index_28d": recovery_index,
+        "efficiency_trend_12w": efficiency_trend,
+        "dist_7d_km": dist_7d / 1000 if dist_7d else 0,
+        "dist_28d_km": dist_28d / 1000 if dist_28d else 0,
+    }
+
+
+def save_snapshot(conn, user_id: int, payload: Dict[str, object], computed_at: str) -> None:
+    """Store ``payload`` as the latest snapshot for ``user_id`` (older ones are dropped)."""
+    conn.execute("DELETE FROM insights_snapshot WHERE user_id = ?", (user_id,))
+    conn.execute(
+        "INSERT INTO insights_snapshot(user_id, computed_at, payload_json) VALUES(?, ?, ?)",
+        (user_id, computed_at, json.dumps(payload)),
+    )
+
+
+def load_snapshot(conn, user_id: int) -> Optional[Tuple[Dict[str, object], str]]:
+    """Latest stored (payload, computed_at) for ``user_id``, or None."""
+    row = conn.execute(
+        """
+        SELECT payload_json, computed_at
+        FROM insights_snapshot
+        WHERE user_id = ?
+        ORDER BY computed_at DESC
+        LIMIT 1
+        """,
+        (user_id,),
+    ).fetchone()
+    if not row or not row[0]:
+        return None
+    try:
+        payload = json.loads(row[0])
+    except json.JSONDecodeError:
+        return None
+    # JSON object keys are strings; the PB maps are keyed by distance in metres.
+    for key in ("pb_all", "pb_12m"):
+        if isinstance(payload.get(key), dict):
+            payload[key] = {int(k): v for k, v in payload[key].items()}
+    return payload, row[1]
+
+
+def snapshot_age_sec(computed_at: str, now: Optional[datetime] = None) -> Optional[float]:
+    try:
+        computed = datetime.fromisoformat(str(computed_at).replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    if computed.tzinfo is None:
+        computed = computed.replace(tzinfo=timezone.utc)
+    return ((now or datetime.now(timezone.utc)) - computed).total_seconds()
+
+
+def refresh_snapshots(conn, computed_at: datetime) -> int:
+    """Recompute and store the snapshot of every user with activities; returns the user count."""
+    user_ids = [
+        row[0]
+        for row in conn.execute(
+            "SELECT DISTINCT user_id FROM activities WHERE user_id IS NOT NULL ORDER BY user_id"
+        ).fetchall()
+    ]
+    stamp = computed_at.isoformat()
+    for user_id in user_ids:
+        payload = compute_insights(conn, user_id, now=computed_at.timestamp())
+        save_snapshot(conn, user_id, payload, stamp)
+    return len(user_ids)
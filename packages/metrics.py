@@ -1,3 +1,5 @@
+import json
+import os
 import threading
 from collections import defaultdict
 
@@ -17,6 +19,47 @@ def observe(name: str, value: float) -> None:
         _durations[name] += value
 
 
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def observe_histogram(name: str, value: float, buckets: tuple = DEFAULT_BUCKETS) -> None:
+    """Prometheus-style histogram: cumulative ``_bucket{le=...}`` and ``_count`` counters plus the ``_sum``."""
+    base, _, labels = name.partition("{")
+    labels = labels.rstrip("}")
+    prefix = f"{labels}," if labels else ""
+    suffix = f"{{{labels}}}" if labels else ""
+    with _lock:
+        for bound in buckets:
+            _counters[f'{base}_bucket{{{prefix}le="{bound}"}}'] += 1 if value <= bound else 0
+        _counters[f'{base}_bucket{{{prefix}le="+Inf"}}'] += 1
+        _counters[f"{base}_count{suffix}"] += 1
+        _durations[name] += value
+
+
 def snapshot() -> tuple[dict, dict]:
     with _lock:
         return dict(_counters), dict(_durations)
+
+
+# Set by packages.ingestion_runner for its step subprocesses, whose metrics would
+# otherwise die with them instead of reaching the parent's /metrics.
+EXPORT_PATH_ENV = "FITNESS_METRICS_EXPORT_PATH"
+
+
+def export_snapshot() -> None:
+    """Write this process's counters and durations to ``$FITNESS_METRICS_EXPORT_PATH``, if set."""
+    path = os.getenv(EXPORT_PATH_ENV)
+    if not path:
+        return
+    counters, durations = snapshot()
+    with open(path, "w", encoding="utf-8") as fh:
+        json.dump({"counters": counters, "durations": durations}, fh)
+
+
+def merge(counters: dict, durations: dict) -> None:
+    """Add another process's snapshot to this one."""
+    with _lock:
+        for name, value in counters.items():
+            _counters[name] += value
+        for name, value in durations.items():
+            _durations[name] += value
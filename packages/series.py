@@ -0,0 +1,119 @@
+"""Chart-ready activity series (``/activity/{id}/series``).
+
+The pipeline precomputes the payload at :data:`SERIES_LEVELS` downsample factors and
+stores it in ``activity_series_cache``; the route builds other factors on the fly
+with :func:`build_series`.
+"""
+from __future__ import annotations
+
+import json
+import zlib
+from typing import Dict, List, Optional, Sequence
+
+SERIES_LEVELS = (1, 5, 20)
+PACE_WINDOW_M = 200
+
+
+def forward_fill(values: Sequence[Optional[float]]) -> List[Optional[float]]:
+    last = None
+    filled = []
+    for v in values:
+        if v is None:
+            filled.append(last)
+        else:
+            last = v
+            filled.append(v)
+    return filled
+
+
+def rolling_distance_avg(
+    distances: Sequence[float], values: List[Optional[float]], window_m: float = PACE_WINDOW_M
+) -> List[Optional[float]]:
+    """Mean of the non-null values within the trailing ``window_m`` metres of each point.
+
+    Two pointers with a running sum/count, so O(n) regardless of the window size.
+    """
+    if not distances or not values:
+        return values
+    out_vals: List[Optional[float]] = []
+    start_idx = 0
+    total = 0.0
+    count = 0
+    for i, d in enumerate(distances):
+        v = values[i] if i < len(values) else None
+        if v is not None:
+            total += v
+            count += 1
+        while start_idx < i and distances[start_idx] < d - window_m:
+            dropped = values[start_idx] if start_idx < len(values) else None
+            if dropped is not None:
+                total -= dropped
+                count -= 1
+            start_idx += 1
+        out_vals.append(total / count if count else v)
+    return out_vals
+
+
+def _non_null(values: Optional[List[Optional[float]]]) -> List[Optional[float]]:
+    # Smoothed arrays that contain only nulls are treated as missing.
+    if values and any(v is not None for v in values):
+        return values
+    return []
+
+
+def build_series(
+    time_stream: List[float],
+    dist: List[float],
+    downsample: int,
+    hr: Optional[List[Optional[float]]] = None,
+    hr_norm: Optional[List[Optional[float]]] = None,
+    pace_smooth: Optional[List[Optional[float]]] = None,
+    cadence_smooth: Optional[List[Optional[float]]] = None,
+    hr_smooth: Optional[List[Optional[float]]] = None,
+    cadence: Optional[List[Optional[float]]] = None,
+    altitude: Optional[List[Optional[float]]] = None,
+) -> Dict[str, list]:
+    """Downsampled time/pace/hr/cadence/elevation series; ``{}`` if time/distance are unusable."""
+    if not time_stream or not dist or len(time_stream) != len(dist):
+        return {}
+    downsample = max(1, int(downsample))
+    hr = hr or []
+    hr_norm = hr_norm or []
+    pace_smooth = _non_null(pace_smooth)
+    cadence_smooth = _non_null(cadence_smooth)
+    hr_smooth = _non_null(hr_smooth)
+    cadence = cadence or []
+    altitude = altitude or []
+
+    out_dist = dist[::downsample]
+    hr_source = hr_smooth or hr_norm or hr
+    out = {
+        "time": time_stream[::downsample],
+        "pace": pace_smooth[::downsample] if pace_smooth else [],
+        "hr": hr_source[::downsample] if hr_source else [],
+        "cadence": (cadence_smooth or cadence)[::downsample] if (cadence_smooth or cadence) else [],
+        "elevation": altitude[::downsample] if altitude else [],
+    }
+
+    if not out["pace"] or not any(v is not None for v in out["pace"]):
+        for i in range(1, len(time_stream), downsample):
+            dt = time_stream[i] - time_stream[i - 1]
+            dd = dist[i] - dist[i - 1]
+            out["pace"].append((dt / (dd / 1000)) if dd > 0 else None)
+
+    out["pace"] = forward_fill(out["pace"])
+    out["hr"] = forward_fill(out["hr"])
+    out["cadence"] = forward_fill(out["cadence"])
+    out["pace"] = rolling_distance_avg(out_dist, out["pace"], window_m=PACE_WINDOW_M)
+    return out
+
+
+def pack(series: Dict[str, list]) -> bytes:
+    return zlib.compress(json.dumps(series, separators=(",", ":")).encode("utf-8"), 6)
+
+
+def unpack(payload) -> Optional[Dict[str, list]]:
+    try:
+        return json.loads(zlib.decompress(bytes(payload)))
+    except (zlib.error, ValueError, TypeError):
+        return None
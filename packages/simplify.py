@@ -0,0 +1,246 @@
+"""Shape-preserving downsampling for chart series and routes (``max_points=``).
+
+* :func:`lttb_indices`: Largest-Triangle-Three-Buckets over a shared x axis. With
+  several y channels (pace, hr, cadence, elevation) the triangle areas of the
+  min-max normalised channels are summed, so one index set keeps the peaks of all
+  of them and the arrays stay aligned.
+* :func:`douglas_peucker_indices`: Douglas–Peucker for latlng routes, run greedily
+  (always split the segment with the largest deviation) so it stops at exactly
+  ``max_points`` instead of needing a distance tolerance.
+
+Both use NumPy for the per-bucket / per-segment maths when installed, with a pure
+Python fallback that selects the same points.
+"""
+from __future__ import annotations
+
+import heapq
+import math
+from typing import Dict, List, Optional, Sequence
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - optional dependency
+    np = None
+
+# Targets the pipeline precomputes per activity; other values are simplified on request.
+SIMPLIFY_TARGETS = (500, 1500)
+MAX_POINTS_LIMIT = 10000
+SERIES_CHANNELS = ("pace", "hr", "cadence", "elevation")
+
+
+def _to_float(v) -> float:
+    return float(v) if isinstance(v, (int, float)) and not isinstance(v, bool) else math.nan
+
+
+def _normalised_channels(ys: Sequence[Sequence], n: int) -> List[List[float]]:
+    """Min-max scale each usable channel to [0, 1]; gaps take the channel mean."""
+    out = []
+    for channel in ys:
+        if not channel or len(channel) != n:
+            continue
+        values = [_to_float(v) for v in channel]
+        finite = [v for v in values if not math.isnan(v)]
+        if not finite:
+            continue
+        lo, hi = min(finite), max(finite)
+        span = (hi - lo) or 1.0
+        mean = sum(finite) / len(finite)
+        out.append([((mean if math.isnan(v) else v) - lo) / span for v in values])
+    return out
+
+
+def _bucket_edges(n: int, max_points: int) -> List[int]:
+    # n - 2 middle buckets over indices 1 .. n - 2; edge i is the first index of bucket i.
+    every = (n - 2) / (max_points - 2)
+    return [int(i * every) + 1 for i in range(max_points - 2)] + [n - 1]
+
+
+def _lttb_python(x: List[float], ys: List[List[float]], max_points: int) -> List[int]:
+    n = len(x)
+    edges = _bucket_edges(n, max_points)
+    buckets = max_points - 2
+    selected = [0]
+    for i in range(buckets):
+        lo, hi = edges[i], edges[i + 1]
+        if i + 1 < buckets:
+            nlo, nhi = edges[i + 1], edges[i + 2]
+            cx = sum(x[nlo:nhi]) / (nhi - nlo)
+            cys = [sum(y[nlo:nhi]) / (nhi - nlo) for y in ys]
+        else:
+            cx = x[n - 1]
+            cys = [y[n - 1] for y in ys]
+        a = selected[-1]
+        ax = x[a]
+        best, best_area = lo, -1.0
+        for j in range(lo, hi):
+            area = 0.0
+            for y, cy in zip(ys, cys):
+                area += abs((ax - cx) * (y[j] - y[a]) - (ax - x[j]) * (cy - y[a]))
+            if area > best_area:
+                best, best_area = j, area
+        selected.append(best)
+    selected.append(n - 1)
+    return selected
+
+
+def _lttb_numpy(x: List[float], ys: List[List[float]], max_points: int) -> List[int]:
+    n = len(x)
+    xs = np.asarray(x, dtype=np.float64)
+    ya = np.asarray(ys, dtype=np.float64)
+    edges = np.asarray(_bucket_edges(n, max_points), dtype=np.int64)
+    buckets = max_points - 2
+    # Mean point of every middle bucket in one pass; the last bucket looks ahead to the end point.
+    starts = edges[:-1]
+    counts = np.diff(edges).astype(np.float64)
+    mean_x = np.add.reduceat(xs[: n - 1], starts) / counts
+    mean_y = np.add.reduceat(ya[:, : n - 1], starts, axis=1) / counts
+    next_x = np.append(mean_x[1:], xs[n - 1])
+    next_y = np.concatenate([mean_y[:, 1:], ya[:, n - 1:]], axis=1)
+    selected = np.empty(max_points, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = n - 1
+    for i in range(buckets):
+        lo, hi = edges[i], edges[i + 1]
+        a = selected[i]
+        ax, ay = xs[a], ya[:, a:a + 1]
+        area = np.abs(
+            (ax - next_x[i]) * (ya[:, lo:hi] - ay) - (ax - xs[lo:hi]) * (next_y[:, i:i + 1] - ay)
+        ).sum(axis=0)
+        selected[i + 1] = lo + int(np.argmax(area))
+    return selected.tolist()
+
+
+def _normalised_numpy(ys: Sequence[Sequence], n: int):
+    rows = []
+    for channel in ys:
+        if not channel or len(channel) != n:
+            continue
+        try:
+            values = np.asarray(channel, dtype=np.float64)  # None -> NaN
+        except (TypeError, ValueError):
+            values = np.asarray([_to_float(v) for v in channel], dtype=np.float64)
+        finite = values[~np.isnan(values)]
+        if not finite.size:
+            continue
+        lo, hi = finite.min(), finite.max()
+        span = (hi - lo) or 1.0
+        rows.append((np.where(np.isnan(values), finite.mean(), values) - lo) / span)
+    return np.vstack(rows) if rows else None
+
+
+# Below this many points per bucket the per-bucket NumPy call overhead outweighs the
+# vectorised maths and the plain loop is faster.
+_NUMPY_MIN_BUCKET = 8
+
+
+def lttb_indices(x: Sequence, ys: Sequence[Sequence], max_points: int) -> List[int]:
+    """Indices of ``max_points`` points (first and last included) that best keep the shape of ``ys``."""
+    n = len(x)
+    if max_points >= n or n <= 2:
+        return list(range(n))
+    max_points = max(3, max_points)
+    xs = [_to_float(v) for v in x]
+    if any(math.isnan(v) for v in xs):
+        xs = [float(i) for i in range(n)]
+    span = (xs[-1] - xs[0]) or 1.0
+    xs = [(v - xs[0]) / span for v in xs]
+    if np is not None:
+        channels = _normalised_numpy(ys, n)
+        if channels is None:
+            return _even_indices(n, max_points)
+        if n >= _NUMPY_MIN_BUCKET * max_points:
+            return _lttb_numpy(xs, channels, max_points)
+        return _lttb_python(xs, channels.tolist(), max_points)
+    channels = _normalised_channels(ys, n)
+    if not channels:
+        return _even_indices(n, max_points)
+    return _lttb_python(xs, channels, max_points)
+
+
+def _even_indices(n: int, max_points: int) -> List[int]:
+    # Nothing to preserve: spread the points evenly.
+    return sorted({round(i * (n - 1) / (max_points - 1)) for i in range(max_points)})
+
+
+def _segment_max_python(px: List[float], py: List[float], start: int, end: int):
+    ax, ay = px[start], py[start]
+    dx, dy = px[end] - ax, py[end] - ay
+    length = math.hypot(dx, dy)
+    best, best_dist = -1, 0.0
+    for j in range(start + 1, end):
+        if length:
+            dist = abs(dx * (py[j] - ay) - dy * (px[j] - ax)) / length
+        else:
+            dist = math.hypot(px[j] - ax, py[j] - ay)
+        if dist > best_dist:
+            best, best_dist = j, dist
+    return best, best_dist
+
+
+def _segment_max_numpy(px, py, start: int, end: int):
+    ax, ay = px[start], py[start]
+    dx, dy = px[end] - ax, py[end] - ay
+    length = math.hypot(dx, dy)
+    sx = px[start + 1:end] - ax
+    sy = py[start + 1:end] - ay
+    if length:
+        dist = np.abs(dx * sy - dy * sx) / length
+    else:
+        dist = np.hypot(sx, sy)
+    j = int(np.argmax(dist))
+    return start + 1 + j, float(dist[j])
+
+
+def douglas_peucker_indices(points: Sequence[Sequence[float]], max_points: int) -> List[int]:
+    """Indices of at most ``max_points`` route points, splitting the worst segment first."""
+    n = len(points)
+    if max_points >= n or n <= 2:
+        return list(range(n))
+    max_points = max(2, max_points)
+    lat0 = math.radians(sum(p[0] for p in points) / n)
+    # Equirectangular projection: fine for the extent of a single activity.
+    px = [p[1] * math.cos(lat0) for p in points]
+    py = [p[0] for p in points]
+    if np is not None:
+        px, py = np.asarray(px), np.asarray(py)
+        segment_max = _segment_max_numpy
+    else:
+        segment_max = _segment_max_python
+
+    selected = {0, n - 1}
+    heap = []
+
+    def push(start: int, end: int) -> None:
+        if end - start < 2:
+            return
+        j, dist = segment_max(px, py, start, end)
+        if dist > 0:
+            heapq.heappush(heap, (-dist, start, end, j))
+
+    push(0, n - 1)
+    while heap and len(selected) < max_points:
+        _, start, end, j = heapq.heappop(heap)
+        selected.add(j)
+        push(start, j)
+        push(j, end)
+    return sorted(selected)
+
+
+def take(values: Optional[Sequence], indices: List[int]) -> list:
+    if not values:
+        return []
+    return [values[i] for i in indices if i < len(values)]
+
+
+def simplify_series(series: Dict[str, list], max_points: int) -> Dict[str, list]:
+    """LTTB over the chart channels of a :func:`packages.series.build_series` payload."""
+    time_values = series.get("time") or []
+    if len(time_values) <= max_points:
+        return series
+    indices = lttb_indices(time_values, [series.get(k) or [] for k in SERIES_CHANNELS], max_points)
+    return {key: take(values, indices) for key, values in series.items()}
+
+
+def simplify_route(latlng: Sequence[Sequence[float]], max_points: int) -> list:
+    points = [p for p in latlng if isinstance(p, (list, tuple)) and len(p) == 2]
+    return take(points, douglas_peucker_indices(points, max_points))
@@ -0,0 +1,333 @@
+"""Compact binary encoding for activity streams (``streams_raw.data_blob``).
+
+Layout: a fixed little-endian header followed by a zlib-compressed body.
+
+* ``KIND_DELTA``: numeric streams whose values are exact at some decimal scale
+  (time, heartrate, cadence, distance, altitude, latlng...). Values are stored as
+  scaled integers: per dimension an int64 base followed by ``count - 1`` deltas in the
+  narrowest signed width (int8/int16/int32/int64) that fits.
+* ``KIND_FLOAT``: numeric streams with no exact decimal scale, as float64 columns.
+* ``KIND_JSON``: anything else (booleans, nulls, ragged arrays), as compact JSON.
+
+Decoding slices the decompressed body with ``array``/``memoryview`` (or NumPy
+``frombuffer`` when installed) instead of parsing text. :func:`load_f32` converts a
+stored row to the packed float32 arrays served by ``format=f32`` API responses.
+"""
+from __future__ import annotations
+
+from array import array
+from itertools import accumulate
+import json
+import struct
+import sys
+import zlib
+from typing import Any, List, Optional, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - optional dependency
+    np = None
+
+import packages.config as config
+
+MAGIC = b"FST1"
+KIND_JSON = 0
+KIND_DELTA = 1
+KIND_FLOAT = 2
+FLAG_INT = 1  # decoded values are ints rather than floats
+
+# magic, kind, width, dims, flags, count, scale
+_HEADER = struct.Struct("<4sBBBBId")
+_BASE = struct.Struct("<q")
+_MAX_SCALE_DIGITS = 7
+_MAX_EXACT = 2 ** 53
+_ARRAY_CODES = {1: "b", 2: "h", 4: "i", 8: "q"}
+_COMPRESS_LEVEL = 6
+
+
+def enabled() -> bool:
+    return config.STREAM_ENCODING == "binary"
+
+
+def is_encoded(blob: Any) -> bool:
+    return blob is not None and bytes(blob[:4]) == MAGIC
+
+
+def _is_number(value: Any) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _columns(data: list) -> Optional[List[list]]:
+    if all(_is_number(v) for v in data):
+        return [data]
+    if all(isinstance(v, (list, tuple)) and len(v) == 2 for v in data):
+        first = [v[0] for v in data]
+        second = [v[1] for v in data]
+        if all(_is_number(v) for v in first) and all(_is_number(v) for v in second):
+            return [first, second]
+    return None
+
+
+def _finite(values: list) -> bool:
+    return all(v == v and v not in (float("inf"), float("-inf")) for v in values)
+
+
+def _find_scale(columns: List[list]) -> Optional[int]:
+    for digits in range(_MAX_SCALE_DIGITS):
+        scale = 10 ** digits
+        ok = True
+        for col in columns:
+            for v in col:
+                scaled = round(v * scale)
+                if abs(scaled) >= _MAX_EXACT or scaled / scale != v:
+                    ok = False
+                    break
+            if not ok:
+                break
+        if ok:
+            return scale
+    return None
+
+
+def _width_for(deltas: List[int]) -> int:
+    lo = min(deltas, default=0)
+    hi = max(deltas, default=0)
+    for width in (1, 2, 4):
+        bound = 1 << (8 * width - 1)
+        if -bound <= lo and hi < bound:
+            return width
+    return 8
+
+
+def _pack(values: array) -> bytes:
+    if sys.byteorder != "little":  # pragma: no cover - big-endian hosts
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
+
+def _encode_json(data: Any) -> bytes:
+    body = json.dumps(data, separators=(",", ":")).encode("utf-8")
+    return _HEADER.pack(MAGIC, KIND_JSON, 0, 0, 0, 0, 0.0) + zlib.compress(body, _COMPRESS_LEVEL)
+
+
+def encode(data: Any) -> bytes:
+    """Encode a stream ``data`` array."""
+    if not isinstance(data, list) or not data:
+        return _encode_json(data)
+    columns = _columns(data)
+    if columns is None or not all(_finite(col) for col in columns):
+        return _encode_json(data)
+    count = len(data)
+    dims = len(columns)
+    flags = FLAG_INT if all(isinstance(v, int) for col in columns for v in col) else 0
+    scale = 1 if flags else _find_scale(columns)
+    if scale is None:
+        body = b"".join(_pack(array("d", [float(v) for v in col])) for col in columns)
+        header = _HEADER.pack(MAGIC, KIND_FLOAT, 8, dims, flags, count, 1.0)
+        return header + zlib.compress(body, _COMPRESS_LEVEL)
+
+    scaled_cols = [[int(round(v * scale)) for v in col] for col in columns]
+    deltas_cols = [[b - a for a, b in zip(col, col[1:])] for col in scaled_cols]
+    width = max(_width_for(deltas) for deltas in deltas_cols)
+    parts = []
+    for col, deltas in zip(scaled_cols, deltas_cols):
+        parts.append(_BASE.pack(col[0]))
+        parts.append(_pack(array(_ARRAY_CODES[width], deltas)))
+    header = _HEADER.pack(MAGIC, KIND_DELTA, width, dims, flags, count, float(scale))
+    return header + zlib.compress(b"".join(parts), _COMPRESS_LEVEL)
+
+
+def _read_header(blob) -> Tuple[int, int, int, int, int, float, bytes]:
+    view = memoryview(blob)
+    magic, kind, width, dims, flags, count, scale = _HEADER.unpack_from(view, 0)
+    if magic != MAGIC:
+        raise ValueError("not an encoded stream")
+    body = zlib.decompress(view[_HEADER.size:])
+    return kind, width, dims, flags, count, scale, body
+
+
+def _delta_column_python(body: bytes, offset: int, width: int, count: int) -> Tuple[List[int], int]:
+    base = _BASE.unpack_from(body, offset)[0]
+    offset += _BASE.size
+    size = width * (count - 1)
+    deltas = array(_ARRAY_CODES[width])
+    deltas.frombytes(memoryview(body)[offset:offset + size])
+    if sys.byteorder != "little":  # pragma: no cover - big-endian hosts
+        deltas.byteswap()
+    return list(accumulate(deltas, initial=base)), offset + size
+
+
+def _delta_column_numpy(body: bytes, offset: int, width: int, count: int):
+    base = _BASE.unpack_from(body, offset)[0]
+    offset += _BASE.size
+    deltas = np.frombuffer(body, dtype=f"<i{width}", count=count - 1, offset=offset)
+    out = np.empty(count, dtype=np.int64)
+    out[0] = base
+    np.cumsum(deltas, dtype=np.int64, out=out[1:])
+    out[1:] += base
+    return out, offset + width * (count - 1)
+
+
+def _numpy_columns(kind: int, width: int, dims: int, flags: int, count: int, scale: float, body: bytes) -> list:
+    columns = []
+    if kind == KIND_FLOAT:
+        for d in range(dims):
+            columns.append(np.frombuffer(body, dtype="<f8", count=count, offset=d * 8 * count))
+        return columns
+    offset = 0
+    for _ in range(dims):
+        col, offset = _delta_column_numpy(body, offset, width, count)
+        columns.append(col if flags & FLAG_INT else col / scale)
+    return columns
+
+
+def decode_columns(blob) -> Optional[list]:
+    """Decode to a list of per-dimension NumPy arrays (None for JSON payloads or without NumPy)."""
+    if np is None:
+        return None
+    kind, width, dims, flags, count, scale, body = _read_header(blob)
+    if kind == KIND_JSON:
+        return None
+    return _numpy_columns(kind, width, dims, flags, count, scale, body)
+
+
+def decode(blob) -> Any:
+    """Decode a blob produced by :func:`encode` back to the original ``data`` list."""
+    kind, width, dims, flags, count, scale, body = _read_header(blob)
+    if kind == KIND_JSON:
+        return json.loads(body)
+    if np is not None:
+        columns = _numpy_columns(kind, width, dims, flags, count, scale, body)
+        if dims == 1:
+            return columns[0].tolist()
+        return np.column_stack(columns).tolist()
+    if kind == KIND_FLOAT:
+        lists = []
+        for d in range(dims):
+            values = array("d")
+            values.frombytes(memoryview(body)[d * 8 * count:(d + 1) * 8 * count])
+            if sys.byteorder != "little":  # pragma: no cover - big-endian hosts
+                values.byteswap()
+            lists.append(values.tolist())
+    else:
+        lists = []
+        offset = 0
+        for _ in range(dims):
+            col, offset = _delta_column_python(body, offset, width, count)
+            lists.append(col if flags & FLAG_INT else [v / scale for v in col])
+    if dims == 1:
+        return lists[0]
+    return [list(pair) for pair in zip(*lists)]
+
+
+def f32_bytes(data: Any) -> Tuple[bytes, int, int]:
+    """Pack a data list as little-endian float32 -> (bytes, count, dims).
+
+    ``[a, b]`` pairs (latlng) are interleaved row-major, non-numbers become NaN.
+    """
+    if not isinstance(data, list):
+        data = []
+    dims = 2 if data and all(isinstance(v, (list, tuple)) and len(v) == 2 for v in data) else 1
+    flat = [x for pair in data for x in pair] if dims == 2 else data
+    values = array("f", [float(v) if _is_number(v) else float("nan") for v in flat])
+    return _pack(values), len(data), dims
+
+
+def load_f32(raw_json: Optional[str], data_blob: Any = None, downsample: int = 1) -> Optional[Tuple[bytes, int, int]]:
+    """float32 (bytes, count, dims) for a stored stream, None if unreadable.
+
+    With NumPy, encoded rows go straight from the stored columns to float32 without
+    materialising Python lists.
+    """
+    downsample = max(1, int(downsample))
+    if data_blob is None or not is_encoded(data_blob):
+        payload = load_payload(raw_json, data_blob)
+        if not isinstance(payload, dict):
+            return None
+        data = payload.get("data")
+        return f32_bytes(data[::downsample] if isinstance(data, list) else [])
+    try:
+        kind, width, dims, flags, count, scale, body = _read_header(data_blob)
+    except (ValueError, zlib.error, struct.error):
+        return None
+    if kind == KIND_JSON:
+        data = json.loads(body)
+        return f32_bytes(data[::downsample] if isinstance(data, list) else [])
+    if np is None:
+        return f32_bytes(decode(data_blob)[::downsample])
+    columns = _numpy_columns(kind, width, dims, flags, count, scale, body)
+    values = columns[0] if dims == 1 else np.column_stack(columns)
+    values = values[::downsample]
+    return values.astype("<f4").tobytes(), len(values), dims
+
+
+def pack_payload(payload: Any, binary: Optional[bool] = None) -> Tuple[str, Optional[bytes]]:
+    """Split a Strava stream payload into (raw_json, data_blob) for storage.
+
+    With binary encoding enabled, ``raw_json`` keeps only the metadata
+    (series_type, resolution...) and the ``data`` array goes to the blob.
+    """
+    if binary is None:
+        binary = enabled()
+    if not binary or not isinstance(payload, dict) or not isinstance(payload.get("data"), list):
+        return json.dumps(payload), None
+    meta = {k: v for k, v in payload.items() if k != "data"}
+    return json.dumps(meta), encode(payload["data"])
+
+
+def load_payload(raw_json: Optional[str], data_blob: Any = None) -> Optional[dict]:
+    """Inverse of :func:`pack_payload`; accepts legacy JSON-only rows. Returns None if unreadable."""
+    try:
+        payload = json.loads(raw_json) if raw_json else {}
+    except json.JSONDecodeError:
+        return None
+    if data_blob is None:
+        return payload if raw_json else None
+    if not isinstance(payload, dict):
+        payload = {}
+    try:
+        payload["data"] = decode(data_blob)
+    except (ValueError, zlib.error, struct.error):
+        return None
+    return payload
+
+
+def load_data(raw_json: Optional[str], data_blob: Any = None) -> list:
+    payload = load_payload(raw_json, data_blob)
+    if not isinstance(payload, dict):
+        return []
+    data = payload.get("data")
+    return data if isinstance(data, list) else []
+
+
+def convert_rows(conn, binary: bool = True, batch_size: int = 200) -> int:
+    """Re-encode existing ``streams_raw`` rows in place; returns the number of rows changed."""
+    if binary:
+        where = "data_blob IS NULL"
+    else:
+        where = "data_blob IS NOT NULL"
+    converted = 0
+    last_id = 0
+    while True:
+        rows = conn.execute(
+            f"SELECT id, raw_json, data_blob FROM streams_raw WHERE {where} AND id > ? ORDER BY id LIMIT ?",
+            (last_id, batch_size),
+        ).fetchall()
+        if not rows:
+            break
+        updates = []
+        for row_id, raw_json, data_blob in rows:
+            last_id = row_id
+            payload = load_payload(raw_json, data_blob)
+            if payload is None:
+                continue
+            new_json, new_blob = pack_payload(payload, binary=binary)
+            if new_blob is None and binary:
+                continue
+            updates.append((new_json, new_blob, row_id))
+        if updates:
+            conn.executemany("UPDATE streams_raw SET raw_json = ?, data_blob = ? WHERE id = ?", updates)
+            converted += len(updates)
+        conn.commit()
+    return converted
@@ -0,0 +1,145 @@
+"""Client-side rate limiting for the ingestion jobs' outbound API calls.
+
+* :class:`TokenBucket` spreads requests at a steady rate with a small burst.
+* :class:`WindowQuota` mirrors a provider's fixed-window quotas (Strava: 15 minutes
+  and one day, reset on UTC boundaries). Each request is counted before it is
+  sent, so concurrent workers never overshoot; the provider's own usage headers
+  are folded in via :meth:`WindowQuota.update`. A full short window is waited
+  out, a full long one raises :class:`QuotaExhausted` so the job can stop cleanly
+  and resume on its next run.
+* :func:`backoff_delay` is the full-jitter exponential delay for retries.
+
+All of them are thread-safe; ``clock``/``sleep`` are injectable for tests.
+"""
+from __future__ import annotations
+
+import random
+import threading
+import time
+from typing import Callable, List, Optional, Sequence
+
+from packages.metrics import inc, observe
+
+
+class QuotaExhausted(RuntimeError):
+    """The remaining quota only resets after longer than the caller is willing to wait."""
+
+    def __init__(self, message: str, reset_in: float):
+        super().__init__(message)
+        self.reset_in = reset_in
+
+
+def backoff_delay(attempt: int, base: float, cap: float, retry_after: Optional[float] = None) -> float:
+    """Full-jitter exponential backoff for retry ``attempt`` (0-based), never below ``retry_after``."""
+    delay = random.uniform(0, min(cap, base * (2 ** attempt)))
+    if retry_after is not None:
+        delay = max(delay, retry_after)
+    return delay
+
+
+class TokenBucket:
+    """``rate`` requests per second on average, up to ``burst`` back to back."""
+
+    def __init__(
+        self,
+        rate: float,
+        burst: int = 1,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], None] = time.sleep,
+    ):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self._clock = clock
+        self._sleep = sleep
+        self._tokens = float(self.burst)
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        while True:
+            with self._lock:
+                now = self._clock()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            self._sleep(wait)
+
+
+class WindowQuota:
+    """Fixed-window request quotas, e.g. ``periods=(900, 86400)`` for Strava.
+
+    ``limits`` are the initial per-window limits (``None`` = unknown until the
+    first :meth:`update`); ``reserve`` requests per window are left unused for
+    other clients of the same account. Waiting for a window to reset is allowed
+    up to ``max_wait`` seconds; longer raises :class:`QuotaExhausted`.
+    """
+
+    def __init__(
+        self,
+        periods: Sequence[int],
+        limits: Optional[Sequence[Optional[int]]] = None,
+        reserve: int = 0,
+        max_wait: float = 900.0,
+        name: str = "api",
+        clock: Callable[[], float] = time.time,
+        sleep: Callable[[float], None] = time.sleep,
+    ):
+        self.periods = list(periods)
+        self.limits: List[Optional[int]] = list(limits) if limits else [None] * len(self.periods)
+        self.used = [0] * len(self.periods)
+        self.reserve = reserve
+        self.max_wait = max_wait
+        self.name = name
+        self._clock = clock
+        self._sleep = sleep
+        now = clock()
+        self._windows = [int(now // period) for period in self.periods]
+        self._lock = threading.Lock()
+
+    def _roll(self, now: float) -> None:
+        for i, period in enumerate(self.periods):
+            window = int(now // period)
+            if window != self._windows[i]:
+                self._windows[i] = window
+                self.used[i] = 0
+
+    def acquire(self) -> None:
+        """Count one request, waiting for the next window when the current one is spent."""
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = self._clock()
+                self._roll(now)
+                wait = 0.0
+                for i, period in enumerate(self.periods):
+                    limit = self.limits[i]
+                    if limit is not None and self.used[i] >= max(limit - self.reserve, 1):
+                        wait = max(wait, (self._windows[i] + 1) * period - now)
+                if wait <= 0:
+                    for i in range(len(self.used)):
+                        self.used[i] += 1
+                    if waited:
+                        observe(f'rate_limit_wait_seconds{{api="{self.name}"}}', waited)
+                    return
+                if wait > self.max_wait:
+                    inc(f'rate_limit_exhausted_total{{api="{self.name}"}}')
+                    raise QuotaExhausted(f"{self.name} quota exhausted; resets in {wait:.0f}s", wait)
+            inc(f'rate_limit_waits_total{{api="{self.name}"}}')
+            # A small pad so the provider's window has really rolled over.
+            self._sleep(wait + 1.0)
+            waited += wait + 1.0
+
+    def update(self, limits: Sequence[Optional[int]], used: Sequence[Optional[int]]) -> None:
+        """Fold in the provider's reported limits and usage (per window, same order as ``periods``)."""
+        with self._lock:
+            self._roll(self._clock())
+            for i in range(min(len(self.periods), len(limits))):
+                if limits[i] is not None:
+                    self.limits[i] = limits[i]
+            for i in range(min(len(self.periods), len(used))):
+                # Our own count also covers requests still in flight, so never lower it.
+                if used[i] is not None:
+                    self.used[i] = max(self.used[i], used[i])
@@ -0,0 +1,238 @@
+"""Per-user daily run rollup (``training_daily``) and date-window summaries over it.
+
+The pipeline rebuilds a user's rows whenever their activities change
+(:func:`refresh_training_daily`): one row per day with runs, distance, moving
+time, HR sums/counts, the day's best 5k/10k segment and its first/last start,
+plus running ``cum_*`` sums. The assistant loads the days it needs once per
+question (:func:`load_training_days`) and answers every window from them:
+totals are the difference of two prefix sums, the remaining fields a scan over
+the window's days. Windows are whole UTC days.
+"""
+from __future__ import annotations
+
+import bisect
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Optional
+
+DAY_COLUMNS = (
+    "day, runs, distance_m, moving_s, hr_norm_sum, hr_norm_n, hr_raw_sum, hr_raw_n, "
+    "best_5k_s, best_10k_s, first_start, last_start"
+)
+CUM_COLUMNS = (
+    "cum_runs, cum_distance_m, cum_moving_s, cum_hr_norm_sum, cum_hr_norm_n, cum_hr_raw_sum, cum_hr_raw_n"
+)
+# Positions of runs..hr_raw_n in a DAY_COLUMNS row, in CUM_COLUMNS order.
+_SUMMED = range(1, 8)
+
+
+def _parse_dt(value) -> Optional[datetime]:
+    if not value:
+        return None
+    if isinstance(value, datetime):
+        dt = value
+    else:
+        try:
+            dt = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+        except ValueError:
+            return None
+    # Naive timestamps are stored as UTC.
+    return dt if dt.tzinfo is not None else dt.replace(tzinfo=timezone.utc)
+
+
+def _day_of(dt: datetime) -> str:
+    if dt.tzinfo is not None:
+        dt = dt.astimezone(timezone.utc)
+    return dt.date().isoformat()
+
+
+def _min(a, b):
+    if a is None:
+        return b
+    if b is None:
+        return a
+    return min(a, b)
+
+
+def build_user_days(rows: Iterable) -> List[tuple]:
+    """DAY_COLUMNS + CUM_COLUMNS rows for one user's runs.
+
+    ``rows`` are ``(start_time, distance_m, moving_s, avg_hr_norm, avg_hr_raw,
+    best_5k_s, best_10k_s)`` per run, in any order.
+    """
+    days: Dict[str, list] = {}
+    for start_time, distance_m, moving_s, hr_norm, hr_raw, best_5k, best_10k in rows:
+        dt = _parse_dt(start_time)
+        if dt is None:
+            continue
+        key = _day_of(dt)
+        day = days.get(key)
+        if day is None:
+            day = days[key] = [key, 0, 0.0, 0.0, 0.0, 0, 0.0, 0, None, None, dt, dt]
+        day[1] += 1
+        day[2] += distance_m or 0.0
+        day[3] += moving_s or 0.0
+        if hr_norm is not None:
+            day[4] += hr_norm
+            day[5] += 1
+        if hr_raw is not None:
+            day[6] += hr_raw
+            day[7] += 1
+        day[8] = _min(day[8], best_5k)
+        day[9] = _min(day[9], best_10k)
+        day[10] = min(day[10], dt)
+        day[11] = max(day[11], dt)
+
+    out: List[tuple] = []
+    cum = [0, 0.0, 0.0, 0.0, 0, 0.0, 0]
+    for key in sorted(days):
+        day = days[key]
+        for i, col in enumerate(_SUMMED):
+            cum[i] += day[col]
+        day[10] = day[10].isoformat()
+        day[11] = day[11].isoformat()
+        out.append((*day, *cum))
+    return out
+
+
+def refresh_training_daily(conn, user_ids: Optional[Iterable] = None) -> int:
+    """Rebuild ``training_daily`` for ``user_ids`` (``None``: every user); returns rows written."""
+    if user_ids is None:
+        conn.execute("DELETE FROM training_daily")
+        user_ids = [
+            row[0]
+            for row in conn.execute(
+                "SELECT DISTINCT user_id FROM activities WHERE user_id IS NOT NULL ORDER BY user_id"
+            ).fetchall()
+        ]
+    else:
+        user_ids = sorted(set(user_ids) - {None})
+        for user_id in user_ids:
+            conn.execute("DELETE FROM training_daily WHERE user_id = ?", (user_id,))
+
+    written = 0
+    for user_id in user_ids:
+        runs = conn.execute(
+            """
+            SELECT a.start_time, c.distance_m, c.moving_s, c.avg_hr_norm, c.avg_hr_raw, b.best_5k, b.best_10k
+            FROM activities a
+            JOIN activities_calc c ON c.activity_id = a.activity_id
+            LEFT JOIN (
+              SELECT activity_id,
+                     MIN(CASE WHEN distance_m = 5000 THEN time_s END) AS best_5k,
+                     MIN(CASE WHEN distance_m = 10000 THEN time_s END) AS best_10k
+              FROM segments_best
+              WHERE scope = 'activity' AND distance_m IN (5000, 10000)
+              GROUP BY activity_id
+            ) b ON b.activity_id = a.activity_id
+            WHERE a.user_id = ? AND lower(a.activity_type) = 'run'
+            """,
+            (user_id,),
+        ).fetchall()
+        rows = build_user_days(runs)
+        if rows:
+            conn.executemany(
+                f"INSERT INTO training_daily(user_id, {DAY_COLUMNS}, {CUM_COLUMNS}) "
+                f"VALUES ({', '.join('?' * (1 + len(rows[0])))})",
+                [(user_id, *row) for row in rows],
+            )
+        written += len(rows)
+    return written
+
+
+def users_missing_training_daily(conn) -> List[int]:
+    """Users with runs but no rollup rows yet (e.g. right after the migration)."""
+    return [
+        row[0]
+        for row in conn.execute(
+            """
+            SELECT DISTINCT a.user_id
+            FROM activities a
+            WHERE a.user_id IS NOT NULL
+              AND lower(a.activity_type) = 'run'
+              AND NOT EXISTS (SELECT 1 FROM training_daily t WHERE t.user_id = a.user_id)
+            """
+        ).fetchall()
+    ]
+
+
+class TrainingDays:
+    """A user's ``training_daily`` rows from some day on, with the prefix sums just before it."""
+
+    def __init__(self, rows: List[tuple], base: List[float]):
+        self.rows = rows
+        self.days = [str(row[0])[:10] for row in rows]
+        # cum[i] = sums over every day before rows[i]; cum[-1] covers all loaded rows.
+        self.cum = [list(base)]
+        for row in rows:
+            self.cum.append([c + (row[col] or 0) for c, col in zip(self.cum[-1], _SUMMED)])
+
+    def _span(self, start_dt: datetime, end_dt: datetime):
+        lo = bisect.bisect_left(self.days, _day_of(start_dt))
+        hi = bisect.bisect_right(self.days, _day_of(end_dt))
+        return lo, hi
+
+    def totals(self, start_dt: datetime, end_dt: datetime) -> List[float]:
+        """(runs, distance_m, moving_s, hr_norm_sum, hr_norm_n, hr_raw_sum, hr_raw_n) in O(log days)."""
+        lo, hi = self._span(start_dt, end_dt)
+        return [b - a for a, b in zip(self.cum[lo], self.cum[hi])]
+
+    def summary(self, start_dt: datetime, end_dt: datetime) -> Dict[str, object]:
+        """Run totals, bests, consistency and per-year distance for ``[start_dt, end_dt]``."""
+        runs, distance_m, moving_s, hr_norm_sum, hr_norm_n, hr_raw_sum, hr_raw_n = self.totals(start_dt, end_dt)
+        avg_hr = (hr_norm_sum / hr_norm_n if hr_norm_n else None) or (hr_raw_sum / hr_raw_n if hr_raw_n else None)
+        avg_pace_sec = moving_s / (distance_m / 1000.0) if distance_m and moving_s else None
+
+        lo, hi = self._span(start_dt, end_dt)
+        best_5k = best_10k = None
+        weeks = set()
+        yearly: Dict[str, float] = {}
+        longest_gap_days = None
+        prev_last = None
+        for row in self.rows[lo:hi]:
+            if not row[1]:
+                continue
+            best_5k = _min(best_5k, row[8])
+            best_10k = _min(best_10k, row[9])
+            day = date.fromisoformat(str(row[0])[:10])
+            weeks.add(day - timedelta(days=day.weekday()))
+            year = str(day.year)
+            yearly[year] = yearly.get(year, 0.0) + (row[2] or 0.0) / 1000.0
+            first, last = _parse_dt(row[10]), _parse_dt(row[11])
+            if row[1] > 1:  # runs on the same day are 0 days apart
+                longest_gap_days = max(longest_gap_days or 0, 0)
+            if prev_last is not None and first is not None:
+                gap = (first - prev_last).days
+                longest_gap_days = gap if longest_gap_days is None else max(longest_gap_days, gap)
+            prev_last = last or prev_last
+
+        return {
+            "runs": int(runs),
+            "distance_km": round(distance_m / 1000.0, 1) if distance_m else 0.0,
+            "moving_hours": round(moving_s / 3600.0, 2) if moving_s else 0.0,
+            "avg_pace_sec": round(avg_pace_sec, 2) if avg_pace_sec else None,
+            "avg_hr": round(avg_hr, 1) if avg_hr else None,
+            "best_5k_time_s": best_5k,
+            "best_10k_time_s": best_10k,
+            "weeks_with_runs": len(weeks),
+            "longest_gap_days": longest_gap_days,
+            "yearly_distance_km": yearly,
+        }
+
+
+def load_training_days(conn, user_id: int, since: datetime) -> TrainingDays:
+    """One query: the user's rollup rows from ``since``'s day on, plus the prefix before it."""
+    rows = conn.execute(
+        f"""
+        SELECT {DAY_COLUMNS}, {CUM_COLUMNS}
+        FROM training_daily
+        WHERE user_id = ? AND day >= ?
+        ORDER BY day
+        """,
+        (user_id, _day_of(since)),
+    ).fetchall()
+    if not rows:
+        return TrainingDays([], [0] * len(_SUMMED))
+    first = rows[0]
+    # The first row's cum_* includes that day; subtract it to get the sums before the window.
+    base = [first[12 + i] - (first[col] or 0) for i, col in enumerate(_SUMMED)]
+    return TrainingDays([row[:12] for row in rows], base)
@@ -0,0 +1,160 @@
+"""Page-fetch latency for /activities: OFFSET vs keyset cursor, before/after the covering index.
+
+Builds a synthetic multi-year, multi-user SQLite DB and times the route handler
+in-process at increasing page depths:
+
+    python3 scripts/bench_activities.py --users 6 --per-user 15000
+"""
+import argparse
+import asyncio
+import importlib
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from tests.fixtures.build_fixture_db import apply_schema_and_migrations
+
+PAGE = 20
+DEPTHS = (0, 1000, 10000)
+OLD_INDEX = (
+    "CREATE INDEX IF NOT EXISTS idx_activities_user_type_time "
+    "ON activities(user_id, lower(activity_type), start_time)"
+)
+COVER_INDEX = "idx_activities_user_type_time_cover"
+MIGRATION = "027_activities_list_covering_index.sql"
+
+
+def build_db(db_path: Path, users: int, per_user: int) -> None:
+    rng = random.Random(42)
+    start = datetime(2016, 1, 1, tzinfo=timezone.utc)
+    with sqlite3.connect(db_path) as conn:
+        apply_schema_and_migrations(conn, ROOT)
+        conn.execute("INSERT INTO sources(id, name) VALUES(1, 'strava')")
+        for user_id in range(1, users + 1):
+            conn.execute(
+                "INSERT INTO users(id, username, password_hash) VALUES(?, ?, 'x')", (user_id, f"u{user_id}")
+            )
+            activities = []
+            details = []
+            for i in range(per_user):
+                when = start + timedelta(minutes=rng.randrange(0, 10 * 365 * 24 * 60))
+                activity_id = f"{user_id}-{i}"
+                activity_type = "Run" if rng.random() < 0.8 else "Ride"
+                activities.append(
+                    (1, activity_id, activity_type, when.isoformat(), f"Activity {i}",
+                     rng.uniform(3000, 25000), rng.uniform(900, 7200), rng.uniform(0, 400), user_id)
+                )
+                if activity_type == "Run":
+                    details.append((activity_id, rng.uniform(130, 170), rng.uniform(240, 420)))
+            conn.executemany(
+                "INSERT INTO activities(source_id, activity_id, activity_type, start_time, name, "
+                "distance_m, moving_s, elev_gain, user_id) VALUES(?,?,?,?,?,?,?,?,?)",
+                activities,
+            )
+            conn.executemany(
+                "INSERT INTO activity_details_run(activity_id, avg_hr_norm, flat_pace_sec) VALUES(?,?,?)",
+                details,
+            )
+        conn.execute("ANALYZE")
+
+
+# One loop for the whole run so the async DB pool stays warm, as in the API process.
+_loop = asyncio.new_event_loop()
+
+
+def run(coro):
+    return _loop.run_until_complete(coro)
+
+
+def timed(fn, n: int):
+    fn()  # warm-up
+    samples = []
+    for _ in range(n):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples)
+
+
+def cursor_at(routes, user, depth: int):
+    """Walk to ``depth`` with cursors once so the timed call fetches exactly one page."""
+    cursor = None
+    fetched = 0
+    while fetched < depth:
+        step = min(routes.MAX_ACTIVITIES_LIMIT, depth - fetched)
+        page = run(routes.activities(
+            activity_type="run", limit=step, offset=0, start=None, end=None, cursor=cursor, user=user
+        ))
+        cursor = page["next_cursor"]
+        fetched += step
+    return cursor
+
+
+def main():
+    p = argparse.ArgumentParser(description="Benchmark /activities OFFSET vs keyset pagination.")
+    p.add_argument("--users", type=int, default=6)
+    p.add_argument("--per-user", type=int, default=15000)
+    p.add_argument("--repeat", type=int, default=30)
+    args = p.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        db_path = Path(tmpdir) / "bench.db"
+        os.environ["FITNESS_DB_PATH"] = str(db_path)
+        os.environ["FITNESS_DB_URL"] = ""
+        os.environ["FITNESS_LOG_LEVEL"] = "WARNING"
+        import packages.config as config
+
+        importlib.reload(config)
+        build_db(db_path, args.users, args.per_user)
+        import apps.api.routes.activities as routes
+
+        importlib.reload(routes)
+        user = {"id": 1, "username": "u1"}
+
+        def offset_page(depth):
+            return lambda: run(routes.activities(
+                activity_type="run", limit=PAGE, offset=depth, start=None, end=None, cursor=None, user=user
+            ))
+
+        def cursor_page(cursor):
+            return lambda: run(routes.activities(
+                activity_type="run", limit=PAGE, offset=0, start=None, end=None, cursor=cursor, user=user
+            ))
+
+        print(f"{args.users} users x {args.per_user} activities, page={PAGE}, median of {args.repeat}")
+        print(f"{'variant':<34}" + "".join(f"{'@' + str(d):>10}" for d in DEPTHS))
+
+        with sqlite3.connect(db_path) as conn:
+            conn.execute(f"DROP INDEX {COVER_INDEX}")
+            conn.execute(OLD_INDEX)
+            conn.execute("ANALYZE")
+        row = [timed(offset_page(d), args.repeat) for d in DEPTHS]
+        print(f"{'before: OFFSET, old index':<34}" + "".join(f"{v:>8.2f}ms" for v in row))
+
+        with sqlite3.connect(db_path) as conn:
+            conn.executescript((ROOT / "database" / "migrations" / MIGRATION).read_text())
+            conn.execute("ANALYZE")
+        row = [timed(offset_page(d), args.repeat) for d in DEPTHS]
+        print(f"{'OFFSET, covering index':<34}" + "".join(f"{v:>8.2f}ms" for v in row))
+        cursors = [cursor_at(routes, user, d) for d in DEPTHS]
+        row = [timed(cursor_page(c), args.repeat) for c in cursors]
+        print(f"{'cursor, covering index':<34}" + "".join(f"{v:>8.2f}ms" for v in row))
+
+        from packages import db_async
+
+        run(db_async.close_pools())
+        _loop.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""Latency and bytes-on-the-wire for /activity/{id}/streams on a synthetic 3-hour run.
+
+Compares the regular FastAPI path (Pydantic validation + stdlib JSON, uncompressed)
+against the fast path (orjson, gzip, optional float rounding) and the packed float32
+format, in-process via TestClient:
+
+    python3 scripts/bench_streams.py --requests 200
+"""
+import argparse
+import importlib
+import logging
+import math
+import os
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from tests.fixtures.build_fixture_db import apply_schema_and_migrations
+
+ACTIVITY_ID = "BENCH3H"
+
+# label, FITNESS_FAST_JSON, Accept-Encoding, query string
+VARIANTS = [
+    ("before: pydantic + json", "0", "identity", ""),
+    ("orjson, no validation", "1", "identity", ""),
+    ("orjson + gzip", "1", "gzip", ""),
+    ("orjson + gzip + precision=1", "1", "gzip", "precision=1"),
+    ("format=f32", "1", "identity", "format=f32"),
+    ("format=f32 + gzip", "1", "gzip", "format=f32"),
+]
+
+
+def build_db(db_path: Path, seconds: int) -> None:
+    from packages import stream_codec
+
+    time_s = list(range(seconds))
+    dist, alt, hr, cad = [], [], [], []
+    d = 0.0
+    for t in time_s:
+        d += 2.9 + 0.35 * math.sin(t / 97.0)
+        dist.append(round(d, 1) + 0.03 * math.sin(t))
+        alt.append(40.0 + 12.0 * math.sin(t / 600.0) + 0.2 * math.cos(t / 7.0))
+        hr.append(138 + int(20 * (t / seconds)) + int(3 * math.sin(t / 45.0)))
+        cad.append(84 + int(2 * math.sin(t / 30.0)))
+    with sqlite3.connect(db_path) as conn:
+        apply_schema_and_migrations(conn, ROOT)
+        conn.execute("INSERT INTO sources(id, name) VALUES(1, 'strava')")
+        conn.execute("INSERT INTO users(id, username, password_hash) VALUES(1, 'bench', 'x')")
+        for stream_type, data in (
+            ("time", time_s),
+            ("distance", dist),
+            ("altitude", alt),
+            ("heartrate", hr),
+            ("cadence", cad),
+        ):
+            raw_json, data_blob = stream_codec.pack_payload({"data": data})
+            conn.execute(
+                "INSERT INTO streams_raw(source_id, activity_id, stream_type, raw_json, data_blob, user_id) "
+                "VALUES(?,?,?,?,?,?)",
+                (1, ACTIVITY_ID, stream_type, raw_json, data_blob, 1),
+            )
+
+
+def run_variant(fast_json: str, encoding: str, query: str, n: int):
+    os.environ["FITNESS_FAST_JSON"] = fast_json
+    import packages.config as config
+
+    importlib.reload(config)
+    import apps.api.responses as responses
+
+    importlib.reload(responses)
+    import apps.api.routes.activities as activities
+
+    importlib.reload(activities)
+    import apps.api.main as api_main
+
+    importlib.reload(api_main)
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    from fastapi.testclient import TestClient
+
+    url = f"/api/v1/activity/{ACTIVITY_ID}/streams"
+    if query:
+        url += f"?{query}"
+    headers = {"Accept-Encoding": encoding}
+    latencies = []
+    wire_bytes = 0
+    with TestClient(api_main.app) as client:
+        client.get(url, headers=headers)  # warm-up
+        for _ in range(n):
+            start = time.perf_counter()
+            resp = client.get(url, headers=headers)
+            latencies.append((time.perf_counter() - start) * 1000)
+            resp.raise_for_status()
+            wire_bytes = int(resp.headers["content-length"])
+    latencies.sort()
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+    return statistics.median(latencies), p99, wire_bytes
+
+
+def main():
+    p = argparse.ArgumentParser(description="Benchmark /activity/{id}/streams serialization and compression.")
+    p.add_argument("--requests", type=int, default=100)
+    p.add_argument("--seconds", type=int, default=3 * 3600, help="Samples in the synthetic run (1 Hz).")
+    args = p.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        db_path = Path(tmpdir) / "bench.db"
+        os.environ["FITNESS_DB_PATH"] = str(db_path)
+        os.environ["FITNESS_DB_URL"] = ""
+        os.environ["FITNESS_AUTH_DISABLED"] = "1"
+        os.environ["FITNESS_LAST_UPDATE_PATH"] = str(Path(tmpdir) / "last_update.json")
+        os.environ["FITNESS_LOG_LEVEL"] = "WARNING"
+        import packages.config as config
+
+        importlib.reload(config)
+        build_db(db_path, args.seconds)
+
+        print(f"{args.seconds} samples x 5 streams, {args.requests} requests per variant")
+        print(f"{'variant':<32} {'p50 ms':>8} {'p99 ms':>8} {'bytes':>10}")
+        for label, fast_json, encoding, query in VARIANTS:
+            p50, p99, wire_bytes = run_variant(fast_json, encoding, query, args.requests)
+            print(f"{label:<32} {p50:>8.1f} {p99:>8.1f} {wire_bytes:>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,26 @@
+import argparse
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from packages import db, stream_codec
+
+
+def main():
+    p = argparse.ArgumentParser(description="Re-encode streams_raw rows (binary data_blob <-> JSON text).")
+    p.add_argument("--to", choices=("binary", "json"), default="binary")
+    p.add_argument("--batch-size", type=int, default=200)
+    args = p.parse_args()
+    if not db.db_exists():
+        raise SystemExit("DB not initialized. Run scripts/init_db.py")
+    with db.connect() as conn:
+        db.configure_connection(conn)
+        converted = stream_codec.convert_rows(conn, binary=args.to == "binary", batch_size=args.batch_size)
+    print(f"Converted {converted} streams_raw rows to {args.to}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,4 @@
+import importlib.util
 import sys
 from pathlib import Path
 
@@ -41,8 +42,15 @@ def applied_migrations(conn):
 
 
 def apply_migration(conn, path):
-    sql = path.read_text()
-    conn.executescript(sql)
+    if path.suffix == ".py":
+        # Data migrations that SQL alone cannot express expose migrate(conn).
+        spec = importlib.util.spec_from_file_location(f"migration_{path.stem}", path)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        module.migrate(conn)
+    else:
+        sql = path.read_text()
+        conn.executescript(sql)
     if db.is_postgres():
         conn.execute(
             "INSERT INTO schema_migrations(filename) VALUES(?) ON CONFLICT(filename) DO NOTHING",
@@ -66,7 +74,11 @@ def main():
     with db.connect() as conn:
         db.configure_connection(conn)
         already = applied_migrations(conn)
-        pending = sorted(p for p in MIGRATIONS_DIR.glob("*.sql") if p.name not in already)
+        pending = sorted(
+            p
+            for p in [*MIGRATIONS_DIR.glob("*.sql"), *MIGRATIONS_DIR.glob("*.py")]
+            if p.name not in already
+        )
         if not pending:
             print("No pending migrations.")
             return
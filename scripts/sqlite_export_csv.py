@@ -15,6 +15,13 @@ def list_tables(conn: sqlite3.Connection) -> list[str]:
     return sorted(t for t in tables if t not in SKIP_TABLES)
 
 
+def _csv_value(value):
+    # BLOB columns (e.g. streams_raw.data_blob) use the bytea hex format Postgres COPY accepts.
+    if isinstance(value, bytes):
+        return "\\x" + value.hex()
+    return value
+
+
 def export_table(conn: sqlite3.Connection, table: str, out_path: Path) -> int:
     cur = conn.cursor()
     cur.execute(f"SELECT * FROM {table}")
@@ -25,7 +32,7 @@ def export_table(conn: sqlite3.Connection, table: str, out_path: Path) -> int:
     with out_path.open("w", newline="") as f:
         w = csv.writer(f)
         w.writerow(cols)
-        w.writerows(rows)
+        w.writerows([_csv_value(v) for v in row] for row in rows)
     return len(rows)
 
 
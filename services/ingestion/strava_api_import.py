@@ -1,27 +1,45 @@
 import json
 import os
 import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from datetime import datetime, timezone
 from urllib import parse, request
 from pathlib import Path
 import sys
+from typing import Iterable, Iterator
+
+import httpx
 
 ROOT = Path(__file__).resolve().parents[2]
 if str(ROOT) not in sys.path:
     sys.path.insert(0, str(ROOT))
 
-from packages import db
+from packages import db, metrics, stream_codec
 from packages.config import (
     STRAVA_CLIENT_ID,
     STRAVA_CLIENT_SECRET,
     STRAVA_REFRESH_TOKEN,
     STRAVA_ACCESS_TOKEN,
     STRAVA_EXPIRES_AT,
+    STRAVA_API_BASE,
+    STRAVA_FETCH_WORKERS,
+    STRAVA_MAX_RETRIES,
+    STRAVA_RATE_RESERVE,
+    STRAVA_WRITE_BATCH,
 )
+from packages.throttle import QuotaExhausted, TokenBucket, WindowQuota, backoff_delay
 
-STRAVA_API_BASE = "https://www.strava.com/api/v3"
 TOKEN_URL = "https://www.strava.com/oauth/token"
 STREAM_KEYS = "time,distance,heartrate,cadence,altitude,velocity_smooth,latlng"
+# Strava's read quotas reset every 15 minutes and at midnight UTC; these are the
+# defaults until the first response reports the app's actual limits.
+RATE_WINDOWS_SEC = (15 * 60, 24 * 60 * 60)
+DEFAULT_READ_LIMITS = (100, 1000)
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+RETRY_BASE_SEC = 1.0
+RETRY_MAX_SEC = 60.0
+# Activity ids per existence query (well under SQLite's bound-parameter limit).
+EXISTING_CHUNK_SIZE = 500
 
 
 def _utc_now() -> datetime:
@@ -40,15 +58,6 @@ def _parse_iso_to_epoch(value: str | None) -> int | None:
     return int(dt.timestamp())
 
 
-def _http_json(url: str, headers: dict[str, str], params: dict | None = None) -> dict:
-    if params:
-        url = f"{url}?{parse.urlencode(params)}"
-    req = request.Request(url, headers=headers)
-    with request.urlopen(req, timeout=30) as resp:
-        payload = resp.read().decode("utf-8")
-    return json.loads(payload)
-
-
 def _post_form(url: str, data: dict) -> dict:
     body = parse.urlencode(data).encode("utf-8")
     req = request.Request(url, data=body, method="POST")
@@ -57,6 +66,102 @@ def _post_form(url: str, data: dict) -> dict:
     return json.loads(payload)
 
 
+def _header_ints(headers, name: str) -> list[int | None]:
+    values = []
+    for part in (headers.get(name) or "").split(","):
+        try:
+            values.append(int(part.strip()))
+        except ValueError:
+            values.append(None)
+    return values
+
+
+class StravaClient:
+    """Keep-alive Strava API client shared by the fetch threads.
+
+    Every request first takes a slot from the 15-minute/daily :class:`WindowQuota`
+    (fed back from the ``X-RateLimit-*`` response headers) and the optional
+    ``min_interval`` bucket. 429, 5xx and network errors are retried with jittered
+    exponential backoff; other HTTP errors are raised.
+    """
+
+    def __init__(
+        self,
+        access_token: str,
+        base_url: str = STRAVA_API_BASE,
+        workers: int = STRAVA_FETCH_WORKERS,
+        max_retries: int = STRAVA_MAX_RETRIES,
+        min_interval: float = 0.0,
+        quota: WindowQuota | None = None,
+    ):
+        workers = max(1, workers)
+        self.http = httpx.Client(
+            base_url=base_url.rstrip("/"),
+            headers={"Authorization": f"Bearer {access_token}"},
+            timeout=30.0,
+            limits=httpx.Limits(max_connections=workers, max_keepalive_connections=workers),
+        )
+        self.max_retries = max_retries
+        self.quota = quota or WindowQuota(
+            RATE_WINDOWS_SEC, DEFAULT_READ_LIMITS, reserve=STRAVA_RATE_RESERVE, name="strava"
+        )
+        self.bucket = TokenBucket(1.0 / min_interval) if min_interval > 0 else None
+
+    def close(self) -> None:
+        self.http.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def _observe_limits(self, headers) -> None:
+        # Reads count against the read quota when Strava reports one separately.
+        prefix = "X-ReadRateLimit" if headers.get("X-ReadRateLimit-Limit") else "X-RateLimit"
+        limits = _header_ints(headers, f"{prefix}-Limit")
+        usage = _header_ints(headers, f"{prefix}-Usage")
+        if any(v is not None for v in limits + usage):
+            self.quota.update(limits, usage)
+
+    def get_json(self, path: str, params: dict | None = None):
+        attempt = 0
+        while True:
+            self.quota.acquire()
+            if self.bucket is not None:
+                self.bucket.acquire()
+            started = time.perf_counter()
+            retry_after = None
+            try:
+                resp = self.http.get(path, params=params)
+            except httpx.TransportError as exc:
+                error: Exception = exc
+                status = "network_error"
+            else:
+                self._observe_limits(resp.headers)
+                status = str(resp.status_code)
+                if resp.status_code < 400:
+                    metrics.inc(f'strava_requests_total{{status="{status}"}}')
+                    metrics.observe("strava_request_duration_seconds", time.perf_counter() - started)
+                    return resp.json()
+                if resp.status_code not in RETRY_STATUSES:
+                    metrics.inc(f'strava_requests_total{{status="{status}"}}')
+                    resp.raise_for_status()
+                error = httpx.HTTPStatusError(
+                    f"Strava API returned {resp.status_code}", request=resp.request, response=resp
+                )
+                try:
+                    retry_after = float(resp.headers["Retry-After"])
+                except (KeyError, ValueError):
+                    retry_after = None
+            metrics.inc(f'strava_requests_total{{status="{status}"}}')
+            if attempt >= self.max_retries:
+                raise error
+            metrics.inc("strava_retries_total")
+            time.sleep(backoff_delay(attempt, RETRY_BASE_SEC, RETRY_MAX_SEC, retry_after))
+            attempt += 1
+
+
 def _ensure_source(conn) -> int:
     cur = conn.cursor()
     cur.execute(
@@ -208,53 +313,130 @@ def _upsert_activity(conn, source_id: int, user_id: int, activity: dict) -> None
     )
 
 
-def _stream_exists(conn, source_id: int, activity_id: str, stream_type: str) -> bool:
-    cur = conn.cursor()
-    cur.execute(
-        """
-        SELECT 1 FROM streams_raw
-        WHERE source_id=? AND activity_id=? AND stream_type=? LIMIT 1
-        """,
-        (source_id, activity_id, stream_type),
-    )
-    return cur.fetchone() is not None
-
-
-def _upsert_stream(conn, source_id: int, user_id: int, activity_id: str, stream_type: str, stream: dict) -> None:
-    cur = conn.cursor()
-    cur.execute(
-        """
-        INSERT INTO streams_raw(source_id, activity_id, stream_type, raw_json, user_id)
-        VALUES (?, ?, ?, ?, ?)
-        ON CONFLICT(source_id, activity_id, stream_type) DO UPDATE SET
-          raw_json=excluded.raw_json,
-          user_id=excluded.user_id
-        """,
-        (
-            source_id,
-            activity_id,
-            stream_type,
-            json.dumps(stream),
-            user_id,
-        ),
-    )
-
-
-def _fetch_streams(access_token: str, activity_id: str) -> dict:
-    return _http_json(
-        f"{STRAVA_API_BASE}/activities/{activity_id}/streams",
-        headers={"Authorization": f"Bearer {access_token}"},
+def load_existing_streams(conn, source_id: int, activity_ids: Iterable[str]) -> set[tuple[str, str]]:
+    """``(activity_id, stream_type)`` already stored for ``activity_ids``, in one query per chunk."""
+    ids = list(dict.fromkeys(activity_ids))
+    existing: set[tuple[str, str]] = set()
+    for start in range(0, len(ids), EXISTING_CHUNK_SIZE):
+        chunk = ids[start:start + EXISTING_CHUNK_SIZE]
+        rows = conn.execute(
+            f"""
+            SELECT activity_id, stream_type FROM streams_raw
+            WHERE source_id=? AND activity_id IN ({", ".join("?" * len(chunk))})
+            """,
+            (source_id, *chunk),
+        ).fetchall()
+        existing.update((str(activity_id), stream_type) for activity_id, stream_type in rows)
+    return existing
+
+
+STREAM_UPSERT_SQL = """
+INSERT INTO streams_raw(source_id, activity_id, stream_type, raw_json, data_blob, user_id)
+VALUES (?, ?, ?, ?, ?, ?)
+ON CONFLICT(source_id, activity_id, stream_type) DO UPDATE SET
+  raw_json=excluded.raw_json,
+  data_blob=excluded.data_blob,
+  user_id=excluded.user_id,
+  version=streams_raw.version + 1
+"""
+
+
+class StreamWriter:
+    """Buffers fetched streams and upserts them with executemany, committing every ``batch_size`` activities.
+
+    ``existing`` is the :func:`load_existing_streams` set for the activities being
+    fetched; those streams are skipped unless ``refresh`` is set.
+    """
+
+    def __init__(
+        self,
+        conn,
+        source_id: int,
+        batch_size: int = STRAVA_WRITE_BATCH,
+        refresh: bool = False,
+        existing: set[tuple[str, str]] | None = None,
+    ):
+        self.conn = conn
+        self.source_id = source_id
+        self.batch_size = max(1, batch_size)
+        self.refresh = refresh
+        self.existing = existing or set()
+        self.activities = 0
+        self.streams = 0
+        self._rows: list[tuple] = []
+        self._pending = 0
+
+    def write(self, user_id: int, activity_id: str, streams_payload: dict) -> None:
+        for stream_type, stream in streams_payload.items():
+            if stream_type == "original_size":
+                continue
+            if not self.refresh and (activity_id, stream_type) in self.existing:
+                continue
+            raw_json, data_blob = stream_codec.pack_payload(stream)
+            self._rows.append((self.source_id, activity_id, stream_type, raw_json, data_blob, user_id))
+        self.activities += 1
+        self._pending += 1
+        if self._pending >= self.batch_size:
+            self.flush()
+
+    def flush(self) -> None:
+        if self._rows:
+            self.conn.executemany(STREAM_UPSERT_SQL, self._rows)
+            self.streams += len(self._rows)
+            metrics.inc("strava_streams_written_total", len(self._rows))
+            self._rows = []
+        self.conn.commit()
+        self._pending = 0
+
+
+def _fetch_streams(client: StravaClient, activity_id: str) -> dict:
+    return client.get_json(
+        f"/activities/{activity_id}/streams",
         params={"keys": STREAM_KEYS, "key_by_type": "true"},
     )
 
 
-def _fetch_activities(access_token: str, after_epoch: int) -> list[dict]:
+def fetch_streams_concurrent(
+    client: StravaClient, activity_ids: Iterable[str], workers: int = STRAVA_FETCH_WORKERS
+) -> Iterator[tuple[str, dict | None, Exception | None]]:
+    """Yield ``(activity_id, streams, error)`` as fetches complete, ``workers`` at a time.
+
+    At most ``2 * workers`` requests are queued ahead. When the daily quota runs out,
+    nothing new is started, the fetches already in flight are yielded and
+    :class:`QuotaExhausted` is raised.
+    """
+    workers = max(1, workers)
+    ids = iter(activity_ids)
+    exhausted: QuotaExhausted | None = None
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="strava-fetch") as pool:
+        pending: dict = {}
+        while True:
+            while exhausted is None and len(pending) < workers * 2:
+                activity_id = next(ids, None)
+                if activity_id is None:
+                    break
+                pending[pool.submit(_fetch_streams, client, activity_id)] = activity_id
+            if not pending:
+                break
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                activity_id = pending.pop(future)
+                try:
+                    yield activity_id, future.result(), None
+                except QuotaExhausted as exc:
+                    exhausted = exc
+                except Exception as exc:
+                    yield activity_id, None, exc
+    if exhausted is not None:
+        raise exhausted
+
+
+def _fetch_activities(client: StravaClient, after_epoch: int) -> list[dict]:
     activities: list[dict] = []
     page = 1
     while True:
-        payload = _http_json(
-            f"{STRAVA_API_BASE}/athlete/activities",
-            headers={"Authorization": f"Bearer {access_token}"},
+        payload = client.get_json(
+            "/athlete/activities",
             params={"after": max(after_epoch - 60, 0), "per_page": 200, "page": page},
         )
         if not payload:
@@ -276,24 +458,30 @@ def main() -> None:
         state = _load_sync_state(conn, source_id, user_id)
         last_time = _resolve_last_activity_time(conn, source_id, user_id, state)
         token_state = _ensure_token(state)
-        access_token = token_state["access_token"]
-        activities = _fetch_activities(access_token, last_time)
         newest_time = last_time
-        new_activity_ids: list[str] = []
-        for activity in activities:
-            _upsert_activity(conn, source_id, user_id, activity)
-            act_id = str(activity.get("id"))
-            new_activity_ids.append(act_id)
-            start_epoch = _parse_iso_to_epoch(activity.get("start_date")) or 0
-            newest_time = max(newest_time, start_epoch)
-        for act_id in new_activity_ids:
-            streams_payload = _fetch_streams(access_token, act_id)
-            for stream_type, stream in streams_payload.items():
-                if stream_type == "original_size":
-                    continue
-                if _stream_exists(conn, source_id, act_id, stream_type):
-                    continue
-                _upsert_stream(conn, source_id, user_id, act_id, stream_type, stream)
+        stopped = None
+        with StravaClient(token_state["access_token"]) as client:
+            activities = _fetch_activities(client, last_time)
+            new_activity_ids: list[str] = []
+            for activity in activities:
+                _upsert_activity(conn, source_id, user_id, activity)
+                act_id = str(activity.get("id"))
+                new_activity_ids.append(act_id)
+                start_epoch = _parse_iso_to_epoch(activity.get("start_date")) or 0
+                newest_time = max(newest_time, start_epoch)
+            conn.commit()
+            writer = StreamWriter(
+                conn, source_id, existing=load_existing_streams(conn, source_id, new_activity_ids)
+            )
+            try:
+                for act_id, streams_payload, error in fetch_streams_concurrent(client, new_activity_ids):
+                    if error is not None:
+                        print(f"Stream fetch failed for {act_id}: {error}")
+                        continue
+                    writer.write(user_id, act_id, streams_payload)
+            except QuotaExhausted as exc:
+                stopped = exc
+            writer.flush()
         _update_sync_state(
             conn,
             source_id,
@@ -306,8 +494,13 @@ def main() -> None:
             },
         )
         conn.commit()
+    if stopped is not None:
+        print(f"Strava quota exhausted ({stopped}); run strava_streams_backfill.py for the remaining streams.")
     print(f"Strava API sync complete. Activities fetched: {len(activities)}")
 
 
 if __name__ == "__main__":
-    main()
+    try:
+        main()
+    finally:
+        metrics.export_snapshot()
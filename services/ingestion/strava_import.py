@@ -1,13 +1,21 @@
-"""Import Strava JSONL + streams into SQLite (raw tables)."""
+"""Import Strava JSONL + streams into SQLite (raw tables).
+
+Files are streamed (``activities.jsonl`` line by line, one stream file at a time)
+and written in batches of ``FITNESS_IMPORT_BATCH_SIZE`` rows, one commit per
+batch. Unchanged files are skipped via ``import_manifest``; when
+``activities.jsonl`` only grew, just the appended lines are imported.
+"""
 from pathlib import Path
+import argparse
+import hashlib
 import json
 import sys
 
 ROOT = Path(__file__).resolve().parents[2]
 if str(ROOT) not in sys.path:
     sys.path.insert(0, str(ROOT))
-from packages import db
-from packages.config import STRAVA_LOCAL_PATH
+from packages import db, import_manifest, stream_codec
+from packages.config import IMPORT_BATCH_SIZE, STRAVA_LOCAL_PATH
 
 RAW_DIR = STRAVA_LOCAL_PATH / "data"
 ACTIVITIES = RAW_DIR / "activities.jsonl"
@@ -15,6 +23,25 @@ STREAMS_DIR = RAW_DIR / "streams"
 
 SOURCE_NAME = "strava"
 
+ACTIVITY_UPSERT_SQL = """
+INSERT INTO activities_raw(source_id, activity_id, start_time, raw_json, user_id)
+VALUES(?,?,?,?,?)
+ON CONFLICT(source_id, activity_id) DO UPDATE SET
+  start_time=excluded.start_time,
+  raw_json=excluded.raw_json,
+  user_id=excluded.user_id
+"""
+
+STREAM_UPSERT_SQL = """
+INSERT INTO streams_raw(source_id, activity_id, stream_type, raw_json, data_blob, user_id)
+VALUES(?,?,?,?,?,?)
+ON CONFLICT(source_id, activity_id, stream_type) DO UPDATE SET
+  raw_json=excluded.raw_json,
+  data_blob=excluded.data_blob,
+  user_id=excluded.user_id,
+  version=streams_raw.version + 1
+"""
+
 
 def ensure_source(conn):
     cur = conn.cursor()
@@ -35,68 +62,121 @@ def get_default_user_id(conn):
     return row[0]
 
 
-def import_activities(conn, source_id, user_id):
+class BatchWriter:
+    """executemany ``sql`` every ``batch_size`` rows, committing each batch."""
+
+    def __init__(self, conn, sql: str, batch_size: int = IMPORT_BATCH_SIZE):
+        self.conn = conn
+        self.sql = sql
+        self.batch_size = max(1, batch_size)
+        self.written = 0
+        self._rows: list = []
+
+    def add(self, row: tuple) -> None:
+        self._rows.append(row)
+        if len(self._rows) >= self.batch_size:
+            self.flush()
+
+    def flush(self) -> None:
+        if self._rows:
+            self.conn.executemany(self.sql, self._rows)
+            self.written += len(self._rows)
+            self._rows = []
+        self.conn.commit()
+
+
+def _activity_row(line: bytes, source_id, user_id):
+    text = line.decode("utf-8").strip()
+    if not text:
+        return None
+    # Parsed only for the id and start time; the line itself is stored as raw_json.
+    row = json.loads(text)
+    return (source_id, str(row.get("id")), row.get("start_date"), text, user_id)
+
+
+def _ends_with_newline(fh, size: int) -> bool:
+    """Whether byte ``size - 1`` is a newline; leaves ``fh`` positioned at ``size``."""
+    if size == 0:
+        return True
+    fh.seek(size - 1)
+    return fh.read(1) == b"\n"
+
+
+def import_activities(conn, source_id, user_id, batch_size=IMPORT_BATCH_SIZE, force=False):
     if not ACTIVITIES.exists():
         return 0
+    stat = ACTIVITIES.stat()
+    entry = None if force else import_manifest.load_entry(conn, ACTIVITIES)
+    if import_manifest.unchanged(entry, stat):
+        return 0
+    writer = BatchWriter(conn, ACTIVITY_UPSERT_SQL, batch_size)
     count = 0
-    cur = conn.cursor()
-    for line in ACTIVITIES.read_text().splitlines():
-        if not line.strip():
-            continue
-        row = json.loads(line)
-        activity_id = str(row.get("id"))
-        start_time = row.get("start_date")
-        raw_json = json.dumps(row)
-        cur.execute(
-            """
-            INSERT INTO activities_raw(source_id, activity_id, start_time, raw_json, user_id)
-            VALUES(?,?,?,?,?)
-            ON CONFLICT(source_id, activity_id) DO UPDATE SET
-              start_time=excluded.start_time,
-              raw_json=excluded.raw_json,
-              user_id=excluded.user_id
-            """,
-            (source_id, activity_id, start_time, raw_json, user_id),
-        )
-        count += 1
-    conn.commit()
+    with ACTIVITIES.open("rb") as fh:
+        digest = hashlib.sha256()
+        if entry is not None and stat.st_size >= entry.size:
+            import_manifest.hash_stream(fh, entry.size, digest)
+            if digest.hexdigest() == entry.sha256 and stat.st_size == entry.size:
+                # Touched, not changed.
+                import_manifest.record(conn, ACTIVITIES, stat, entry.sha256, 0)
+                conn.commit()
+                return 0
+            # Append-only growth after a complete last line: only the new lines need
+            # importing. Anything else is re-imported from the start.
+            if digest.hexdigest() != entry.sha256 or not _ends_with_newline(fh, entry.size):
+                digest = hashlib.sha256()
+                fh.seek(0)
+        for line in fh:
+            digest.update(line)
+            row = _activity_row(line, source_id, user_id)
+            if row is not None:
+                writer.add(row)
+                count += 1
+    # Recorded in the same transaction as the last batch.
+    import_manifest.record(conn, ACTIVITIES, stat, digest.hexdigest(), count)
+    writer.flush()
     return count
 
 
-def import_streams(conn, source_id, user_id):
+def import_streams(conn, source_id, user_id, batch_size=IMPORT_BATCH_SIZE, force=False):
     if not STREAMS_DIR.exists():
         return 0
-    count = 0
-    cur = conn.cursor()
-    for p in STREAMS_DIR.glob("*.json"):
+    entries = {} if force else import_manifest.load_entries(conn, STREAMS_DIR)
+    writer = BatchWriter(conn, STREAM_UPSERT_SQL, batch_size)
+    for p in sorted(STREAMS_DIR.glob("*.json")):
+        stat = p.stat()
+        entry = entries.get(import_manifest.manifest_key(p))
+        if import_manifest.unchanged(entry, stat):
+            continue
+        raw = p.read_bytes()
+        sha256 = hashlib.sha256(raw).hexdigest()
+        if entry is not None and entry.sha256 == sha256:
+            import_manifest.record(conn, p, stat, sha256, 0)
+            continue
+        data = json.loads(raw)
+        del raw
         activity_id = p.stem
-        data = json.loads(p.read_text())
         for key, payload in data.items():
-            raw_json = json.dumps(payload)
-            cur.execute(
-                """
-                INSERT INTO streams_raw(source_id, activity_id, stream_type, raw_json, user_id)
-                VALUES(?,?,?,?,?)
-                ON CONFLICT(source_id, activity_id, stream_type) DO UPDATE SET
-                  raw_json=excluded.raw_json,
-                  user_id=excluded.user_id
-                """,
-                (source_id, activity_id, key, raw_json, user_id),
-            )
-            count += 1
-    conn.commit()
-    return count
+            raw_json, data_blob = stream_codec.pack_payload(payload)
+            writer.add((source_id, activity_id, key, raw_json, data_blob, user_id))
+        # Recorded in the same transaction as the file's last rows.
+        import_manifest.record(conn, p, stat, sha256, len(data))
+    writer.flush()
+    return writer.written
 
 
 def main():
+    parser = argparse.ArgumentParser(description="Import local Strava activities.jsonl and stream files.")
+    parser.add_argument("--force", action="store_true", help="Re-import files even if unchanged.")
+    parser.add_argument("--batch-size", type=int, default=IMPORT_BATCH_SIZE, help="Rows per commit.")
+    args = parser.parse_args()
     if not db.db_exists():
         raise SystemExit("DB not initialized. Run scripts/init_db.py")
     with db.connect() as conn:
         db.configure_connection(conn)
         source_id = ensure_source(conn)
         user_id = get_default_user_id(conn)
-        a = import_activities(conn, source_id, user_id)
-        s = import_streams(conn, source_id, user_id)
+        a = import_activities(conn, source_id, user_id, args.batch_size, args.force)
+        s = import_streams(conn, source_id, user_id, args.batch_size, args.force)
     print(f"Imported activities: {a}")
     print(f"Imported streams: {s}")
 
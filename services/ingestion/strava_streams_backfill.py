@@ -1,6 +1,5 @@
 import argparse
 import json
-import time
 from pathlib import Path
 import sys
 
@@ -9,7 +8,14 @@ if str(ROOT) not in sys.path:
     sys.path.insert(0, str(ROOT))
 
 from packages import db
-from packages.config import STRAVA_CLIENT_ID, STRAVA_CLIENT_SECRET, STRAVA_REFRESH_TOKEN
+from packages.config import (
+    STRAVA_CLIENT_ID,
+    STRAVA_CLIENT_SECRET,
+    STRAVA_FETCH_WORKERS,
+    STRAVA_REFRESH_TOKEN,
+    STRAVA_WRITE_BATCH,
+)
+from packages.throttle import QuotaExhausted
 from services.ingestion import strava_api_import as api
 
 
@@ -49,7 +55,14 @@ def _is_run(raw_json: str) -> bool:
 def main() -> int:
     parser = argparse.ArgumentParser(description="Backfill Strava streams for activities missing time/distance.")
     parser.add_argument("--limit", type=int, default=None, help="Max activities to process.")
-    parser.add_argument("--sleep", type=float, default=0.5, help="Seconds to sleep between API calls.")
+    parser.add_argument(
+        "--sleep",
+        type=float,
+        default=0.0,
+        help="Minimum seconds between API calls (the Strava rate-limit headers are always honoured).",
+    )
+    parser.add_argument("--workers", type=int, default=STRAVA_FETCH_WORKERS, help="Concurrent stream fetches.")
+    parser.add_argument("--batch-size", type=int, default=STRAVA_WRITE_BATCH, help="Activities per commit.")
     parser.add_argument("--after", type=str, default=None, help="Only activities at/after ISO timestamp.")
     parser.add_argument("--before", type=str, default=None, help="Only activities at/before ISO timestamp.")
     parser.add_argument("--include-non-runs", action="store_true", help="Also backfill non-run activities.")
@@ -60,35 +73,39 @@ def main() -> int:
         raise SystemExit("Strava API not configured. Set STRAVA_CLIENT_ID/SECRET/REFRESH_TOKEN.")
 
     processed = 0
+    stopped = None
     with db.connect() as conn:
         db.configure_connection(conn)
         source_id = api._ensure_source(conn)
         user_id = api._default_user_id(conn)
         state = api._load_sync_state(conn, source_id, user_id)
         token_state = api._ensure_token(state)
-        access_token = token_state["access_token"]
 
         rows = _iter_missing_streams(conn, args.after, args.before, args.limit)
-        for activity_id, start_time, raw_json, row_user_id in rows:
-            if not args.include_non_runs and not _is_run(raw_json):
-                continue
+        owners = {
+            activity_id: row_user_id
+            for activity_id, _, raw_json, row_user_id in rows
+            if args.include_non_runs or _is_run(raw_json)
+        }
+        existing = set() if args.refresh else api.load_existing_streams(conn, source_id, owners)
+        writer = api.StreamWriter(
+            conn, source_id, batch_size=args.batch_size, refresh=args.refresh, existing=existing
+        )
+        with api.StravaClient(token_state["access_token"], workers=args.workers, min_interval=args.sleep) as client:
             try:
-                streams_payload = api._fetch_streams(access_token, activity_id)
-            except Exception as exc:
-                print(f"Stream fetch failed for {activity_id}: {exc}")
-                continue
-            for stream_type, stream in streams_payload.items():
-                if stream_type == "original_size":
-                    continue
-                if not args.refresh and api._stream_exists(conn, source_id, activity_id, stream_type):
-                    continue
-                api._upsert_stream(conn, source_id, row_user_id, activity_id, stream_type, stream)
-            conn.commit()
-            processed += 1
-            if processed % 25 == 0:
-                print(f"Streams fetched: {processed}")
-            if args.sleep:
-                time.sleep(args.sleep)
+                for activity_id, streams_payload, error in api.fetch_streams_concurrent(
+                    client, list(owners), workers=args.workers
+                ):
+                    if error is not None:
+                        print(f"Stream fetch failed for {activity_id}: {error}")
+                        continue
+                    writer.write(owners[activity_id], activity_id, streams_payload)
+                    processed += 1
+                    if processed % 25 == 0:
+                        print(f"Streams fetched: {processed}")
+            except QuotaExhausted as exc:
+                stopped = exc
+        writer.flush()
 
         # Keep tokens fresh without changing last_activity_time.
         api._update_sync_state(
@@ -104,6 +121,8 @@ def main() -> int:
         )
         conn.commit()
 
+    if stopped is not None:
+        print(f"Strava quota exhausted ({stopped}); rerun later to continue.")
     print(f"Streams backfill complete: {processed}")
     return 0
 
@@ -1,19 +1,58 @@
+"""Backfill per-activity weather from the Open-Meteo archive.
+
+Activities are grouped by grid cell (``FITNESS_WEATHER_GRID_DEG``); each cell's
+missing days are fetched in ranges of up to ``FITNESS_WEATHER_RANGE_DAYS`` per
+request and stored once per cell/day in ``weather_cache``. ``weather_raw`` rows
+are derived from the cached hourly data, so nearby runs on the same or adjacent
+days cost no extra requests.
+
+Cells are fetched by a pool of ``--workers`` threads sharing one keep-alive
+client, rate-limited per archive host; results are written from the main thread
+and committed every ``--batch-size`` activities.
+"""
 import argparse
 import json
 import os
+import threading
 import time
-from datetime import datetime, timezone
-from urllib import parse, request
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import date as date_cls, datetime, timezone
 from pathlib import Path
 import sys
+from typing import Iterable, Iterator
+from urllib.parse import urlparse
+
+import httpx
 
 ROOT = Path(__file__).resolve().parents[2]
 if str(ROOT) not in sys.path:
     sys.path.insert(0, str(ROOT))
 
-from packages import db
+from packages import db, metrics
+from packages.config import (
+    WEATHER_API_BASE,
+    WEATHER_FETCH_WORKERS,
+    WEATHER_GRID_DEG,
+    WEATHER_MAX_RETRIES,
+    WEATHER_RANGE_DAYS,
+    WEATHER_RATE_PER_SEC,
+    WEATHER_WRITE_BATCH,
+)
+from packages.throttle import TokenBucket, backoff_delay
 
-WEATHER_API_BASE = "https://archive-api.open-meteo.com/v1/archive"
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+RETRY_BASE_SEC = 1.0
+RETRY_MAX_SEC = 60.0
+# Dates per weather_cache lookup; keeps the IN (...) list well under SQLite's variable limit.
+CACHE_LOOKUP_CHUNK_SIZE = 100
+HOURLY_VARS = (
+    "temperature_2m",
+    "relative_humidity_2m",
+    "wind_speed_10m",
+    "wind_gusts_10m",
+    "precipitation",
+    "weather_code",
+)
 
 
 def _parse_start_dt(value: str | None) -> datetime | None:
@@ -28,30 +67,197 @@ def _parse_start_dt(value: str | None) -> datetime | None:
     return dt.astimezone(timezone.utc)
 
 
-def _fetch_weather(lat: float, lon: float, date: str, hour_utc: int | None) -> dict | None:
+def grid_cell(lat: float, lon: float, grid: float = WEATHER_GRID_DEG) -> tuple[float, float]:
+    """Centre of the ``grid``-degree cell containing ``lat``/``lon``."""
+    return round(round(lat / grid) * grid, 4), round(round(lon / grid) * grid, 4)
+
+
+def cell_key(cell: tuple[float, float]) -> str:
+    return f"{cell[0]:.4f},{cell[1]:.4f}"
+
+
+def date_ranges(dates, max_days: int = WEATHER_RANGE_DAYS) -> list[tuple[str, str]]:
+    """Cover the ISO ``dates`` with as few ``(start, end)`` ranges of at most ``max_days`` as possible."""
+    ranges: list[tuple[str, str]] = []
+    start = end = None
+    for day in sorted(date_cls.fromisoformat(d) for d in set(dates)):
+        if start is not None and (day - start).days < max(1, max_days):
+            end = day
+            continue
+        if start is not None:
+            ranges.append((start.isoformat(), end.isoformat()))
+        start = end = day
+    if start is not None:
+        ranges.append((start.isoformat(), end.isoformat()))
+    return ranges
+
+
+class ArchiveClient:
+    """Keep-alive archive client shared by the fetch threads.
+
+    Requests to each host go through that host's :class:`TokenBucket` (``rate`` per
+    second, bursts of up to one per worker). 429, 5xx and network errors are
+    retried with jittered exponential backoff; other HTTP errors are raised.
+    """
+
+    def __init__(
+        self,
+        base_url: str = WEATHER_API_BASE,
+        workers: int = WEATHER_FETCH_WORKERS,
+        rate: float = WEATHER_RATE_PER_SEC,
+        max_retries: int = WEATHER_MAX_RETRIES,
+    ):
+        self.workers = max(1, workers)
+        self.base_url = base_url
+        self.http = httpx.Client(
+            timeout=30.0,
+            limits=httpx.Limits(max_connections=self.workers, max_keepalive_connections=self.workers),
+        )
+        self.rate = rate
+        self.max_retries = max_retries
+        self.requests = 0
+        self._buckets: dict[str, TokenBucket] = {}
+        self._lock = threading.Lock()
+
+    def close(self) -> None:
+        self.http.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def _acquire(self, host: str) -> None:
+        if self.rate <= 0:
+            return
+        with self._lock:
+            bucket = self._buckets.get(host)
+            if bucket is None:
+                bucket = self._buckets[host] = TokenBucket(self.rate, burst=self.workers)
+        bucket.acquire()
+
+    def get_json(self, params: dict, url: str | None = None):
+        url = url or self.base_url
+        host = urlparse(url).netloc
+        attempt = 0
+        while True:
+            self._acquire(host)
+            with self._lock:
+                self.requests += 1
+            started = time.perf_counter()
+            retry_after = None
+            try:
+                resp = self.http.get(url, params=params)
+            except httpx.TransportError as exc:
+                error: Exception = exc
+                status = "network_error"
+            else:
+                status = str(resp.status_code)
+                metrics.observe_histogram("weather_request_duration_seconds", time.perf_counter() - started)
+                if resp.status_code < 400:
+                    metrics.inc(f'weather_requests_total{{status="{status}"}}')
+                    return resp.json()
+                if resp.status_code not in RETRY_STATUSES:
+                    metrics.inc(f'weather_requests_total{{status="{status}"}}')
+                    resp.raise_for_status()
+                error = httpx.HTTPStatusError(
+                    f"Open-Meteo archive returned {resp.status_code}", request=resp.request, response=resp
+                )
+                try:
+                    retry_after = float(resp.headers["Retry-After"])
+                except (KeyError, ValueError):
+                    retry_after = None
+            metrics.inc(f'weather_requests_total{{status="{status}"}}')
+            if attempt >= self.max_retries:
+                raise error
+            metrics.inc("weather_retries_total")
+            time.sleep(backoff_delay(attempt, RETRY_BASE_SEC, RETRY_MAX_SEC, retry_after))
+            attempt += 1
+
+
+def _fetch_range(client: ArchiveClient, lat: float, lon: float, start: str, end: str) -> dict[str, dict]:
+    """One archive request for ``start``..``end``; the hourly series split per UTC day."""
     params = {
         "latitude": str(lat),
         "longitude": str(lon),
-        "start_date": date,
-        "end_date": date,
-        "hourly": ",".join(
-            [
-                "temperature_2m",
-                "relative_humidity_2m",
-                "wind_speed_10m",
-                "wind_gusts_10m",
-                "precipitation",
-                "weather_code",
-            ]
-        ),
+        "start_date": start,
+        "end_date": end,
+        "hourly": ",".join(HOURLY_VARS),
         "timezone": "UTC",
     }
-    url = f"{WEATHER_API_BASE}?{parse.urlencode(params)}"
-    req = request.Request(url)
-    with request.urlopen(req, timeout=30) as resp:
-        payload = resp.read().decode("utf-8")
-    data = json.loads(payload)
-    hourly = data.get("hourly") or {}
+    hourly = client.get_json(params).get("hourly") or {}
+    days: dict[str, dict] = {}
+    for i, t in enumerate(hourly.get("time") or []):
+        day = days.setdefault(t[:10], {"time": [], **{var: [] for var in HOURLY_VARS}})
+        day["time"].append(t)
+        for var in HOURLY_VARS:
+            values = hourly.get(var)
+            day[var].append(values[i] if isinstance(values, list) and i < len(values) else None)
+    return days
+
+
+def _fetch_cell(client: ArchiveClient, cell: tuple[float, float], dates) -> tuple[dict[str, dict], list[str]]:
+    """Fetch ``dates`` for ``cell``; a failed range is reported and the others still kept."""
+    fetched: dict[str, dict] = {}
+    errors: list[str] = []
+    for start, end in date_ranges(dates):
+        try:
+            fetched.update(_fetch_range(client, cell[0], cell[1], start, end))
+        except Exception as exc:
+            errors.append(f"Weather fetch failed for cell {cell_key(cell)} {start}..{end}: {exc}")
+    return fetched, errors
+
+
+def fetch_cells_concurrent(
+    client: ArchiveClient, jobs: Iterable[tuple], workers: int = WEATHER_FETCH_WORKERS
+) -> Iterator[tuple[tuple, dict[str, dict], list[str]]]:
+    """Yield ``(job, fetched, errors)`` as cells complete, ``workers`` at a time.
+
+    ``jobs`` are ``(cell, activities, cached_days, missing_dates)`` and are pulled
+    lazily, so at most ``2 * workers`` cells (and their cached days) are held at once.
+    """
+    workers = max(1, workers)
+    jobs = iter(jobs)
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="weather-fetch") as pool:
+        pending: dict = {}
+        while True:
+            while len(pending) < workers * 2:
+                job = next(jobs, None)
+                if job is None:
+                    break
+                pending[pool.submit(_fetch_cell, client, job[0], job[3])] = job
+            if not pending:
+                break
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                job = pending.pop(future)
+                fetched, errors = future.result()
+                yield job, fetched, errors
+
+
+def _complete(day: dict) -> bool:
+    # The archive lags a few days behind; partial days are used but not cached.
+    temps = day.get("temperature_2m") or []
+    return len(temps) == 24 and all(v is not None for v in temps)
+
+
+def load_cached(conn, cell: tuple[float, float], dates) -> dict[str, dict]:
+    """Cached hourly days for ``cell`` on exactly ``dates`` (queried in chunks)."""
+    wanted = sorted(dates)
+    days: dict[str, dict] = {}
+    for start in range(0, len(wanted), CACHE_LOOKUP_CHUNK_SIZE):
+        chunk = wanted[start:start + CACHE_LOOKUP_CHUNK_SIZE]
+        rows = conn.execute(
+            f"SELECT date, hourly_json FROM weather_cache WHERE cell = ? AND date IN ({','.join('?' for _ in chunk)})",
+            (cell_key(cell), *chunk),
+        ).fetchall()
+        days.update((str(day)[:10], json.loads(hourly_json)) for day, hourly_json in rows)
+    return days
+
+
+def summarize_day(hourly: dict, date: str, hour_utc: int | None) -> dict | None:
+    """The per-activity ``weather_raw`` payload: the start hour's values plus daily averages."""
     times = hourly.get("time")
     if not times:
         return None
@@ -120,14 +326,99 @@ def _iter_activities(conn, refresh: bool, limit: int | None, after: str | None,
     return conn.execute(query, tuple(params)).fetchall()
 
 
+def _candidates(rows) -> list[tuple]:
+    """``(activity_id, user_id, cell, date, hour_utc)`` for activities with a start position."""
+    out = []
+    for activity_id, start_time, raw_json, user_id in rows:
+        try:
+            raw = json.loads(raw_json)
+        except json.JSONDecodeError:
+            continue
+        latlng = raw.get("start_latlng") or raw.get("start_latlngs")
+        if not latlng or len(latlng) < 2:
+            continue
+        dt = _parse_start_dt(raw.get("start_date") or start_time)
+        if not dt:
+            continue
+        cell = grid_cell(float(latlng[0]), float(latlng[1]))
+        out.append((activity_id, user_id, cell, dt.date().isoformat(), dt.hour))
+    return out
+
+
+class WeatherWriter:
+    """Buffers ``weather_cache`` and ``weather_raw`` rows, committing every ``batch_size`` activities."""
+
+    def __init__(self, conn, batch_size: int = WEATHER_WRITE_BATCH):
+        self.conn = conn
+        self.batch_size = max(1, batch_size)
+        self.written = 0
+        self.started = time.perf_counter()
+        self._cache_rows: list[tuple] = []
+        self._weather_rows: list[tuple] = []
+
+    def write(self, cell: tuple[float, float], activities: list[tuple], days: dict, fetched: dict) -> None:
+        fetched_at = datetime.now(timezone.utc).isoformat()
+        for day, hourly in sorted(fetched.items()):
+            if _complete(hourly):
+                self._cache_rows.append((cell_key(cell), day, cell[0], cell[1], json.dumps(hourly), fetched_at))
+        for activity_id, user_id, _, date, hour_utc in activities:
+            weather = summarize_day(days[date], date, hour_utc) if date in days else None
+            if weather:
+                self._weather_rows.append((activity_id, json.dumps(weather), user_id))
+        if len(self._weather_rows) >= self.batch_size:
+            self.flush()
+
+    def flush(self) -> None:
+        if self._cache_rows:
+            self.conn.executemany(
+                """
+                INSERT INTO weather_cache(cell, date, lat, lon, hourly_json, fetched_at)
+                VALUES(?, ?, ?, ?, ?, ?)
+                ON CONFLICT(cell, date) DO UPDATE SET
+                    hourly_json=excluded.hourly_json,
+                    fetched_at=excluded.fetched_at
+                """,
+                self._cache_rows,
+            )
+        if self._weather_rows:
+            self.conn.executemany(
+                """
+                INSERT INTO weather_raw(activity_id, raw_json, user_id)
+                VALUES(?, ?, ?)
+                ON CONFLICT(user_id, activity_id) DO UPDATE SET
+                    raw_json=excluded.raw_json,
+                    version=weather_raw.version + 1
+                """,
+                self._weather_rows,
+            )
+        self.conn.commit()
+        if self._weather_rows:
+            self.written += len(self._weather_rows)
+            metrics.inc("weather_backfill_activities_total", len(self._weather_rows))
+            print(f"Weather written: {self.written} ({self.throughput():.1f} activities/s)")
+        self._cache_rows = []
+        self._weather_rows = []
+
+    def throughput(self) -> float:
+        elapsed = time.perf_counter() - self.started
+        return self.written / elapsed if elapsed > 0 else 0.0
+
+
 def main() -> int:
     parser = argparse.ArgumentParser(description="Fetch Open-Meteo archive weather for activities.")
     parser.add_argument("--refresh", action="store_true", help="Refetch weather even if already present.")
     parser.add_argument("--limit", type=int, default=None, help="Max activities to process.")
-    parser.add_argument("--sleep", type=float, default=0.2, help="Seconds to sleep between requests.")
+    parser.add_argument(
+        "--sleep", type=float, default=0.0, help="Minimum seconds between archive requests (caps --rate)."
+    )
     parser.add_argument("--after", type=str, default=None, help="Only activities at/after ISO timestamp.")
     parser.add_argument("--before", type=str, default=None, help="Only activities at/before ISO timestamp.")
     parser.add_argument("--dry-run", action="store_true", help="List activities that would be processed.")
+    parser.add_argument("--workers", type=int, default=WEATHER_FETCH_WORKERS, help="Concurrent archive requests.")
+    parser.add_argument(
+        "--rate", type=float, default=WEATHER_RATE_PER_SEC, help="Max requests per second to the archive host."
+    )
+    parser.add_argument("--batch-size", type=int, default=WEATHER_WRITE_BATCH, help="Activities per commit.")
     args = parser.parse_args()
     if args.limit is None:
         env_limit = os.getenv("FITNESS_WEATHER_API_LIMIT")
@@ -142,54 +433,45 @@ def main() -> int:
             args.sleep = float(env_sleep)
         except ValueError:
             pass
+    rate = args.rate
+    if args.sleep > 0:
+        rate = min(rate, 1.0 / args.sleep) if rate > 0 else 1.0 / args.sleep
 
-    processed = 0
-    with db.connect() as conn:
+    with db.connect() as conn, ArchiveClient(workers=args.workers, rate=rate) as client:
         db.configure_connection(conn)
         rows = _iter_activities(conn, args.refresh, args.limit, args.after, args.before)
         if args.dry_run:
             print(f"weather backfill candidates: {len(rows)}")
             return 0
-        for activity_id, start_time, raw_json, user_id in rows:
-            try:
-                raw = json.loads(raw_json)
-            except json.JSONDecodeError:
-                continue
-            latlng = raw.get("start_latlng") or raw.get("start_latlngs")
-            if not latlng or len(latlng) < 2:
-                continue
-            dt = _parse_start_dt(raw.get("start_date") or start_time)
-            if not dt:
-                continue
-            lat = float(latlng[0])
-            lon = float(latlng[1])
-            date = dt.date().isoformat()
-            hour_utc = dt.hour
-            try:
-                weather = _fetch_weather(lat, lon, date, hour_utc)
-            except Exception as exc:
-                print(f"Weather fetch failed for {activity_id}: {exc}")
-                continue
-            if not weather:
-                continue
-            conn.execute(
-                """
-                INSERT INTO weather_raw(activity_id, raw_json, user_id)
-                VALUES(?, ?, ?)
-                ON CONFLICT(user_id, activity_id) DO UPDATE SET
-                    raw_json=excluded.raw_json
-                """,
-                (activity_id, json.dumps(weather), user_id),
-            )
-            conn.commit()
-            processed += 1
-            if processed % 25 == 0:
-                print(f"Weather fetched: {processed}")
-            if args.sleep:
-                time.sleep(args.sleep)
-    print(f"Weather records written: {processed}")
+        by_cell: dict[tuple[float, float], list[tuple]] = {}
+        for candidate in _candidates(rows):
+            by_cell.setdefault(candidate[2], []).append(candidate)
+
+        def jobs():
+            # Runs on the main thread as the pool pulls work, so cache reads share `conn`.
+            for cell, activities in by_cell.items():
+                dates = {c[3] for c in activities}
+                # --refresh refetches the archive too, not just the derived rows.
+                days = {} if args.refresh else load_cached(conn, cell, dates)
+                yield cell, activities, days, dates - days.keys()
+
+        writer = WeatherWriter(conn, args.batch_size)
+        for (cell, activities, days, _), fetched, errors in fetch_cells_concurrent(client, jobs(), args.workers):
+            for error in errors:
+                print(error)
+            days.update(fetched)
+            writer.write(cell, activities, days, fetched)
+        writer.flush()
+        metrics.observe("weather_backfill_duration_seconds", time.perf_counter() - writer.started)
+    print(
+        f"Weather records written: {writer.written} ({client.requests} archive requests, "
+        f"{len(by_cell)} grid cells, {writer.throughput():.1f} activities/s)"
+    )
     return 0
 
 
 if __name__ == "__main__":
-    raise SystemExit(main())
+    try:
+        raise SystemExit(main())
+    finally:
+        metrics.export_snapshot()
@@ -1,51 +1,69 @@
-"""Import weather JSON into SQLite (raw table)."""
+"""Import weather JSON into SQLite (raw table).
+
+Files are stored as-is and committed every ``FITNESS_IMPORT_BATCH_SIZE`` rows;
+unchanged files are skipped via ``import_manifest``.
+"""
 from pathlib import Path
-import json
+import argparse
+import hashlib
 import sys
 
 ROOT = Path(__file__).resolve().parents[2]
 if str(ROOT) not in sys.path:
     sys.path.insert(0, str(ROOT))
-from packages import db
-from packages.config import STRAVA_LOCAL_PATH
+from packages import db, import_manifest
+from packages.config import IMPORT_BATCH_SIZE, STRAVA_LOCAL_PATH
+from services.ingestion.strava_import import BatchWriter
 
 RAW_DIR = STRAVA_LOCAL_PATH / "data"
 WEATHER_DIR = RAW_DIR / "weather"
 
+WEATHER_UPSERT_SQL = """
+INSERT INTO weather_raw(activity_id, raw_json, user_id)
+VALUES(?,?,?)
+ON CONFLICT(user_id, activity_id) DO UPDATE SET
+  raw_json=excluded.raw_json,
+  version=weather_raw.version + 1
+"""
+
 
-def import_weather(conn):
+def import_weather(conn, batch_size=IMPORT_BATCH_SIZE, force=False):
     if not WEATHER_DIR.exists():
         return 0
-    count = 0
     cur = conn.cursor()
     cur.execute("SELECT id FROM users ORDER BY id LIMIT 1")
     row = cur.fetchone()
     if not row:
         raise SystemExit("No users found. Run scripts/create_user.py first.")
     user_id = row[0]
-    for p in WEATHER_DIR.glob("*.json"):
-        activity_id = p.stem
-        raw_json = p.read_text()
-        cur.execute(
-            """
-            INSERT INTO weather_raw(activity_id, raw_json, user_id)
-            VALUES(?,?,?)
-            ON CONFLICT(user_id, activity_id) DO UPDATE SET
-              raw_json=excluded.raw_json
-            """,
-            (activity_id, raw_json, user_id),
-        )
-        count += 1
-    conn.commit()
-    return count
+    entries = {} if force else import_manifest.load_entries(conn, WEATHER_DIR)
+    writer = BatchWriter(conn, WEATHER_UPSERT_SQL, batch_size)
+    for p in sorted(WEATHER_DIR.glob("*.json")):
+        stat = p.stat()
+        entry = entries.get(import_manifest.manifest_key(p))
+        if import_manifest.unchanged(entry, stat):
+            continue
+        raw = p.read_bytes()
+        sha256 = hashlib.sha256(raw).hexdigest()
+        if entry is not None and entry.sha256 == sha256:
+            import_manifest.record(conn, p, stat, sha256, 0)
+            continue
+        writer.add((p.stem, raw.decode("utf-8"), user_id))
+        import_manifest.record(conn, p, stat, sha256, 1)
+    writer.flush()
+    return writer.written
 
 
 def main():
+    parser = argparse.ArgumentParser(description="Import local weather JSON files.")
+    parser.add_argument("--force", action="store_true", help="Re-import files even if unchanged.")
+    parser.add_argument("--batch-size", type=int, default=IMPORT_BATCH_SIZE, help="Rows per commit.")
+    args = parser.parse_args()
     if not db.db_exists():
         raise SystemExit("DB not initialized. Run scripts/init_db.py")
     with db.connect() as conn:
         db.configure_connection(conn)
-        c = import_weather(conn)
+        c = import_weather(conn, args.batch_size, args.force)
     print(f"Imported weather records: {c}")
 
 
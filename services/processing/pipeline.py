@@ -1,18 +1,26 @@
 """Process raw Strava data into normalized, calculated, and view layers in SQLite."""
 from __future__ import annotations
 
+import argparse
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import hashlib
 import json
 import math
+import multiprocessing
+import queue
+import threading
+import time
 from dataclasses import dataclass
 from datetime import datetime, timezone, timedelta
 from pathlib import Path
 import sys
-from typing import Dict, List, Optional, Tuple
+from typing import Deque, Dict, Iterable, Iterator, List, Optional, Tuple
 
 ROOT = Path(__file__).resolve().parents[2]
 if str(ROOT) not in sys.path:
     sys.path.insert(0, str(ROOT))
-from packages import db
+from packages import db, insights, metrics, series, simplify, stream_codec, training_days
 from packages.config import (
     DB_PATH,
     LAST_UPDATE_PATH,
@@ -23,7 +31,19 @@ from packages.config import (
     HR_MAX,
     HR_REST,
     HR_ZONE_METHOD,
+    PIPELINE_BACKEND,
+    PIPELINE_BATCH_SIZE,
+    PIPELINE_CHUNK_SIZE,
+    PIPELINE_LOAD_CHUNK_SIZE,
+    PIPELINE_WORKERS,
 )
+from services.processing import signal_numpy
+
+# Bump whenever a change to the processing code alters stored outputs, so the
+# incremental mode reprocesses every activity on the next run.
+PIPELINE_VERSION = "3"
+SEGMENT_TARGETS = [400, 800, 1000, 1500, 3000, 5000, 10000]
+BEST_12W_DAYS = 84
 
 
 @dataclass
@@ -33,6 +53,14 @@ class FlatPaceResult:
     dist: float
 
 
+def numpy_backend() -> bool:
+    if PIPELINE_BACKEND == "python":
+        return False
+    if PIPELINE_BACKEND == "numpy" and not signal_numpy.available():
+        raise SystemExit("FITNESS_PIPELINE_BACKEND=numpy requires numpy to be installed")
+    return signal_numpy.available()
+
+
 def parse_dt(value: Optional[str]) -> Optional[datetime]:
     if not value:
         return None
@@ -243,6 +271,8 @@ def compute_activity_segments(time: List[float], dist: List[float], targets: Lis
 
 
 def smooth_pace(time: List[float], dist: List[float]) -> Tuple[List[Optional[float]], Optional[float]]:
+    if numpy_backend():
+        return signal_numpy.smooth_pace(time, dist)
     pace = compute_pace_series(time, dist)
     pace = clamp_values(pace, 150, 900)
     pace = hampel_filter(pace, window=7, t0=3.0)
@@ -253,6 +283,8 @@ def smooth_pace(time: List[float], dist: List[float]) -> Tuple[List[Optional[flo
 
 
 def smooth_cadence(cadence: List[Optional[float]]) -> Tuple[List[Optional[float]], Optional[float]]:
+    if numpy_backend():
+        return signal_numpy.smooth_cadence(cadence)
     cadence = drop_initial_zeros(cadence)
     cadence = clamp_values(cadence, 50, 200)
     cadence = hampel_filter(cadence, window=7, t0=3.0)
@@ -268,6 +300,8 @@ def smooth_cadence(cadence: List[Optional[float]]) -> Tuple[List[Optional[float]
 
 
 def smooth_hr(hr: List[Optional[float]]) -> Tuple[List[Optional[float]], Optional[float]]:
+    if numpy_backend():
+        return signal_numpy.smooth_hr(hr)
     hr = drop_initial_zeros(hr)
     hr = clamp_values(hr, 60, 210)
     hr = hampel_filter(hr, window=7, t0=3.0)
@@ -277,15 +311,14 @@ def smooth_hr(hr: List[Optional[float]]) -> Tuple[List[Optional[float]], Optiona
 
 def load_streams(conn, activity_id: str) -> Dict[str, dict]:
     rows = conn.execute(
-        "SELECT stream_type, raw_json FROM streams_raw WHERE activity_id=?",
+        "SELECT stream_type, raw_json, data_blob FROM streams_raw WHERE activity_id=?",
         (activity_id,),
     ).fetchall()
     out: Dict[str, dict] = {}
-    for stream_type, raw_json in rows:
-        try:
-            out[stream_type] = json.loads(raw_json)
-        except json.JSONDecodeError:
-            continue
+    for stream_type, raw_json, data_blob in rows:
+        payload = stream_codec.load_payload(raw_json, data_blob)
+        if payload is not None:
+            out[stream_type] = payload
     return out
 
 
@@ -307,6 +340,15 @@ def compute_flat_pace(streams: Dict[str, dict]) -> Optional[FlatPaceResult]:
         return None
     n = len(time)
     has_alt = alt and len(alt) == n
+    if numpy_backend():
+        flat_time, total_dist = signal_numpy.flat_pace_totals(time, dist, alt if has_alt else None)
+        if total_dist <= 0:
+            return None
+        return FlatPaceResult(
+            flat_pace_sec_per_km=(flat_time / total_dist) * 1000,
+            flat_time=flat_time,
+            dist=total_dist,
+        )
     total_dist = 0.0
     flat_time = 0.0
     for i in range(1, n):
@@ -591,6 +633,14 @@ def compute_hr_zones(
     z4_lo = hr_rest + 0.80 * hrr
     z5_lo = hr_rest + 0.90 * hrr
 
+    if numpy_backend():
+        (z1, z2, z3, z4, z5), total = signal_numpy.hr_zone_seconds(
+            time, hr, [z2_lo, z3_lo, z4_lo, z5_lo]
+        )
+        if total <= 0:
+            return None
+        return _zone_summary(z1, z2, z3, z4, z5, total, hr_rest, hr_max)
+
     z1 = z2 = z3 = z4 = z5 = 0.0
     total = 0.0
     for i in range(1, n):
@@ -615,6 +665,19 @@ def compute_hr_zones(
             z5 += dt
     if total <= 0:
         return None
+    return _zone_summary(z1, z2, z3, z4, z5, total, hr_rest, hr_max)
+
+
+def _zone_summary(
+    z1: float,
+    z2: float,
+    z3: float,
+    z4: float,
+    z5: float,
+    total: float,
+    hr_rest: float,
+    hr_max: float,
+) -> Dict[str, float]:
     zone_score = (z1 * 1 + z2 * 2 + z3 * 3 + z4 * 4 + z5 * 5) / total
     if zone_score < 1.5:
         zone_label = "Recovery"
@@ -653,206 +716,925 @@ def load_weather(conn, activity_id: str) -> Optional[dict]:
         return None
 
 
-def upsert_activity_norm(conn, activity_id: str, values: dict) -> None:
-    conn.execute(
+def algorithm_signature() -> str:
+    # Config knobs that change stored outputs are part of the code version.
+    return "|".join(
+        [
+            PIPELINE_VERSION,
+            f"hr_rest={HR_REST}",
+            f"hr_max={HR_MAX}",
+            f"hr_zone_method={HR_ZONE_METHOD}",
+            f"decoupling={DECOUPLING_WARMUP_SEC},{DECOUPLING_COOLDOWN_SEC},"
+            f"{DECOUPLING_GRADE_MAX},{DECOUPLING_MIN_SAMPLES}",
+        ]
+    )
+
+
+def load_stream_signatures(conn) -> Dict[str, List[Tuple[str, int, int]]]:
+    """Per-activity stream signatures (type, row id, version) without reading payloads.
+
+    Every streams_raw upsert bumps ``version``, so a refetch that rewrites a row in
+    place (same id, possibly the same byte length) still changes the signature.
+    """
+    rows = conn.execute(
+        """
+        SELECT activity_id, stream_type, id, version
+        FROM streams_raw
+        ORDER BY activity_id, stream_type, id
+        """
+    ).fetchall()
+    out: Dict[str, List[Tuple[str, int, int]]] = {}
+    for activity_id, stream_type, row_id, version in rows:
+        out.setdefault(activity_id, []).append((stream_type, row_id, version or 0))
+    return out
+
+
+def load_weather_signatures(conn) -> Dict[str, List[Tuple[int, int]]]:
+    """Per-activity weather signatures (row id, version); weather_raw upserts bump ``version``."""
+    rows = conn.execute(
+        "SELECT activity_id, id, version FROM weather_raw ORDER BY activity_id, id"
+    ).fetchall()
+    out: Dict[str, List[Tuple[int, int]]] = {}
+    for activity_id, row_id, version in rows:
+        out.setdefault(activity_id, []).append((row_id, version or 0))
+    return out
+
+
+def activity_fingerprint(
+    raw_json: str,
+    start_time: Optional[str],
+    user_id: Optional[int],
+    stream_sig: Optional[List[Tuple[str, int, int]]],
+    weather_sig: Optional[List[Tuple[int, int]]],
+    algo: str,
+) -> str:
+    h = hashlib.sha256()
+    h.update(algo.encode("utf-8"))
+    h.update(b"\0")
+    h.update(f"{start_time}|{user_id}".encode("utf-8"))
+    h.update(b"\0")
+    h.update((raw_json or "").encode("utf-8"))
+    h.update(b"\0")
+    for stream_type, row_id, version in stream_sig or []:
+        h.update(f"{stream_type}:{row_id}:{version};".encode("utf-8"))
+    h.update(b"\0")
+    for row_id, version in weather_sig or []:
+        h.update(f"{row_id}:{version};".encode("utf-8"))
+    return h.hexdigest()
+
+
+def load_fingerprints(conn) -> Dict[str, str]:
+    rows = conn.execute("SELECT activity_id, fingerprint FROM activity_fingerprints").fetchall()
+    return {activity_id: fingerprint for activity_id, fingerprint in rows}
+
+
+FINGERPRINT_UPSERT_SQL = """
+INSERT INTO activity_fingerprints(activity_id, fingerprint, pipeline_version, processed_at)
+VALUES(?,?,?,?)
+ON CONFLICT(activity_id) DO UPDATE SET
+  fingerprint=excluded.fingerprint,
+  pipeline_version=excluded.pipeline_version,
+  processed_at=excluded.processed_at
+"""
+SEGMENTS_DELETE_SQL = "DELETE FROM segments_best WHERE scope='activity' AND activity_id=?"
+SERIES_DELETE_SQL = "DELETE FROM activity_series_cache WHERE activity_id=?"
+SERIES_INSERT_SQL = """
+INSERT INTO activity_series_cache(activity_id, downsample, payload)
+VALUES(?, ?, ?)
+"""
+SIMPLIFIED_DELETE_SQL = "DELETE FROM activity_simplified_cache WHERE activity_id=?"
+SIMPLIFIED_INSERT_SQL = """
+INSERT INTO activity_simplified_cache(activity_id, kind, max_points, payload)
+VALUES(?, ?, ?, ?)
+"""
+SEGMENTS_INSERT_SQL = """
+INSERT INTO segments_best(distance_m, time_s, activity_id, scope, date)
+VALUES(?, ?, ?, ?, ?)
+"""
+
+
+def write_fingerprints(conn, rows: List[tuple]) -> None:
+    """Upsert ``(activity_id, fingerprint, pipeline_version, processed_at)`` rows."""
+    if rows:
+        conn.executemany(FINGERPRINT_UPSERT_SQL, rows)
+
+
+def previous_run_failed(conn, run_id) -> bool:
+    """Whether the run before ``run_id`` ended in an error or never finished.
+
+    Such a run may have committed per-activity rows without the aggregate refresh
+    that goes with them.
+    """
+    row = conn.execute(
+        "SELECT status FROM pipeline_runs WHERE id < ? ORDER BY id DESC LIMIT 1",
+        (run_id,),
+    ).fetchone()
+    return row is not None and row[0] != "ok"
+
+
+def refresh_best_segments(conn, now: datetime) -> None:
+    """Rebuild best_all / best_12w from the stored per-activity segment rows of runs."""
+    rows = conn.execute(
         """
-        INSERT INTO activities_norm(
-          activity_id, avg_hr_norm, flat_pace_sec, flat_pace_weather_sec, cadence_avg,
-          stride_len, hr_drift, decoupling, hr_norm_json, pace_smooth_json,
-          cadence_smooth_json, hr_smooth_json
-        ) VALUES (?,?,?,?,?,?,?,?,?,?,?,?)
-        ON CONFLICT(activity_id) DO UPDATE SET
-          avg_hr_norm=excluded.avg_hr_norm,
-          flat_pace_sec=excluded.flat_pace_sec,
-          flat_pace_weather_sec=excluded.flat_pace_weather_sec,
-          cadence_avg=excluded.cadence_avg,
-          stride_len=excluded.stride_len,
-          hr_drift=excluded.hr_drift,
-          decoupling=excluded.decoupling,
-          hr_norm_json=excluded.hr_norm_json,
-          pace_smooth_json=excluded.pace_smooth_json,
-          cadence_smooth_json=excluded.cadence_smooth_json,
-          hr_smooth_json=excluded.hr_smooth_json
+        SELECT s.distance_m, s.time_s, s.activity_id, s.date
+        FROM segments_best s
+        JOIN activities a ON a.activity_id = s.activity_id
+        WHERE s.scope='activity' AND s.time_s IS NOT NULL AND a.activity_type='run'
+        ORDER BY s.distance_m, s.time_s, s.date, s.activity_id
+        """
+    ).fetchall()
+    cutoff_12w = now - timedelta(days=BEST_12W_DAYS)
+    best_all: Dict[int, Tuple[float, str, str]] = {}
+    best_12w: Dict[int, Tuple[float, str, str]] = {}
+    for distance_m, time_s, activity_id, date in rows:
+        # Rows are ordered by time, so the first hit per distance is the best.
+        if distance_m not in best_all:
+            best_all[distance_m] = (time_s, activity_id, date)
+        if distance_m not in best_12w:
+            date_dt = parse_dt(date)
+            if date_dt and date_dt.tzinfo is None:
+                date_dt = date_dt.replace(tzinfo=timezone.utc)
+            if date_dt and date_dt >= cutoff_12w:
+                best_12w[distance_m] = (time_s, activity_id, date)
+
+    conn.execute("DELETE FROM segments_best WHERE scope IN ('best_all', 'best_12w')")
+    for scope, bests in (("best_all", best_all), ("best_12w", best_12w)):
+        conn.executemany(
+            SEGMENTS_INSERT_SQL,
+            [
+                (distance_m, time_s, act_id, scope, date)
+                for distance_m, (time_s, act_id, date) in bests.items()
+            ],
+        )
+
+
+METRICS_WEEKLY_COLUMNS = (
+    "week, user_id, runs, distance_m, moving_s, avg_pace_sec, flat_pace_sec, "
+    "flat_pace_weather_sec, avg_hr_norm, cadence_avg, stride_len, eff_index, "
+    "roll_pace_sec, roll_hr, roll_dist, monotony, strain"
+)
+# roll_* are 4-row windows, so a changed week also shifts the next 3 weeks with runs.
+METRICS_WEEKLY_ROLL_TRAIL = 3
+
+
+def _week_expr() -> str:
+    # Must match the week bucketing of the metrics_weekly view for each backend.
+    if db.is_postgres():
+        return "date_trunc('week', start_time)::date"
+    return "date(start_time, 'weekday 1', '-7 days')"
+
+
+def _null_safe_eq() -> str:
+    return "IS NOT DISTINCT FROM" if db.is_postgres() else "IS"
+
+
+def load_activity_weeks(conn, activity_ids: List[str]) -> Dict[int, set]:
+    """Weeks (per user) the given activities fall into, as stored in activities_calc."""
+    out: Dict[int, set] = {}
+    ids = list(activity_ids)
+    for start in range(0, len(ids), PIPELINE_LOAD_CHUNK_SIZE):
+        chunk = ids[start:start + PIPELINE_LOAD_CHUNK_SIZE]
+        rows = conn.execute(
+            f"""
+            SELECT DISTINCT user_id, {_week_expr()}
+            FROM activities_calc
+            WHERE activity_id IN ({_placeholders(len(chunk))}) AND start_time IS NOT NULL
+            """,
+            tuple(chunk),
+        ).fetchall()
+        for user_id, week in rows:
+            if week is not None:
+                out.setdefault(user_id, set()).add(week)
+    return out
+
+
+def refresh_metrics_weekly(conn, touched: Optional[Dict[int, set]] = None) -> int:
+    """Refresh metrics_weekly_mat from the metrics_weekly view.
+
+    ``touched`` maps user_id -> weeks whose activities changed; only those weeks and the
+    following rolling-window weeks are rewritten. ``None`` rebuilds the whole table.
+    Returns the number of rows written.
+    """
+    if touched is None:
+        conn.execute("DELETE FROM metrics_weekly_mat")
+        cur = conn.execute(
+            f"INSERT INTO metrics_weekly_mat({METRICS_WEEKLY_COLUMNS}) "
+            f"SELECT {METRICS_WEEKLY_COLUMNS} FROM metrics_weekly"
+        )
+        return max(cur.rowcount or 0, 0)
+
+    written = 0
+    for user_id, weeks in touched.items():
+        if not weeks:
+            continue
+        rows = conn.execute(
+            f"""
+            SELECT {METRICS_WEEKLY_COLUMNS}
+            FROM metrics_weekly
+            WHERE user_id {_null_safe_eq()} ? AND week >= ?
+            ORDER BY week
+            """,
+            (user_id, min(weeks)),
+        ).fetchall()
+        affected = set(weeks)
+        for week in weeks:
+            later = [row[0] for row in rows if row[0] > week]
+            affected.update(later[:METRICS_WEEKLY_ROLL_TRAIL])
+        affected_list = sorted(affected)
+        for start in range(0, len(affected_list), PIPELINE_LOAD_CHUNK_SIZE):
+            chunk = affected_list[start:start + PIPELINE_LOAD_CHUNK_SIZE]
+            conn.execute(
+                f"DELETE FROM metrics_weekly_mat "
+                f"WHERE user_id {_null_safe_eq()} ? AND week IN ({_placeholders(len(chunk))})",
+                (user_id, *chunk),
+            )
+        fresh = [row for row in rows if row[0] in affected]
+        conn.executemany(
+            f"INSERT INTO metrics_weekly_mat({METRICS_WEEKLY_COLUMNS}) "
+            f"VALUES ({_placeholders(len(METRICS_WEEKLY_COLUMNS.split(',')))})",
+            fresh,
+        )
+        written += len(fresh)
+    return written
+
+
+def bump_data_versions(conn, user_ids: Iterable, bumped_at: str) -> int:
+    """Increment user_data_versions for users whose derived data changed this run."""
+    rows = [(user_id, bumped_at) for user_id in sorted(set(user_ids) - {None})]
+    conn.executemany(
+        """
+        INSERT INTO user_data_versions(user_id, version, updated_at)
+        VALUES (?, 1, ?)
+        ON CONFLICT(user_id) DO UPDATE SET
+          version = user_data_versions.version + 1,
+          updated_at = excluded.updated_at
         """,
-        (
-            activity_id,
-            values.get("avg_hr_norm"),
-            values.get("flat_pace_sec"),
-            values.get("flat_pace_weather_sec"),
-            values.get("cadence_avg"),
-            values.get("stride_len"),
-            values.get("hr_drift"),
-            values.get("decoupling"),
-            values.get("hr_norm_json"),
-            values.get("pace_smooth_json"),
-            values.get("cadence_smooth_json"),
-            values.get("hr_smooth_json"),
-        ),
+        rows,
+    )
+    return len(rows)
+
+
+ACTIVITY_NORM_UPSERT_SQL = """
+INSERT INTO activities_norm(
+  activity_id, avg_hr_norm, flat_pace_sec, flat_pace_weather_sec, cadence_avg,
+  stride_len, hr_drift, decoupling, hr_norm_json, pace_smooth_json,
+  cadence_smooth_json, hr_smooth_json
+) VALUES (?,?,?,?,?,?,?,?,?,?,?,?)
+ON CONFLICT(activity_id) DO UPDATE SET
+  avg_hr_norm=excluded.avg_hr_norm,
+  flat_pace_sec=excluded.flat_pace_sec,
+  flat_pace_weather_sec=excluded.flat_pace_weather_sec,
+  cadence_avg=excluded.cadence_avg,
+  stride_len=excluded.stride_len,
+  hr_drift=excluded.hr_drift,
+  decoupling=excluded.decoupling,
+  hr_norm_json=excluded.hr_norm_json,
+  pace_smooth_json=excluded.pace_smooth_json,
+  cadence_smooth_json=excluded.cadence_smooth_json,
+  hr_smooth_json=excluded.hr_smooth_json
+"""
+
+
+def activity_norm_params(activity_id: str, values: dict) -> tuple:
+    return (
+        activity_id,
+        values.get("avg_hr_norm"),
+        values.get("flat_pace_sec"),
+        values.get("flat_pace_weather_sec"),
+        values.get("cadence_avg"),
+        values.get("stride_len"),
+        values.get("hr_drift"),
+        values.get("decoupling"),
+        values.get("hr_norm_json"),
+        values.get("pace_smooth_json"),
+        values.get("cadence_smooth_json"),
+        values.get("hr_smooth_json"),
+    )
+
+
+def upsert_activity_norm(conn, activity_id: str, values: dict) -> None:
+    conn.execute(ACTIVITY_NORM_UPSERT_SQL, activity_norm_params(activity_id, values))
+
+
+ACTIVITY_CALC_UPSERT_SQL = """
+INSERT INTO activities_calc(
+  activity_id, start_time, activity_type, distance_m, moving_s, avg_speed_mps, avg_hr_raw,
+  avg_hr_norm, flat_pace_sec, flat_pace_weather_sec, flat_time, flat_dist, cadence_avg,
+  stride_len, hr_drift, decoupling, hr_z1_s, hr_z2_s, hr_z3_s, hr_z4_s, hr_z5_s,
+  hr_zone_score, hr_zone_label, hr_max_used, hr_rest_used, hr_zone_method, user_id
+) VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)
+ON CONFLICT(activity_id) DO UPDATE SET
+  start_time=excluded.start_time,
+  activity_type=excluded.activity_type,
+  distance_m=excluded.distance_m,
+  moving_s=excluded.moving_s,
+  avg_speed_mps=excluded.avg_speed_mps,
+  avg_hr_raw=excluded.avg_hr_raw,
+  avg_hr_norm=excluded.avg_hr_norm,
+  flat_pace_sec=excluded.flat_pace_sec,
+  flat_pace_weather_sec=excluded.flat_pace_weather_sec,
+  flat_time=excluded.flat_time,
+  flat_dist=excluded.flat_dist,
+  cadence_avg=excluded.cadence_avg,
+  stride_len=excluded.stride_len,
+  hr_drift=excluded.hr_drift,
+  decoupling=excluded.decoupling,
+  hr_z1_s=excluded.hr_z1_s,
+  hr_z2_s=excluded.hr_z2_s,
+  hr_z3_s=excluded.hr_z3_s,
+  hr_z4_s=excluded.hr_z4_s,
+  hr_z5_s=excluded.hr_z5_s,
+  hr_zone_score=excluded.hr_zone_score,
+  hr_zone_label=excluded.hr_zone_label,
+  hr_max_used=excluded.hr_max_used,
+  hr_rest_used=excluded.hr_rest_used,
+  hr_zone_method=excluded.hr_zone_method,
+  user_id=excluded.user_id
+"""
+
+
+def activity_calc_params(activity_id: str, values: dict) -> tuple:
+    return (
+        activity_id,
+        values.get("start_time"),
+        values.get("activity_type"),
+        values.get("distance_m"),
+        values.get("moving_s"),
+        values.get("avg_speed_mps"),
+        values.get("avg_hr_raw"),
+        values.get("avg_hr_norm"),
+        values.get("flat_pace_sec"),
+        values.get("flat_pace_weather_sec"),
+        values.get("flat_time"),
+        values.get("flat_dist"),
+        values.get("cadence_avg"),
+        values.get("stride_len"),
+        values.get("hr_drift"),
+        values.get("decoupling"),
+        values.get("hr_z1_s"),
+        values.get("hr_z2_s"),
+        values.get("hr_z3_s"),
+        values.get("hr_z4_s"),
+        values.get("hr_z5_s"),
+        values.get("hr_zone_score"),
+        values.get("hr_zone_label"),
+        values.get("hr_max_used"),
+        values.get("hr_rest_used"),
+        values.get("hr_zone_method"),
+        values.get("user_id"),
     )
 
 
 def upsert_activity_calc(conn, activity_id: str, values: dict) -> None:
-    conn.execute(
-        """
-        INSERT INTO activities_calc(
-          activity_id, start_time, activity_type, distance_m, moving_s, avg_speed_mps, avg_hr_raw,
-          avg_hr_norm, flat_pace_sec, flat_pace_weather_sec, flat_time, flat_dist, cadence_avg,
-          stride_len, hr_drift, decoupling, hr_z1_s, hr_z2_s, hr_z3_s, hr_z4_s, hr_z5_s,
-          hr_zone_score, hr_zone_label, hr_max_used, hr_rest_used, hr_zone_method, user_id
-        ) VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)
-        ON CONFLICT(activity_id) DO UPDATE SET
-          start_time=excluded.start_time,
-          activity_type=excluded.activity_type,
-          distance_m=excluded.distance_m,
-          moving_s=excluded.moving_s,
-          avg_speed_mps=excluded.avg_speed_mps,
-          avg_hr_raw=excluded.avg_hr_raw,
-          avg_hr_norm=excluded.avg_hr_norm,
-          flat_pace_sec=excluded.flat_pace_sec,
-          flat_pace_weather_sec=excluded.flat_pace_weather_sec,
-          flat_time=excluded.flat_time,
-          flat_dist=excluded.flat_dist,
-          cadence_avg=excluded.cadence_avg,
-          stride_len=excluded.stride_len,
-          hr_drift=excluded.hr_drift,
-          decoupling=excluded.decoupling,
-          hr_z1_s=excluded.hr_z1_s,
-          hr_z2_s=excluded.hr_z2_s,
-          hr_z3_s=excluded.hr_z3_s,
-          hr_z4_s=excluded.hr_z4_s,
-          hr_z5_s=excluded.hr_z5_s,
-          hr_zone_score=excluded.hr_zone_score,
-          hr_zone_label=excluded.hr_zone_label,
-          hr_max_used=excluded.hr_max_used,
-          hr_rest_used=excluded.hr_rest_used,
-          hr_zone_method=excluded.hr_zone_method,
-          user_id=excluded.user_id
-        """,
-        (
-            activity_id,
-            values.get("start_time"),
-            values.get("activity_type"),
-            values.get("distance_m"),
-            values.get("moving_s"),
-            values.get("avg_speed_mps"),
-            values.get("avg_hr_raw"),
-            values.get("avg_hr_norm"),
-            values.get("flat_pace_sec"),
-            values.get("flat_pace_weather_sec"),
-            values.get("flat_time"),
-            values.get("flat_dist"),
-            values.get("cadence_avg"),
-            values.get("stride_len"),
-            values.get("hr_drift"),
-            values.get("decoupling"),
-            values.get("hr_z1_s"),
-            values.get("hr_z2_s"),
-            values.get("hr_z3_s"),
-            values.get("hr_z4_s"),
-            values.get("hr_z5_s"),
-            values.get("hr_zone_score"),
-            values.get("hr_zone_label"),
-            values.get("hr_max_used"),
-            values.get("hr_rest_used"),
-            values.get("hr_zone_method"),
-            values.get("user_id"),
-        ),
+    conn.execute(ACTIVITY_CALC_UPSERT_SQL, activity_calc_params(activity_id, values))
+
+
+ACTIVITY_CORE_UPSERT_SQL = """
+INSERT INTO activities(
+  source_id, activity_id, activity_type, start_time, name,
+  distance_m, moving_s, elev_gain, user_id
+) VALUES (?,?,?,?,?,?,?,?,?)
+ON CONFLICT(activity_id) DO UPDATE SET
+  source_id=excluded.source_id,
+  activity_type=excluded.activity_type,
+  start_time=excluded.start_time,
+  name=excluded.name,
+  distance_m=excluded.distance_m,
+  moving_s=excluded.moving_s,
+  elev_gain=excluded.elev_gain,
+  user_id=excluded.user_id
+"""
+
+
+def activity_core_params(values: dict) -> tuple:
+    return (
+        values.get("source_id"),
+        values.get("activity_id"),
+        values.get("activity_type"),
+        values.get("start_time"),
+        values.get("name"),
+        values.get("distance_m"),
+        values.get("moving_s"),
+        values.get("elev_gain"),
+        values.get("user_id"),
     )
 
 
 def upsert_activity_core(conn, values: dict) -> None:
-    conn.execute(
-        """
-        INSERT INTO activities(
-          source_id, activity_id, activity_type, start_time, name,
-          distance_m, moving_s, elev_gain, user_id
-        ) VALUES (?,?,?,?,?,?,?,?,?)
-        ON CONFLICT(activity_id) DO UPDATE SET
-          source_id=excluded.source_id,
-          activity_type=excluded.activity_type,
-          start_time=excluded.start_time,
-          name=excluded.name,
-          distance_m=excluded.distance_m,
-          moving_s=excluded.moving_s,
-          elev_gain=excluded.elev_gain,
-          user_id=excluded.user_id
-        """,
-        (
-            values.get("source_id"),
-            values.get("activity_id"),
-            values.get("activity_type"),
-            values.get("start_time"),
-            values.get("name"),
-            values.get("distance_m"),
-            values.get("moving_s"),
-            values.get("elev_gain"),
-            values.get("user_id"),
-        ),
+    conn.execute(ACTIVITY_CORE_UPSERT_SQL, activity_core_params(values))
+
+
+ACTIVITY_RUN_DETAILS_UPSERT_SQL = """
+INSERT INTO activity_details_run(
+  activity_id, avg_hr_raw, avg_hr_norm, flat_pace_sec, flat_pace_weather_sec,
+  cadence_avg, stride_len, hr_drift, decoupling,
+  hr_z1_s, hr_z2_s, hr_z3_s, hr_z4_s, hr_z5_s,
+  hr_zone_score, hr_zone_label, hr_max_used, hr_rest_used, hr_zone_method
+) VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)
+ON CONFLICT(activity_id) DO UPDATE SET
+  avg_hr_raw=excluded.avg_hr_raw,
+  avg_hr_norm=excluded.avg_hr_norm,
+  flat_pace_sec=excluded.flat_pace_sec,
+  flat_pace_weather_sec=excluded.flat_pace_weather_sec,
+  cadence_avg=excluded.cadence_avg,
+  stride_len=excluded.stride_len,
+  hr_drift=excluded.hr_drift,
+  decoupling=excluded.decoupling,
+  hr_z1_s=excluded.hr_z1_s,
+  hr_z2_s=excluded.hr_z2_s,
+  hr_z3_s=excluded.hr_z3_s,
+  hr_z4_s=excluded.hr_z4_s,
+  hr_z5_s=excluded.hr_z5_s,
+  hr_zone_score=excluded.hr_zone_score,
+  hr_zone_label=excluded.hr_zone_label,
+  hr_max_used=excluded.hr_max_used,
+  hr_rest_used=excluded.hr_rest_used,
+  hr_zone_method=excluded.hr_zone_method
+"""
+
+
+def activity_run_details_params(values: dict) -> tuple:
+    return (
+        values.get("activity_id"),
+        values.get("avg_hr_raw"),
+        values.get("avg_hr_norm"),
+        values.get("flat_pace_sec"),
+        values.get("flat_pace_weather_sec"),
+        values.get("cadence_avg"),
+        values.get("stride_len"),
+        values.get("hr_drift"),
+        values.get("decoupling"),
+        values.get("hr_z1_s"),
+        values.get("hr_z2_s"),
+        values.get("hr_z3_s"),
+        values.get("hr_z4_s"),
+        values.get("hr_z5_s"),
+        values.get("hr_zone_score"),
+        values.get("hr_zone_label"),
+        values.get("hr_max_used"),
+        values.get("hr_rest_used"),
+        values.get("hr_zone_method"),
     )
 
 
 def upsert_activity_run_details(conn, values: dict) -> None:
-    conn.execute(
-        """
-        INSERT INTO activity_details_run(
-          activity_id, avg_hr_raw, avg_hr_norm, flat_pace_sec, flat_pace_weather_sec,
-          cadence_avg, stride_len, hr_drift, decoupling,
-          hr_z1_s, hr_z2_s, hr_z3_s, hr_z4_s, hr_z5_s,
-          hr_zone_score, hr_zone_label, hr_max_used, hr_rest_used, hr_zone_method
-        ) VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)
-        ON CONFLICT(activity_id) DO UPDATE SET
-          avg_hr_raw=excluded.avg_hr_raw,
-          avg_hr_norm=excluded.avg_hr_norm,
-          flat_pace_sec=excluded.flat_pace_sec,
-          flat_pace_weather_sec=excluded.flat_pace_weather_sec,
-          cadence_avg=excluded.cadence_avg,
-          stride_len=excluded.stride_len,
-          hr_drift=excluded.hr_drift,
-          decoupling=excluded.decoupling,
-          hr_z1_s=excluded.hr_z1_s,
-          hr_z2_s=excluded.hr_z2_s,
-          hr_z3_s=excluded.hr_z3_s,
-          hr_z4_s=excluded.hr_z4_s,
-          hr_z5_s=excluded.hr_z5_s,
-          hr_zone_score=excluded.hr_zone_score,
-          hr_zone_label=excluded.hr_zone_label,
-          hr_max_used=excluded.hr_max_used,
-          hr_rest_used=excluded.hr_rest_used,
-          hr_zone_method=excluded.hr_zone_method
+    conn.execute(ACTIVITY_RUN_DETAILS_UPSERT_SQL, activity_run_details_params(values))
+
+
+@dataclass
+class ActivityInput:
+    source_id: int
+    activity_id: str
+    start_time: Optional[str]
+    raw_json: str
+    user_id: Optional[int]
+    fingerprint: str
+    streams: Dict[str, dict]
+    weather: Optional[dict]
+
+
+def _placeholders(n: int) -> str:
+    return ",".join("?" for _ in range(n))
+
+
+def load_streams_bulk(conn, activity_ids: List[str]) -> Dict[str, Dict[str, dict]]:
+    out: Dict[str, Dict[str, dict]] = {}
+    if not activity_ids:
+        return out
+    rows = conn.execute(
+        f"""
+        SELECT activity_id, stream_type, raw_json, data_blob
+        FROM streams_raw
+        WHERE activity_id IN ({_placeholders(len(activity_ids))})
+        ORDER BY activity_id, id
         """,
-        (
-            values.get("activity_id"),
-            values.get("avg_hr_raw"),
-            values.get("avg_hr_norm"),
-            values.get("flat_pace_sec"),
-            values.get("flat_pace_weather_sec"),
-            values.get("cadence_avg"),
-            values.get("stride_len"),
-            values.get("hr_drift"),
-            values.get("decoupling"),
-            values.get("hr_z1_s"),
-            values.get("hr_z2_s"),
-            values.get("hr_z3_s"),
-            values.get("hr_z4_s"),
-            values.get("hr_z5_s"),
-            values.get("hr_zone_score"),
-            values.get("hr_zone_label"),
-            values.get("hr_max_used"),
-            values.get("hr_rest_used"),
-            values.get("hr_zone_method"),
-        ),
+        tuple(activity_ids),
+    ).fetchall()
+    for activity_id, stream_type, raw_json, data_blob in rows:
+        payload = stream_codec.load_payload(raw_json, data_blob)
+        if payload is not None:
+            out.setdefault(activity_id, {})[stream_type] = payload
+    return out
+
+
+def load_weather_bulk(conn, activity_ids: List[str]) -> Dict[str, Optional[dict]]:
+    out: Dict[str, Optional[dict]] = {}
+    if not activity_ids:
+        return out
+    rows = conn.execute(
+        f"""
+        SELECT activity_id, raw_json
+        FROM weather_raw
+        WHERE activity_id IN ({_placeholders(len(activity_ids))})
+        ORDER BY activity_id, id
+        """,
+        tuple(activity_ids),
+    ).fetchall()
+    for activity_id, raw_json in rows:
+        if activity_id in out:
+            continue  # first row wins, matching load_weather()
+        try:
+            out[activity_id] = json.loads(raw_json)
+        except json.JSONDecodeError:
+            out[activity_id] = None
+    return out
+
+
+def iter_activity_inputs(
+    conn,
+    rows: List[Tuple[int, str, Optional[str], str, Optional[int], str]],
+    chunk_size: int = PIPELINE_LOAD_CHUNK_SIZE,
+) -> Iterator[ActivityInput]:
+    """Yield ActivityInputs, loading streams and weather with one query each per chunk.
+
+    ``rows`` are (source_id, activity_id, start_time, raw_json, user_id, fingerprint)
+    tuples; only ``chunk_size`` activities' streams are held in memory at a time.
+    """
+    chunk_size = max(1, chunk_size)
+    for offset in range(0, len(rows), chunk_size):
+        chunk = rows[offset:offset + chunk_size]
+        activity_ids = sorted({row[1] for row in chunk})
+        streams = load_streams_bulk(conn, activity_ids)
+        weather = load_weather_bulk(conn, activity_ids)
+        for source_id, activity_id, start_time, raw_json, user_id, fingerprint in chunk:
+            yield ActivityInput(
+                source_id=source_id,
+                activity_id=activity_id,
+                start_time=start_time,
+                raw_json=raw_json,
+                user_id=user_id,
+                fingerprint=fingerprint,
+                streams=streams.get(activity_id, {}),
+                weather=weather.get(activity_id),
+            )
+
+
+def compute_activity(item: ActivityInput) -> Optional[dict]:
+    """Compute every derived record for one activity (pure; safe to run in a worker process)."""
+    try:
+        raw = json.loads(item.raw_json)
+    except json.JSONDecodeError:
+        return None
+
+    streams = item.streams
+    time_stream = stream_data(streams, "time") or []
+    dist_stream = stream_data(streams, "distance") or []
+    cadence_stream = stream_data(streams, "cadence")
+    hr_stream = stream_data(streams, "heartrate")
+    flat = compute_flat_pace(streams)
+    avg_hr_norm, hr_norm, _ = normalize_hr(streams)
+    hr_drift, decoupling = compute_run_drift(streams, hr_norm)
+
+    flat_weather = adjust_pace_for_weather(
+        flat.flat_pace_sec_per_km if flat else None, item.weather
     )
 
+    distance_m = raw.get("distance") or 0.0
+    moving_s = raw.get("moving_time") or 0.0
+    avg_speed_mps = raw.get("average_speed")
+    if avg_speed_mps is None and distance_m and moving_s:
+        avg_speed_mps = distance_m / moving_s
+
+    avg_hr_raw = raw.get("average_heartrate")
+
+    pace_smooth = None
+    if time_stream and dist_stream and len(time_stream) == len(dist_stream):
+        pace_smooth, _ = smooth_pace(time_stream, dist_stream)
+
+    cadence_smooth = None
+    cadence_smooth_avg = None
+    if cadence_stream:
+        cadence_smooth, cadence_smooth_avg = smooth_cadence(cadence_stream)
+
+    hr_source = hr_norm if hr_norm else (hr_stream or [])
+    hr_smooth = None
+    hr_smooth_avg = None
+    if hr_source:
+        hr_smooth, hr_smooth_avg = smooth_hr(hr_source)
+    if hr_smooth_avg is not None:
+        avg_hr_norm = hr_smooth_avg
+
+    zone_data = None
+    if time_stream and hr_source:
+        zone_data = compute_hr_zones(time_stream, hr_source, HR_REST, HR_MAX)
+    zones = {
+        "hr_z1_s": zone_data.get("z1_s") if zone_data else None,
+        "hr_z2_s": zone_data.get("z2_s") if zone_data else None,
+        "hr_z3_s": zone_data.get("z3_s") if zone_data else None,
+        "hr_z4_s": zone_data.get("z4_s") if zone_data else None,
+        "hr_z5_s": zone_data.get("z5_s") if zone_data else None,
+        "hr_zone_score": zone_data.get("zone_score") if zone_data else None,
+        "hr_zone_label": zone_data.get("zone_label") if zone_data else None,
+        "hr_max_used": zone_data.get("hr_max_used") if zone_data else None,
+        "hr_rest_used": zone_data.get("hr_rest_used") if zone_data else None,
+        "hr_zone_method": zone_data.get("zone_method") if zone_data else None,
+    }
+
+    cadence_avg = cadence_smooth_avg or compute_cadence(streams)
+    stride_len = (
+        (avg_speed_mps * 60 / cadence_avg)
+        if avg_speed_mps is not None and cadence_avg
+        else None
+    )
+    flat_pace_sec = flat.flat_pace_sec_per_km if flat else None
+
+    activity_type = normalize_activity_type(str(raw.get("sport_type") or raw.get("type") or ""))
+    name = str(raw.get("name") or "").strip()
+    elev_gain = raw.get("total_elevation_gain")
+
+    # Chart payloads for /activity/{id}/series, built from the same in-memory
+    # arrays the API would otherwise re-read and re-parse per request.
+    chart_series = {
+        level: series.build_series(
+            time_stream,
+            dist_stream,
+            level,
+            hr=hr_stream,
+            hr_norm=hr_norm,
+            pace_smooth=pace_smooth,
+            cadence_smooth=cadence_smooth,
+            hr_smooth=hr_smooth,
+            cadence=cadence_stream,
+            altitude=stream_data(streams, "altitude"),
+        )
+        for level in series.SERIES_LEVELS
+    }
+    # max_points=N payloads for the common targets: LTTB series, Douglas-Peucker route.
+    simplified = {}
+    latlng = stream_data(streams, "latlng")
+    for target in simplify.SIMPLIFY_TARGETS:
+        if chart_series.get(1):
+            simplified[("series", target)] = series.pack(simplify.simplify_series(chart_series[1], target))
+        if latlng:
+            simplified[("route", target)] = series.pack(simplify.simplify_route(latlng, target))
+
+    result = {
+        "activity_id": item.activity_id,
+        "fingerprint": item.fingerprint,
+        "start_time": item.start_time,
+        "activity_type": activity_type,
+        "norm": {
+            "avg_hr_norm": avg_hr_norm,
+            "flat_pace_sec": flat_pace_sec,
+            "flat_pace_weather_sec": flat_weather,
+            "cadence_avg": cadence_avg,
+            "stride_len": stride_len,
+            "hr_drift": hr_drift,
+            "decoupling": decoupling,
+            "hr_norm_json": json.dumps(hr_norm) if hr_norm else None,
+            "pace_smooth_json": json.dumps(pace_smooth) if pace_smooth else None,
+            "cadence_smooth_json": json.dumps(cadence_smooth) if cadence_smooth else None,
+            "hr_smooth_json": json.dumps(hr_smooth) if hr_smooth else None,
+        },
+        "calc": {
+            "start_time": item.start_time,
+            "activity_type": activity_type,
+            "distance_m": distance_m,
+            "moving_s": moving_s,
+            "avg_speed_mps": avg_speed_mps,
+            "avg_hr_raw": avg_hr_raw,
+            "avg_hr_norm": avg_hr_norm,
+            "flat_pace_sec": flat_pace_sec,
+            "flat_pace_weather_sec": flat_weather,
+            "flat_time": flat.flat_time if flat else None,
+            "flat_dist": flat.dist if flat else None,
+            "cadence_avg": cadence_avg,
+            "stride_len": stride_len,
+            "hr_drift": hr_drift,
+            "decoupling": decoupling,
+            **zones,
+            "user_id": item.user_id,
+        },
+        "core": {
+            "source_id": item.source_id,
+            "activity_id": item.activity_id,
+            "activity_type": activity_type,
+            "start_time": item.start_time,
+            "name": name,
+            "distance_m": distance_m,
+            "moving_s": moving_s,
+            "elev_gain": elev_gain,
+            "user_id": item.user_id,
+        },
+        "run_details": None,
+        "segments": None,
+        "series": {level: series.pack(payload) for level, payload in chart_series.items()},
+        "simplified": simplified,
+    }
 
-def process():
+    if activity_type.lower() == "run":
+        # Build per-activity segments from streams.
+        if time_stream and dist_stream and len(time_stream) == len(dist_stream):
+            result["segments"] = compute_activity_segments(
+                time_stream, dist_stream, SEGMENT_TARGETS
+            ) or None
+        result["run_details"] = {
+            "activity_id": item.activity_id,
+            "avg_hr_raw": avg_hr_raw,
+            "avg_hr_norm": avg_hr_norm,
+            "flat_pace_sec": flat_pace_sec,
+            "flat_pace_weather_sec": flat_weather,
+            "cadence_avg": cadence_avg,
+            "stride_len": stride_len,
+            "hr_drift": hr_drift,
+            "decoupling": decoupling,
+            **zones,
+        }
+    return result
+
+
+def compute_chunk(items: List[ActivityInput]) -> List[Optional[dict]]:
+    return [compute_activity(item) for item in items]
+
+
+# Flush order respects the activity_details_run -> activities foreign key.
+WRITE_STATEMENTS = [
+    ("activities", ACTIVITY_CORE_UPSERT_SQL),
+    ("activities_norm", ACTIVITY_NORM_UPSERT_SQL),
+    ("activities_calc", ACTIVITY_CALC_UPSERT_SQL),
+    ("activity_details_run", ACTIVITY_RUN_DETAILS_UPSERT_SQL),
+    ("segments_best_delete", SEGMENTS_DELETE_SQL),
+    ("segments_best", SEGMENTS_INSERT_SQL),
+    ("activity_series_delete", SERIES_DELETE_SQL),
+    ("activity_series_cache", SERIES_INSERT_SQL),
+    ("activity_simplified_delete", SIMPLIFIED_DELETE_SQL),
+    ("activity_simplified_cache", SIMPLIFIED_INSERT_SQL),
+]
+
+
+class ResultWriter:
+    """Buffers computed activities per table and flushes them with executemany.
+
+    Each flush (every ``batch_size`` activities, plus a final one) is a single
+    short transaction; sizes and timings go to packages.metrics. Fingerprints are
+    only collected in ``fingerprints``: :func:`process` writes them in the same
+    transaction as the aggregate refresh, so an activity is never marked up to date
+    while its weeks, rollups or data version are not.
+    """
+
+    def __init__(self, conn, processed_at: str, batch_size: int = PIPELINE_BATCH_SIZE):
+        self.conn = conn
+        self.processed_at = processed_at
+        self.batch_size = max(1, batch_size)
+        self.written = 0
+        self._pending = 0
+        self._buffers: Dict[str, List[tuple]] = {table: [] for table, _ in WRITE_STATEMENTS}
+        self.fingerprints: List[tuple] = []
+
+    def write(self, result: Optional[dict]) -> None:
+        if result is None:
+            return
+        activity_id = result["activity_id"]
+        buffers = self._buffers
+        buffers["activities"].append(activity_core_params(result["core"]))
+        buffers["activities_norm"].append(activity_norm_params(activity_id, result["norm"]))
+        buffers["activities_calc"].append(activity_calc_params(activity_id, result["calc"]))
+        if result["run_details"]:
+            buffers["activity_details_run"].append(
+                activity_run_details_params(result["run_details"])
+            )
+        # Always cleared: an activity that lost its segments must stop feeding the bests.
+        buffers["segments_best_delete"].append((activity_id,))
+        if result["segments"]:
+            for distance_m, time_s in result["segments"].items():
+                buffers["segments_best"].append(
+                    (distance_m, time_s, activity_id, "activity", result["start_time"])
+                )
+        buffers["activity_series_delete"].append((activity_id,))
+        for level, payload in result["series"].items():
+            buffers["activity_series_cache"].append((activity_id, level, payload))
+        buffers["activity_simplified_delete"].append((activity_id,))
+        for (kind, max_points), payload in result["simplified"].items():
+            buffers["activity_simplified_cache"].append((activity_id, kind, max_points, payload))
+        self.fingerprints.append((activity_id, result["fingerprint"], PIPELINE_VERSION, self.processed_at))
+        self.written += 1
+        self._pending += 1
+        if self._pending >= self.batch_size:
+            self.flush()
+
+    def flush(self) -> None:
+        started = time.perf_counter()
+        for table, sql in WRITE_STATEMENTS:
+            rows = self._buffers[table]
+            if not rows:
+                continue
+            t0 = time.perf_counter()
+            self.conn.executemany(sql, rows)
+            metrics.inc(f"pipeline_writer_flushes_total{{table=\"{table}\"}}")
+            metrics.inc(f"pipeline_writer_rows_total{{table=\"{table}\"}}", len(rows))
+            metrics.observe(
+                f"pipeline_writer_flush_duration_seconds{{table=\"{table}\"}}",
+                time.perf_counter() - t0,
+            )
+            rows.clear()
+        self.conn.commit()
+        if self._pending:
+            metrics.inc("pipeline_writer_batches_total")
+            metrics.inc("pipeline_writer_activities_total", self._pending)
+            metrics.observe("pipeline_writer_batch_duration_seconds", time.perf_counter() - started)
+        self._pending = 0
+
+
+# Queue sentinel: the producer failed, drop whatever is still buffered.
+_ABORT = object()
+
+
+def _writer_thread(results: "queue.Queue", processed_at: str, outcome: dict) -> None:
+    try:
+        with db.connect() as conn:
+            configure_sqlite(conn)
+            writer = ResultWriter(conn, processed_at)
+            while True:
+                chunk = results.get()
+                if chunk is None or chunk is _ABORT:
+                    break
+                for result in chunk:
+                    writer.write(result)
+            if chunk is _ABORT:
+                return
+            writer.flush()
+            outcome["written"] = writer.written
+            outcome["fingerprints"] = writer.fingerprints
+    except Exception as exc:
+        outcome["error"] = exc
+        # Keep draining so the producer never blocks on a full queue.
+        while results.get() not in (None, _ABORT):
+            pass
+
+
+def _chunks(items: Iterable[ActivityInput], size: int) -> Iterator[List[ActivityInput]]:
+    chunk: List[ActivityInput] = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def run_serial(conn, items: Iterable[ActivityInput], processed_at: str) -> Tuple[int, List[tuple]]:
+    """Compute and write every item; returns the count and the fingerprint rows still to write."""
+    writer = ResultWriter(conn, processed_at)
+    for item in items:
+        writer.write(compute_activity(item))
+    writer.flush()
+    return writer.written, writer.fingerprints
+
+
+def run_parallel(items: Iterable[ActivityInput], processed_at: str, workers: int) -> Tuple[int, List[tuple]]:
+    """Fan chunks out to a process pool; a single writer thread persists results in input order.
+
+    If a worker fails, the writer drops its buffered results instead of flushing them.
+    """
+    results: "queue.Queue" = queue.Queue(maxsize=workers * 2)
+    outcome: dict = {}
+    writer = threading.Thread(
+        target=_writer_thread, args=(results, processed_at, outcome), name="pipeline-writer"
+    )
+    ctx = multiprocessing.get_context("spawn")
+    sentinel = _ABORT
+    try:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=ctx) as pool:
+            writer.start()
+            pending: Deque = deque()
+            for chunk in _chunks(items, PIPELINE_CHUNK_SIZE):
+                if "error" in outcome:
+                    break
+                pending.append(pool.submit(compute_chunk, chunk))
+                # Bound the number of in-flight chunks; results are handed over in submission order.
+                while len(pending) > workers * 2:
+                    results.put(pending.popleft().result())
+            while pending:
+                results.put(pending.popleft().result())
+        sentinel = None
+    finally:
+        if writer.is_alive():
+            results.put(sentinel)
+            writer.join()
+    if "error" in outcome:
+        raise outcome["error"]
+    return outcome.get("written", 0), outcome.get("fingerprints", [])
+
+
+def process(full: bool = False, workers: Optional[int] = None) -> Dict[str, int]:
+    """Run the pipeline.
+
+    By default only activities whose fingerprint (raw/stream/weather inputs plus the
+    algorithm signature) changed since the last run are recomputed; ``full=True``
+    reprocesses everything. ``workers`` > 1 computes activities in a process pool.
+    """
     if not db.db_exists():
         raise SystemExit("DB not initialized. Run scripts/init_db.py")
 
+    workers = PIPELINE_WORKERS if workers is None else workers
     started_at = datetime.now(timezone.utc)
     activities_processed = 0
     streams_processed = 0
     weather_processed = 0
     weather_distinct = 0
+    recomputed = 0
+    skipped = 0
     run_id = None
     status = "running"
     message = None
@@ -875,6 +1657,16 @@ def process():
                 )
                 """
             )
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS activity_fingerprints (
+                  activity_id TEXT PRIMARY KEY,
+                  fingerprint TEXT NOT NULL,
+                  pipeline_version TEXT NOT NULL,
+                  processed_at TEXT
+                )
+                """
+            )
         cur = conn.cursor()
         if db.is_postgres():
             cur.execute(
@@ -903,248 +1695,82 @@ def process():
         weather_distinct = conn.execute("SELECT COUNT(DISTINCT activity_id) FROM weather_raw").fetchone()[0]
 
         rows = conn.execute(
-            "SELECT source_id, activity_id, start_time, raw_json, user_id FROM activities_raw"
+            """
+            SELECT source_id, activity_id, start_time, raw_json, user_id
+            FROM activities_raw
+            ORDER BY activity_id, id
+            """
         ).fetchall()
-        runs_for_weekly: List[dict] = []
-        segment_targets = [400, 800, 1000, 1500, 3000, 5000, 10000]
-        best_all: Dict[int, Tuple[float, str, str]] = {}
-        best_12w: Dict[int, Tuple[float, str, str]] = {}
-        cutoff_12w = started_at - timedelta(days=84)
+        algo = algorithm_signature()
+        processed_at = started_at.isoformat()
 
         try:
+            # After a failed or interrupted run the aggregates may lag the per-activity
+            # rows it committed, so rebuild them in full rather than per touched week.
+            rebuild = full or previous_run_failed(conn, run_id)
+            stored_fingerprints = {} if full else load_fingerprints(conn)
+            stream_sigs = load_stream_signatures(conn)
+            weather_sigs = load_weather_signatures(conn)
+
+            changed = []
             for source_id, activity_id, start_time, raw_json, user_id in rows:
-                try:
-                    raw = json.loads(raw_json)
-                except json.JSONDecodeError:
-                    continue
-
-                streams = load_streams(conn, activity_id)
-                time_stream = stream_data(streams, "time") or []
-                dist_stream = stream_data(streams, "distance") or []
-                cadence_stream = stream_data(streams, "cadence")
-                hr_stream = stream_data(streams, "heartrate")
-                flat = compute_flat_pace(streams)
-                avg_hr_norm, hr_norm, _ = normalize_hr(streams)
-                hr_drift, decoupling = compute_run_drift(streams, hr_norm)
-
-                weather = load_weather(conn, activity_id)
-                flat_weather = adjust_pace_for_weather(
-                    flat.flat_pace_sec_per_km if flat else None, weather
-                )
-
-                distance_m = raw.get("distance") or 0.0
-                moving_s = raw.get("moving_time") or 0.0
-                avg_speed_mps = raw.get("average_speed")
-                if avg_speed_mps is None and distance_m and moving_s:
-                    avg_speed_mps = distance_m / moving_s
-
-                avg_hr_raw = raw.get("average_heartrate")
-
-                pace_smooth = None
-                pace_smooth_avg = None
-                if time_stream and dist_stream and len(time_stream) == len(dist_stream):
-                    pace_smooth, pace_smooth_avg = smooth_pace(time_stream, dist_stream)
-
-                cadence_smooth = None
-                cadence_smooth_avg = None
-                if cadence_stream:
-                    cadence_smooth, cadence_smooth_avg = smooth_cadence(cadence_stream)
-
-                hr_source = hr_norm if hr_norm else (hr_stream or [])
-                hr_smooth = None
-                hr_smooth_avg = None
-                if hr_source:
-                    hr_smooth, hr_smooth_avg = smooth_hr(hr_source)
-                if hr_smooth_avg is not None:
-                    avg_hr_norm = hr_smooth_avg
-
-                zone_data = None
-                if time_stream and hr_source:
-                    zone_data = compute_hr_zones(time_stream, hr_source, HR_REST, HR_MAX)
-
-                cadence_avg = cadence_smooth_avg or compute_cadence(streams)
-                stride_len = (
-                    (avg_speed_mps * 60 / cadence_avg)
-                    if avg_speed_mps is not None and cadence_avg
-                    else None
-                )
-
-                hr_norm_json = json.dumps(hr_norm) if hr_norm else None
-                pace_smooth_json = json.dumps(pace_smooth) if pace_smooth else None
-                cadence_smooth_json = json.dumps(cadence_smooth) if cadence_smooth else None
-                hr_smooth_json = json.dumps(hr_smooth) if hr_smooth else None
-
-                upsert_activity_norm(
-                    conn,
-                    activity_id,
-                    {
-                        "avg_hr_norm": avg_hr_norm,
-                        "flat_pace_sec": flat.flat_pace_sec_per_km if flat else None,
-                        "flat_pace_weather_sec": flat_weather,
-                        "cadence_avg": cadence_avg,
-                        "stride_len": stride_len,
-                        "hr_drift": hr_drift,
-                        "decoupling": decoupling,
-                        "hr_norm_json": hr_norm_json,
-                        "pace_smooth_json": pace_smooth_json,
-                        "cadence_smooth_json": cadence_smooth_json,
-                        "hr_smooth_json": hr_smooth_json,
-                    },
-                )
-
-                activity_type = normalize_activity_type(str(raw.get("sport_type") or raw.get("type") or ""))
-                name = str(raw.get("name") or "").strip()
-                elev_gain = raw.get("total_elevation_gain")
-
-                upsert_activity_calc(
-                    conn,
-                    activity_id,
-                    {
-                        "start_time": start_time,
-                        "activity_type": activity_type,
-                        "distance_m": distance_m,
-                        "moving_s": moving_s,
-                        "avg_speed_mps": avg_speed_mps,
-                        "avg_hr_raw": avg_hr_raw,
-                        "avg_hr_norm": avg_hr_norm,
-                        "flat_pace_sec": flat.flat_pace_sec_per_km if flat else None,
-                        "flat_pace_weather_sec": flat_weather,
-                        "flat_time": flat.flat_time if flat else None,
-                        "flat_dist": flat.dist if flat else None,
-                        "cadence_avg": cadence_avg,
-                        "stride_len": stride_len,
-                        "hr_drift": hr_drift,
-                        "decoupling": decoupling,
-                        "hr_z1_s": zone_data.get("z1_s") if zone_data else None,
-                        "hr_z2_s": zone_data.get("z2_s") if zone_data else None,
-                        "hr_z3_s": zone_data.get("z3_s") if zone_data else None,
-                        "hr_z4_s": zone_data.get("z4_s") if zone_data else None,
-                        "hr_z5_s": zone_data.get("z5_s") if zone_data else None,
-                        "hr_zone_score": zone_data.get("zone_score") if zone_data else None,
-                        "hr_zone_label": zone_data.get("zone_label") if zone_data else None,
-                        "hr_max_used": zone_data.get("hr_max_used") if zone_data else None,
-                        "hr_rest_used": zone_data.get("hr_rest_used") if zone_data else None,
-                        "hr_zone_method": zone_data.get("zone_method") if zone_data else None,
-                        "user_id": user_id,
-                    },
+                fingerprint = activity_fingerprint(
+                    raw_json,
+                    start_time,
+                    user_id,
+                    stream_sigs.get(activity_id),
+                    weather_sigs.get(activity_id),
+                    algo,
                 )
+                if stored_fingerprints.get(activity_id) == fingerprint:
+                    skipped += 1
+                    continue
+                changed.append((source_id, activity_id, start_time, raw_json, user_id, fingerprint))
 
-                upsert_activity_core(
-                    conn,
-                    {
-                        "source_id": source_id,
-                        "activity_id": activity_id,
-                        "activity_type": activity_type,
-                        "start_time": start_time,
-                        "name": name,
-                        "distance_m": distance_m,
-                        "moving_s": moving_s,
-                        "elev_gain": elev_gain,
-                        "user_id": user_id,
-                    },
-                )
+            changed_ids = [item[1] for item in changed]
+            # Weeks the changed activities left (old start_time) and entered (new one).
+            touched_weeks = None if rebuild else load_activity_weeks(conn, changed_ids)
 
-                if activity_type.lower() == "run":
-                    # Build per-activity segments from streams and update bests.
-                    activity_segments = {}
-                    if time_stream and dist_stream and len(time_stream) == len(dist_stream):
-                        activity_segments = compute_activity_segments(
-                            time_stream, dist_stream, segment_targets
-                        )
-                    if activity_segments:
-                        conn.execute(
-                            "DELETE FROM segments_best WHERE scope='activity' AND activity_id=?",
-                            (activity_id,),
-                        )
-                        for distance_m, time_s in activity_segments.items():
-                            conn.execute(
-                                """
-                                INSERT INTO segments_best(distance_m, time_s, activity_id, scope, date)
-                                VALUES(?, ?, ?, 'activity', ?)
-                                """,
-                                (distance_m, time_s, activity_id, start_time),
-                            )
-                        start_dt = parse_dt(start_time)
-                        for distance_m, time_s in activity_segments.items():
-                            current = best_all.get(distance_m)
-                            if current is None or time_s < current[0]:
-                                best_all[distance_m] = (time_s, activity_id, start_time)
-                            if start_dt and start_dt >= cutoff_12w:
-                                current_12w = best_12w.get(distance_m)
-                                if current_12w is None or time_s < current_12w[0]:
-                                    best_12w[distance_m] = (time_s, activity_id, start_time)
-
-                    upsert_activity_run_details(
-                        conn,
-                        {
-                            "activity_id": activity_id,
-                            "avg_hr_raw": avg_hr_raw,
-                            "avg_hr_norm": avg_hr_norm,
-                            "flat_pace_sec": flat.flat_pace_sec_per_km if flat else None,
-                            "flat_pace_weather_sec": flat_weather,
-                            "cadence_avg": cadence_avg,
-                            "stride_len": stride_len,
-                            "hr_drift": hr_drift,
-                            "decoupling": decoupling,
-                            "hr_z1_s": zone_data.get("z1_s") if zone_data else None,
-                            "hr_z2_s": zone_data.get("z2_s") if zone_data else None,
-                            "hr_z3_s": zone_data.get("z3_s") if zone_data else None,
-                            "hr_z4_s": zone_data.get("z4_s") if zone_data else None,
-                            "hr_z5_s": zone_data.get("z5_s") if zone_data else None,
-                            "hr_zone_score": zone_data.get("zone_score") if zone_data else None,
-                            "hr_zone_label": zone_data.get("zone_label") if zone_data else None,
-                            "hr_max_used": zone_data.get("hr_max_used") if zone_data else None,
-                            "hr_rest_used": zone_data.get("hr_rest_used") if zone_data else None,
-                            "hr_zone_method": zone_data.get("zone_method") if zone_data else None,
-                        },
-                    )
-                    runs_for_weekly.append(
-                        {
-                            "activity_id": activity_id,
-                            "start_time": start_time,
-                            "distance_m": distance_m,
-                            "moving_s": moving_s,
-                            "avg_speed_mps": avg_speed_mps,
-                            "avg_hr_raw": avg_hr_raw,
-                            "avg_hr_norm": avg_hr_norm,
-                            "flat_pace_sec": flat.flat_pace_sec_per_km if flat else None,
-                            "flat_pace_weather_sec": flat_weather,
-                            "cadence_avg": cadence_avg,
-                            "stride_len": stride_len,
-                            "hr_drift": hr_drift,
-                            "decoupling": decoupling,
-                            "hr_zone_score": zone_data.get("zone_score") if zone_data else None,
-                            "hr_zone_label": zone_data.get("zone_label") if zone_data else None,
-                            "flat_time": flat.flat_time if flat else None,
-                            "flat_dist": flat.dist if flat else None,
-                        }
-                    )
+            inputs = iter_activity_inputs(conn, changed)
+            if workers > 1:
+                recomputed, fingerprints = run_parallel(inputs, processed_at, workers)
+            else:
+                recomputed, fingerprints = run_serial(conn, inputs, processed_at)
+
+            if touched_weeks is not None:
+                for user_id, weeks in load_activity_weeks(conn, changed_ids).items():
+                    touched_weeks.setdefault(user_id, set()).update(weeks)
+            metrics.inc("pipeline_metrics_weekly_rows_total", refresh_metrics_weekly(conn, touched_weeks))
+            affected_users = {item[4] for item in changed}
+            if touched_weeks is not None:
+                affected_users.update(touched_weeks)
+            if rebuild:
+                affected_users.update(row[0] for row in conn.execute("SELECT DISTINCT user_id FROM activities"))
+            bump_data_versions(conn, affected_users, processed_at)
+            # Daily rollup behind the assistant's window summaries; users that have none
+            # yet (first run after the migration) are backfilled too.
+            daily_users = None if rebuild else affected_users | set(training_days.users_missing_training_daily(conn))
+            metrics.inc(
+                "pipeline_training_daily_rows_total",
+                training_days.refresh_training_daily(conn, daily_users),
+            )
 
+            # best_12w depends on the current date, so refresh it every run from the
+            # stored per-activity rows (cheap: no stream parsing).
+            refresh_best_segments(conn, started_at)
+            # Precompute /api/insights per user now that every derived table is current.
+            metrics.inc(
+                "pipeline_insights_snapshots_total",
+                insights.refresh_snapshots(conn, datetime.now(timezone.utc)),
+            )
+            # Same transaction as the aggregates: if anything above failed, these
+            # activities are recomputed (and their weeks refreshed) next run.
+            write_fingerprints(conn, fingerprints)
             conn.commit()
 
-            # Refresh best_all / best_12w from activity segments.
-            if best_all or best_12w:
-                conn.execute("DELETE FROM segments_best WHERE scope IN ('best_all', 'best_12w')")
-                for distance_m, (time_s, act_id, date) in best_all.items():
-                    conn.execute(
-                        """
-                        INSERT INTO segments_best(distance_m, time_s, activity_id, scope, date)
-                        VALUES(?, ?, ?, 'best_all', ?)
-                        """,
-                        (distance_m, time_s, act_id, date),
-                    )
-                for distance_m, (time_s, act_id, date) in best_12w.items():
-                    conn.execute(
-                        """
-                        INSERT INTO segments_best(distance_m, time_s, activity_id, scope, date)
-                        VALUES(?, ?, ?, 'best_12w', ?)
-                        """,
-                        (distance_m, time_s, act_id, date),
-                    )
-                conn.commit()
-
             status = "ok"
         except Exception as exc:
+            conn.rollback()
             status = "error"
             message = str(exc)
             print(f"Pipeline error (run_id={run_id}): {message}")
@@ -1175,17 +1801,37 @@ def process():
         json.dumps({"last_update": datetime.now(timezone.utc).isoformat()}),
         encoding="utf-8",
     )
+    return {"recomputed": recomputed, "skipped": skipped}
 
 
 def main():
+    parser = argparse.ArgumentParser(description="Process raw activities into calculated tables.")
+    parser.add_argument(
+        "--full",
+        action="store_true",
+        help="Reprocess every activity instead of only those whose inputs changed.",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help="Worker processes for per-activity computation (default: FITNESS_PIPELINE_WORKERS).",
+    )
+    args = parser.parse_args()
     try:
-        process()
+        stats = process(full=args.full, workers=args.workers)
     except KeyboardInterrupt:
         # Avoid a noisy stack trace when stopping dev runs.
         print("Interrupted.")
         raise SystemExit(130)
-    print("Processed raw -> normalized -> calculated (views read from DB)")
+    print(
+        "Processed raw -> normalized -> calculated (views read from DB): "
+        f"{stats['recomputed']} recomputed, {stats['skipped']} unchanged"
+    )
 
 
 if __name__ == "__main__":
-    main()
+    try:
+        main()
+    finally:
+        metrics.export_snapshot()
@@ -0,0 +1,239 @@
+"""NumPy implementation of the pipeline's stream signal-processing chain.
+
+Mirrors the pure-Python helpers in ``pipeline.py`` on NaN-masked float64 arrays.
+Results match the reference implementation within floating-point tolerance; sums
+that feed stored aggregates are accumulated left-to-right like the originals.
+"""
+from __future__ import annotations
+
+from typing import List, Optional, Sequence, Tuple
+
+try:
+    import numpy as np
+    from numpy.lib.stride_tricks import sliding_window_view
+except ImportError:  # pragma: no cover - optional dependency
+    np = None
+    sliding_window_view = None
+
+# EMA is evaluated in blocks so the (1 - alpha) ** -j scaling stays well inside float64 range.
+EMA_BLOCK = 64
+
+
+def available() -> bool:
+    return np is not None
+
+
+def to_array(values: Sequence[Optional[float]]):
+    return np.asarray(values, dtype=np.float64)
+
+
+def to_list(arr) -> List[Optional[float]]:
+    return [None if v != v else v for v in arr.tolist()]
+
+
+def _seq_sum(arr) -> float:
+    # Python's sum keeps the reference implementation's accumulation order.
+    return float(sum(arr.tolist()))
+
+
+def nanmean(arr) -> Optional[float]:
+    vals = arr[~np.isnan(arr)]
+    if vals.size == 0:
+        return None
+    return _seq_sum(vals) / vals.size
+
+
+def upper_median(arr) -> Optional[float]:
+    vals = np.sort(arr[~np.isnan(arr)])
+    if vals.size == 0:
+        return None
+    return float(vals[vals.size // 2])
+
+
+def drop_initial_zeros(arr):
+    out = arr.copy()
+    started = (~np.isnan(out)) & (out != 0)
+    first = int(np.argmax(started)) if started.any() else out.size
+    head = out[:first]
+    head[head == 0] = np.nan
+    return out
+
+
+def clamp_values(arr, min_val: Optional[float], max_val: Optional[float]):
+    out = arr.copy()
+    if min_val is not None:
+        out[out < min_val] = np.nan
+    if max_val is not None:
+        out[out > max_val] = np.nan
+    return out
+
+
+def _window_upper_median(windows, counts):
+    rows = np.arange(windows.shape[0])
+    ordered = np.sort(windows, axis=1)  # NaNs sort last
+    return ordered[rows, np.minimum(counts // 2, windows.shape[1] - 1)]
+
+
+def hampel_filter(arr, window: int = 5, t0: float = 3.0):
+    n = arr.size
+    if n == 0:
+        return arr.copy()
+    padded = np.concatenate([np.full(window, np.nan), arr, np.full(window, np.nan)])
+    windows = sliding_window_view(padded, 2 * window + 1)
+    counts = np.count_nonzero(~np.isnan(windows), axis=1)
+    med = _window_upper_median(windows, counts)
+    mad = _window_upper_median(np.abs(windows - med[:, None]), counts)
+    scale = 1.4826 * mad
+    with np.errstate(invalid="ignore"):
+        replace = (
+            (counts > 0)
+            & ~np.isnan(arr)
+            & (scale != 0)
+            & (np.abs(arr - med) > t0 * scale)
+        )
+    out = arr.copy()
+    out[replace] = med[replace]
+    return out
+
+
+def _ema_valid(vals, alpha: float):
+    m = vals.size
+    out = np.empty(m)
+    out[0] = vals[0]
+    if m == 1:
+        return out
+    decay = 1.0 - alpha
+    rest = vals[1:]
+    blocks = -(-rest.size // EMA_BLOCK)
+    padded = np.zeros(blocks * EMA_BLOCK)
+    padded[: rest.size] = rest
+    padded = padded.reshape(blocks, EMA_BLOCK)
+    j = np.arange(EMA_BLOCK)
+    grow = decay ** j
+    # Within a block: y_t = decay**t * (decay * carry + alpha * sum_{k<=t} v_k * decay**-k).
+    local = alpha * np.cumsum(padded / grow, axis=1) * grow
+    carry_scale = decay * grow
+    result = np.empty_like(padded)
+    carry = vals[0]
+    for b in range(blocks):
+        result[b] = local[b] + carry_scale * carry
+        carry = result[b, -1]
+    out[1:] = result.reshape(-1)[: rest.size]
+    return out
+
+
+def ema(arr, alpha: float = 0.2):
+    valid = ~np.isnan(arr)
+    if not valid.any():
+        return arr.copy()
+    if not 0 < alpha < 1:
+        vals = arr[valid]
+        smoothed = vals.copy()
+        for i in range(1, vals.size):
+            smoothed[i] = alpha * vals[i] + (1 - alpha) * smoothed[i - 1]
+    else:
+        smoothed = _ema_valid(arr[valid], alpha)
+    # Gaps carry the previous smoothed value forward (leading gaps stay NaN).
+    idx = np.where(valid, np.arange(arr.size), -1)
+    last = np.maximum.accumulate(idx)
+    out = np.full(arr.size, np.nan)
+    seen = last >= 0
+    out[seen] = smoothed[np.cumsum(valid)[seen] - 1]
+    return out
+
+
+def rolling_mean(arr, window: int = 5):
+    if window <= 1 or arr.size == 0:
+        return arr.copy()
+    half = window // 2
+    padded = np.concatenate([np.full(half, np.nan), arr, np.full(half, np.nan)])
+    windows = sliding_window_view(padded, 2 * half + 1)
+    valid = ~np.isnan(windows)
+    counts = np.count_nonzero(valid, axis=1)
+    sums = np.where(valid, windows, 0.0).sum(axis=1)
+    out = arr.copy()
+    has = counts > 0
+    out[has] = sums[has] / counts[has]
+    return out
+
+
+def compute_pace_series(time, dist):
+    n = min(time.size, dist.size)
+    pace = np.full(n, np.nan)
+    if n < 2:
+        return pace
+    dt = np.diff(time[:n])
+    dd = np.diff(dist[:n])
+    ok = (dt > 0) & (dd > 0)
+    pace[1:][ok] = dt[ok] / (dd[ok] / 1000)
+    return pace
+
+
+def smooth_pace(time: Sequence[float], dist: Sequence[float]) -> Tuple[List[Optional[float]], Optional[float]]:
+    pace = compute_pace_series(to_array(time), to_array(dist))
+    pace = clamp_values(pace, 150, 900)
+    pace = hampel_filter(pace, window=7, t0=3.0)
+    pace = ema(pace, alpha=0.12)
+    pace = rolling_mean(pace, window=5)
+    pace = clamp_values(pace, 150, 900)
+    return to_list(pace), nanmean(pace)
+
+
+def smooth_cadence(cadence: Sequence[Optional[float]]) -> Tuple[List[Optional[float]], Optional[float]]:
+    arr = drop_initial_zeros(to_array(cadence))
+    arr = clamp_values(arr, 50, 200)
+    arr = hampel_filter(arr, window=7, t0=3.0)
+    med = upper_median(arr) or 0
+    if med and med < 120:
+        arr = arr * 2
+    arr = clamp_values(arr, 120, 240)
+    cadence_avg = nanmean(arr)
+    arr = ema(arr, alpha=0.2)
+    return to_list(arr), cadence_avg
+
+
+def smooth_hr(hr: Sequence[Optional[float]]) -> Tuple[List[Optional[float]], Optional[float]]:
+    arr = drop_initial_zeros(to_array(hr))
+    arr = clamp_values(arr, 60, 210)
+    arr = hampel_filter(arr, window=7, t0=3.0)
+    arr = ema(arr, alpha=0.2)
+    return to_list(arr), nanmean(arr)
+
+
+def flat_pace_totals(
+    time: Sequence[float],
+    dist: Sequence[float],
+    alt: Optional[Sequence[float]],
+) -> Tuple[float, float]:
+    t = to_array(time)
+    d = to_array(dist)
+    dt = np.diff(t)
+    dd = np.diff(d)
+    ok = (dt > 0) & (dd > 0)
+    dt = dt[ok]
+    dd = dd[ok]
+    if alt is not None:
+        grade = np.clip(np.diff(to_array(alt))[ok] / dd, -0.1, 0.1)
+    else:
+        grade = np.zeros(dd.size)
+    # Grade-adjusted cost curve to estimate flat-equivalent pace.
+    cost = 1 + 0.045 * grade + 0.35 * grade * grade
+    flat = (dt / dd) * cost * dd
+    return _seq_sum(flat), _seq_sum(dd)
+
+
+def hr_zone_seconds(
+    time: Sequence[float],
+    hr: Sequence[Optional[float]],
+    bounds: Sequence[float],
+) -> Tuple[List[float], float]:
+    n = min(len(time), len(hr))
+    t = to_array(time[:n])
+    v = to_array(hr[:n])[1:]
+    dt = np.diff(t)
+    with np.errstate(invalid="ignore"):
+        ok = (dt > 0) & ~np.isnan(v) & (v >= 40) & (v <= 220)
+    dt = dt[ok]
+    zone = np.searchsorted(np.asarray(bounds, dtype=np.float64), v[ok], side="right")
+    per_zone = np.bincount(zone, weights=dt, minlength=len(bounds) + 1)
+    return [float(x) for x in per_zone], _seq_sum(dt)
@@ -0,0 +1,83 @@
+import asyncio
+import base64
+import importlib
+import json
+import sqlite3
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+import pytest
+from fastapi import HTTPException
+
+from apps.api.utils import encode_cursor
+from tests.fixtures.build_fixture_db import build_fixture_db
+
+
+def _raw_cursor(values):
+    return base64.urlsafe_b64encode(json.dumps(values).encode("utf-8")).decode("ascii")
+
+
+def test_keyset_pages_cover_offset_order(monkeypatch):
+    with TemporaryDirectory() as tmpdir:
+        db_path = Path(tmpdir) / "fixture.db"
+        build_fixture_db(db_path)
+        with sqlite3.connect(db_path) as conn:
+            rows = [
+                (1, f"P{i:03d}", "Run", f"2025-{1 + i % 12:02d}-{1 + i % 27:02d}T07:00:00Z", f"Run {i}", 5000.0, 1500.0, 1)
+                for i in range(57)
+            ]
+            # Ties on start_time are broken by activity_id.
+            rows.append((1, "P999", "Run", rows[0][3], "Tie", 5000.0, 1500.0, 1))
+            # No start time: not in the newest-first listing (a NULL keyset position would end paging early).
+            rows.append((1, "P000N", "Run", None, "Undated", 5000.0, 1500.0, 1))
+            conn.executemany(
+                "INSERT INTO activities(source_id, activity_id, activity_type, start_time, name, distance_m, moving_s, user_id) "
+                "VALUES(?,?,?,?,?,?,?,?)",
+                rows,
+            )
+            plan = " ".join(
+                str(r[-1])
+                for r in conn.execute(
+                    "EXPLAIN QUERY PLAN SELECT activity_id FROM activities a WHERE a.user_id=? "
+                    "AND lower(a.activity_type)=lower(?) ORDER BY a.start_time DESC, a.activity_id DESC",
+                    (1, "run"),
+                )
+            )
+        assert "idx_activities_user_type_time_cover" in plan
+        assert "TEMP B-TREE" not in plan
+
+        monkeypatch.setenv("FITNESS_DB_PATH", str(db_path))
+        monkeypatch.setenv("FITNESS_DB_URL", "")
+        import packages.config as config
+        importlib.reload(config)
+        import apps.api.routes.activities as activities
+        importlib.reload(activities)
+
+        user = {"id": 1, "username": "u1"}
+        page_args = dict(activity_type="run", start=None, end=None, user=user)
+        everything = asyncio.run(activities.activities(limit=200, offset=0, cursor=None, **page_args))["activities"]
+
+        seen = []
+        cursor = None
+        while True:
+            page = asyncio.run(activities.activities(limit=10, offset=0, cursor=cursor, **page_args))
+            seen.extend(row["activity_id"] for row in page["activities"])
+            cursor = page["next_cursor"]
+            if cursor is None:
+                break
+        assert seen == [row["activity_id"] for row in everything]
+        assert len(seen) == len(set(seen)) == 58
+
+        offset_page = asyncio.run(activities.activities(limit=10, offset=20, cursor=None, **page_args))["activities"]
+        assert [row["activity_id"] for row in offset_page] == seen[20:30]
+
+        bad_cursors = [
+            "not-a-cursor!",
+            encode_cursor("x", "y", "z"),
+            _raw_cursor([{"a": 1}, 2]),  # would bind a dict as an SQL parameter
+            _raw_cursor([None, "P001"]),
+        ]
+        for bad in bad_cursors:
+            with pytest.raises(HTTPException) as exc:
+                asyncio.run(activities.activities(limit=10, offset=0, cursor=bad, **page_args))
+            assert exc.value.status_code == 400
@@ -0,0 +1,79 @@
+import importlib
+import json
+import random
+import sqlite3
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+import pytest
+
+from packages import series
+from tests.fixtures.build_fixture_db import build_fixture_db
+
+
+def _naive_rolling(distances, values, window_m):
+    out = []
+    start = 0
+    for i, d in enumerate(distances):
+        while start < i and distances[start] < d - window_m:
+            start += 1
+        window = [v for v in values[start:i + 1] if v is not None]
+        out.append(sum(window) / len(window) if window else values[i])
+    return out
+
+
+def _body(response):
+    return json.loads(response.body)
+
+
+def test_rolling_distance_avg_matches_window_rebuild():
+    rng = random.Random(3)
+    distances = []
+    d = 0.0
+    for _ in range(2000):
+        d += rng.uniform(0, 8)
+        distances.append(d)
+    values = [None if rng.random() < 0.1 else rng.uniform(200, 400) for _ in distances]
+    expected = _naive_rolling(distances, values, 200)
+    actual = series.rolling_distance_avg(distances, values, 200)
+    assert len(actual) == len(expected)
+    for a, e in zip(actual, expected):
+        assert a == pytest.approx(e, rel=1e-9) if e is not None else a is None
+
+
+def test_series_served_from_pipeline_cache(monkeypatch):
+    with TemporaryDirectory() as tmpdir:
+        db_path = Path(tmpdir) / "fixture.db"
+        build_fixture_db(db_path)
+        monkeypatch.setenv("FITNESS_DB_PATH", str(db_path))
+        monkeypatch.setenv("FITNESS_DB_URL", "")
+        monkeypatch.setenv("FITNESS_LAST_UPDATE_PATH", str(Path(tmpdir) / "last_update.json"))
+
+        import packages.config as config
+        importlib.reload(config)
+
+        import services.processing.pipeline as pipeline
+        importlib.reload(pipeline)
+        pipeline.process()
+
+        import apps.api.routes.activities as activities
+        importlib.reload(activities)
+
+        with sqlite3.connect(db_path) as conn:
+            levels = conn.execute(
+                "SELECT downsample FROM activity_series_cache WHERE activity_id='A1' ORDER BY downsample"
+            ).fetchall()
+        assert [row[0] for row in levels] == list(series.SERIES_LEVELS)
+
+        owner = {"id": 1, "username": "u1"}
+        cached = {level: _body(activities.activity_series("A1", downsample=level, user=owner)) for level in (1, 5)}
+        assert cached[1]["series"]["time"]
+
+        with sqlite3.connect(db_path) as conn:
+            conn.execute("DELETE FROM activity_series_cache")
+        for level, payload in cached.items():
+            assert _body(activities.activity_series("A1", downsample=level, user=owner)) == payload
+        assert _body(activities.activity_series("A1", downsample=3, user=owner))["series"]["time"]
+
+        other = {"id": 2, "username": "u2"}
+        assert activities.activity_series("A1", downsample=5, user=other) == {"series": {}}
@@ -1,6 +1,16 @@
+import builtins
+import importlib
+import pickle
+import threading
 import time
+from datetime import date
 
+import pytest
+
+import packages.config as config
+from apps.api import cache
 from apps.api.cache import clear, get_or_set
+from packages.metrics import snapshot
 
 
 def test_cache_ttl():
@@ -18,3 +28,96 @@ def test_cache_ttl():
     time.sleep(1.1)
     third = get_or_set("key", 1, None, compute)
     assert third == 2
+
+
+
+@pytest.fixture
+def configure_cache(monkeypatch):
+    def apply(**env):
+        for name, value in env.items():
+            monkeypatch.setenv(name, value)
+        importlib.reload(config)
+        cache.clear()
+        return cache
+
+    yield apply
+    monkeypatch.undo()
+    importlib.reload(config)
+    cache.clear()
+
+
+def test_cache_lru_evicts_least_recently_used(configure_cache):
+    configure_cache(FITNESS_CACHE_MAX_ENTRIES="2", FITNESS_CACHE_BACKEND="memory")
+    before = snapshot()[0].get("api_cache_evictions_total", 0)
+    get_or_set("a", 60, None, lambda: "A")
+    get_or_set("b", 60, None, lambda: "B")
+    get_or_set("a", 60, None, lambda: "A2")  # refresh "a"
+    get_or_set("c", 60, None, lambda: "C")  # evicts "b"
+    assert get_or_set("a", 60, None, lambda: "A3") == "A"
+    assert get_or_set("b", 60, None, lambda: "B2") == "B2"
+    assert snapshot()[0]["api_cache_evictions_total"] - before == 2
+
+
+def test_cache_single_flight(configure_cache):
+    configure_cache(FITNESS_CACHE_BACKEND="memory")
+    calls = {"n": 0}
+    gate = threading.Event()
+
+    def compute():
+        calls["n"] += 1
+        gate.wait(1)
+        return "value"
+
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(get_or_set("k", 60, None, compute)))
+        for _ in range(8)
+    ]
+    for t in threads:
+        t.start()
+    time.sleep(0.1)
+    gate.set()
+    for t in threads:
+        t.join()
+    assert results == ["value"] * 8
+    assert calls["n"] == 1
+
+
+def test_cache_sqlite_shared_tier(configure_cache, tmp_path):
+    configure_cache(
+        FITNESS_CACHE_BACKEND="sqlite",
+        FITNESS_CACHE_SQLITE_PATH=str(tmp_path / "cache.db"),
+    )
+    value = {"pb_all": {5000: {"time_s": 1200}}, "day": date(2026, 10, 1)}
+    assert get_or_set("insights:1", 60, "v1", lambda: value) == value
+
+    # Another worker has a cold LRU but shares the file; the entry comes back as JSON.
+    cache._cache.clear()
+    assert get_or_set("insights:1", 60, "v1", lambda: "recomputed") == {
+        "pb_all": {"5000": {"time_s": 1200}},
+        "day": "2026-10-01",
+    }
+    # A new last_update invalidates the shared entry too.
+    cache._cache.clear()
+    assert get_or_set("insights:1", 60, "v2", lambda: "recomputed") == "recomputed"
+
+
+class _Exploit:
+    def __reduce__(self):
+        return (exec, ("import builtins; builtins.cache_pwned = True",))
+
+
+def test_cache_shared_tier_never_unpickles(configure_cache, tmp_path):
+    configure_cache(
+        FITNESS_CACHE_BACKEND="sqlite",
+        FITNESS_CACHE_SQLITE_PATH=str(tmp_path / "cache.db"),
+    )
+    # Someone with write access to the shared store plants a pickle payload.
+    cache._shared_tier().set("insights:2", pickle.dumps((time.time() + 60, "v1", _Exploit())), time.time() + 60)
+    assert get_or_set("insights:2", 60, "v1", lambda: "computed") == "computed"
+    assert not hasattr(builtins, "cache_pwned")
+
+    # Values JSON can't represent are still cached in-process, just not shared.
+    marker = object()
+    assert get_or_set("insights:3", 60, "v1", lambda: marker) is marker
+    assert cache._shared_tier().get("insights:3") is None
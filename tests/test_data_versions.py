@@ -0,0 +1,55 @@
+import importlib
+import json
+import sqlite3
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+from tests.fixtures.build_fixture_db import build_fixture_db
+
+
+def test_pipeline_bumps_only_affected_users(monkeypatch):
+    with TemporaryDirectory() as tmpdir:
+        db_path = Path(tmpdir) / "fixture.db"
+        build_fixture_db(db_path)
+        monkeypatch.setenv("FITNESS_DB_PATH", str(db_path))
+        monkeypatch.setenv("FITNESS_DB_URL", "")
+        monkeypatch.setenv("FITNESS_LAST_UPDATE_PATH", str(Path(tmpdir) / "last_update.json"))
+
+        import packages.config as config
+        importlib.reload(config)
+
+        import services.processing.pipeline as pipeline
+        importlib.reload(pipeline)
+
+        import apps.api.utils as utils
+        importlib.reload(utils)
+
+        pipeline.process()
+        assert utils.get_data_version(1) == "v1"
+        assert utils.get_data_version(2) == "v1"
+
+        loads = {"n": 0}
+        real_load = utils._load_data_versions
+
+        def counting_load():
+            loads["n"] += 1
+            return real_load()
+
+        monkeypatch.setattr(utils, "_load_data_versions", counting_load)
+        for _ in range(5):
+            utils.get_data_version(1)
+        assert loads["n"] == 0  # memoised until last_update.json changes
+
+        with sqlite3.connect(db_path) as conn:
+            conn.execute(
+                "UPDATE streams_raw SET raw_json=?, version=version + 1 "
+                "WHERE activity_id='A1' AND stream_type='heartrate'",
+                (json.dumps({"data": [141, 146, 151, 156, 161, 166, 170]}),),
+            )
+        assert pipeline.process() == {"recomputed": 1, "skipped": 2}
+        assert utils.get_data_version(1) == "v2"
+        assert utils.get_data_version(2) == "v1"
+        assert loads["n"] == 1
+
+        assert pipeline.process() == {"recomputed": 0, "skipped": 3}
+        assert utils.get_data_version(1) == "v2"
@@ -0,0 +1,137 @@
+import asyncio
+import importlib
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+import pytest
+
+from apps.api import cache
+from packages import metrics
+from tests.fixtures.build_fixture_db import build_fixture_db
+
+
+def _setup(monkeypatch, tmpdir, backend):
+    db_path = Path(tmpdir) / "fixture.db"
+    build_fixture_db(db_path)
+    monkeypatch.setenv("FITNESS_DB_PATH", str(db_path))
+    monkeypatch.setenv("FITNESS_DB_URL", "")
+    monkeypatch.setenv("FITNESS_DB_ASYNC_BACKEND", backend)
+    monkeypatch.setenv("FITNESS_LAST_UPDATE_PATH", str(Path(tmpdir) / "last_update.json"))
+    import packages.config as config
+    importlib.reload(config)
+    from packages import db_async
+    return db_async
+
+
+@pytest.mark.parametrize("backend", ["native", "thread"])
+def test_async_connection_backends(monkeypatch, backend):
+    with TemporaryDirectory() as tmpdir:
+        db_async = _setup(monkeypatch, tmpdir, backend)
+        if backend == "native" and db_async.aiosqlite is None:
+            pytest.skip("aiosqlite not installed")
+
+        async def run():
+            assert db_async.backend() == backend
+            async with db_async.connection() as conn:
+                cur = await conn.execute("PRAGMA foreign_keys")
+                assert (await cur.fetchone())[0] == 1
+                cur = await conn.execute("SELECT id, username FROM users WHERE id <= ? ORDER BY id", (2,))
+                rows = await db_async.dict_rows(cur)
+                await conn.execute("UPDATE users SET username='renamed' WHERE id=1")
+            with pytest.raises(RuntimeError):
+                async with db_async.connection() as conn:
+                    await conn.execute("UPDATE users SET username='rolled-back' WHERE id=1")
+                    raise RuntimeError("boom")
+            async with db_async.connection() as conn:
+                cur = await conn.execute("SELECT username FROM users WHERE id=1")
+                name = (await cur.fetchone())[0]
+            await db_async.close_pools()
+            return rows, name
+
+        rows, name = asyncio.run(run())
+        assert rows == [{"id": 1, "username": "u1"}, {"id": 2, "username": "u2"}]
+        assert name == "renamed"
+
+
+def test_native_pool_reuses_connections(monkeypatch):
+    with TemporaryDirectory() as tmpdir:
+        db_async = _setup(monkeypatch, tmpdir, "auto")
+        if db_async.aiosqlite is None:
+            pytest.skip("aiosqlite not installed")
+
+        async def run():
+            first = await db_async.acquire()
+            raw = first._conn
+            await first.close()
+            second = await db_async.acquire()
+            reused = second._conn is raw
+            await second.close()
+            return reused
+
+        # No close_pools(): the pool must still release its aiosqlite threads when the loop ends.
+        assert asyncio.run(run())
+
+
+def test_async_routes_coalesce_concurrent_misses(monkeypatch):
+    with TemporaryDirectory() as tmpdir:
+        _setup(monkeypatch, tmpdir, "auto")
+        import services.processing.pipeline as pipeline
+        importlib.reload(pipeline)
+        pipeline.process()
+        import apps.api.routes.activities as activities
+        importlib.reload(activities)
+        cache.clear()
+        user = {"id": 1, "username": "u1"}
+
+        async def run():
+            misses = metrics.snapshot()[0].get("api_cache_misses_total", 0)
+            weekly = await asyncio.gather(*(activities.weekly(limit=10, user=user) for _ in range(8)))
+            after = metrics.snapshot()[0].get("api_cache_misses_total", 0)
+            pages = await asyncio.gather(
+                *(
+                    activities.activities(
+                        activity_type="run", limit=5, offset=0, start=None, end=None, cursor=None, user=user
+                    )
+                    for _ in range(8)
+                )
+            )
+            detail = await activities.activity_detail("A1", user=user)
+            return weekly, after - misses, pages, detail
+
+        weekly, misses, pages, detail = asyncio.run(run())
+        assert weekly[0]["weekly"] and all(w == weekly[0] for w in weekly)
+        assert misses == 1
+        assert all(p == pages[0] for p in pages) and pages[0]["activities"]
+        assert detail["activity_id"] == "A1"
+
+
+def test_cancelled_leader_does_not_cancel_coalesced_waiters():
+    cache.clear()
+    calls = []
+
+    async def run():
+        release = asyncio.Event()
+
+        async def compute():
+            calls.append(len(calls))
+            await release.wait()
+            return {"call": len(calls)}
+
+        leader = asyncio.create_task(cache.get_or_set_async("cancel-key", 60, "v1", compute))
+        await asyncio.sleep(0)
+        waiters = [asyncio.create_task(cache.get_or_set_async("cancel-key", 60, "v1", compute)) for _ in range(3)]
+        await asyncio.sleep(0)
+        # The leader's client disconnects mid-compute.
+        leader.cancel()
+        await asyncio.sleep(0)
+        release.set()
+        results = await asyncio.gather(*waiters)
+        return leader, waiters, results
+
+    leader, waiters, results = asyncio.run(run())
+    assert leader.cancelled()
+    assert not any(w.cancelled() for w in waiters)
+    # One waiter took over as leader; the others coalesced onto it.
+    assert len(calls) == 2
+    assert results == [{"call": 2}] * 3
+    cache.clear()
@@ -0,0 +1,108 @@
+import importlib
+import threading
+import time
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+import pytest
+from fastapi.testclient import TestClient
+
+from packages import metrics
+from tests.fixtures.build_fixture_db import build_fixture_db
+
+
+def _setup(monkeypatch, tmpdir, **env):
+    db_path = Path(tmpdir) / "fixture.db"
+    build_fixture_db(db_path)
+    monkeypatch.setenv("FITNESS_DB_PATH", str(db_path))
+    monkeypatch.setenv("FITNESS_DB_URL", "")
+    monkeypatch.setenv("FITNESS_AUTH_DISABLED", "1")
+    monkeypatch.setenv("FITNESS_LAST_UPDATE_PATH", str(Path(tmpdir) / "last_update.json"))
+    for key, value in env.items():
+        monkeypatch.setenv(key, value)
+    import packages.config as config
+    importlib.reload(config)
+    from packages import db
+    return db, db_path
+
+
+def _counter(name):
+    return metrics.snapshot()[0].get(name, 0)
+
+
+def test_pool_reuses_configured_connections(monkeypatch):
+    with TemporaryDirectory() as tmpdir:
+        db, db_path = _setup(monkeypatch, tmpdir, FITNESS_DB_POOL_MAX="2")
+        with db.connection() as conn:
+            raw = conn._conn
+            assert conn.execute("PRAGMA foreign_keys").fetchone()[0] == 1
+            conn.execute("UPDATE users SET username='renamed' WHERE id=1")
+        with db.connection() as conn:
+            assert conn._conn is raw
+            assert conn.execute("SELECT username FROM users WHERE id=1").fetchone()[0] == "renamed"
+        assert db.pool_stats() == {"size": 1, "idle": 1, "in_use": 0, "max": 2}
+
+        # Uncommitted work is rolled back when a connection goes back to the pool.
+        conn = db.connection()
+        conn.execute("UPDATE users SET username='leaked' WHERE id=1")
+        conn.close()
+        conn.close()  # idempotent: must not release the same connection twice
+        assert db.pool_stats()["idle"] == 1
+        with db.connection() as conn:
+            assert conn.execute("SELECT username FROM users WHERE id=1").fetchone()[0] == "renamed"
+
+        # A rebuilt database file gets a fresh pool instead of the old inode.
+        build_fixture_db(db_path)
+        with db.connection() as conn:
+            assert conn._conn is not raw
+            assert conn.execute("SELECT username FROM users WHERE id=1").fetchone()[0] == "u1"
+
+
+def test_pool_waits_times_out_and_replaces_broken_connections(monkeypatch):
+    with TemporaryDirectory() as tmpdir:
+        db, _ = _setup(
+            monkeypatch, tmpdir, FITNESS_DB_POOL_MAX="1", FITNESS_DB_POOL_TIMEOUT_SEC="0.05"
+        )
+        held = db.connection()
+        timeouts = _counter("db_pool_timeouts_total")
+        with pytest.raises(db.PoolTimeout):
+            db.connection()
+        assert _counter("db_pool_timeouts_total") == timeouts + 1
+
+        pool = db.get_pool()
+        pool.timeout = 5
+        got = []
+        waiter = threading.Thread(target=lambda: got.append(db.connection()))
+        waiter.start()
+        time.sleep(0.05)
+        held.close()
+        waiter.join(2)
+        assert got and got[0]._conn is held._conn
+        raw = got[0]._conn
+        got[0].close()
+
+        # Health check: a connection that died while idle is discarded on checkout.
+        raw.close()
+        pool.ping_after = 0
+        discarded = _counter("db_pool_connections_discarded_total")
+        with db.connection() as conn:
+            assert conn._conn is not raw
+            assert conn.execute("SELECT COUNT(*) FROM users").fetchone()[0] == 2
+        assert _counter("db_pool_connections_discarded_total") == discarded + 1
+
+
+def test_request_reuses_one_connection(monkeypatch):
+    with TemporaryDirectory() as tmpdir:
+        db, _ = _setup(monkeypatch, tmpdir)
+        import apps.api.main as api_main
+        importlib.reload(api_main)
+
+        with TestClient(api_main.app) as client:
+            client.get("/api/v1/activities?limit=5")
+            before = _counter("db_pool_acquire_total")
+            resp = client.get("/api/v1/activities?limit=5")
+            assert resp.status_code == 200
+            # Auth, the ETag dependency and the route all share one checkout.
+            assert _counter("db_pool_acquire_total") == before + 1
+            assert db.pool_stats()["in_use"] == 0
+            assert "db_pool_idle 1" in client.get("/metrics").text
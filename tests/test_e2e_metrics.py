@@ -1,3 +1,4 @@
+import asyncio
 import importlib
 import os
 from pathlib import Path
@@ -56,7 +57,7 @@ def test_decoupling_series_meta_when_hr_missing():
     tmp, _, insights = _setup_db()
     user = {"id": 2, "username": "u2"}
 
-    payload = insights.insights_series(metric="decoupling", weeks=52, user=user)
+    payload = asyncio.run(insights.insights_series(metric="decoupling", weeks=52, user=user))
     meta = payload.get("series_meta") or {}
     assert meta.get("reason") == "missing_hr_streams"
 
@@ -67,10 +68,10 @@ def test_weekly_and_volume_series_present():
     tmp, activities, insights = _setup_db()
     user = {"id": 1, "username": "u1"}
 
-    weekly = activities.weekly(limit=10, user=user)
+    weekly = asyncio.run(activities.weekly(limit=10, user=user))
     assert weekly.get("weekly")
 
-    volume_series = insights.insights_series(metric="volume", weeks=52, user=user)
+    volume_series = asyncio.run(insights.insights_series(metric="volume", weeks=52, user=user))
     assert volume_series.get("series")
 
     tmp.cleanup()
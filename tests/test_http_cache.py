@@ -0,0 +1,78 @@
+import importlib
+import sqlite3
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+from fastapi.testclient import TestClient
+
+from apps.api import cache
+from apps.api.http_cache import etag_matches
+from tests.fixtures.build_fixture_db import build_fixture_db
+
+
+def test_etag_matches_weak_lists_and_wildcard():
+    etag = 'W/"abc"'
+    assert etag_matches('W/"abc"', etag)
+    assert etag_matches('"abc"', etag)
+    assert etag_matches('W/"x", W/"abc"', etag)
+    assert etag_matches("*", etag)
+    assert not etag_matches('W/"abd"', etag)
+    assert not etag_matches(None, etag)
+
+
+def test_conditional_requests(monkeypatch):
+    with TemporaryDirectory() as tmpdir:
+        db_path = Path(tmpdir) / "fixture.db"
+        build_fixture_db(db_path)
+        monkeypatch.setenv("FITNESS_DB_PATH", str(db_path))
+        monkeypatch.setenv("FITNESS_DB_URL", "")
+        monkeypatch.setenv("FITNESS_AUTH_DISABLED", "1")
+        monkeypatch.setenv("FITNESS_LAST_UPDATE_PATH", str(Path(tmpdir) / "last_update.json"))
+
+        import packages.config as config
+        importlib.reload(config)
+        import services.processing.pipeline as pipeline
+        importlib.reload(pipeline)
+        pipeline.process()
+        cache.clear()
+
+        import apps.api.main as api_main
+        importlib.reload(api_main)
+
+        with TestClient(api_main.app) as client:
+            first = client.get("/api/v1/weekly?limit=4")
+            assert first.status_code == 200
+            etag = first.headers["etag"]
+            assert first.headers["cache-control"] == "private, no-cache"
+
+            again = client.get("/api/v1/weekly?limit=4", headers={"If-None-Match": etag})
+            assert again.status_code == 304
+            assert again.content == b""
+            assert again.headers["etag"] == etag
+            # Same validator on every mount, different one for different queries.
+            assert client.get("/weekly?limit=4", headers={"If-None-Match": etag}).status_code == 304
+            assert client.get("/api/v1/weekly?limit=8", headers={"If-None-Match": etag}).status_code == 200
+
+            streams = client.get("/api/v1/activity/A1/streams")
+            assert streams.status_code == 200
+            assert "immutable" in streams.headers["cache-control"]
+            detail = client.get("/api/v1/activity/A1")
+            assert detail.headers["cache-control"] == "private, no-cache"
+            detail_etag = detail.headers["etag"]
+            assert client.get("/api/v1/activity/A1", headers={"If-None-Match": detail_etag}).status_code == 304
+
+            # Reprocessing the activity changes both the user- and activity-level validators.
+            with sqlite3.connect(db_path) as conn:
+                conn.execute(
+                    "UPDATE streams_raw SET raw_json=?, version=version + 1 "
+                    "WHERE activity_id='A1' AND stream_type='heartrate'",
+                    ('{"data": [141, 146, 151, 156, 161, 166, 170]}',),
+                )
+            pipeline.process()
+            assert client.get("/api/v1/weekly?limit=4", headers={"If-None-Match": etag}).status_code == 200
+            assert client.get("/api/v1/activity/A1", headers={"If-None-Match": detail_etag}).status_code == 200
+
+            # Unknown activities carry no validator.
+            missing = client.get("/api/v1/activity/NOPE")
+            assert missing.status_code == 404
+            assert "etag" not in missing.headers
@@ -0,0 +1,32 @@
+import sys
+from pathlib import Path
+
+from packages import ingestion_runner, metrics
+
+ROOT = Path(__file__).resolve().parents[1]
+
+
+def test_step_metrics_reach_the_parent_process():
+    before_counters, before_durations = metrics.snapshot()
+    script = (
+        "from packages import metrics\n"
+        "metrics.inc('runner_test_rows_total', 3)\n"
+        "metrics.observe_histogram('runner_test_seconds', 0.2)\n"
+        "metrics.export_snapshot()\n"
+    )
+    assert ingestion_runner._run_step("runner_test", [sys.executable, "-c", script], cwd=str(ROOT))
+    counters, durations = metrics.snapshot()
+
+    def delta(name):
+        return counters.get(name, 0) - before_counters.get(name, 0)
+
+    assert delta("runner_test_rows_total") == 3
+    assert delta("runner_test_seconds_count") == 1
+    assert delta('runner_test_seconds_bucket{le="0.25"}') == 1
+    assert durations["runner_test_seconds"] - before_durations.get("runner_test_seconds", 0) == 0.2
+    assert delta('pipeline_step_runs_total{step="runner_test"}') == 1
+
+
+def test_step_without_export_still_runs():
+    assert ingestion_runner._run_step("runner_noop", [sys.executable, "-c", "pass"])
+    assert not ingestion_runner._run_step("runner_fail", [sys.executable, "-c", "raise SystemExit(1)"])
@@ -0,0 +1,123 @@
+import asyncio
+import importlib
+import json
+import sqlite3
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+import httpx
+
+from apps.api import cache
+from tests.fixtures.build_fixture_db import build_fixture_db
+
+
+class _MockLLM:
+    """Stand-in for the Responses API: counts calls, connections and held DB connections."""
+
+    def __init__(self):
+        self.calls = 0
+        self.summaries = 0
+        self.ports = set()
+        self.db_in_use = []
+        self.status = 200
+        self.delay = 0.3
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                from packages import db
+
+                if "summarizing a long-term memory" in body["input"][0]["content"]:
+                    mock.summaries += 1
+                else:
+                    mock.calls += 1
+                mock.ports.add(self.client_address[1])
+                mock.db_in_use.append((db.pool_stats() or {}).get("in_use", 0))
+                time.sleep(mock.delay)
+                question = body["input"][1]["content"].splitlines()[0]
+                text = json.dumps({"answer": f"mock: {question}", "summary": "mock summary"})
+                data = json.dumps({"output_text": text}).encode("utf-8")
+                self.send_response(mock.status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/v1"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+
+def test_evaluate_coalesces_caches_and_releases_db(monkeypatch):
+    mock = _MockLLM()
+    try:
+        with TemporaryDirectory() as tmpdir:
+            db_path = Path(tmpdir) / "fixture.db"
+            build_fixture_db(db_path)
+            monkeypatch.setenv("FITNESS_DB_PATH", str(db_path))
+            monkeypatch.setenv("FITNESS_DB_URL", "")
+            monkeypatch.setenv("FITNESS_AUTH_DISABLED", "1")
+            monkeypatch.setenv("FITNESS_LAST_UPDATE_PATH", str(Path(tmpdir) / "last_update.json"))
+            monkeypatch.setenv("OPENAI_API_KEY", "test-key")
+            monkeypatch.setenv("OPENAI_BASE_URL", mock.url)
+            import packages.config as config
+            importlib.reload(config)
+            import apps.api.main as api_main
+            importlib.reload(api_main)
+            cache.clear()
+
+            async def run():
+                transport = httpx.ASGITransport(app=api_main.app)
+                async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+
+                    async def ask(question, session_id):
+                        resp = await client.post(
+                            "/api/v1/insights/evaluate", json={"question": question, "session_id": session_id}
+                        )
+                        assert resp.status_code == 200
+                        return resp.json()
+
+                    same = await asyncio.gather(*(ask("How am I doing?", "s1") for _ in range(5)))
+                    assert mock.calls == 1
+                    assert {r["answer"] for r in same} == {"mock: Question: How am I doing?"}
+
+                    # Same prompt (new session, no history yet): served from the cache.
+                    cached = await ask("How am I doing?", "s2")
+                    assert cached["answer"] == same[0]["answer"] and mock.calls == 1
+
+                    # Errors fall back to the deterministic answer and are not cached.
+                    mock.status = 500
+                    failed = await ask("Plan my week", "s3")
+                    assert failed["answer"].startswith("Trend summary")
+                    mock.status = 200
+                    ok = await ask("Plan my week", "s4")
+                    assert ok["answer"] == "mock: Question: Plan my week"
+                    assert mock.calls == 3
+                from apps.api import llm
+
+                await llm.close_clients()
+
+            asyncio.run(run())
+
+            assert len(mock.ports) == 1  # one keep-alive connection for every call
+            # No pooled DB connection held during a call (skip the burst, where the
+            # other four requests may still be reading their inputs).
+            assert mock.db_in_use[1:] == [0, 0, 0]
+            with sqlite3.connect(db_path) as conn:
+                sessions = conn.execute("SELECT COUNT(*) FROM insight_sessions").fetchone()[0]
+                memory = conn.execute("SELECT summary_json FROM assistant_memory WHERE user_id=1").fetchone()
+            assert sessions == 8
+            # The 6th turn triggered one background memory compaction.
+            assert mock.summaries == 1
+            assert json.loads(memory[0])["summary"] == "mock summary"
+    finally:
+        mock.server.shutdown()
@@ -0,0 +1,76 @@
+import importlib
+import json
+import sqlite3
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+from apps.api import cache
+from packages.insights import compute_insights
+from tests.fixtures.build_fixture_db import build_fixture_db
+
+
+def _setup(db_path: Path, monkeypatch):
+    monkeypatch.setenv("FITNESS_DB_PATH", str(db_path))
+    monkeypatch.setenv("FITNESS_DB_URL", "")
+    monkeypatch.setenv("FITNESS_LAST_UPDATE_PATH", str(db_path.parent / "last_update.json"))
+
+    import packages.config as config
+    importlib.reload(config)
+
+    import services.processing.pipeline as pipeline
+    importlib.reload(pipeline)
+    pipeline.process()
+
+    import apps.api.routes.insights as insights
+    cache.clear()
+    importlib.reload(insights)
+    return insights
+
+
+def test_pipeline_snapshot_is_served_and_recomputed_when_missing(monkeypatch):
+    with TemporaryDirectory() as tmpdir:
+        db_path = Path(tmpdir) / "fixture.db"
+        build_fixture_db(db_path)
+        insights = _setup(db_path, monkeypatch)
+        user = {"id": 1, "username": "u1"}
+
+        with sqlite3.connect(db_path) as conn:
+            stored = dict(conn.execute("SELECT user_id, payload_json FROM insights_snapshot").fetchall())
+            assert set(stored) == {1, 2}
+            # Mark the stored snapshot so we can tell it is served as-is.
+            payload = json.loads(stored[1])
+            payload["dist_7d_km"] = 123.0
+            conn.execute("UPDATE insights_snapshot SET payload_json=? WHERE user_id=1", (json.dumps(payload),))
+
+        served = insights.insights(user=user)
+        assert served["dist_7d_km"] == 123.0
+        assert set(served["pb_all"]) <= {5000, 10000}
+
+        with sqlite3.connect(db_path) as conn:
+            conn.execute("DELETE FROM insights_snapshot")
+            expected = compute_insights(conn, 1)
+        cache.clear()
+        recomputed = insights.insights(user=user)
+        assert recomputed["dist_7d_km"] == expected["dist_7d_km"]
+        assert recomputed["pb_all"] == expected["pb_all"]
+        with sqlite3.connect(db_path) as conn:
+            assert conn.execute("SELECT COUNT(*) FROM insights_snapshot WHERE user_id=1").fetchone()[0] == 1
+
+
+def test_stale_snapshot_is_recomputed(monkeypatch):
+    with TemporaryDirectory() as tmpdir:
+        db_path = Path(tmpdir) / "fixture.db"
+        build_fixture_db(db_path)
+        insights = _setup(db_path, monkeypatch)
+
+        with sqlite3.connect(db_path) as conn:
+            conn.execute(
+                "UPDATE insights_snapshot SET computed_at='2020-01-01T00:00:00+00:00', payload_json='{}'"
+            )
+        payload = insights.insights(user={"id": 1, "username": "u1"})
+        assert "dist_28d_km" in payload
+        with sqlite3.connect(db_path) as conn:
+            computed_at = conn.execute(
+                "SELECT computed_at FROM insights_snapshot WHERE user_id=1"
+            ).fetchone()[0]
+        assert not computed_at.startswith("2020")
@@ -0,0 +1,82 @@
+import importlib
+import json
+import os
+import sqlite3
+import sys
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+from packages import stream_codec
+from tests.fixtures.build_fixture_db import build_fixture_db
+
+
+def _activity(i):
+    return json.dumps({"id": f"L{i}", "type": "Run", "start_date": f"2026-04-{i + 1:02d}T07:00:00Z"})
+
+
+def _setup(monkeypatch, tmpdir):
+    db_path = Path(tmpdir) / "fixture.db"
+    build_fixture_db(db_path)
+    local = Path(tmpdir) / "strava"
+    (local / "data" / "streams").mkdir(parents=True)
+    (local / "data" / "weather").mkdir()
+    (local / "data" / "activities.jsonl").write_text("".join(_activity(i) + "\n" for i in range(5)))
+    for i in range(3):
+        streams = {"time": {"data": [0, 1, 2]}, "heartrate": {"data": [140 + i, 141, 142]}}
+        (local / "data" / "streams" / f"L{i}.json").write_text(json.dumps(streams))
+        (local / "data" / "weather" / f"L{i}.json").write_text(json.dumps({"hourly": {"temperature_2m": [10 + i]}}))
+    monkeypatch.setenv("FITNESS_DB_PATH", str(db_path))
+    monkeypatch.setenv("FITNESS_DB_URL", "")
+    monkeypatch.setenv("STRAVA_LOCAL_PATH", str(local))
+    import packages.config as config
+    importlib.reload(config)
+    import services.ingestion.strava_import as strava_import
+    importlib.reload(strava_import)
+    import services.ingestion.weather_import as weather_import
+    importlib.reload(weather_import)
+    return strava_import, weather_import, db_path, local / "data"
+
+
+def _run(monkeypatch, capsys, module, *args):
+    monkeypatch.setattr(sys, "argv", ["import", "--batch-size", "2", *args])
+    module.main()
+    return [int(line.rsplit(":", 1)[1]) for line in capsys.readouterr().out.splitlines()]
+
+
+def test_local_import_skips_unchanged_files_and_resumes_appends(monkeypatch, capsys):
+    with TemporaryDirectory() as tmpdir:
+        strava_import, weather_import, db_path, data = _setup(monkeypatch, tmpdir)
+        assert _run(monkeypatch, capsys, strava_import) == [5, 6]
+        assert _run(monkeypatch, capsys, weather_import) == [3]
+        with sqlite3.connect(db_path) as conn:
+            raw = conn.execute("SELECT raw_json FROM activities_raw WHERE activity_id='L3'").fetchone()[0]
+            assert raw == _activity(3)  # stored verbatim
+            assert conn.execute("SELECT COUNT(*) FROM import_manifest").fetchone()[0] == 1 + 3 + 3
+
+        # Nothing changed.
+        assert _run(monkeypatch, capsys, strava_import) == [0, 0]
+        assert _run(monkeypatch, capsys, weather_import) == [0]
+
+        # Touched but identical: the hash decides, and the new mtime is recorded.
+        for path in (data / "streams" / "L0.json", data / "activities.jsonl"):
+            stat = path.stat()
+            os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+        assert _run(monkeypatch, capsys, strava_import) == [0, 0]
+
+        # Appended lines only; a rewritten stream file is re-imported.
+        with (data / "activities.jsonl").open("a") as fh:
+            fh.write(_activity(5) + "\n" + _activity(6) + "\n")
+        (data / "streams" / "L1.json").write_text(json.dumps({"time": {"data": [0, 5]}}))
+        assert _run(monkeypatch, capsys, strava_import) == [2, 1]
+        with sqlite3.connect(db_path) as conn:
+            assert conn.execute("SELECT COUNT(*) FROM activities_raw WHERE activity_id LIKE 'L%'").fetchone()[0] == 7
+            stored = conn.execute(
+                "SELECT raw_json, data_blob FROM streams_raw WHERE activity_id='L1' AND stream_type='time'"
+            ).fetchone()
+            assert stream_codec.load_data(*stored) == [0, 5]
+
+        # A rewritten activities.jsonl is imported in full; --force re-imports everything.
+        (data / "activities.jsonl").write_text("".join(_activity(i) + "\n" for i in range(4)))
+        assert _run(monkeypatch, capsys, strava_import) == [4, 0]
+        assert _run(monkeypatch, capsys, strava_import, "--force") == [4, 5]
+        assert _run(monkeypatch, capsys, weather_import, "--force") == [3]
@@ -0,0 +1,66 @@
+import importlib
+import json
+import sqlite3
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+from tests.fixtures.build_fixture_db import build_fixture_db
+
+COLUMNS = "week, user_id, runs, distance_m, moving_s, avg_pace_sec, roll_dist, monotony, strain"
+
+
+def _load_pipeline(db_path: Path, monkeypatch):
+    monkeypatch.setenv("FITNESS_DB_PATH", str(db_path))
+    monkeypatch.setenv("FITNESS_DB_URL", "")
+    monkeypatch.setenv("FITNESS_LAST_UPDATE_PATH", str(db_path.parent / "last_update.json"))
+
+    import packages.config as config
+    importlib.reload(config)
+
+    import services.processing.pipeline as pipeline
+    importlib.reload(pipeline)
+    return pipeline
+
+
+def _rows(conn, source: str):
+    return conn.execute(f"SELECT {COLUMNS} FROM {source} ORDER BY user_id, week").fetchall()
+
+
+def test_pipeline_keeps_materialized_weekly_in_sync(monkeypatch):
+    with TemporaryDirectory() as tmpdir:
+        db_path = Path(tmpdir) / "fixture.db"
+        build_fixture_db(db_path)
+        pipeline = _load_pipeline(db_path, monkeypatch)
+
+        pipeline.process()
+        with sqlite3.connect(db_path) as conn:
+            expected = _rows(conn, "metrics_weekly")
+            assert expected
+            assert _rows(conn, "metrics_weekly_mat") == expected
+            # Sentinel in a week no activity touches: incremental runs must leave it alone.
+            conn.execute("INSERT INTO metrics_weekly_mat(week, user_id, runs) VALUES('2020-01-06', 1, 99)")
+
+            # Move A1 into a different week.
+            raw = json.loads(
+                conn.execute("SELECT raw_json FROM activities_raw WHERE activity_id='A1'").fetchone()[0]
+            )
+            raw["start_date"] = "2026-03-11T07:00:00Z"
+            conn.execute(
+                "UPDATE activities_raw SET start_time=?, raw_json=? WHERE activity_id='A1'",
+                (raw["start_date"], json.dumps(raw)),
+            )
+
+        assert pipeline.process() == {"recomputed": 1, "skipped": 2}
+        with sqlite3.connect(db_path) as conn:
+            sentinel = conn.execute(
+                "SELECT runs FROM metrics_weekly_mat WHERE week='2020-01-06'"
+            ).fetchone()
+            assert sentinel == (99,)
+            conn.execute("DELETE FROM metrics_weekly_mat WHERE week='2020-01-06'")
+            expected = _rows(conn, "metrics_weekly")
+            assert "2026-03-09" in {row[0] for row in expected}
+            assert _rows(conn, "metrics_weekly_mat") == expected
+
+        pipeline.process(full=True)
+        with sqlite3.connect(db_path) as conn:
+            assert _rows(conn, "metrics_weekly_mat") == _rows(conn, "metrics_weekly")
@@ -9,16 +9,20 @@ import pytest
 from tests.fixtures.build_fixture_db import build_fixture_db
 
 
-def _run_pipeline(db_path: Path) -> None:
+def _run_pipeline(db_path: Path, backend: str = "python") -> None:
     os.environ["FITNESS_DB_PATH"] = str(db_path)
     os.environ["FITNESS_DB_URL"] = ""
+    os.environ["FITNESS_PIPELINE_BACKEND"] = backend
 
     import packages.config as config
     importlib.reload(config)
 
     import services.processing.pipeline as pipeline
     importlib.reload(pipeline)
-    pipeline.process()
+    try:
+        pipeline.process()
+    finally:
+        os.environ.pop("FITNESS_PIPELINE_BACKEND", None)
 
 
 def _expected_flat_pace_sec() -> float:
@@ -38,11 +42,14 @@ def _expected_flat_pace_sec() -> float:
     return (flat_time / total_dist) * 1000
 
 
-def test_pipeline_outputs_are_deterministic():
+@pytest.mark.parametrize("backend", ["python", "numpy"])
+def test_pipeline_outputs_are_deterministic(backend):
+    if backend == "numpy":
+        pytest.importorskip("numpy")
     with TemporaryDirectory() as tmpdir:
         db_path = Path(tmpdir) / "fixture.db"
         build_fixture_db(db_path)
-        _run_pipeline(db_path)
+        _run_pipeline(db_path, backend)
 
         with sqlite3.connect(db_path) as conn:
             cur = conn.cursor()
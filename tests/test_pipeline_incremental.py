@@ -0,0 +1,159 @@
+import importlib
+import json
+import sqlite3
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+from services.ingestion.strava_import import STREAM_UPSERT_SQL
+from services.ingestion.weather_import import WEATHER_UPSERT_SQL
+from tests.fixtures.build_fixture_db import build_fixture_db
+
+
+def _load_pipeline(db_path: Path, monkeypatch):
+    monkeypatch.setenv("FITNESS_DB_PATH", str(db_path))
+    monkeypatch.setenv("FITNESS_DB_URL", "")
+    monkeypatch.setenv("FITNESS_LAST_UPDATE_PATH", str(db_path.parent / "last_update.json"))
+
+    import packages.config as config
+    importlib.reload(config)
+
+    import services.processing.pipeline as pipeline
+    importlib.reload(pipeline)
+    return pipeline
+
+
+def _best_rows(db_path: Path):
+    with sqlite3.connect(db_path) as conn:
+        return conn.execute(
+            """
+            SELECT scope, distance_m, time_s, activity_id
+            FROM segments_best
+            WHERE scope IN ('best_all', 'best_12w')
+            ORDER BY scope, distance_m
+            """
+        ).fetchall()
+
+
+def test_incremental_run_skips_unchanged_activities(monkeypatch):
+    with TemporaryDirectory() as tmpdir:
+        db_path = Path(tmpdir) / "fixture.db"
+        build_fixture_db(db_path)
+        pipeline = _load_pipeline(db_path, monkeypatch)
+
+        first = pipeline.process()
+        assert first == {"recomputed": 3, "skipped": 0}
+        bests = _best_rows(db_path)
+        assert any(row[0] == "best_all" for row in bests)
+
+        second = pipeline.process()
+        assert second == {"recomputed": 0, "skipped": 3}
+        assert _best_rows(db_path) == bests
+
+        # Refetching one stream only reprocesses that activity, even when the upsert keeps
+        # the row id and the payload length.
+        with sqlite3.connect(db_path) as conn:
+            raw_json, user_id = conn.execute(
+                "SELECT raw_json, user_id FROM streams_raw WHERE activity_id='A1' AND stream_type='heartrate'"
+            ).fetchone()
+            refetched = json.dumps({"data": [v + 1 for v in json.loads(raw_json)["data"]]})
+            assert len(refetched) == len(raw_json)
+            conn.execute(STREAM_UPSERT_SQL, (1, "A1", "heartrate", refetched, None, user_id))
+        third = pipeline.process()
+        assert third == {"recomputed": 1, "skipped": 2}
+
+        # Same for a weather row rewritten in place.
+        with sqlite3.connect(db_path) as conn:
+            conn.execute(WEATHER_UPSERT_SQL, ("B1", json.dumps({"temp_c": 12.5}), 1))
+            conn.execute(WEATHER_UPSERT_SQL, ("B1", json.dumps({"temp_c": 14.5}), 1))
+        assert pipeline.process() == {"recomputed": 1, "skipped": 2}
+        assert pipeline.process() == {"recomputed": 0, "skipped": 3}
+        with sqlite3.connect(db_path) as conn:
+            conn.execute(WEATHER_UPSERT_SQL, ("B1", json.dumps({"temp_c": 16.5}), 1))
+        assert pipeline.process() == {"recomputed": 1, "skipped": 2}
+
+        full = pipeline.process(full=True)
+        assert full == {"recomputed": 3, "skipped": 0}
+        assert _best_rows(db_path) == bests
+
+
+def test_algorithm_version_change_reprocesses_everything(monkeypatch):
+    with TemporaryDirectory() as tmpdir:
+        db_path = Path(tmpdir) / "fixture.db"
+        build_fixture_db(db_path)
+        pipeline = _load_pipeline(db_path, monkeypatch)
+        pipeline.process()
+
+        pipeline.PIPELINE_VERSION = "test-bump"
+        assert pipeline.process() == {"recomputed": 3, "skipped": 0}
+
+
+def test_failed_aggregate_refresh_is_replayed_next_run(monkeypatch):
+    with TemporaryDirectory() as tmpdir:
+        db_path = Path(tmpdir) / "fixture.db"
+        build_fixture_db(db_path)
+        pipeline = _load_pipeline(db_path, monkeypatch)
+        pipeline.process()
+
+        # Move A1 into another week; the aggregate refresh then fails after the
+        # per-activity rows were committed.
+        with sqlite3.connect(db_path) as conn:
+            raw = json.loads(conn.execute("SELECT raw_json FROM activities_raw WHERE activity_id='A1'").fetchone()[0])
+            raw["start_date"] = "2026-03-02T07:00:00Z"
+            conn.execute(
+                "UPDATE activities_raw SET raw_json=?, start_time=? WHERE activity_id='A1'",
+                (json.dumps(raw), raw["start_date"]),
+            )
+            old_fingerprint = conn.execute(
+                "SELECT fingerprint FROM activity_fingerprints WHERE activity_id='A1'"
+            ).fetchone()[0]
+
+        def fail(*args):
+            raise RuntimeError("boom")
+
+        monkeypatch.setattr(pipeline, "bump_data_versions", fail)
+        assert pipeline.process() == {"recomputed": 1, "skipped": 2}
+        with sqlite3.connect(db_path) as conn:
+            assert conn.execute("SELECT status FROM pipeline_runs ORDER BY id DESC").fetchone()[0] == "error"
+            # Not marked up to date: the aggregates never caught up.
+            assert conn.execute(
+                "SELECT fingerprint FROM activity_fingerprints WHERE activity_id='A1'"
+            ).fetchone()[0] == old_fingerprint
+            versions = dict(conn.execute("SELECT user_id, version FROM user_data_versions").fetchall())
+
+        monkeypatch.undo()
+        pipeline = _load_pipeline(db_path, monkeypatch)
+        assert pipeline.process() == {"recomputed": 1, "skipped": 2}
+        with sqlite3.connect(db_path) as conn:
+            columns = pipeline.METRICS_WEEKLY_COLUMNS
+            mat = conn.execute(f"SELECT {columns} FROM metrics_weekly_mat ORDER BY user_id, week").fetchall()
+            view = conn.execute(f"SELECT {columns} FROM metrics_weekly ORDER BY user_id, week").fetchall()
+            assert mat == view
+            assert "2026-02-23" in [row[0] for row in mat]
+            assert conn.execute("SELECT COUNT(*) FROM training_daily WHERE day = '2026-03-02'").fetchone()[0] == 1
+            after = dict(conn.execute("SELECT user_id, version FROM user_data_versions").fetchall())
+            assert all(after[user] > version for user, version in versions.items())
+        assert pipeline.process() == {"recomputed": 0, "skipped": 3}
+
+
+def test_activity_that_stops_being_a_run_leaves_the_bests(monkeypatch):
+    with TemporaryDirectory() as tmpdir:
+        db_path = Path(tmpdir) / "fixture.db"
+        build_fixture_db(db_path)
+        pipeline = _load_pipeline(db_path, monkeypatch)
+        pipeline.process()
+        assert "A1" in {row[3] for row in _best_rows(db_path)}
+
+        with sqlite3.connect(db_path) as conn:
+            raw = json.loads(conn.execute("SELECT raw_json FROM activities_raw WHERE activity_id='A1'").fetchone()[0])
+            raw["type"] = "Ride"
+            conn.execute("UPDATE activities_raw SET raw_json=? WHERE activity_id='A1'", (json.dumps(raw),))
+
+        assert pipeline.process() == {"recomputed": 1, "skipped": 2}
+        assert "A1" not in {row[3] for row in _best_rows(db_path)}
+        with sqlite3.connect(db_path) as conn:
+            assert conn.execute("SELECT COUNT(*) FROM segments_best WHERE activity_id='A1'").fetchone()[0] == 0
+        # Same bests as computing from scratch without A1 as a run.
+        bests = _best_rows(db_path)
+        assert bests
+        pipeline.process(full=True)
+        assert _best_rows(db_path) == bests
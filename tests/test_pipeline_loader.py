@@ -0,0 +1,47 @@
+import importlib
+import sqlite3
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+from tests.fixtures.build_fixture_db import build_fixture_db
+
+
+class CountingConnection:
+    def __init__(self, conn):
+        self._conn = conn
+        self.queries = 0
+
+    def execute(self, sql, params=()):
+        self.queries += 1
+        return self._conn.execute(sql, params)
+
+
+def test_bulk_loader_matches_per_activity_queries(monkeypatch):
+    with TemporaryDirectory() as tmpdir:
+        db_path = Path(tmpdir) / "fixture.db"
+        build_fixture_db(db_path)
+        monkeypatch.setenv("FITNESS_DB_PATH", str(db_path))
+        monkeypatch.setenv("FITNESS_DB_URL", "")
+
+        import packages.config as config
+        importlib.reload(config)
+
+        import services.processing.pipeline as pipeline
+        importlib.reload(pipeline)
+
+        with sqlite3.connect(db_path) as raw_conn:
+            conn = CountingConnection(raw_conn)
+            rows = [
+                (source_id, activity_id, start_time, raw_json, user_id, "fp")
+                for source_id, activity_id, start_time, raw_json, user_id in raw_conn.execute(
+                    "SELECT source_id, activity_id, start_time, raw_json, user_id "
+                    "FROM activities_raw ORDER BY activity_id"
+                )
+            ]
+            items = list(pipeline.iter_activity_inputs(conn, rows, chunk_size=2))
+            # Two chunks -> one streams query and one weather query each.
+            assert conn.queries == 4
+            assert [item.activity_id for item in items] == ["A1", "B1", "C1"]
+            for item in items:
+                assert item.streams == pipeline.load_streams(raw_conn, item.activity_id)
+                assert item.weather == pipeline.load_weather(raw_conn, item.activity_id)
@@ -0,0 +1,101 @@
+import importlib
+import sqlite3
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+from tests.fixtures.build_fixture_db import build_fixture_db
+
+TABLES = [
+    "activities_norm",
+    "activities_calc",
+    "activities",
+    "activity_details_run",
+    "segments_best",
+]
+
+
+def _run(db_path: Path, workers: int, monkeypatch) -> dict:
+    monkeypatch.setenv("FITNESS_DB_PATH", str(db_path))
+    monkeypatch.setenv("FITNESS_DB_URL", "")
+    monkeypatch.setenv("FITNESS_LAST_UPDATE_PATH", str(db_path.parent / "last_update.json"))
+    monkeypatch.setenv("FITNESS_PIPELINE_CHUNK_SIZE", "1")
+    monkeypatch.setenv("FITNESS_PIPELINE_BATCH_SIZE", "2")
+
+    import packages.config as config
+    importlib.reload(config)
+
+    import services.processing.pipeline as pipeline
+    importlib.reload(pipeline)
+    return pipeline.process(full=True, workers=workers)
+
+
+def _dump(db_path: Path) -> dict:
+    out = {}
+    with sqlite3.connect(db_path) as conn:
+        for table in TABLES:
+            # Wall-clock defaults differ between runs; everything else must match.
+            columns = [
+                row[1]
+                for row in conn.execute(f"PRAGMA table_info({table})")
+                if row[1] not in {"created_at", "updated_at"}
+            ]
+            out[table] = conn.execute(
+                f"SELECT {', '.join(columns)} FROM {table} ORDER BY 1, 2"
+            ).fetchall()
+    return out
+
+
+def test_parallel_run_matches_serial_run(monkeypatch):
+    with TemporaryDirectory() as tmpdir:
+        serial_db = Path(tmpdir) / "serial.db"
+        parallel_db = Path(tmpdir) / "parallel.db"
+        build_fixture_db(serial_db)
+        build_fixture_db(parallel_db)
+
+        assert _run(serial_db, 1, monkeypatch)["recomputed"] == 3
+        assert _run(parallel_db, 2, monkeypatch)["recomputed"] == 3
+
+        serial = _dump(serial_db)
+        parallel = _dump(parallel_db)
+        assert serial["activities_calc"]
+        assert serial == parallel
+
+
+def test_worker_failure_discards_buffered_results(monkeypatch):
+    from concurrent.futures import ThreadPoolExecutor
+
+    with TemporaryDirectory() as tmpdir:
+        db_path = Path(tmpdir) / "fixture.db"
+        build_fixture_db(db_path)
+        _run(db_path, 1, monkeypatch)
+        with sqlite3.connect(db_path) as conn:
+            conn.execute("DELETE FROM activity_fingerprints")
+            conn.execute("DELETE FROM activities_calc")
+
+        monkeypatch.setenv("FITNESS_PIPELINE_BATCH_SIZE", "10")
+        import packages.config as config
+        importlib.reload(config)
+
+        import services.processing.pipeline as pipeline
+        importlib.reload(pipeline)
+
+        compute_chunk = pipeline.compute_chunk
+
+        def flaky(chunk):
+            if any(item.activity_id == "C1" for item in chunk):
+                raise RuntimeError("worker died")
+            return compute_chunk(chunk)
+
+        # Threads instead of processes so the patched compute_chunk is used.
+        monkeypatch.setattr(pipeline, "ProcessPoolExecutor", lambda max_workers, mp_context: ThreadPoolExecutor(max_workers))
+        monkeypatch.setattr(pipeline, "compute_chunk", flaky)
+        pipeline.process(workers=2)
+
+        with sqlite3.connect(db_path) as conn:
+            assert conn.execute("SELECT status FROM pipeline_runs ORDER BY id DESC").fetchone()[0] == "error"
+            # A1 and B1 were computed but only buffered: nothing is written or marked done.
+            assert conn.execute("SELECT COUNT(*) FROM activities_calc").fetchone()[0] == 0
+            assert conn.execute("SELECT COUNT(*) FROM activity_fingerprints").fetchone()[0] == 0
+
+        monkeypatch.setattr(pipeline, "compute_chunk", compute_chunk)
+        assert pipeline.process(workers=2)["recomputed"] == 3
@@ -0,0 +1,44 @@
+import importlib
+import sqlite3
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+from tests.fixtures.build_fixture_db import build_fixture_db
+
+
+def test_writer_flushes_in_batches_and_reports_metrics(monkeypatch):
+    with TemporaryDirectory() as tmpdir:
+        db_path = Path(tmpdir) / "fixture.db"
+        build_fixture_db(db_path)
+        monkeypatch.setenv("FITNESS_DB_PATH", str(db_path))
+        monkeypatch.setenv("FITNESS_DB_URL", "")
+        monkeypatch.setenv("FITNESS_LAST_UPDATE_PATH", str(Path(tmpdir) / "last_update.json"))
+        monkeypatch.setenv("FITNESS_PIPELINE_BATCH_SIZE", "2")
+
+        import packages.config as config
+        importlib.reload(config)
+
+        import services.processing.pipeline as pipeline
+        importlib.reload(pipeline)
+
+        from packages import metrics
+
+        before, _ = metrics.snapshot()
+        pipeline.process(full=True)
+        after, durations = metrics.snapshot()
+
+        def delta(name):
+            return after.get(name, 0) - before.get(name, 0)
+
+        # 3 activities with batch size 2 -> one full batch plus the final flush.
+        assert delta("pipeline_writer_batches_total") == 2
+        assert delta("pipeline_writer_activities_total") == 3
+        assert delta('pipeline_writer_rows_total{table="activities_calc"}') == 3
+        assert delta('pipeline_writer_flushes_total{table="activities_calc"}') == 2
+        assert 'pipeline_writer_flush_duration_seconds{table="activities_calc"}' in durations
+
+        with sqlite3.connect(db_path) as conn:
+            assert conn.execute("SELECT COUNT(*) FROM activities_calc").fetchone()[0] == 3
+            assert conn.execute(
+                "SELECT COUNT(*) FROM activity_fingerprints"
+            ).fetchone()[0] == 3
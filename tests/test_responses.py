@@ -0,0 +1,87 @@
+import importlib
+import json
+import sqlite3
+import struct
+from array import array
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+from fastapi.testclient import TestClient
+
+from apps.api.responses import dumps, f32_frame, round_floats
+from tests.fixtures.build_fixture_db import build_fixture_db
+
+
+def test_round_floats_nested():
+    payload = {"streams": {"a": {"data": [1.23456, 2, None, [3.14159]]}}, "n": 7.77777}
+    assert round_floats(payload, 2) == {"streams": {"a": {"data": [1.23, 2, None, [3.14]]}}, "n": 7.78}
+    assert json.loads(dumps({1: [0.5]})) == {"1": [0.5]}
+
+
+def _read_frame(body: bytes) -> dict:
+    header_len = struct.unpack_from("<I", body)[0]
+    assert (4 + header_len) % 4 == 0
+    header = json.loads(body[4:4 + header_len])
+    base = 4 + header_len
+    out = {}
+    for name, col in header["columns"].items():
+        values = array("f")
+        values.frombytes(body[base + col["offset"]:base + col["offset"] + 4 * col["count"] * col["dims"]])
+        out[name] = values.tolist()
+    return out
+
+
+def test_f32_frame_layout():
+    frame = f32_frame({"a": (array("f", [1.0, 2.0]).tobytes(), 2, 1), "b": (array("f", [3.0]).tobytes(), 1, 1)})
+    assert _read_frame(frame) == {"a": [1.0, 2.0], "b": [3.0]}
+
+
+def test_streams_fast_path_gzip_and_precision(monkeypatch):
+    with TemporaryDirectory() as tmpdir:
+        db_path = Path(tmpdir) / "fixture.db"
+        build_fixture_db(db_path)
+        with sqlite3.connect(db_path) as conn:
+            conn.execute(
+                "UPDATE streams_raw SET raw_json=? WHERE activity_id='A1' AND stream_type='distance'",
+                (json.dumps({"data": [i * 2.123456 for i in range(2000)]}),),
+            )
+            conn.execute(
+                "UPDATE streams_raw SET raw_json=? WHERE activity_id='A1' AND stream_type='time'",
+                (json.dumps({"data": list(range(2000))}),),
+            )
+        monkeypatch.setenv("FITNESS_DB_PATH", str(db_path))
+        monkeypatch.setenv("FITNESS_DB_URL", "")
+        monkeypatch.setenv("FITNESS_AUTH_DISABLED", "1")
+        monkeypatch.setenv("FITNESS_GZIP_MIN_BYTES", "500")
+
+        import packages.config as config
+        importlib.reload(config)
+        import apps.api.main as api_main
+        importlib.reload(api_main)
+
+        with TestClient(api_main.app) as client:
+            resp = client.get("/api/v1/activity/A1/streams?types=distance", headers={"Accept-Encoding": "gzip"})
+            assert resp.status_code == 200
+            assert resp.headers["content-encoding"] == "gzip"
+            assert int(resp.headers["content-length"]) < len(resp.content)
+            assert resp.json()["streams"]["distance"]["data"][1] == 2.123456
+
+            rounded = client.get("/api/v1/activity/A1/streams?types=distance&precision=1")
+            assert rounded.json()["streams"]["distance"]["data"][1] == 2.1
+            assert client.get("/api/v1/activity/A1/streams?precision=9").status_code == 422
+
+            small = client.get("/api/v1/activity/A1/streams?types=heartrate", headers={"Accept-Encoding": "gzip"})
+            assert "content-encoding" not in small.headers
+
+            frame = client.get("/api/v1/activity/A1/streams?types=time,distance&format=f32&downsample=3")
+            assert frame.headers["content-type"] == "application/octet-stream"
+            columns = _read_frame(frame.content)
+            assert columns["time"][:2] == [0.0, 3.0]
+            assert columns["distance"][:2] == [0.0, array("f", [3 * 2.123456])[0]]
+
+            series = client.get("/api/v1/activity/A1/series?downsample=1&format=f32")
+            as_json = client.get("/api/v1/activity/A1/series?downsample=1").json()["series"]
+            decoded = _read_frame(series.content)
+            assert as_json["time"] and set(decoded) == set(as_json)
+            assert decoded["time"] == as_json["time"]
+            assert decoded["pace"][5] == array("f", [as_json["pace"][5]])[0]
@@ -0,0 +1,106 @@
+import random
+
+import pytest
+
+pytest.importorskip("numpy")
+
+from services.processing import pipeline
+from services.processing import signal_numpy
+
+
+def _approx_series(actual, expected):
+    assert len(actual) == len(expected)
+    for a, e in zip(actual, expected):
+        if e is None:
+            assert a is None
+        else:
+            assert a == pytest.approx(e, rel=1e-9, abs=1e-9)
+
+
+def _synthetic_run(n: int = 3600, seed: int = 7):
+    rng = random.Random(seed)
+    time = []
+    dist = []
+    alt = []
+    hr = []
+    cad = []
+    t = 0.0
+    d = 0.0
+    a = 40.0
+    for i in range(n):
+        t += 1 if rng.random() > 0.02 else 0  # occasional duplicate timestamps
+        d += max(0.0, rng.gauss(3.1, 0.4)) if rng.random() > 0.03 else 0.0
+        a += rng.gauss(0, 0.3)
+        time.append(t)
+        dist.append(round(d, 1))
+        alt.append(round(a, 1))
+        h = rng.gauss(150, 6)
+        if rng.random() < 0.01:
+            h = 230  # spikes
+        hr.append(None if rng.random() < 0.02 else round(h))
+        c = rng.gauss(84, 3) if i > 5 else 0
+        cad.append(round(c))
+    return time, dist, alt, hr, cad
+
+
+def _with_backend(backend, fn, *args):
+    previous = pipeline.PIPELINE_BACKEND
+    pipeline.PIPELINE_BACKEND = backend
+    try:
+        return fn(*args)
+    finally:
+        pipeline.PIPELINE_BACKEND = previous
+
+
+def test_filters_match_python_reference():
+    time, dist, _, hr, _ = _synthetic_run()
+    pace = pipeline.compute_pace_series(time, dist)
+    arr = signal_numpy.to_array(pace)
+    _approx_series(signal_numpy.to_list(signal_numpy.compute_pace_series(
+        signal_numpy.to_array(time), signal_numpy.to_array(dist)
+    )), pace)
+    _approx_series(
+        signal_numpy.to_list(signal_numpy.clamp_values(arr, 150, 900)),
+        pipeline.clamp_values(pace, 150, 900),
+    )
+    _approx_series(
+        signal_numpy.to_list(signal_numpy.hampel_filter(signal_numpy.to_array(hr), window=7)),
+        pipeline.hampel_filter(hr, window=7),
+    )
+    _approx_series(
+        signal_numpy.to_list(signal_numpy.ema(signal_numpy.to_array([None, None] + hr), alpha=0.12)),
+        pipeline.ema([None, None] + hr, alpha=0.12),
+    )
+    _approx_series(
+        signal_numpy.to_list(signal_numpy.rolling_mean(arr, window=5)),
+        pipeline.rolling_mean(pace, window=5),
+    )
+
+
+def test_smoothing_chain_matches_python_reference():
+    time, dist, alt, hr, cad = _synthetic_run()
+    for fn, args in (
+        (pipeline.smooth_pace, (time, dist)),
+        (pipeline.smooth_cadence, (cad,)),
+        (pipeline.smooth_hr, (hr,)),
+    ):
+        expected_series, expected_avg = _with_backend("python", fn, *args)
+        series, avg = _with_backend("numpy", fn, *args)
+        _approx_series(series, expected_series)
+        assert avg == pytest.approx(expected_avg, rel=1e-9)
+
+    streams = {
+        "time": {"data": time},
+        "distance": {"data": dist},
+        "altitude": {"data": alt},
+    }
+    expected_flat = _with_backend("python", pipeline.compute_flat_pace, streams)
+    flat = _with_backend("numpy", pipeline.compute_flat_pace, streams)
+    assert flat.flat_time == pytest.approx(expected_flat.flat_time, rel=1e-12)
+    assert flat.dist == pytest.approx(expected_flat.dist, rel=1e-12)
+
+    expected_zones = _with_backend("python", pipeline.compute_hr_zones, time, hr, 48, 185)
+    zones = _with_backend("numpy", pipeline.compute_hr_zones, time, hr, 48, 185)
+    for key in ("z1_s", "z2_s", "z3_s", "z4_s", "z5_s", "zone_score"):
+        assert zones[key] == pytest.approx(expected_zones[key], rel=1e-12)
+    assert zones["zone_label"] == expected_zones["zone_label"]
@@ -0,0 +1,111 @@
+import importlib
+import json
+import math
+import random
+import sqlite3
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+from packages import series, simplify
+from tests.fixtures.build_fixture_db import build_fixture_db, insert_stream
+
+
+def _out_and_back(n: int):
+    half = n // 2
+    out = [[51.5 + 0.0001 * i, -0.1 + 0.00002 * math.sin(i / 40)] for i in range(half)]
+    return out + out[::-1]
+
+
+def test_lttb_keeps_spikes_and_matches_pure_python(monkeypatch):
+    rng = random.Random(7)
+    n = 12000
+    time_s = list(range(n))
+    hr = [140 + 5 * math.sin(i / 300) + rng.random() for i in time_s]
+    hr[7777] = 199
+    pace = [None if i < 30 else 300 + 15 * math.sin(i / 90) for i in time_s]
+
+    indices = simplify.lttb_indices(time_s, [pace, hr, [], None], 500)
+    assert len(indices) == 500
+    assert indices[0] == 0 and indices[-1] == n - 1
+    assert indices == sorted(set(indices))
+    assert 7777 in indices
+    assert 7777 not in range(0, n, n // 500)  # stride slicing would drop the spike
+
+    monkeypatch.setattr(simplify, "np", None)
+    assert simplify.lttb_indices(time_s, [pace, hr, [], None], 500) == indices
+    assert simplify.lttb_indices(time_s[:100], [hr[:100]], 500) == list(range(100))
+
+
+def test_douglas_peucker_keeps_turnaround(monkeypatch):
+    route = _out_and_back(10000)
+    indices = simplify.douglas_peucker_indices(route, 50)
+    assert len(indices) == 50
+    assert 4999 in indices or 5000 in indices
+    monkeypatch.setattr(simplify, "np", None)
+    assert simplify.douglas_peucker_indices(route, 50) == indices
+    # Closed loops (start == end) still split.
+    loop = [[math.sin(t / 100), math.cos(t / 100)] for t in range(629)] + [[0.0, 1.0]]
+    assert len(simplify.douglas_peucker_indices(loop, 20)) == 20
+
+
+def test_max_points_served_from_pipeline_cache(monkeypatch):
+    with TemporaryDirectory() as tmpdir:
+        db_path = Path(tmpdir) / "fixture.db"
+        build_fixture_db(db_path)
+        n = 4000
+        with sqlite3.connect(db_path) as conn:
+            conn.execute("DELETE FROM streams_raw WHERE activity_id='A1'")
+            insert_stream(conn, 1, "A1", "time", list(range(n)), 1)
+            insert_stream(conn, 1, "A1", "distance", [i * 3.0 for i in range(n)], 1)
+            insert_stream(conn, 1, "A1", "heartrate", [150 + (40 if i == 2222 else 0) for i in range(n)], 1)
+            insert_stream(conn, 1, "A1", "latlng", _out_and_back(n), 1)
+        monkeypatch.setenv("FITNESS_DB_PATH", str(db_path))
+        monkeypatch.setenv("FITNESS_DB_URL", "")
+        monkeypatch.setenv("FITNESS_LAST_UPDATE_PATH", str(Path(tmpdir) / "last_update.json"))
+
+        import packages.config as config
+        importlib.reload(config)
+        import services.processing.pipeline as pipeline
+        importlib.reload(pipeline)
+        pipeline.process()
+        import apps.api.routes.activities as activities
+        importlib.reload(activities)
+
+        with sqlite3.connect(db_path) as conn:
+            keys = conn.execute(
+                "SELECT kind, max_points FROM activity_simplified_cache WHERE activity_id='A1' ORDER BY kind, max_points"
+            ).fetchall()
+        assert keys == [(kind, t) for kind in ("route", "series") for t in simplify.SIMPLIFY_TARGETS]
+
+        owner = {"id": 1, "username": "u1"}
+        cached = json.loads(activities.activity_series("A1", max_points=500, user=owner).body)["series"]
+        full = json.loads(activities.activity_series("A1", downsample=1, user=owner).body)["series"]
+        assert len(cached["time"]) == 500
+        assert max(cached["hr"]) == max(full["hr"])
+        cached_route = activities.activity_route("A1", max_points=500, user=owner)["route"]
+        assert len(cached_route) == 500
+
+        with sqlite3.connect(db_path) as conn:
+            conn.execute("DELETE FROM activity_simplified_cache")
+        assert json.loads(activities.activity_series("A1", max_points=500, user=owner).body)["series"] == cached
+        assert activities.activity_route("A1", max_points=500, user=owner)["route"] == cached_route
+        assert len(activities.activity_route("A1", max_points=40, user=owner)["route"]) == 40
+
+        streams = json.loads(
+            activities.activity_streams("A1", types="time,heartrate,latlng", max_points=300, user=owner).body
+        )["streams"]
+        assert {len(s["data"]) for s in streams.values()} == {300}
+        assert 2222 in streams["time"]["data"]
+
+        with sqlite3.connect(db_path) as conn:
+            conn.execute("DELETE FROM streams_raw WHERE activity_id='A1'")
+            insert_stream(conn, 1, "A1", "time", [], 1)
+            insert_stream(conn, 1, "A1", "heartrate", [], 1)
+        empty = json.loads(
+            activities.activity_streams("A1", types="time,heartrate", max_points=300, user=owner).body
+        )["streams"]
+        assert {k: s["data"] for k, s in empty.items()} == {"time": [], "heartrate": []}
+
+        other = {"id": 2, "username": "u2"}
+        assert activities.activity_route("A1", max_points=500, user=other) == {"route": []}
+        assert series.unpack(b"garbage") is None
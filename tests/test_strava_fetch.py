@@ -0,0 +1,203 @@
+import importlib
+import json
+import sqlite3
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+import pytest
+
+from packages import metrics, stream_codec
+from packages.throttle import QuotaExhausted, WindowQuota
+from tests.fixtures.build_fixture_db import build_fixture_db
+
+
+class _StubStrava:
+    """Streams endpoint with X-RateLimit headers, scripted failures and in-flight tracking."""
+
+    def __init__(self, failures=None, usage="1,1"):
+        self.failures = dict(failures or {})  # activity_id -> list of statuses to return first
+        self.usage = usage
+        self.requests = 0
+        self.ports = set()
+        self.auth = set()
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                activity_id = self.path.split("/")[2]
+                with stub.lock:
+                    stub.requests += 1
+                    stub.ports.add(self.client_address[1])
+                    stub.auth.add(self.headers.get("Authorization"))
+                    stub.in_flight += 1
+                    stub.max_in_flight = max(stub.max_in_flight, stub.in_flight)
+                    scripted = stub.failures.get(activity_id)
+                    status = scripted.pop(0) if scripted else 200
+                time.sleep(0.05)
+                body = {
+                    "time": {"data": [0, 1, 2]},
+                    "distance": {"data": [0.0, 3.0, 6.0]},
+                    "heartrate": {"data": [140, 141, 142]},
+                    "original_size": 3,
+                }
+                data = json.dumps(body if status == 200 else {"message": "error"}).encode("utf-8")
+                with stub.lock:
+                    stub.in_flight -= 1
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.send_header("X-RateLimit-Limit", "600,30000")
+                self.send_header("X-RateLimit-Usage", stub.usage)
+                if status == 429:
+                    self.send_header("Retry-After", "0")
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+
+def _setup(monkeypatch, tmpdir, stub, count):
+    db_path = Path(tmpdir) / "fixture.db"
+    build_fixture_db(db_path)
+    with sqlite3.connect(db_path) as conn:
+        for i in range(count):
+            raw = {"id": f"X{i}", "type": "Run", "start_date": f"2026-03-{i + 1:02d}T08:00:00Z"}
+            conn.execute(
+                "INSERT INTO activities_raw(source_id, activity_id, start_time, raw_json, user_id) VALUES(1,?,?,?,?)",
+                (f"X{i}", raw["start_date"], json.dumps(raw), 1 + i % 2),
+            )
+    for key, value in {
+        "FITNESS_DB_PATH": str(db_path),
+        "FITNESS_DB_URL": "",
+        "STRAVA_CLIENT_ID": "id",
+        "STRAVA_CLIENT_SECRET": "secret",
+        "STRAVA_REFRESH_TOKEN": "refresh",
+        "STRAVA_ACCESS_TOKEN": "token",
+        "STRAVA_EXPIRES_AT": str(int(time.time()) + 3600),
+        "FITNESS_STRAVA_API_BASE": stub.url,
+    }.items():
+        monkeypatch.setenv(key, value)
+    import packages.config as config
+    importlib.reload(config)
+    import services.ingestion.strava_api_import as api
+    importlib.reload(api)
+    monkeypatch.setattr(api, "RETRY_BASE_SEC", 0.01)
+    import services.ingestion.strava_streams_backfill as backfill
+    importlib.reload(backfill)
+    return backfill, db_path
+
+
+def test_window_quota_waits_for_short_window_and_stops_on_daily():
+    now = [1000 * 86400.0 + 10]  # 10s into a UTC day and its first 15-minute window
+    slept = []
+
+    def sleep(seconds):
+        slept.append(seconds)
+        now[0] += seconds
+
+    quota = WindowQuota((900, 86400), (3, 5), clock=lambda: now[0], sleep=sleep)
+    for _ in range(3):
+        quota.acquire()
+    assert not slept
+    quota.acquire()  # 15-minute window spent: waits for the next one
+    assert slept and 890 <= now[0] - 1000 * 86400.0 - 10 <= 900
+    quota.update([None, None], [None, 5])  # the provider says the day is used up
+    with pytest.raises(QuotaExhausted) as exc:
+        quota.acquire()
+    assert exc.value.reset_in > 900
+
+
+def test_backfill_fetches_concurrently_retries_and_batches(monkeypatch):
+    stub = _StubStrava(failures={"X1": [429], "X2": [503, 502]})
+    try:
+        with TemporaryDirectory() as tmpdir:
+            backfill, db_path = _setup(monkeypatch, tmpdir, stub, count=10)
+            retries = metrics.snapshot()[0].get("strava_retries_total", 0)
+            monkeypatch.setattr(sys, "argv", ["backfill", "--workers", "4", "--batch-size", "3"])
+            assert backfill.main() == 0
+
+            with sqlite3.connect(db_path) as conn:
+                rows = conn.execute(
+                    "SELECT activity_id, stream_type, user_id FROM streams_raw WHERE activity_id LIKE 'X%'"
+                ).fetchall()
+            assert len(rows) == 10 * 3  # original_size is not a stream
+            assert {(a, u) for a, _, u in rows} == {(f"X{i}", 1 + i % 2) for i in range(10)}
+            assert stub.requests == 10 + 3
+            assert metrics.snapshot()[0].get("strava_retries_total", 0) == retries + 3
+            assert stub.max_in_flight > 1
+            assert len(stub.ports) <= 4  # keep-alive: one connection per worker at most
+            assert stub.auth == {"Bearer token"}
+    finally:
+        stub.server.shutdown()
+
+
+def test_backfill_stops_cleanly_when_daily_quota_is_spent(monkeypatch, capsys):
+    # Daily usage at the limit minus the reserve: the first response stops further requests.
+    stub = _StubStrava(usage="1,29995")
+    try:
+        with TemporaryDirectory() as tmpdir:
+            backfill, db_path = _setup(monkeypatch, tmpdir, stub, count=10)
+            monkeypatch.setattr(sys, "argv", ["backfill", "--workers", "1"])
+            assert backfill.main() == 0
+            with sqlite3.connect(db_path) as conn:
+                fetched = conn.execute(
+                    "SELECT COUNT(DISTINCT activity_id) FROM streams_raw WHERE activity_id LIKE 'X%'"
+                ).fetchone()[0]
+            # Whatever was already in flight is kept; nothing after the quota ran out.
+            assert 1 <= fetched == stub.requests < 10
+            assert "quota exhausted" in capsys.readouterr().out
+    finally:
+        stub.server.shutdown()
+
+
+def test_backfill_skips_stored_streams_from_one_bulk_lookup(monkeypatch):
+    stub = _StubStrava()
+    try:
+        with TemporaryDirectory() as tmpdir:
+            backfill, db_path = _setup(monkeypatch, tmpdir, stub, count=3)
+            with sqlite3.connect(db_path) as conn:
+                conn.execute(
+                    "INSERT INTO streams_raw(source_id, activity_id, stream_type, raw_json, user_id) "
+                    "VALUES(1, 'X0', 'time', '{\"data\": [9]}', 1)"
+                )
+            import services.ingestion.strava_api_import as api
+
+            lookups = []
+            load = api.load_existing_streams
+            monkeypatch.setattr(api, "load_existing_streams", lambda *a: lookups.append(a) or load(*a))
+            monkeypatch.setattr(sys, "argv", ["backfill"])
+            backfill.main()
+            assert len(lookups) == 1
+            with sqlite3.connect(db_path) as conn:
+                stored = conn.execute(
+                    "SELECT raw_json FROM streams_raw WHERE activity_id='X0' AND stream_type='time'"
+                ).fetchone()[0]
+                total = conn.execute("SELECT COUNT(*) FROM streams_raw WHERE activity_id LIKE 'X%'").fetchone()[0]
+            assert json.loads(stored) == {"data": [9]}  # existing stream left alone
+            assert total == 3 * 3
+
+            monkeypatch.setattr(sys, "argv", ["backfill", "--refresh", "--after", "2026-03-01T00:00:00Z"])
+            with sqlite3.connect(db_path) as conn:
+                conn.execute("DELETE FROM streams_raw WHERE activity_id='X0' AND stream_type='distance'")
+            backfill.main()
+            with sqlite3.connect(db_path) as conn:
+                stored = conn.execute(
+                    "SELECT raw_json, data_blob FROM streams_raw WHERE activity_id='X0' AND stream_type='time'"
+                ).fetchone()
+            assert stream_codec.load_data(*stored) == [0, 1, 2]  # --refresh overwrites
+    finally:
+        stub.server.shutdown()
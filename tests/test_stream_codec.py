@@ -0,0 +1,132 @@
+import importlib
+import json
+import math
+import sqlite3
+from array import array
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+from packages import stream_codec
+from tests.fixtures.build_fixture_db import build_fixture_db
+
+
+def test_encode_round_trips_common_stream_shapes():
+    cases = [
+        list(range(0, 3600)),
+        [round(i * 3.1, 1) for i in range(3600)],
+        [round(40 + math.sin(i / 50) * 12, 1) for i in range(3600)],
+        [[51.501234 + i * 1e-5, -0.141234 - i * 2e-5] for i in range(500)],
+        [math.pi * i for i in range(100)],
+        [150, None, 152, 153],
+        [True, False, True],
+        [],
+        [7],
+    ]
+    for data in cases:
+        blob = stream_codec.encode(data)
+        assert stream_codec.is_encoded(blob)
+        assert stream_codec.decode(blob) == data
+        assert stream_codec.decode(memoryview(blob)) == data
+
+    time_blob = stream_codec.encode(cases[0])
+    assert len(time_blob) * 5 < len(json.dumps(cases[0]))
+
+
+def test_pack_and_load_payload_handle_legacy_rows():
+    payload = {"data": [1.5, 2.5, 4.0], "series_type": "distance", "resolution": "high"}
+    raw_json, blob = stream_codec.pack_payload(payload, binary=True)
+    assert "data" not in json.loads(raw_json)
+    assert stream_codec.load_payload(raw_json, blob) == payload
+
+    legacy_json, no_blob = stream_codec.pack_payload(payload, binary=False)
+    assert no_blob is None
+    assert stream_codec.load_payload(legacy_json) == payload
+    assert stream_codec.load_payload("not json") is None
+    assert stream_codec.load_data("{}", b"garbage") == []
+
+
+def test_load_f32_matches_decoded_values(monkeypatch):
+    cases = [
+        list(range(0, 3600)),
+        [round(40 + math.sin(i / 50) * 12, 1) for i in range(3600)],
+        [[51.501234 + i * 1e-5, -0.141234 - i * 2e-5] for i in range(500)],
+        [math.pi * i for i in range(100)],
+        [150, None, 152, 153],
+    ]
+
+    def expected(data, step):
+        packed, count, dims = stream_codec.f32_bytes(data[::step])
+        return packed, count, dims
+
+    for use_numpy in (True, False):
+        if not use_numpy:
+            monkeypatch.setattr(stream_codec, "np", None)
+        for data in cases:
+            raw_json, blob = stream_codec.pack_payload({"data": data}, binary=True)
+            legacy_json, _ = stream_codec.pack_payload({"data": data}, binary=False)
+            for step in (1, 7):
+                want = expected(data, step)
+                assert stream_codec.load_f32(raw_json, blob, step) == want
+                assert stream_codec.load_f32(legacy_json, None, step) == want
+
+    packed, count, dims = stream_codec.f32_bytes([[1.5, 2.5], [3.5, 4.5]])
+    assert (count, dims) == (2, 2)
+    assert array("f", packed).tolist() == [1.5, 2.5, 3.5, 4.5]
+    assert math.isnan(array("f", stream_codec.f32_bytes([1, None])[0])[1])
+    assert stream_codec.load_f32("not json") is None
+
+
+def _snapshot(db_path: Path, monkeypatch) -> dict:
+    monkeypatch.setenv("FITNESS_DB_PATH", str(db_path))
+    monkeypatch.setenv("FITNESS_DB_URL", "")
+    monkeypatch.setenv("FITNESS_LAST_UPDATE_PATH", str(db_path.parent / "last_update.json"))
+
+    import packages.config as config
+    importlib.reload(config)
+
+    import services.processing.pipeline as pipeline
+    importlib.reload(pipeline)
+    pipeline.process(full=True)
+
+    import apps.api.routes.activities as activities
+    import apps.api.routes.segments as segments
+    importlib.reload(activities)
+    importlib.reload(segments)
+
+    user = {"id": 1, "username": "u1"}
+    with sqlite3.connect(db_path) as conn:
+        calc = conn.execute(
+            "SELECT activity_id, distance_m, moving_s, avg_hr_norm, flat_pace_sec "
+            "FROM activities_calc ORDER BY activity_id"
+        ).fetchall()
+    return {
+        "calc": calc,
+        "streams": json.loads(activities.activity_streams("A1", user=user).body),
+        "laps": activities.activity_laps("A1", user=user),
+        "series": json.loads(activities.activity_series("A1", user=user).body),
+        "route": activities.activity_route("A1", user=user),
+        "segments": segments.activity_segments("A1", user=user),
+    }
+
+
+def test_binary_rows_serve_the_same_results(monkeypatch):
+    with TemporaryDirectory() as tmpdir:
+        json_db = Path(tmpdir) / "json" / "fixture.db"
+        binary_db = Path(tmpdir) / "binary" / "fixture.db"
+        build_fixture_db(json_db)
+        build_fixture_db(binary_db)
+
+        with sqlite3.connect(binary_db) as conn:
+            total = conn.execute("SELECT COUNT(*) FROM streams_raw").fetchone()[0]
+            assert stream_codec.convert_rows(conn, binary=True, batch_size=3) == total
+            assert conn.execute("SELECT COUNT(*) FROM streams_raw WHERE data_blob IS NULL").fetchone()[0] == 0
+
+        expected = _snapshot(json_db, monkeypatch)
+        assert expected["calc"]
+        assert expected["streams"]["streams"]
+        assert _snapshot(binary_db, monkeypatch) == expected
+
+        with sqlite3.connect(binary_db) as conn:
+            assert stream_codec.convert_rows(conn, binary=False) == total
+            assert conn.execute("SELECT COUNT(*) FROM streams_raw WHERE data_blob IS NOT NULL").fetchone()[0] == 0
+        assert _snapshot(binary_db, monkeypatch) == expected
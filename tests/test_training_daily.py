@@ -0,0 +1,106 @@
+import importlib
+import sqlite3
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+from packages import training_days
+from tests.fixtures.build_fixture_db import build_fixture_db
+
+NOW = datetime(2026, 10, 16, 12, 0, tzinfo=timezone.utc)
+# activity_id, start_time, distance_m, moving_s, avg_hr_norm, avg_hr_raw, best 5k, best 10k
+RUNS = [
+    ("R1", "2026-10-15T07:00:00Z", 5000.0, 1500.0, 150.0, 151.0, 1490.0, None),
+    ("R2", "2026-10-15T18:00:00Z", 3000.0, 900.0, None, 140.0, None, None),
+    ("R3", "2026-10-01T06:00:00Z", 10000.0, 3000.0, 145.0, 146.0, 1450.0, 2950.0),
+    ("R4", "2025-12-30T23:30:00Z", 8000.0, 2400.0, None, None, 1480.0, None),
+    ("R5", "2024-01-10T10:00:00Z", 12000.0, 3900.0, 140.0, 141.0, 1500.0, 3100.0),
+]
+
+
+def _setup(monkeypatch, tmpdir):
+    db_path = Path(tmpdir) / "fixture.db"
+    build_fixture_db(db_path)
+    monkeypatch.setenv("FITNESS_DB_PATH", str(db_path))
+    monkeypatch.setenv("FITNESS_DB_URL", "")
+    monkeypatch.setenv("FITNESS_LAST_UPDATE_PATH", str(Path(tmpdir) / "last_update.json"))
+    import packages.config as config
+    importlib.reload(config)
+    import services.processing.pipeline as pipeline
+    importlib.reload(pipeline)
+    return pipeline, db_path
+
+
+def test_pipeline_maintains_daily_rollup(monkeypatch):
+    with TemporaryDirectory() as tmpdir:
+        pipeline, db_path = _setup(monkeypatch, tmpdir)
+        pipeline.process()
+        with sqlite3.connect(db_path) as conn:
+            rows = conn.execute(
+                "SELECT user_id, day, runs, distance_m, cum_runs FROM training_daily ORDER BY user_id, day"
+            ).fetchall()
+            assert rows == [
+                (1, "2026-02-01", 1, 1000.0, 1),
+                (1, "2026-02-02", 1, 1000.0, 2),
+                (2, "2026-02-02", 1, 1000.0, 1),
+            ]
+            # Existing installs: users without rows are backfilled by the next incremental run.
+            conn.execute("DELETE FROM training_daily WHERE user_id = 2")
+        pipeline.process()
+        with sqlite3.connect(db_path) as conn:
+            assert conn.execute("SELECT COUNT(*) FROM training_daily WHERE user_id = 2").fetchone()[0] == 1
+
+
+def test_window_summaries_from_prefix_sums(monkeypatch):
+    with TemporaryDirectory() as tmpdir:
+        _, db_path = _setup(monkeypatch, tmpdir)
+        with sqlite3.connect(db_path) as conn:
+            for activity_id, start, distance, moving, hr_norm, hr_raw, best_5k, best_10k in RUNS:
+                conn.execute(
+                    "INSERT INTO activities(activity_id, activity_type, start_time, user_id) VALUES(?, 'Run', ?, 3)",
+                    (activity_id, start),
+                )
+                conn.execute(
+                    """
+                    INSERT INTO activities_calc(activity_id, start_time, activity_type, distance_m, moving_s,
+                                                avg_hr_norm, avg_hr_raw, user_id)
+                    VALUES(?, ?, 'Run', ?, ?, ?, ?, 3)
+                    """,
+                    (activity_id, start, distance, moving, hr_norm, hr_raw),
+                )
+                for target, best in ((5000, best_5k), (10000, best_10k)):
+                    if best is not None:
+                        conn.execute(
+                            "INSERT INTO segments_best(distance_m, time_s, activity_id, scope, date) "
+                            "VALUES(?, ?, ?, 'activity', ?)",
+                            (target, best, activity_id, start),
+                        )
+            assert training_days.refresh_training_daily(conn, [3]) == 4
+
+            loaded = training_days.load_training_days(conn, 3, NOW - timedelta(days=365))
+            assert loaded.days == ["2025-12-30", "2026-10-01", "2026-10-15"]
+
+        quarter = loaded.summary(NOW - timedelta(days=90), NOW)
+        assert quarter == {
+            "runs": 3,
+            "distance_km": 18.0,
+            "moving_hours": 1.5,
+            "avg_pace_sec": 300.0,
+            "avg_hr": 147.5,
+            "best_5k_time_s": 1450.0,
+            "best_10k_time_s": 2950.0,
+            "weeks_with_runs": 2,
+            "longest_gap_days": 14,
+            "yearly_distance_km": {"2026": 18.0},
+        }
+        year = loaded.summary(NOW - timedelta(days=365), NOW)
+        assert year["runs"] == 4
+        assert year["best_5k_time_s"] == 1450.0
+        # 2025-12-30T23:30 -> 2026-10-01T06:00
+        assert year["longest_gap_days"] == (datetime(2026, 10, 1, 6) - datetime(2025, 12, 30, 23, 30)).days
+        assert year["yearly_distance_km"] == {"2025": 8.0, "2026": 18.0}
+        # Totals come from the prefix sums stored before the loaded range.
+        assert loaded.cum[0] == [1, 12000.0, 3900.0, 140.0, 1, 141.0, 1]
+
+        empty = loaded.summary(NOW - timedelta(days=7), NOW - timedelta(days=3))
+        assert empty["runs"] == 0 and empty["avg_hr"] is None and empty["longest_gap_days"] is None
@@ -0,0 +1,238 @@
+import importlib
+import json
+import sqlite3
+import sys
+import threading
+import time
+from datetime import date, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from urllib.parse import parse_qs, urlparse
+
+from packages import metrics
+from tests.fixtures.build_fixture_db import build_fixture_db
+
+
+class _StubArchive:
+    """Open-Meteo archive endpoint: hourly temperature = day-of-month * 100 + hour."""
+
+    def __init__(self, partial_days=(), failures=None, delay=0.0):
+        self.partial_days = set(partial_days)  # days returned with missing hours (archive lag)
+        self.failures = dict(failures or {})  # latitude -> list of statuses to return first
+        self.delay = delay
+        self.requests = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                query = {k: v[0] for k, v in parse_qs(urlparse(self.path).query).items()}
+                with stub.lock:
+                    stub.requests.append(query)
+                    stub.in_flight += 1
+                    stub.max_in_flight = max(stub.max_in_flight, stub.in_flight)
+                    scripted = stub.failures.get(query["latitude"])
+                    status = scripted.pop(0) if scripted else 200
+                time.sleep(stub.delay)
+                with stub.lock:
+                    stub.in_flight -= 1
+                if status != 200:
+                    self.send_response(status)
+                    self.send_header("Content-Length", "0")
+                    self.send_header("Retry-After", "0")
+                    self.end_headers()
+                    return
+                start, end = date.fromisoformat(query["start_date"]), date.fromisoformat(query["end_date"])
+                times, temps = [], []
+                day = start
+                while day <= end:
+                    for hour in range(24):
+                        times.append(f"{day.isoformat()}T{hour:02d}:00")
+                        partial = day.isoformat() in stub.partial_days and hour >= 12
+                        temps.append(None if partial else day.day * 100 + hour)
+                    day += timedelta(days=1)
+                hourly = {"time": times, "temperature_2m": temps}
+                for var in query["hourly"].split(","):
+                    hourly.setdefault(var, [1.0] * len(times))
+                data = json.dumps({"hourly": hourly}).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/v1/archive"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+
+# activity_id, start, lat, lon
+RUNS = [
+    ("W1", "2026-05-02T07:15:00Z", 51.5012, -0.1201),
+    ("W2", "2026-05-02T18:40:00Z", 51.5049, -0.1180),  # same park, same day
+    ("W3", "2026-05-03T06:05:00Z", 51.4987, -0.1222),  # same park, next day
+    ("W4", "2026-05-20T09:00:00Z", 51.5001, -0.1199),  # same park, within the range cap
+    ("W5", "2026-05-02T07:00:00Z", 48.8566, 2.3522),  # elsewhere
+]
+
+
+def _setup(monkeypatch, tmpdir, stub, runs=RUNS):
+    db_path = Path(tmpdir) / "fixture.db"
+    build_fixture_db(db_path)
+    with sqlite3.connect(db_path) as conn:
+        for activity_id, start, lat, lon in runs:
+            raw = {"id": activity_id, "type": "Run", "start_date": start, "start_latlng": [lat, lon]}
+            conn.execute(
+                "INSERT INTO activities_raw(source_id, activity_id, start_time, raw_json, user_id) VALUES(1,?,?,?,1)",
+                (activity_id, start, json.dumps(raw)),
+            )
+    monkeypatch.setenv("FITNESS_DB_PATH", str(db_path))
+    monkeypatch.setenv("FITNESS_DB_URL", "")
+    monkeypatch.setenv("FITNESS_WEATHER_API_BASE", stub.url)
+    monkeypatch.delenv("FITNESS_WEATHER_API_SLEEP", raising=False)
+    monkeypatch.delenv("FITNESS_WEATHER_API_LIMIT", raising=False)
+    import packages.config as config
+    importlib.reload(config)
+    import services.ingestion.weather_api_import as weather_api
+    importlib.reload(weather_api)
+    return weather_api, db_path
+
+
+def _weather(db_path):
+    with sqlite3.connect(db_path) as conn:
+        rows = conn.execute("SELECT activity_id, raw_json FROM weather_raw WHERE activity_id LIKE 'W%'").fetchall()
+    return {activity_id: json.loads(raw) for activity_id, raw in rows}
+
+
+def test_date_ranges_respect_span_cap():
+    from services.ingestion import weather_api_import as weather_api
+
+    dates = ["2026-05-03", "2026-05-01", "2026-05-31", "2026-06-01", "2026-05-03"]
+    assert weather_api.date_ranges(dates, 31) == [("2026-05-01", "2026-05-31"), ("2026-06-01", "2026-06-01")]
+    assert weather_api.date_ranges(dates, 1) == [
+        ("2026-05-01", "2026-05-01"),
+        ("2026-05-03", "2026-05-03"),
+        ("2026-05-31", "2026-05-31"),
+        ("2026-06-01", "2026-06-01"),
+    ]
+
+
+def test_load_cached_reads_only_requested_days(monkeypatch):
+    from services.ingestion import weather_api_import as weather_api
+
+    with TemporaryDirectory() as tmpdir:
+        db_path = Path(tmpdir) / "fixture.db"
+        build_fixture_db(db_path)
+        cell = (51.5, -0.1)
+        with sqlite3.connect(db_path) as conn:
+            for day in range(1, 31):
+                conn.execute(
+                    "INSERT INTO weather_cache(cell, date, lat, lon, hourly_json) VALUES(?,?,?,?,?)",
+                    (weather_api.cell_key(cell), f"2026-05-{day:02d}", *cell, json.dumps({"day": day})),
+                )
+            monkeypatch.setattr(weather_api, "CACHE_LOOKUP_CHUNK_SIZE", 2)
+            # Spans most of the month but only three days are wanted (two lookups).
+            days = weather_api.load_cached(conn, cell, {"2026-05-30", "2026-05-01", "2026-05-15", "2026-06-01"})
+        assert days == {
+            "2026-05-01": {"day": 1},
+            "2026-05-15": {"day": 15},
+            "2026-05-30": {"day": 30},
+        }
+
+
+def test_weather_fetched_once_per_grid_cell_and_cached(monkeypatch):
+    stub = _StubArchive(partial_days={"2026-05-20"})
+    try:
+        with TemporaryDirectory() as tmpdir:
+            weather_api, db_path = _setup(monkeypatch, tmpdir, stub)
+            monkeypatch.setattr(sys, "argv", ["weather"])
+            assert weather_api.main() == 0
+            # One request per cell: London 2026-05-02..2026-05-20, Paris 2026-05-02.
+            assert sorted((r["latitude"], r["start_date"], r["end_date"]) for r in stub.requests) == [
+                ("48.9", "2026-05-02", "2026-05-02"),
+                ("51.5", "2026-05-02", "2026-05-20"),
+            ]
+            weather = _weather(db_path)
+            assert {k: (w["date"], w["hour_utc"], w["temp_c"]) for k, w in weather.items()} == {
+                "W1": ("2026-05-02", 7, 207),
+                "W2": ("2026-05-02", 18, 218),
+                "W3": ("2026-05-03", 6, 306),
+                "W4": ("2026-05-20", 9, 2009),
+                "W5": ("2026-05-02", 7, 207),
+            }
+            assert weather["W1"]["avg_temp_c"] == 211.5
+            with sqlite3.connect(db_path) as conn:
+                cached = conn.execute("SELECT cell, date FROM weather_cache ORDER BY cell, date").fetchall()
+            # Only the days the activities need are kept; the lagging partial day is not cached.
+            assert ("51.5000,-0.1000", "2026-05-02") in cached
+            assert ("51.5000,-0.1000", "2026-05-20") not in cached
+            assert ("48.9000,2.4000", "2026-05-02") in cached
+
+            # Derived rows are rebuilt from the cache; only the partial day is refetched.
+            with sqlite3.connect(db_path) as conn:
+                conn.execute("DELETE FROM weather_raw WHERE activity_id LIKE 'W%'")
+            stub.requests.clear()
+            assert weather_api.main() == 0
+            assert [(r["start_date"], r["end_date"]) for r in stub.requests] == [("2026-05-20", "2026-05-20")]
+            assert _weather(db_path) == weather
+
+            # --refresh refetches the archive as well.
+            stub.requests.clear()
+            monkeypatch.setattr(sys, "argv", ["weather", "--refresh"])
+            assert weather_api.main() == 0
+            assert len(stub.requests) == 2
+    finally:
+        stub.server.shutdown()
+
+
+def test_backfill_pool_is_bounded_rate_limited_and_batched(monkeypatch, capsys):
+    # Twelve runs in twelve cells; the first cell's archive request is throttled once.
+    runs = [(f"W{i}", f"2026-06-{i + 1:02d}T08:00:00Z", 40.0 + i, 10.0) for i in range(12)]
+    stub = _StubArchive(failures={"40.0": [429]}, delay=0.05)
+    try:
+        with TemporaryDirectory() as tmpdir:
+            weather_api, db_path = _setup(monkeypatch, tmpdir, stub, runs)
+            monkeypatch.setattr(weather_api, "RETRY_BASE_SEC", 0.01)
+            counters = metrics.snapshot()[0]
+            monkeypatch.setattr(
+                sys, "argv", ["weather", "--workers", "3", "--rate", "20", "--batch-size", "5"]
+            )
+            started = time.perf_counter()
+            assert weather_api.main() == 0
+            elapsed = time.perf_counter() - started
+
+            assert len(_weather(db_path)) == 12
+            assert len(stub.requests) == 12 + 1
+            assert 1 < stub.max_in_flight <= 3
+            # 13 requests at 20/s with a burst of 3.
+            assert elapsed >= (13 - 3) / 20 * 0.9
+            out = capsys.readouterr().out
+            # Committed in batches of five activities, not per row.
+            assert [line.split()[2] for line in out.splitlines() if line.startswith("Weather written:")] == [
+                "5",
+                "10",
+                "12",
+            ]
+            assert "13 archive requests, 12 grid cells" in out
+
+            after = metrics.snapshot()[0]
+
+            def delta(name):
+                return after.get(name, 0) - counters.get(name, 0)
+
+            assert delta("weather_backfill_activities_total") == 12
+            assert delta("weather_retries_total") == 1
+            assert delta('weather_requests_total{status="429"}') == 1
+            assert delta("weather_request_duration_seconds_count") == 13
+            assert delta('weather_request_duration_seconds_bucket{le="+Inf"}') == 13
+            assert delta('weather_request_duration_seconds_bucket{le="0.05"}') == 0
+    finally:
+        stub.server.shutdown()